@@ -1,10 +1,13 @@
 # APP_PHOEINX.PY BY <:..:> hthc..., 02.06.2025 [Date x Time] 06:20h <:..:>
 # This file is part of the BlackBox DHQ Phoenix project.
+import time
+_STARTUP_T0 = time.perf_counter() # Početak mjerenja za --profile-startup, prije ostalih uvoza
+import sys
 import customtkinter as ctk
 import tkinter as tk
+from tkinter import messagebox
 import logging
 import os
-from unittest.mock import MagicMock, patch
 import datetime  # (optional: remove if not used elsewhere) 
 
 from gui.main_window import MainWindow
@@ -12,8 +15,13 @@ from gui.license_activation_window import LicenseActivationWindow
 from core.license_manager import LicenseManager
 from core import settings_handler
 from core import downloader_engine
+from core import metrics
+from core import tracing
+from core.log_buffer import LogRingBuffer, install_log_buffer_handler
+from utils.startup_profile import StartupProfiler
 
 APP_NAME = "BlackBox DHQ Phoenix v3.0 (UI Test)" # Možeš ažurirati fazu
+LICENSE_REFRESH_POLL_MS = 500
 
 # ... (logging setup kao prije) ...
 log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
@@ -32,9 +40,12 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class App:
-    def __init__(self):
+    def __init__(self, startup_profiler: StartupProfiler | None = None):
+        self.startup_profiler = startup_profiler or StartupProfiler(enabled=False)
+        self.startup_profiler.mark("imports")
         logger.info(f"Starting application: {APP_NAME}")
         self.settings = settings_handler.load_settings()
+        self.startup_profiler.mark("settings")
 
         ctk.set_appearance_mode(self.settings.get("appearance_mode", "dark"))
         ctk.set_default_color_theme(self.settings.get("theme", "blue"))
@@ -61,16 +72,20 @@ class App:
         # Statusna traka zauzima obje kolone u svom redu
         status_bar.grid(row=1, column=0, columnspan=2, sticky="ew", padx=0, pady=0)
 
-        self.download_manager = downloader_engine.Downloader(
-            update_callback=self._placeholder_initial_dm_callback,
-            max_concurrent_downloads=self.settings.get("max_concurrent_downloads", 1)
-        )
+        self.download_manager = self._create_download_manager()
+        self.metrics_exporter = metrics.start_exporter(self.settings) # None dok metrike nisu uključene u postavkama
+        self.engine_capture = tracing.start_capture(self.settings) # Trace / cProfile / tracemalloc, None dok nisu uključeni
+        self.startup_profiler.mark("download_manager")
+        # Log pane čita iz ograničenog buffera; handler ide na root logger odmah, da se vide i logovi pokretanja
+        self.log_buffer = LogRingBuffer(self.settings.get("log_buffer_lines", 5000))
+        install_log_buffer_handler(self.log_buffer)
 
         self.root.app_context = {
             "root": self.root,
             "settings": self.settings,
             "download_manager": self.download_manager,
             "status_bar_var": self.status_bar_text_var,
+            "log_buffer": self.log_buffer,
             "theme_colors": {}
         }
         try:
@@ -86,11 +101,29 @@ class App:
         except Exception as e_colors: logger.error(f"Greška pri učitavanju boja teme: {e_colors}")
 
         self.license_manager = LicenseManager()
+        self.startup_profiler.mark("license_manager")
         self._check_license_and_launch()
     
     # ... (ostatak App klase: _placeholder_initial_dm_callback, _on_app_quit, 
     #      _check_license_and_launch, _show_license_activation, 
     #      _on_license_activated_successfully, _show_main_app ostaju isti) ...
+    def _create_download_manager(self):
+        max_concurrent = self.settings.get("max_concurrent_downloads", 1)
+        engine_error = settings_handler.download_engine_error(self.settings)
+        if engine_error: logger.error(f"{engine_error} Koristim \"threading\".")
+        journal = None
+        try: journal = downloader_engine.TaskJournal()
+        except Exception as e_journal: logger.error(f"Dnevnik zadataka nije dostupan, red se neće čuvati između pokretanja: {e_journal}")
+        if not engine_error and self.settings.get("download_engine") == "asyncio":
+            from core.async_engine import AsyncDownloader
+            logger.info("Koristim asyncio download engine.")
+            return AsyncDownloader(update_callback=self._placeholder_initial_dm_callback, max_concurrent_downloads=max_concurrent, journal=journal)
+        return downloader_engine.Downloader(
+            update_callback=self._placeholder_initial_dm_callback,
+            max_concurrent_downloads=max_concurrent,
+            journal=journal
+        )
+
     def _placeholder_initial_dm_callback(self, task, update_type, data=None):
          logger.debug(f"DM_INIT_CALLBACK: Task {task.item_id if task else 'N/A'}, Type: {update_type}, Data: {data}")
 
@@ -104,29 +137,61 @@ class App:
              logger.info("Zatvaram aplikaciju nakon odjave licence...")
 
         if self.download_manager: self.download_manager.stop_worker()
+        if self.metrics_exporter: self.metrics_exporter.close()
+        if self.engine_capture: self.engine_capture.close()
+        settings_handler.flush_settings() # Odgođeni upis postavki ide na disk prije izlaska
         self.root.destroy()
         print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - INFO     - [__main__] (N/A) - Aplikacija uspješno zatvorena.")
 
     def _check_license_and_launch(self):
+         # Samo lokalna provjera (keširani ključ + dekripcija); online provjera ide u pozadini nakon što je prozor prikazan
          is_valid, license_info_or_error = self.license_manager.is_license_valid()
+         self.startup_profiler.mark("license_check")
+         self.root.app_context["license_manager"] = self.license_manager
          if is_valid:
              logger.info(f"Validna licenca pronađena: Tip {license_info_or_error.get('type')}")
              user_type = license_info_or_error.get("type", "standard")
              self.root.app_context["license_info"] = license_info_or_error
-             self.root.app_context["license_manager"] = self.license_manager
              self.root.app_context["user_type"] = user_type
              self._show_main_app(user_type, license_info_or_error)
-             self.root.mainloop() 
+             self.startup_profiler.mark("main_window")
+             self._start_license_refresh()
+         elif isinstance(license_info_or_error, dict) and license_info_or_error.get("grace_expired"):
+             # Ključ je poznat, samo treba online potvrda: prozor za aktivaciju je sam pokreće
+             logger.warning("Istekao offline grace period licence, pokrećem ponovnu online provjeru.")
+             self._show_license_activation(initial_key=license_info_or_error.get("license_key"))
          else:
              logger.warning(f"Nema validne lokalne licence ili je istekla ({license_info_or_error}), pokrećem prozor za aktivaciju.")
-             self.root.app_context["license_manager"] = self.license_manager
              self._show_license_activation()
-             self.root.mainloop()
-
-    def _show_license_activation(self):
+         if self.startup_profiler.enabled: self.root.after_idle(self._finish_startup_profile)
+         self.root.mainloop()
+
+    def _finish_startup_profile(self):
+         # Prvi idle nakon ulaska u mainloop: sve zakazano za iscrtavanje je obrađeno
+         self.root.update_idletasks(); self.startup_profiler.mark("first_paint")
+         self.startup_profiler.dump()
+         if self.download_manager: self.download_manager.stop_worker()
+         if self.metrics_exporter: self.metrics_exporter.close()
+         if self.engine_capture: self.engine_capture.close()
+         self.root.after(0, self.root.destroy)
+
+    def _start_license_refresh(self):
+         refresh_future = self.license_manager.refresh_license_async()
+         def poll_refresh():
+             if not refresh_future.done(): self.root.after(LICENSE_REFRESH_POLL_MS, poll_refresh); return
+             try: still_valid, license_info = refresh_future.result()
+             except Exception as e_refresh: logger.error(f"Greška pri pozadinskoj provjeri licence: {e_refresh}", exc_info=True); return
+             if still_valid: self.root.app_context["license_info"] = license_info; return
+             license_info = license_info or {}; error_msg = license_info.get("error", "Licenca više nije važeća.")
+             logger.error(f"Pozadinska provjera licence: {error_msg}")
+             messagebox.showerror("Licenca", f"{error_msg}\n\nPotrebna je ponovna aktivacija.", parent=self.root)
+             self._show_license_activation(initial_key=license_info.get("license_key") if license_info.get("grace_expired") else None)
+         self.root.after(LICENSE_REFRESH_POLL_MS, poll_refresh)
+
+    def _show_license_activation(self, initial_key: str | None = None):
          self.root.withdraw() 
          LicenseActivationWindow(
-             self.root, self.license_manager, self._on_license_activated_successfully
+             self.root, self.license_manager, self._on_license_activated_successfully, initial_key=initial_key
          )
 
     def _on_license_activated_successfully(self, license_info):
@@ -138,7 +203,7 @@ class App:
          user_type = license_info.get("type", "standard")
          self.root.app_context["license_info"] = license_info
          self.root.app_context["user_type"] = user_type 
-         self._show_main_app(user_type, license_info)
+         if getattr(self, "main_window_instance", None) is None: self._show_main_app(user_type, license_info)
 
     def _show_main_app(self, user_type: str, license_info: dict):
          logger.info(f"Prikazujem glavni prozor aplikacije za korisnika tipa: {user_type}")
@@ -152,10 +217,13 @@ class App:
              def default_download_update(task, update_type, data=None):
                  logger.warning(f"Default fallback: Task {task.item_id if task else 'N/A'}, Type: {update_type}, Data: {data}")
              self.download_manager.update_callback = default_download_update
+         if self.settings.get("resume_unfinished_on_start", True) and hasattr(self.download_manager, "restore_from_journal"):
+             self.download_manager.restore_from_journal()
 
 if __name__ == "__main__":
     try:
-        app = App()
+        # --profile-startup: ispiše JSON s vremenima faza do prvog iscrtavanja i zatvori aplikaciju
+        app = App(startup_profiler=StartupProfiler(enabled="--profile-startup" in sys.argv[1:], started=_STARTUP_T0))
     except Exception as e:
         try:
             logger.critical(f"Nepredviđena greška pri pokretanju aplikacije: {e}", exc_info=True)
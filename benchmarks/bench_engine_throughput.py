@@ -0,0 +1,184 @@
+# benchmarks/bench_engine_throughput.py
+# Propusnost threading Downloader-a (backend "subprocess") bez interneta: yt-dlp je zamijenjen s benchmarks/fake_ytdlp.py
+# preko BBX_YT_DLP_EXECUTABLE, pa se mjeri samo engine (dispatcher, reaktor procesa, parsiranje protokola, callbackovi).
+# Za svaku razinu istovremenosti (zadano 1, 10, 100) javlja:
+#   tasks_per_s            završeni taskovi u sekundi (bez "stall" taskova, koji se na kraju otkazuju)
+#   callback_latency_ms    od ispisa progress linije u fake procesu do update_callbacka (p50/p95/p99/max)
+#   cpu_per_active_pct     CPU procesa engine-a po aktivnom preuzimanju (fake procesi se broje zasebno, children_cpu_s)
+#   peak_threads/peak_fds  vrhunac niti i otvorenih fajl deskriptora (fd samo na Linuxu; uključuje i nit uzorkovanja)
+#   peak_postprocess_queue vrhunac reda stupnja obrade; ffmpeg je benchmarks/fake_ffmpeg.py (--ffmpeg-ms po poslu)
+#
+#   python benchmarks/bench_engine_throughput.py --concurrency 1,10,100 --json-out engine.json
+#   python benchmarks/bench_engine_throughput.py --baseline engine.json   # izlazni kod 1 ako je nešto lošije od --tolerance
+#
+# Postavke idu u privremeni HOME, da benchmark ne dira stvarne postavke korisnika. Rezultat je JSON na stdout (i u --json-out).
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+_SAMPLE_INTERVAL = 0.02
+_FAKE_YTDLP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_ytdlp.py")
+_FAKE_FFMPEG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_ffmpeg.py")
+
+def _write_launcher(work_dir: str, script: str = _FAKE_YTDLP, name: str = "fake-yt-dlp") -> str:
+    # YT_DLP_EXECUTABLE je jedna izvršna datoteka, pa fake ide preko malog launchera s istim Python interpreterom
+    if os.name == "nt":
+        path = os.path.join(work_dir, f"{name}.cmd")
+        with open(path, "w") as f: f.write(f'@"{sys.executable}" "{script}" %*\n')
+    else:
+        path = os.path.join(work_dir, name)
+        with open(path, "w") as f: f.write(f'#!/bin/sh\nexec "{sys.executable}" "{script}" "$@"\n')
+        os.chmod(path, 0o755)
+    return path
+
+def _open_fds() -> int | None:
+    try: return len(os.listdir("/proc/self/fd"))
+    except OSError: return None
+
+def _percentiles_ms(values: list) -> dict:
+    if not values: return {"count": 0}
+    ordered = sorted(values)
+    pick = lambda fraction: round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 2)
+    return {"count": len(ordered), "p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99), "max": round(ordered[-1] * 1000, 2)}
+
+class _Sampler:
+    def __init__(self, downloader):
+        self.downloader = downloader; self.stop_event = threading.Event()
+        self.peak_threads = threading.active_count(); self.peak_fds = _open_fds(); self.active_samples = []
+        self.peak_postprocess_queue = 0
+        self.thread = threading.Thread(target=self._run, name="BenchSampler", daemon=True)
+
+    def _run(self):
+        while not self.stop_event.wait(_SAMPLE_INTERVAL):
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+            fds = _open_fds()
+            if fds is not None: self.peak_fds = max(self.peak_fds or 0, fds)
+            self.active_samples.append(self.downloader.active_downloads_count)
+            self.peak_postprocess_queue = max(self.peak_postprocess_queue, self.downloader.stage_depths()["postprocess"]["queued"])
+
+def _url_for(index: int, args) -> str:
+    query = [f"duration={args.duration}", f"hz={args.hz}", f"size_kb={args.size_kb}"]
+    if args.fail_every and index % args.fail_every == args.fail_every - 1: query.append("fail=1")
+    elif args.stall_every and index % args.stall_every == args.stall_every - 1: query.append("stall=1")
+    return f"https://fake.invalid/watch/{index}?{'&'.join(query)}"
+
+def _run_level(de, settings_handler, concurrency: int, args, output_dir: str) -> dict:
+    settings = settings_handler.load_settings()
+    settings.update(download_backend="subprocess", max_concurrent_downloads=concurrency, resume_unfinished_on_start=False,
+                    extraction_cache_enabled=False, download_archive_enabled=False,
+                    host_max_concurrent_default=0, bandwidth_limit_kib=0, # Svi URL-ovi su na istom hostu; limit po hostu bi mjerio sebe
+                    postprocess_stage_enabled=args.ffmpeg_ms > 0)
+    settings_handler.save_settings(settings)
+    urls = [_url_for(index, args) for index in range(concurrency * args.tasks_per_slot)]
+    stalled_ids = {f"bench_{index}" for index, url in enumerate(urls) if "stall=1" in url}
+    finished = {}; latencies = []; lock = threading.Lock(); all_done = threading.Event()
+    def on_update(task, update_type, data=None):
+        if update_type == "progress_update" and getattr(task, "bench_sent_at", None):
+            latencies.append(time.time() - task.bench_sent_at)
+        elif update_type in ("download_complete", "download_error") and task.item_id.startswith("bench_") and task.item_id not in stalled_ids:
+            with lock:
+                finished[task.item_id] = task.status == "Završeno"
+                if len(finished) == len(urls) - len(stalled_ids): all_done.set()
+
+    downloader = de.Downloader(on_update, max_concurrent_downloads=concurrency)
+    baseline_threads = threading.active_count(); baseline_fds = _open_fds()
+    sampler = _Sampler(downloader); sampler.thread.start()
+    cpu_before = os.times(); started = time.perf_counter()
+    downloader.start_worker()
+    for index, url in enumerate(urls):
+        downloader.add_to_queue(de.DownloadTask(url, "Video - 720p MP4", output_dir, f"bench_{index}"))
+    if len(urls) > len(stalled_ids): all_done.wait(timeout=args.timeout)
+    wall = time.perf_counter() - started
+
+    cancel_started = time.perf_counter()
+    for task_id in stalled_ids: downloader.cancel_task(task_id)
+    while downloader.active_downloads_count and time.perf_counter() - cancel_started < 30: time.sleep(0.01)
+    cancel_wall = time.perf_counter() - cancel_started
+    cpu_after = os.times()
+    sampler.stop_event.set(); sampler.thread.join()
+    downloader.stop_worker()
+
+    engine_cpu = (cpu_after.user - cpu_before.user) + (cpu_after.system - cpu_before.system)
+    children_cpu = (cpu_after.children_user - cpu_before.children_user) + (cpu_after.children_system - cpu_before.children_system)
+    avg_active = statistics.fmean(sampler.active_samples) if sampler.active_samples else 0.0
+    return {"concurrency": concurrency, "tasks": len(urls), "ok": sum(finished.values()), "failed": len(finished) - sum(finished.values()),
+            "stalled_cancelled": len(stalled_ids), "unfinished": len(urls) - len(stalled_ids) - len(finished),
+            "wall_s": round(wall, 3), "tasks_per_s": round(len(finished) / wall, 2) if wall else None,
+            "cancel_stalled_s": round(cancel_wall, 3) if stalled_ids else None,
+            "callback_latency_ms": _percentiles_ms(latencies),
+            "engine_cpu_s": round(engine_cpu, 3), "children_cpu_s": round(children_cpu, 3), "avg_active": round(avg_active, 2),
+            "cpu_per_active_pct": round(engine_cpu / (wall * avg_active) * 100, 2) if wall and avg_active else None,
+            "baseline_threads": baseline_threads, "peak_threads": sampler.peak_threads,
+            "baseline_fds": baseline_fds, "peak_fds": sampler.peak_fds, "peak_postprocess_queue": sampler.peak_postprocess_queue}
+
+def _compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Metrike lošije od baseline-a za više od tolerance (udio); (razina, metrika, baseline, sada)."""
+    regressions = []
+    for level, current in results["levels"].items():
+        previous = baseline.get("levels", {}).get(level)
+        if not previous: continue
+        checks = (("tasks_per_s", current["tasks_per_s"], previous.get("tasks_per_s"), False),
+                  ("callback_latency_p95_ms", current["callback_latency_ms"].get("p95"), previous.get("callback_latency_ms", {}).get("p95"), True),
+                  ("cpu_per_active_pct", current["cpu_per_active_pct"], previous.get("cpu_per_active_pct"), True),
+                  ("peak_threads", current["peak_threads"], previous.get("peak_threads"), True))
+        for name, now, before, lower_is_better in checks:
+            if now is None or not before: continue
+            worse = now > before * (1 + tolerance) if lower_is_better else now < before * (1 - tolerance)
+            if worse: regressions.append({"concurrency": level, "metric": name, "baseline": before, "current": now})
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark: propusnost Downloader-a s lažnim yt-dlp-om (bez mreže).")
+    parser.add_argument("--concurrency", default="1,10,100", help="Razine istovremenosti, odvojene zarezom.")
+    parser.add_argument("--tasks-per-slot", type=int, default=3, help="Broj taskova = istovremenost * ovo.")
+    parser.add_argument("--duration", type=float, default=1.0, help="Trajanje jednog lažnog preuzimanja (s).")
+    parser.add_argument("--hz", type=float, default=20.0, help="Progress linija u sekundi po procesu.")
+    parser.add_argument("--size-kb", type=int, default=256)
+    parser.add_argument("--fail-every", type=int, default=0, help="Svaki N-ti task završava greškom (0 = nikad).")
+    parser.add_argument("--stall-every", type=int, default=0, help="Svaki N-ti task visi i na kraju se otkazuje (0 = nikad).")
+    parser.add_argument("--ffmpeg-ms", type=int, default=0, help="Trajanje lažnog ffmpeg posla po tasku (ms); 0 = stupanj obrade isključen.")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--json-out", help="Upiši rezultat i u ovaj fajl (za praćenje regresija).")
+    parser.add_argument("--baseline", help="Prethodni --json-out; izlazni kod 1 ako je neka metrika lošija od --tolerance.")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix="bbx_bench_engine_")
+    os.environ["HOME"] = os.environ["USERPROFILE"] = work_dir # Prije uvoza core paketa (CONFIG_DIR se računa pri uvozu)
+    os.environ["BBX_YT_DLP_EXECUTABLE"] = _write_launcher(work_dir) # Čita se pri uvozu core.downloader_engine
+    os.environ["BBX_FFMPEG_EXECUTABLE"] = _write_launcher(work_dir, _FAKE_FFMPEG, "fake-ffmpeg")
+    os.environ["BBX_FAKE_FFMPEG_MS"] = str(args.ffmpeg_ms)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from core import settings_handler
+    from core import downloader_engine as de
+    from core.process_reactor import get_reactor
+
+    original_apply_progress = de.apply_progress
+    def apply_progress_with_timestamp(task, payload): # Vrijeme ispisa u fake procesu, za kašnjenje do callbacka
+        original_apply_progress(task, payload); task.bench_sent_at = payload.get("bbx_sent_at")
+    de.apply_progress = apply_progress_with_timestamp
+
+    results = {"meta": {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+                        "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "duration_s": args.duration, "hz": args.hz, "size_kb": args.size_kb,
+                        "tasks_per_slot": args.tasks_per_slot, "fail_every": args.fail_every, "stall_every": args.stall_every,
+                        "ffmpeg_ms": args.ffmpeg_ms},
+               "levels": {}}
+    for concurrency in (int(level) for level in args.concurrency.split(",")):
+        output_dir = os.path.join(work_dir, "out", str(concurrency))
+        results["levels"][str(concurrency)] = _run_level(de, settings_handler, concurrency, args, output_dir)
+    results["reactor_stats"] = dict(get_reactor().stats)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f: results["regressions"] = _compare(results, json.load(f), args.tolerance)
+    print(json.dumps(results, indent=2))
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f: json.dump(results, f, indent=2)
+    return 1 if results.get("regressions") else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
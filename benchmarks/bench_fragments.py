@@ -0,0 +1,134 @@
+# benchmarks/bench_fragments.py
+# Propusnost preuzimanja s obzirom na "download_tuning" (core.download_tuning): jedan HLS stream iz N segmenata
+# i jedan veliki HTTP fajl, s lokalnog servera koji simulira CDN: kašnjenje po zahtjevu i ograničenu brzinu po vezi.
+# Kod takvog servera jedna veza ne može iskoristiti link; paralelni fragmenti (ili aria2c s više veza) mogu.
+#
+#   python benchmarks/bench_fragments.py --segments 24 --segment-kb 256 --per-conn-kbps 2048 --latency-ms 50
+#
+# Postavke idu u privremeni HOME, da benchmark ne dira stvarne postavke korisnika. Rezultat je JSON na stdout.
+# Konfiguracija "aria2c" se mjeri samo ako je aria2c u PATH-u.
+import argparse
+import functools
+import http.server
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+_RANGE_RE = re.compile(r"^bytes=(\d+)-(\d*)$")
+
+class _ThrottledHandler(http.server.SimpleHTTPRequestHandler):
+    # SimpleHTTPRequestHandler ne zna Range, a trebaju ga --http-chunk-size i aria2c (više veza na isti fajl)
+    latency = 0.05
+    bytes_per_second = 2 * 1024 * 1024
+
+    def log_message(self, *args): pass
+
+    def send_head(self):
+        time.sleep(self.latency); self._remaining = None
+        range_match = _RANGE_RE.match(self.headers.get("Range", "").strip())
+        path = self.translate_path(self.path)
+        if not range_match or not os.path.isfile(path): return super().send_head()
+        size = os.path.getsize(path); start = int(range_match.group(1))
+        end = min(int(range_match.group(2)) if range_match.group(2) else size - 1, size - 1)
+        if start >= size: self.send_error(416); return None
+        f = open(path, "rb"); f.seek(start); self._remaining = end - start + 1
+        self.send_response(206)
+        self.send_header("Content-Type", self.guess_type(path)); self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Range", f"bytes {start}-{end}/{size}"); self.send_header("Content-Length", str(self._remaining))
+        self.end_headers()
+        return f
+
+    def copyfile(self, source, outputfile):
+        started = time.monotonic(); sent = 0
+        while self._remaining is None or sent < self._remaining:
+            block = source.read(16384 if self._remaining is None else min(16384, self._remaining - sent))
+            if not block: break
+            outputfile.write(block); sent += len(block)
+            ahead = sent / self.bytes_per_second - (time.monotonic() - started)
+            if ahead > 0: time.sleep(ahead)
+
+class _QuietServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    def handle_error(self, request, client_address): pass # yt-dlp/aria2c znaju prekinuti vezu usred odgovora
+
+def _serve_directory(directory: str, latency: float, bytes_per_second: int) -> http.server.ThreadingHTTPServer:
+    handler = type("_Handler", (_ThrottledHandler,), {"latency": latency, "bytes_per_second": bytes_per_second})
+    server = _QuietServer(("127.0.0.1", 0), functools.partial(handler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def _write_fixtures(media_dir: str, segments: int, segment_kb: int) -> int:
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:4", "#EXT-X-MEDIA-SEQUENCE:0", "#EXT-X-PLAYLIST-TYPE:VOD"]
+    for index in range(segments):
+        with open(os.path.join(media_dir, f"seg{index}.ts"), "wb") as f: f.write(os.urandom(segment_kb * 1024))
+        lines.extend(["#EXTINF:4.0,", f"seg{index}.ts"])
+    lines.append("#EXT-X-ENDLIST")
+    with open(os.path.join(media_dir, "stream.m3u8"), "w", encoding="utf-8") as f: f.write("\n".join(lines) + "\n")
+    with open(os.path.join(media_dir, "movie.mp4"), "wb") as f: f.write(os.urandom(segments * segment_kb * 1024))
+    return segments * segment_kb * 1024
+
+def _run_config(de, settings_handler, name: str, tuning: dict, url: str, output_dir: str) -> dict:
+    settings = settings_handler.load_settings()
+    settings.update(download_tuning={"default": tuning}, max_concurrent_downloads=1, add_metadata_video=False,
+                    resume_unfinished_on_start=False, extraction_cache_enabled=False, download_archive_enabled=False, bandwidth_limit_kib=0)
+    settings_handler.save_settings(settings)
+    finished = threading.Event(); result = {}
+    def on_update(task, update_type, data=None):
+        if update_type in ("download_complete", "download_error") and task.item_id == "bench_frag":
+            result.update(ok=task.status == "Završeno", error=task.error_message); finished.set()
+    downloader = de.Downloader(on_update, max_concurrent_downloads=1)
+    started = time.perf_counter()
+    downloader.add_to_queue(de.DownloadTask(url, "Općenito - Najbolje Moguće", os.path.join(output_dir, name), "bench_frag"))
+    finished.wait(timeout=600)
+    wall = time.perf_counter() - started
+    downloader.stop_worker()
+    return {"wall_s": round(wall, 3), **result}
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark: paralelni fragmenti / vanjski downloader vs. jedna veza.")
+    parser.add_argument("--segments", type=int, default=24)
+    parser.add_argument("--segment-kb", type=int, default=256)
+    parser.add_argument("--per-conn-kbps", type=int, default=2048, help="Ograničenje brzine po vezi na serveru (KiB/s).")
+    parser.add_argument("--latency-ms", type=int, default=50, help="Kašnjenje servera po zahtjevu.")
+    parser.add_argument("--fragments", default="1,4,8", help="Vrijednosti concurrent_fragments za HLS.")
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix="bbx_bench_frag_")
+    os.environ["HOME"] = os.environ["USERPROFILE"] = work_dir # Prije uvoza core paketa (CONFIG_DIR se računa pri uvozu)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from core import settings_handler
+    from core import downloader_engine as de
+
+    media_dir = os.path.join(work_dir, "media"); os.makedirs(media_dir)
+    total_bytes = _write_fixtures(media_dir, args.segments, args.segment_kb)
+    server = _serve_directory(media_dir, args.latency_ms / 1000.0, args.per_conn_kbps * 1024)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    output_dir = os.path.join(work_dir, "out")
+
+    configs = [(f"hls_fragments_{count}", f"{base_url}/stream.m3u8", {"concurrent_fragments": int(count)}) for count in args.fragments.split(",")]
+    configs.append(("http_native", f"{base_url}/movie.mp4", {"concurrent_fragments": 1, "http_chunk_size": "1M"}))
+    if shutil.which("aria2c"):
+        configs.append(("http_aria2c", f"{base_url}/movie.mp4", {"external_downloader": {"http": "aria2c"},
+                                                                 "external_downloader_args": {"aria2c": "-x 8 -s 8 -k 1M"}}))
+    results = {"total_mib": round(total_bytes / 1024 ** 2, 2), "per_conn_kbps": args.per_conn_kbps, "latency_ms": args.latency_ms}
+    for name, url, tuning in configs:
+        run = _run_config(de, settings_handler, name, tuning, url, output_dir)
+        run["mib_per_s"] = round(total_bytes / 1024 ** 2 / run["wall_s"], 2) if run.get("ok") else None
+        results[name] = run
+    baseline = results.get("hls_fragments_1", {}).get("wall_s")
+    if baseline:
+        results["hls_speedup"] = {name: round(baseline / run["wall_s"], 2) for name, run in results.items()
+                                  if name.startswith("hls_fragments_") and run.get("ok")}
+    if results.get("http_aria2c", {}).get("ok"):
+        results["aria2c_speedup"] = round(results["http_native"]["wall_s"] / results["http_aria2c"]["wall_s"], 2)
+    server.shutdown()
+    print(json.dumps(results, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+# benchmarks/bench_license_startup.py
+# Vrijeme od pokretanja do trenutka kad App može prikazati glavni prozor (LicenseManager() + is_license_valid()),
+# uz lokalni stub server licenci umjesto Pastebina (LicenseManager(server_url=...)) sa simuliranim kašnjenjem mreže.
+#
+#   python benchmarks/bench_license_startup.py --latency-ms 800 --runs 5
+#
+# "cold" je prvo pokretanje (PBKDF2 + upis keša ključa), "warm" svako sljedeće (novi proces simuliran brisanjem
+# memorijskog keša). "legacy_*" su stari putevi na glavnoj niti: PBKDF2 + lokalna provjera prije prozora, te
+# blokirajuća aktivacija (PBKDF2 + dohvat sa servera) tijekom koje prozor ne reagira.
+# Postavke idu u privremeni HOME, stvarna licenca korisnika se ne dira. Rezultat je JSON na stdout.
+import argparse
+import http.server
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+_LICENSE_KEY = "BENCH-0000-0000"
+
+class _StubLicenseHandler(http.server.BaseHTTPRequestHandler):
+    latency = 0.5
+
+    def log_message(self, *args): pass
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        body = json.dumps({"license_key": _LICENSE_KEY, "type": "standard", "user": "bench", "status": "active", "expires_at": "2099-01-01T00:00:00Z"}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json"); self.send_header("Content-Length", str(len(body)))
+        self.end_headers(); self.wfile.write(body)
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 2)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark: vrijeme do glavnog prozora s obzirom na provjeru licence.")
+    parser.add_argument("--latency-ms", type=int, default=800, help="Kašnjenje stub servera licenci po zahtjevu.")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix="bbx_bench_license_")
+    os.environ["HOME"] = os.environ["USERPROFILE"] = work_dir # Prije uvoza core paketa (CONFIG_DIR se računa pri uvozu)
+    handler = type("_Handler", (_StubLicenseHandler,), {"latency": args.latency_ms / 1000.0})
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server_url = f"http://127.0.0.1:{server.server_address[1]}/raw/license"
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from core import license_manager as lm
+
+    started = time.perf_counter(); manager = lm.LicenseManager(server_url); cold_init = time.perf_counter() - started
+    started = time.perf_counter(); activated, _info = manager.activate_license(_LICENSE_KEY); activation = time.perf_counter() - started
+    if not activated:
+        print(json.dumps({"error": "Aktivacija na stub serveru nije uspjela."})); return 1
+
+    warm_to_window, refresh_done, legacy_init, legacy_activation = [], [], [], []
+    for _ in range(args.runs):
+        lm._derived_keys.clear() # Novi proces: samo keš na disku
+        started = time.perf_counter()
+        manager = lm.LicenseManager(server_url); is_valid, _info = manager.is_license_valid()
+        warm_to_window.append(time.perf_counter() - started)
+        assert is_valid
+        refresh_future = manager.refresh_license_async(); refresh_future.result()
+        refresh_done.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        manager._derive_key(manager._get_or_create_salt()); manager.is_license_valid() # Stari LicenseManager.__init__ + provjera
+        legacy_init.append(time.perf_counter() - started)
+        manager._fetch_license_from_remote(_LICENSE_KEY)
+        legacy_activation.append(time.perf_counter() - started)
+
+    server.shutdown()
+    print(json.dumps({
+        "latency_ms": args.latency_ms, "runs": args.runs,
+        "cold_init_ms": _ms(cold_init), "activation_ms": _ms(activation),
+        "warm_time_to_window_ms": _ms(statistics.median(warm_to_window)),
+        "background_refresh_done_ms": _ms(statistics.median(refresh_done)),
+        "legacy_time_to_window_ms": _ms(statistics.median(legacy_init)),
+        "legacy_blocking_activation_ms": _ms(statistics.median(legacy_activation)),
+        "time_to_window_speedup": round(statistics.median(legacy_init) / statistics.median(warm_to_window), 1),
+    }, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
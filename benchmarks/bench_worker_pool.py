@@ -0,0 +1,84 @@
+# benchmarks/bench_worker_pool.py
+# Usporedba backend-a "subprocess" (yt-dlp proces po tasku) i "worker_pool" (core.ytdlp_worker_pool) na mnogo kratkih klipova.
+# Klipovi se poslužuju s lokalnog HTTP servera, pa mjerenje ne ovisi o mreži: razlika je gotovo čisto cijena pokretanja yt-dlp-a.
+#
+#   python benchmarks/bench_worker_pool.py --tasks 30 --jobs 4
+#
+# Postavke i dnevnik idu u privremeni HOME, da benchmark ne dira stvarne postavke korisnika. Rezultat je JSON na stdout.
+import argparse
+import functools
+import http.server
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args): pass
+
+class _QuietServer(http.server.ThreadingHTTPServer):
+    def handle_error(self, request, client_address): pass # yt-dlp zna prekinuti vezu nakon HEAD/probe zahtjeva
+
+def _serve_directory(directory: str) -> http.server.ThreadingHTTPServer:
+    server = _QuietServer(("127.0.0.1", 0), functools.partial(_QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def _run_backend(de, settings_handler, backend: str, urls: list, jobs: int, output_dir: str, max_jobs_per_worker: int) -> dict:
+    settings = settings_handler.load_settings()
+    settings.update(download_backend=backend, worker_pool_max_jobs=max_jobs_per_worker, max_concurrent_downloads=jobs,
+                    add_metadata_video=False, resume_unfinished_on_start=False,
+                    extraction_cache_enabled=False, download_archive_enabled=False) # Drugi backend inače dobije iste URL-ove besplatno
+    settings_handler.save_settings(settings)
+    finished = {}; all_done = threading.Event()
+    def on_update(task, update_type, data=None):
+        if update_type in ("download_complete", "download_error") and task.item_id.startswith("bench_"):
+            finished[task.item_id] = task.status == "Završeno"
+            if len(finished) == len(urls): all_done.set()
+    downloader = de.Downloader(on_update, max_concurrent_downloads=jobs)
+    downloader.start_worker()
+    if backend == "worker_pool": time.sleep(2.0) # Pool se grije u pozadini kao u aplikaciji (između pokretanja i prvog taska)
+    started = time.perf_counter()
+    for index, url in enumerate(urls):
+        downloader.add_to_queue(de.DownloadTask(url, "Općenito - Najbolje Moguće", os.path.join(output_dir, backend), f"bench_{index}"))
+    all_done.wait(timeout=600)
+    wall = time.perf_counter() - started
+    pool_stats = dict(downloader._worker_pool.stats) if downloader._worker_pool else None
+    downloader.stop_worker()
+    return {"wall_s": round(wall, 3), "per_task_s": round(wall / max(1, len(urls)), 3), "ok": sum(finished.values()),
+            "failed": len(urls) - sum(finished.values()), "pool_stats": pool_stats}
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark: yt-dlp proces po tasku vs. pool zagrijanih workera.")
+    parser.add_argument("--tasks", type=int, default=20)
+    parser.add_argument("--jobs", type=int, default=2)
+    parser.add_argument("--size-kb", type=int, default=256)
+    parser.add_argument("--max-jobs-per-worker", type=int, default=25)
+    parser.add_argument("--backends", default="subprocess,worker_pool")
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix="bbx_bench_")
+    os.environ["HOME"] = os.environ["USERPROFILE"] = work_dir # Prije uvoza core paketa (CONFIG_DIR se računa pri uvozu)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from core import settings_handler
+    from core import downloader_engine as de
+
+    media_dir = os.path.join(work_dir, "media"); os.makedirs(media_dir)
+    for index in range(args.tasks):
+        with open(os.path.join(media_dir, f"clip{index}.mp3"), "wb") as f: f.write(os.urandom(args.size_kb * 1024))
+    server = _serve_directory(media_dir)
+    urls = [f"http://127.0.0.1:{server.server_address[1]}/clip{index}.mp3" for index in range(args.tasks)]
+
+    results = {"tasks": args.tasks, "jobs": args.jobs, "size_kb": args.size_kb}
+    for backend in args.backends.split(","):
+        results[backend] = _run_backend(de, settings_handler, backend, urls, args.jobs, os.path.join(work_dir, "out"), args.max_jobs_per_worker)
+    if "subprocess" in results and "worker_pool" in results and results["worker_pool"]["wall_s"]:
+        results["speedup"] = round(results["subprocess"]["wall_s"] / results["worker_pool"]["wall_s"], 2)
+    server.shutdown()
+    print(json.dumps(results, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
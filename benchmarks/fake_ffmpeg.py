@@ -0,0 +1,35 @@
+# benchmarks/fake_ffmpeg.py
+# Zamjena za ffmpeg u stupnju obrade (core.postprocess_stage), za benchmark i ručno testiranje bez pravog ffmpeg-a.
+# Razumije ono što šalje PostProcessJob.command: -i ulazi, -progress pipe:1 i izlazni fajl kao zadnji argument;
+# ostale opcije (mapiranje, kodeci, metapodaci) preskače. Izlaz je spoj bajtova svih ulaza.
+#   BBX_FAKE_FFMPEG_MS    trajanje simulirane obrade u milisekundama (zadano 200)
+#   BBX_FAKE_FFMPEG_FAIL  1 = izlaz s greškom na stderr i kodom 1
+# Pokreće se preko BBX_FFMPEG_EXECUTABLE=<launcher> (vidi _write_launcher u benchmarku).
+import os
+import sys
+import time
+
+_PROGRESS_INTERVAL = 0.05
+
+def main(argv=None) -> int:
+    args = sys.argv[1:] if argv is None else argv
+    inputs = [args[index + 1] for index, arg in enumerate(args[:-1]) if arg == "-i"]
+    progress = "-progress" in args
+    output = args[-1] if args else None
+    if not inputs or not output:
+        sys.stderr.write("fake ffmpeg: nema ulaza ili izlaza\n"); return 1
+    if os.environ.get("BBX_FAKE_FFMPEG_FAIL") == "1":
+        sys.stderr.write(f"{inputs[0]}: Simulirana greška obrade\n"); return 1
+    duration = float(os.environ.get("BBX_FAKE_FFMPEG_MS", 200)) / 1000.0; started = time.time()
+    while progress and time.time() - started < duration:
+        sys.stdout.write(f"out_time_us={int((time.time() - started) / duration * 10_000_000)}\nprogress=continue\n"); sys.stdout.flush()
+        time.sleep(_PROGRESS_INTERVAL)
+    if not progress: time.sleep(duration)
+    with open(output, "wb") as out:
+        for path in inputs:
+            with open(path, "rb") as source: out.write(source.read())
+    if progress: sys.stdout.write("out_time_us=10000000\nprogress=end\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
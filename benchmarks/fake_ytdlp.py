@@ -0,0 +1,193 @@
+# benchmarks/fake_ytdlp.py
+# Zamjena za yt-dlp bez mreže, za mjerenje Downloader-a (benchmarks/bench_engine_throughput.py) i ručno testiranje.
+# Razumije argumente koje šalje core.downloader_engine.build_download_command: --output (i infojson:), --progress-template,
+# --print before_dl:/after_move:..., --load-info-json, --write-info-json, --merge-output-format, --extract-audio/--audio-format,
+# --ffmpeg-location i --write-thumbnail. S --ffmpeg-location (mrežni stupanj, core.postprocess_stage) "nema" ffmpeg kao i pravi
+# yt-dlp: format s "+" ostaje dva nespojena fajla, a putanje javljaju bbx-raw: predlošci. Izvor nudi mali fiksni popis
+# formata (_FORMATS, zapisuje se i u info-JSON) s kodecima, pa --format prima i ID-eve koje fiksira core.format_planner.
+# Progress i --print linije ispisuje po predlošcima iz argumenata, kao pravi yt-dlp, pa engine ne zna da je lažan.
+#
+# Ponašanje se zadaje varijablama okoline (zadano za sve) ili query parametrima URL-a (za pojedini task):
+#   BBX_FAKE_YTDLP_DURATION_S  / duration=    trajanje "preuzimanja" u sekundama (zadano 1.0)
+#   BBX_FAKE_YTDLP_PROGRESS_HZ / hz=          progress linija u sekundi (zadano 20)
+#   BBX_FAKE_YTDLP_SIZE_KB     / size_kb=     veličina zapisanog fajla (zadano 256)
+#   BBX_FAKE_YTDLP_EXTRACT_MS  / extract_ms=  simulirano izvlačenje prije preuzimanja (zadano 0)
+#   BBX_FAKE_YTDLP_WARNINGS    / warnings=    broj WARNING linija na stderr (brbljavi extractor, zadano 0)
+#   BBX_FAKE_YTDLP_FAIL        / fail=1       izlaz s ERROR porukom i kodom 1 prije preuzimanja
+#   BBX_FAKE_YTDLP_STALL       / stall=1      nakon prvog progressa visi dok ga se ne ugasi (otkazivanje, timeouti)
+#   BBX_FAKE_YTDLP_MERGE_MS    / merge_ms=    simulirani Merger nakon preuzimanja, s postprocess progressom (zadano 0 = bez spajanja)
+# Svaki progress događaj nosi i "bbx_sent_at" (time.time() pri ispisu) za mjerenje kašnjenja do callbacka.
+#
+# Aplikacija se može pokrenuti bez interneta: BBX_YT_DLP_EXECUTABLE=<launcher> (vidi _write_launcher u benchmarku).
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from urllib.parse import parse_qsl, urlsplit
+
+_OPTIONS_WITH_VALUE = {"--retries", "--fragment-retries", "--download-archive", "--limit-rate", "--audio-quality",
+                       "--concurrent-fragments", "--http-chunk-size", "--downloader", "--downloader-args"}
+_FIELD_RE = re.compile(r"%\(([^)]*)\)([sj])")
+_INDEX_RE = re.compile(r"-?\d+")
+_DEFAULTS = {"duration": ("BBX_FAKE_YTDLP_DURATION_S", 1.0), "hz": ("BBX_FAKE_YTDLP_PROGRESS_HZ", 20.0),
+             "size_kb": ("BBX_FAKE_YTDLP_SIZE_KB", 256.0), "extract_ms": ("BBX_FAKE_YTDLP_EXTRACT_MS", 0.0),
+             "warnings": ("BBX_FAKE_YTDLP_WARNINGS", 0.0), "fail": ("BBX_FAKE_YTDLP_FAIL", 0.0), "stall": ("BBX_FAKE_YTDLP_STALL", 0.0),
+             "merge_ms": ("BBX_FAKE_YTDLP_MERGE_MS", 0.0)}
+# Poredani od najlošijeg prema najboljem, kao u yt-dlp info-JSON-u
+_FORMATS = [{"format_id": "140", "ext": "m4a", "acodec": "mp4a.40.2", "vcodec": "none", "abr": 129.5},
+            {"format_id": "251", "ext": "webm", "acodec": "opus", "vcodec": "none", "abr": 135.7},
+            {"format_id": "247", "ext": "webm", "acodec": "none", "vcodec": "vp9", "height": 720},
+            {"format_id": "136", "ext": "mp4", "acodec": "none", "vcodec": "avc1.4d401f", "height": 720}]
+_COMBINED_FORMAT = {"format_id": "18", "ext": "mp4", "acodec": "mp4a.40.2", "vcodec": "avc1.42001E"}
+_AUDIO_EXTENSIONS = {"aac": "m4a", "vorbis": "ogg", "mp4a": "m4a"}
+
+def parse_args(argv):
+    options = {"url": None, "outputs": [], "prints": [], "progress_templates": {}, "info_json": None,
+               "write_info_json": False, "merge_format": None, "audio_format": None, "format": "", "no_ffmpeg": False, "write_thumbnail": False}
+    args = iter(argv)
+    for arg in args:
+        if arg == "--output": options["outputs"].append(next(args))
+        elif arg == "--print": options["prints"].append(next(args))
+        elif arg == "--progress-template":
+            kind, separator, template = next(args).partition(":")
+            if separator and kind in ("download", "postprocess"): options["progress_templates"][kind] = template
+            else: options["progress_templates"]["download"] = kind + separator + template
+        elif arg == "--load-info-json": options["info_json"] = next(args)
+        elif arg == "--write-info-json": options["write_info_json"] = True
+        elif arg == "--format": options["format"] = next(args)
+        elif arg == "--ffmpeg-location": next(args); options["no_ffmpeg"] = True # Uvijek prazan direktorij (NO_FFMPEG_DIR)
+        elif arg == "--write-thumbnail": options["write_thumbnail"] = True
+        elif arg == "--merge-output-format": options["merge_format"] = next(args)
+        elif arg == "--audio-format": options["audio_format"] = next(args)
+        elif arg in _OPTIONS_WITH_VALUE: next(args)
+        elif "://" in arg and options["url"] is None: options["url"] = arg
+    return options
+
+def behaviour_for(url: str) -> dict:
+    query = dict(parse_qsl(urlsplit(url).query))
+    return {name: float(query.get(name, os.environ.get(env_name, default))) for name, (env_name, default) in _DEFAULTS.items()}
+
+def select_formats(spec: str) -> list:
+    """Podskup yt-dlp odabira: prva alternativa, ID formata ili bestaudio/bestvideo s [ext=...]; [] = kombinirani format."""
+    selected = []
+    for part in spec.split("/")[0].split("+"):
+        ext = re.search(r"\[ext=(\w+)\]", part); kind = "audio" if part.startswith("bestaudio") else "video" if part.startswith("bestvideo") else None
+        candidates = [fmt for fmt in _FORMATS if fmt["format_id"] == part] or \
+                     [fmt for fmt in _FORMATS if kind and (fmt["vcodec"] == "none") == (kind == "audio") and (not ext or fmt["ext"] == ext.group(1))]
+        if not candidates: return []
+        selected.append(candidates[-1])
+    return selected
+
+def audio_target(mapping: str, source_ext: str, acodec: str) -> str:
+    # --audio-format pravila "izvor>cilj/.../cilj"; "best" zadržava kodek (kao FFmpegExtractAudioPP)
+    for rule in mapping.split("/"):
+        source, _, target = rule.rpartition(">")
+        if not source or source == source_ext: break
+    if target == "best": return _AUDIO_EXTENSIONS.get(acodec.split(".")[0], acodec.split(".")[0])
+    return _AUDIO_EXTENSIONS.get(target, target)
+
+def _traverse(value, path: list):
+    # Podskup yt-dlp traversala: polja, indeks liste (-1) i ":" za sve elemente (%(requested_formats.:.filepath)j)
+    for position, name in enumerate(path):
+        if name == ":": return [item for item in (_traverse(element, path[position + 1:]) for element in value or []) if item is not None]
+        if isinstance(value, dict): value = value.get(name)
+        elif isinstance(value, list) and _INDEX_RE.fullmatch(name) and -len(value) <= int(name) < len(value): value = value[int(name)]
+        else: return None
+    return value
+
+def _field(fields: dict, expression: str):
+    expression, has_default, default = expression.partition("|")
+    if expression.startswith(".{"): # %(.{title,duration})j
+        value = {name: fields[name] for name in expression[2:-1].split(",") if fields.get(name) is not None}
+    else: value = _traverse(fields, expression.split("."))
+    return default if value is None and has_default else value
+
+def render(template: str, fields: dict) -> str:
+    def substitute(match):
+        value = _field(fields, match.group(1))
+        return json.dumps(value) if match.group(2) == "j" else ("NA" if value is None else str(value))
+    return _FIELD_RE.sub(substitute, template)
+
+def _print_when(options: dict, when: str, fields: dict):
+    for template in options["prints"]:
+        if template.startswith(when + ":"): _emit(render(template[len(when) + 1:], fields))
+
+def _emit(line: str):
+    sys.stdout.write(line + "\n"); sys.stdout.flush() # Kao yt-dlp s --newline: linija po događaju
+
+def main(argv=None) -> int:
+    options = parse_args(sys.argv[1:] if argv is None else argv)
+    url = options["url"]
+    if options["info_json"]:
+        with open(options["info_json"], encoding="utf-8") as f: url = json.load(f).get("webpage_url") or url
+    if not url:
+        sys.stderr.write("ERROR: fake yt-dlp: nema URL-a\n"); return 2
+    behaviour = behaviour_for(url)
+    video_id = hashlib.sha1(url.encode("utf-8")).hexdigest()[:11]
+    selected = select_formats(options["format"]) or [_COMBINED_FORMAT]
+    split_streams = options["no_ffmpeg"] and len(selected) > 1
+    if len(selected) > 1: ext = "mp4" if split_streams else (options["merge_format"] or "mp4").split("/")[0]
+    elif options["audio_format"] and not options["no_ffmpeg"]: ext = audio_target(options["audio_format"], selected[0]["ext"], selected[0]["acodec"])
+    else: ext = selected[0]["ext"]
+    fields = {"id": video_id, "title": f"fake_{video_id}", "ext": ext, "extractor_key": "Fake", "webpage_url": url,
+              "uploader": "Fake", "upload_date": "20240101", "duration": 10, "format_id": "+".join(fmt["format_id"] for fmt in selected),
+              "acodec": next((fmt["acodec"] for fmt in selected if fmt["acodec"] != "none"), "none"),
+              "vcodec": next((fmt["vcodec"] for fmt in selected if fmt["vcodec"] != "none"), "none")}
+    for index in range(int(behaviour["warnings"])): sys.stderr.write(f"WARNING: [Fake] {video_id}: simulirano upozorenje {index}\n")
+    if behaviour["extract_ms"]: time.sleep(behaviour["extract_ms"] / 1000.0)
+    if behaviour["fail"]:
+        sys.stderr.write(f"ERROR: [Fake] {video_id}: Simulirana greška (fail=1)\n"); return 1
+
+    default_templates = [template for template in options["outputs"] if not template.startswith("infojson:")]
+    filepath = render(default_templates[-1] if default_templates else "%(title)s.%(ext)s", fields)
+    for template in options["outputs"]:
+        if template.startswith("infojson:") and options["write_info_json"]:
+            info_path = render(template[len("infojson:"):], fields)
+            if not info_path.endswith(".info.json"): info_path += ".info.json"
+            with open(info_path, "w", encoding="utf-8") as f: json.dump({**fields, "_type": "video", "formats": _FORMATS}, f)
+
+    _print_when(options, "before_dl", fields)
+    progress_template = options["progress_templates"].get("download", "")
+    os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+    if options["write_thumbnail"]:
+        thumbnail_path = os.path.splitext(filepath)[0] + ".webp"
+        with open(thumbnail_path, "wb") as f: f.write(b"RIFF\0\0\0\0WEBP")
+        fields["thumbnails"] = [{"url": "https://fake.invalid/thumb.webp", "filepath": thumbnail_path}]
+    if split_streams: # Bez ffmpeg-a nema spajanja: video i audio ostaju zasebni fajlovi, kao kod pravog yt-dlp-a
+        sys.stderr.write("WARNING: You have requested merging of multiple formats but ffmpeg is not installed. The formats won't be merged\n")
+        base = os.path.splitext(filepath)[0]
+        fields["requested_formats"] = [{**fmt, "filepath": f"{base}.f{fmt['format_id']}.{fmt['ext']}"} for fmt in selected]
+        for stream in fields["requested_formats"]: _download(stream["filepath"], behaviour, progress_template, len(fields["requested_formats"]))
+    else: _download(filepath, behaviour, progress_template, 1)
+    postprocess_template = options["progress_templates"].get("postprocess")
+    if behaviour["merge_ms"] and not options["no_ffmpeg"]:
+        if postprocess_template: _emit(render(postprocess_template, {"progress": {"status": "started", "postprocessor": "Merger"}}))
+        time.sleep(behaviour["merge_ms"] / 1000.0)
+        if postprocess_template: _emit(render(postprocess_template, {"progress": {"status": "finished", "postprocessor": "Merger"}}))
+    _print_when(options, "after_move", {**fields, "filepath": os.path.abspath(filepath)})
+    return 0
+
+def _download(filepath: str, behaviour: dict, progress_template: str, stream_count: int):
+    total_bytes = int(behaviour["size_kb"] * 1024) // stream_count; steps = max(1, int(behaviour["duration"] * behaviour["hz"] / stream_count))
+    downloaded = 0; started = time.time(); hz = behaviour["hz"]
+    with open(filepath + ".part", "wb") as part:
+        for step in range(1, steps + 1):
+            chunk_size = total_bytes * step // steps - downloaded
+            part.write(b"\0" * chunk_size); part.flush(); downloaded += chunk_size
+            elapsed = time.time() - started
+            progress = {"status": "downloading", "downloaded_bytes": downloaded, "total_bytes": total_bytes, "filename": filepath,
+                        "speed": downloaded / elapsed if elapsed else None, "eta": max(0.0, behaviour["duration"] - elapsed),
+                        "elapsed": elapsed, "bbx_sent_at": time.time()}
+            if progress_template: _emit(render(progress_template, {"progress": progress}))
+            if behaviour["stall"]:
+                while True: time.sleep(3600) # Gasi ga samo terminate()/kill()
+            time.sleep(max(0.0, started + step / hz - time.time())) # Bez nakupljanja kašnjenja
+    os.replace(filepath + ".part", filepath)
+    if progress_template:
+        _emit(render(progress_template, {"progress": {"status": "finished", "downloaded_bytes": total_bytes, "total_bytes": total_bytes,
+                                                      "filename": filepath, "elapsed": time.time() - started, "bbx_sent_at": time.time()}}))
+
+if __name__ == "__main__":
+    sys.exit(main())
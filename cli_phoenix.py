@@ -0,0 +1,140 @@
+# cli_phoenix.py
+# Headless batch ulaz za download engine (cron, kontejneri, serveri bez ekrana).
+# Ne uvozi customtkinter, tkinter ni PIL: koristi samo core.downloader_engine (ili core.async_engine) i core.settings_handler.
+#
+#   python cli_phoenix.py urls.txt --jobs 4 --profile "Audio - Najbolji MP3" --output /data/downloads
+#   cat urls.txt | python cli_phoenix.py - --jobs 2
+#
+# Na stdout ide JSON-lines tok događaja (jedan JSON objekt po liniji), a logovi na stderr.
+# Izlazni kod: 0 ako su svi zadaci uspjeli, 1 ako je bar jedan neuspješan, 2 za grešku u argumentima ili postavkama, 130 za prekid (Ctrl+C).
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+from core import settings_handler
+from core import downloader_engine as de
+from core import metrics
+from core import tracing
+from core.task_journal import is_finished_status
+from core.url_canonicalizer import canonicalize_url
+
+logger = logging.getLogger("cli_phoenix")
+
+EXIT_OK = 0
+EXIT_TASK_FAILED = 1
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+
+def _read_urls(source: str) -> list:
+    stream = sys.stdin if source == "-" else open(source, "r", encoding="utf-8")
+    try:
+        return [line.strip() for line in stream if line.strip() and not line.lstrip().startswith("#")]
+    finally:
+        if stream is not sys.stdin: stream.close()
+
+class JsonLinesReporter:
+    def __init__(self, total_tasks: int, progress_interval: float, out=None):
+        self.out = out or sys.stdout # Tek pri pozivu, da se stdout može preusmjeriti (testovi, ugradnja)
+        self.progress_interval = progress_interval
+        self.results: dict = {}
+        self._total_tasks = total_tasks
+        self._last_progress_at: dict = {}
+        self._lock = threading.Lock()
+        self.all_done = threading.Event()
+        if total_tasks == 0: self.all_done.set()
+
+    def write(self, payload: dict):
+        with self._lock:
+            self.out.write(json.dumps(payload, ensure_ascii=False) + "\n"); self.out.flush()
+
+    def __call__(self, task: de.DownloadTask, update_type: str, data=None):
+        if not task.item_id.startswith("cli_"): return # Statusni pseudo-taskovi engine-a (red prazan i sl.)
+        if is_finished_status(task.status) and update_type != "log_message":
+            with self._lock:
+                if task.item_id in self.results: return
+                ok = task.status == "Završeno" or task.status.startswith("Preskočeno")
+                exit_code = EXIT_OK if ok else (task.return_code or EXIT_TASK_FAILED) # yt-dlp je mogao izaći s 0, a obrada pasti
+                self.results[task.item_id] = ok
+                finished_all = len(self.results) >= self._total_tasks
+            self.write({"event": "done", "id": task.item_id, "url": task.url, "status": task.status, "ok": ok,
+                        "exit_code": exit_code, "file": task.final_filename if ok else None, "error": task.error_message, "ts": time.time()})
+            if finished_all: self.all_done.set()
+        elif update_type == "progress_update":
+            now = time.monotonic()
+            if now - self._last_progress_at.get(task.item_id, 0.0) < self.progress_interval: return
+            self._last_progress_at[task.item_id] = now
+            self.write({"event": "progress", "id": task.item_id, "progress": task.progress_val, "speed": task.speed_str,
+                        "eta": task.eta_str, "downloaded_bytes": task.downloaded_bytes, "total_bytes": task.total_bytes, "ts": time.time()})
+        elif update_type == "status_update":
+            self.write({"event": "status", "id": task.item_id, "url": task.url, "status": task.status, "ts": time.time()})
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cli_phoenix", description="BlackBox DHQ Phoenix - headless batch preuzimanje (JSON-lines izlaz).")
+    parser.add_argument("url_file", nargs="?", default="-", help="Fajl s URL-ovima (jedan po liniji, # za komentar) ili '-' za stdin.")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="Broj istovremenih preuzimanja (default: max_concurrent_downloads iz postavki).")
+    parser.add_argument("--profile", "-p", default=None, choices=de.QUALITY_PROFILE_KEYS, metavar="PROFILE",
+                        help="Ključ iz QUALITY_PROFILES (default: automatski prema URL-u). Dostupni: " + ", ".join(de.QUALITY_PROFILE_KEYS))
+    parser.add_argument("--output", "-o", default=None, help="Izlazni direktorij (default: output_directory iz postavki).")
+    parser.add_argument("--progress-interval", type=float, default=0.5, help="Najmanji razmak (s) između progress događaja po zadatku.")
+    parser.add_argument("--metrics-port", type=int, default=None, help="Prometheus metrike na 127.0.0.1:PORT/metrics (default: metrics_port iz postavki, 0 = isključeno).")
+    parser.add_argument("--metrics-file", default=None, help="Periodični JSON snapshot metrika u ovaj fajl (default: metrics_snapshot_file iz postavki).")
+    parser.add_argument("--trace-file", default=None, help="Spanovi faza preuzimanja kao Chrome trace-event JSON (chrome://tracing, Perfetto), zapisuje se na kraju.")
+    parser.add_argument("--profile-cpu-file", default=None, help="cProfile engine-a (pstats) u ovaj fajl na kraju.")
+    parser.add_argument("--profile-memory-file", default=None, help="tracemalloc top alokacija engine-a u ovaj fajl na kraju.")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Detaljniji logovi na stderr.")
+    return parser
+
+def main(argv=None) -> int:
+    args = build_arg_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, stream=sys.stderr,
+                        format='%(asctime)s - %(levelname)-8s - [%(name)s] - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+    if args.jobs is not None and args.jobs < 1:
+        logger.error("--jobs mora biti barem 1."); return EXIT_USAGE
+    try: urls = _read_urls(args.url_file)
+    except OSError as e:
+        logger.error(f"Ne mogu pročitati listu URL-ova '{args.url_file}': {e}"); return EXIT_USAGE
+    seen_urls, unique_urls = set(), []
+    for url in urls: # Isti kanonski URL (youtu.be/X, watch?v=X&t=5, tracking parametri) preuzima se samo jednom
+        canonical_url = canonicalize_url(url)
+        if canonical_url not in seen_urls: seen_urls.add(canonical_url); unique_urls.append(url)
+    if len(unique_urls) < len(urls): logger.warning(f"Preskočeno {len(urls) - len(unique_urls)} duplikata (isti kanonski URL).")
+    urls = unique_urls
+
+    settings = settings_handler.load_settings()
+    engine_error = settings_handler.download_engine_error(settings)
+    if engine_error: logger.error(engine_error); return EXIT_USAGE
+    output_dir = os.path.abspath(args.output or settings.get("output_directory"))
+    jobs = args.jobs or settings.get("max_concurrent_downloads", 1)
+    reporter = JsonLinesReporter(len(urls), args.progress_interval)
+    if settings.get("download_engine") == "asyncio":
+        from core.async_engine import AsyncDownloader
+        downloader = AsyncDownloader(update_callback=reporter, max_concurrent_downloads=jobs)
+    else: downloader = de.Downloader(update_callback=reporter, max_concurrent_downloads=jobs)
+    metrics_exporter = metrics.start_exporter(settings, args.metrics_port, args.metrics_file)
+    capture = tracing.start_capture(settings, args.trace_file, args.profile_cpu_file, args.profile_memory_file)
+
+    try:
+        for index, url in enumerate(urls):
+            profile_key = args.profile or de.determine_content_type_and_suggest_quality(url)
+            task = de.DownloadTask(url, profile_key, output_dir, f"cli_{index}")
+            if not downloader.add_to_queue(task): reporter(task, "status_update") # Već preuzeto (arhiva) -> odmah "done"
+        while not reporter.all_done.wait(timeout=1.0): pass # Kratki timeout da Ctrl+C radi i na Windowsima
+    except KeyboardInterrupt:
+        logger.warning("Prekid (Ctrl+C), otkazujem preostala preuzimanja...")
+        downloader.stop_worker()
+        if metrics_exporter: metrics_exporter.close()
+        if capture: capture.close()
+        return EXIT_INTERRUPTED
+    downloader.stop_worker()
+    if metrics_exporter: metrics_exporter.close() # Zadnji snapshot sadrži i zadnje završene taskove
+    if capture: capture.close()
+    failed = sum(1 for ok in reporter.results.values() if not ok)
+    reporter.write({"event": "summary", "total": len(urls), "ok": len(urls) - failed, "failed": failed, "ts": time.time()})
+    return EXIT_OK if failed == 0 else EXIT_TASK_FAILED
+
+if __name__ == "__main__":
+    sys.exit(main())
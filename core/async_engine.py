@@ -0,0 +1,317 @@
+# core/async_engine.py
+# Alternativni download engine: svi yt-dlp procesi žive na jednoj asyncio petlji (bez niti po preuzimanju).
+# Model (DownloadTask, QUALITY_PROFILES) i naredba su zajednički s core.downloader_engine.
+# Bira se s "download_engine": "asyncio" (aplikacija i CLI) ili se ugrađuje kroz asyncio API (submit, events, join).
+# Dijeli dnevnik zadataka (core.task_journal) i arhivu preuzimanja (core.download_archive) s threading engine-om; nema
+# cache izvlačenja, limite po hostu, budžet brzine, metrike, tracing, stupanj obrade ni playliste (GUI te dijelove preskače).
+import asyncio
+import os
+import threading
+import logging
+import time
+from typing import AsyncIterator, Callable, Dict, List, NamedTuple
+from . import settings_handler
+from .task_journal import TaskJournal, is_finished_status
+from .download_archive import DownloadArchive
+from .downloader_engine import (DownloadTask, YT_DLP_EXECUTABLE, FFMPEG_EXECUTABLE, SKIPPED_ARCHIVED_STATUS, SKIPPED_DUPLICATE_STATUS,
+                                JOURNALED_UPDATE_TYPES, build_download_command, apply_protocol_line, reset_progress)
+from .progress_protocol import LINE_PROGRESS, LINE_FILEPATH
+
+logger = logging.getLogger(__name__)
+
+STREAM_LINE_LIMIT = 1024 * 1024 # yt-dlp zna ispisati vrlo duge linije (JSON, URL-ovi), default od 64 KiB je premalo
+SUBSCRIBER_QUEUE_SIZE = 1000 # Događaja po pretplatniku events(); spori pretplatnik prvo gubi progress i log događaje
+_DROPPABLE_EVENT_TYPES = ("progress_update", "log_message")
+
+class DownloadEvent(NamedTuple):
+    task: DownloadTask
+    update_type: str # isti tipovi kao update_callback: status_update, progress_update, download_complete, download_error, log_message...
+    data: object = None
+
+class AsyncDownloader:
+    def __init__(self, update_callback: Callable | None = None, max_concurrent_downloads: int = 1, journal: TaskJournal | None = None):
+        self.update_callback = update_callback
+        self.max_concurrent_downloads = max(1, int(max_concurrent_downloads))
+        self.current_settings = settings_handler.load_settings()
+        self.all_tasks_map: Dict[str, DownloadTask] = {}
+        self.active_tasks: Dict[str, DownloadTask] = {}
+        self.active_downloads_count = 0
+        self._runners: Dict[str, asyncio.Task] = {}
+        self._subscribers: List[asyncio.Queue] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread: threading.Thread | None = None
+        self._slot_condition: asyncio.Condition | None = None
+        self._idle_event: asyncio.Event | None = None
+        self._closed = False
+        self.journal = journal
+        self._download_archive: DownloadArchive | None = None
+        settings_handler.add_settings_listener(self._on_settings_changed)
+
+    # --- asyncio API (poziva se s petlje na kojoj engine radi) ---
+    def submit(self, task: DownloadTask) -> bool:
+        """Vraća False (i postavlja task.status) ako je isti posao već u redu ili je (URL, profil) već preuzet."""
+        self._bind_loop()
+        if not self._admit(task): return False
+        self._start_runner(task); return True
+
+    def _start_runner(self, task: DownloadTask):
+        self._emit(task, "status_update")
+        self._idle_event.clear()
+        runner = self._loop.create_task(self._run_task(task))
+        self._runners[task.item_id] = runner
+        runner.add_done_callback(lambda _r, item_id=task.item_id: self._on_runner_done(item_id))
+
+    def _admit(self, task: DownloadTask) -> bool:
+        # Iste provjere kao Downloader.add_to_queue; poziva se prije nego task dobije coroutine
+        existing = self.all_tasks_map.get(task.item_id)
+        if existing is not None and existing is not task and not is_finished_status(existing.status):
+            task.status = SKIPPED_DUPLICATE_STATUS; logger.info(f"[async] Task {task.item_id} je već u redu/aktivan, preskačem."); return False
+        archive = self._get_download_archive()
+        if archive and archive.contains(task.url, task.quality_profile_key):
+            task.status = SKIPPED_ARCHIVED_STATUS; logger.info(f"[async] Već preuzeto ({task.quality_profile_key}), preskačem: {task.url[:70]}"); return False
+        logger.info(f"[async] Dodajem task u red: {task.item_id} - {task.url[:70]}...")
+        self.all_tasks_map[task.item_id] = task; task.status = "U redu"
+        return True
+
+    def cancel(self, task_item_id: str, by_system: bool = False) -> bool:
+        task = self.all_tasks_map.get(task_item_id); runner = self._runners.get(task_item_id)
+        if not task or not runner or runner.done():
+            logger.warning(f"[async] Pokušaj otkazivanja nepostojećeg ili završenog taska: {task_item_id}"); return False
+        task.status = "Otkazano (sistem)" if by_system else "Otkazano (korisnik)"
+        runner.cancel() # _run_task gasi proces u svom CancelledError bloku
+        return True
+
+    async def events(self) -> AsyncIterator[DownloadEvent]:
+        """Asinkroni tok događaja: `async for event in engine.events()`. Završava kad se engine zatvori (aclose)."""
+        self._bind_loop()
+        subscriber: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.append(subscriber)
+        try:
+            while True:
+                event = await subscriber.get()
+                if event is None: return
+                yield event
+        finally:
+            if subscriber in self._subscribers: self._subscribers.remove(subscriber)
+
+    async def join(self):
+        """Čeka da se isprazne red i svi aktivni taskovi."""
+        self._bind_loop()
+        await self._idle_event.wait()
+
+    async def aclose(self):
+        self._closed = True
+        for item_id in list(self._runners): self.cancel(item_id, by_system=True)
+        if self._runners: await asyncio.gather(*self._runners.values(), return_exceptions=True)
+        for subscriber in list(self._subscribers): self._offer(subscriber, None)
+        settings_handler.remove_settings_listener(self._on_settings_changed)
+
+    async def __aenter__(self):
+        self._bind_loop(); return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    # --- Sinkrono sučelje kompatibilno s core.downloader_engine.Downloader (GUI) ---
+    def start_worker(self):
+        if self._loop_thread is not None and self._loop_thread.is_alive():
+            logger.info("Async download petlja je već aktivna."); return
+        self.current_settings = settings_handler.load_settings(); self._closed = False
+        settings_handler.add_settings_listener(self._on_settings_changed)
+        loop_ready = threading.Event()
+        def _loop_main():
+            asyncio.set_event_loop(asyncio.new_event_loop())
+            self._loop = None; self._bind_loop(asyncio.get_event_loop())
+            loop_ready.set()
+            self._loop.run_forever()
+            self._loop.close()
+        self._loop_thread = threading.Thread(target=_loop_main, name="AsyncDownloaderLoop", daemon=True)
+        self._loop_thread.start(); loop_ready.wait()
+        logger.info("Async download petlja pokrenuta.")
+
+    def add_to_queue(self, task: DownloadTask) -> bool:
+        """Kao Downloader.add_to_queue: False ako je posao već u redu ili već preuzet."""
+        if self._loop_thread is None or not self._loop_thread.is_alive(): self.start_worker()
+        if not self._admit(task): return False
+        self._loop.call_soon_threadsafe(self._start_runner, task)
+        return True
+
+    def restore_from_journal(self) -> int:
+        """Vraća u red nezavršene taskove iz prethodne sesije (isti dnevnik kao threading engine)."""
+        if not self.journal: return 0
+        purged = self.journal.purge_finished(); restored = 0
+        for row in self.journal.load_unfinished():
+            if row["item_id"] in self.all_tasks_map: continue
+            task = DownloadTask(row["url"], row["quality_profile_key"], row["output_dir"], row["item_id"])
+            task.added_time = row["added_time"]; task.resumed = True
+            task.progress_val = float(row.get("progress_val") or 0.0); task.progress_str = f"{task.progress_val:.1f}%"
+            if self.add_to_queue(task): restored += 1
+        logger.info(f"[async] Iz dnevnika vraćeno {restored} nezavršenih zadataka (obrisano {purged} završenih zapisa).")
+        return restored
+
+    def cancel_task(self, task_item_id: str, by_system: bool = False) -> bool:
+        if task_item_id not in self.all_tasks_map: return False
+        if self._loop is None or not self._loop.is_running(): return False
+        return asyncio.run_coroutine_threadsafe(self._cancel_async(task_item_id, by_system), self._loop).result(timeout=5)
+
+    async def _cancel_async(self, task_item_id: str, by_system: bool) -> bool:
+        return self.cancel(task_item_id, by_system)
+
+    def stop_worker(self):
+        logger.info("[async] Zahtjev za zaustavljanje SVIH preuzimanja...")
+        if self.journal: self.journal.freeze() # Otkazivanje zbog gašenja ne smije u dnevniku završiti taskove
+        if self._loop is not None and self._loop.is_running() and self._loop_thread is not None:
+            try: asyncio.run_coroutine_threadsafe(self.aclose(), self._loop).result(timeout=5)
+            except Exception as e: logger.error(f"[async] Greška pri gašenju engine-a: {e}")
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join(timeout=2)
+        self._loop_thread = None
+        if self.journal: self.journal.close(); self.journal = None
+        logger.info("Async download petlja zaustavljena.")
+
+    def get_all_tasks_snapshot(self) -> List[DownloadTask]:
+        return sorted(list(self.all_tasks_map.values()), key=lambda t: t.added_time, reverse=True)
+
+    def iter_tasks(self):
+        yield from list(self.all_tasks_map.values())
+
+    def task_count(self) -> int:
+        return len(self.all_tasks_map)
+
+    def remove_task_completely(self, task_item_id: str):
+        self.all_tasks_map.pop(task_item_id, None)
+        runner = self._runners.get(task_item_id)
+        if runner is not None and self._loop is not None and self._loop.is_running():
+            self._loop.call_soon_threadsafe(runner.cancel) # _execute_download gasi proces u svom CancelledError bloku
+        if self.journal: self.journal.delete(task_item_id)
+        logger.info(f"Task {task_item_id} potpuno uklonjen iz AsyncDownloadera.")
+
+    def set_max_concurrent_downloads(self, new_max: int):
+        try: new_max = max(1, int(new_max))
+        except (TypeError, ValueError):
+            logger.warning(f"Neispravan broj istovremenih preuzimanja: {new_max!r}"); return
+        self.max_concurrent_downloads = new_max
+        if self._loop is not None and self._loop.is_running():
+            self._loop.call_soon_threadsafe(lambda: self._loop.create_task(self._notify_slots()))
+        logger.info(f"[async] Broj istovremenih preuzimanja: {new_max}")
+
+    # --- Interno ---
+    def _on_settings_changed(self, new_settings: dict):
+        self.current_settings = new_settings
+        new_max = new_settings.get("max_concurrent_downloads", self.max_concurrent_downloads)
+        if new_max != self.max_concurrent_downloads: self.set_max_concurrent_downloads(new_max)
+
+    def _bind_loop(self, loop: asyncio.AbstractEventLoop | None = None):
+        if self._loop is not None and loop is None: return
+        self._loop = loop or asyncio.get_running_loop()
+        self._slot_condition = asyncio.Condition()
+        self._idle_event = asyncio.Event(); self._idle_event.set()
+
+    def _get_download_archive(self) -> DownloadArchive | None:
+        if not self.current_settings.get("download_archive_enabled", True): return None
+        if self._download_archive is None:
+            try: self._download_archive = DownloadArchive()
+            except OSError as e:
+                logger.error(f"[async] Arhiva preuzimanja nije dostupna: {e}"); return None
+        return self._download_archive
+
+    def _emit(self, task: DownloadTask, update_type: str, data=None):
+        if self.journal and update_type in JOURNALED_UPDATE_TYPES and task.item_id in self.all_tasks_map: self.journal.record(task)
+        event = DownloadEvent(task, update_type, data)
+        for subscriber in self._subscribers: self._offer(subscriber, event)
+        if self.update_callback:
+            try: self.update_callback(task, update_type, data) if data is not None else self.update_callback(task, update_type)
+            except Exception as e: logger.error(f"[async] Greška u update_callback: {e}", exc_info=True)
+
+    @staticmethod
+    def _offer(subscriber: asyncio.Queue, event: DownloadEvent | None):
+        if subscriber.full():
+            if event is not None and event.update_type in _DROPPABLE_EVENT_TYPES: return
+            subscriber.get_nowait() # Najstariji događaj ustupa mjesto statusu, kraju taska ili kraju toka
+        subscriber.put_nowait(event)
+
+    def _on_runner_done(self, task_item_id: str):
+        self._runners.pop(task_item_id, None)
+        if not self._runners and not self._closed:
+            self._idle_event.set()
+            status_task = DownloadTask("Red", "N/A", "", f"status_q_empty_{time.time()}"); status_task.status = "Red je prazan."
+            self._emit(status_task, "general_status_update", status_task.status)
+
+    async def _notify_slots(self):
+        async with self._slot_condition: self._slot_condition.notify_all()
+
+    async def _run_task(self, task: DownloadTask):
+        slot_taken = False
+        try:
+            async with self._slot_condition:
+                await self._slot_condition.wait_for(lambda: self.active_downloads_count < self.max_concurrent_downloads)
+                self.active_downloads_count += 1; self.active_tasks[task.item_id] = task; slot_taken = True
+            logger.info(f"[async] Započinjem obradu taska: {task.item_id} (aktivno: {self.active_downloads_count}/{self.max_concurrent_downloads})")
+            await self._execute_download(task)
+        except asyncio.CancelledError:
+            if not task.status.startswith("Otkazano"): task.status = "Otkazano (sistem)"
+            task.error_message = "Preuzimanje otkazano."; task.speed_str = ""; task.eta_str = ""
+            self._emit(task, "download_error")
+        finally:
+            if not is_finished_status(task.status):
+                task.status = "Završeno (?)"; logger.warning(f"Task {task.item_id} završen s nejasnim statusom: {task.status}")
+            if slot_taken:
+                self.active_tasks.pop(task.item_id, None)
+                self.active_downloads_count = max(0, self.active_downloads_count - 1)
+                if not self._closed: self._loop.create_task(self._notify_slots())
+            self._emit(task, "status_update")
+            logger.info(f"[async] Obrada taska {task.item_id} završena ({task.status}). Aktivno: {self.active_downloads_count}")
+
+    async def _execute_download(self, task: DownloadTask):
+        task.status = "Priprema..."; reset_progress(task)
+        self._emit(task, "status_update")
+        process = None
+        try:
+            os.makedirs(task.output_dir, exist_ok=True)
+            archive = self._get_download_archive()
+            command = build_download_command(task, self.current_settings, download_archive=archive.archive_path(task.quality_profile_key) if archive else None)
+            logger.info(f"[{task.item_id}] [async] Pokrećem: {' '.join(command)}")
+            task.status = "Preuzimanje..."
+            self._emit(task, "status_update")
+            process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                                                           limit=STREAM_LINE_LIMIT,
+                                                           creationflags=0x08000000 if os.name == 'nt' else 0) # CREATE_NO_WINDOW
+            # stderr se čita paralelno da se pipe nikad ne napuni i ne blokira proces
+            stderr_reader = asyncio.ensure_future(process.stderr.read())
+            log_prefix = f"[{os.path.basename(task.url)[:20]}]"
+            async for raw_line in process.stdout:
+                line = raw_line.decode("utf-8", errors="replace").strip()
+                if not line: continue
+                kind = apply_protocol_line(task, line)
+                if kind == LINE_PROGRESS: self._emit(task, "progress_update")
+                elif kind == LINE_FILEPATH: self._emit(task, "log_message", f"{log_prefix} Spremljeno: {task.final_filename}")
+                elif kind is None: self._emit(task, "log_message", f"{log_prefix} {line}")
+            return_code = await process.wait()
+            task.return_code = return_code
+            stderr_rem = (await stderr_reader).decode("utf-8", errors="replace").strip()
+            for line_err in stderr_rem.splitlines():
+                logger.error(f"[{task.item_id}] yt-dlp stderr: {line_err}")
+                self._emit(task, "log_message", f"{log_prefix} GREŠKA: {line_err}")
+
+            if return_code == 0:
+                task.status = "Završeno"; task.progress_str = "100.0%"; task.progress_val = 100.0; task.speed_str = ""; task.eta_str = ""
+                if not task.final_filename: logger.warning(f"[{task.item_id}] yt-dlp nije javio konačnu putanju fajla (after_move).")
+                if archive and task.archive_id: archive.record(task.url, task.quality_profile_key, task.archive_id)
+                self._emit(task, "download_complete")
+            else:
+                task.status = "Greška"; task.error_message = stderr_rem or f"yt-dlp greška (kod: {return_code})"
+                self._emit(task, "download_error")
+        except asyncio.CancelledError:
+            if process is not None and process.returncode is None:
+                logger.info(f"[{task.item_id}] [async] Otkazivanje, gasim proces (PID: {process.pid})")
+                process.terminate()
+                try: await asyncio.wait_for(process.wait(), timeout=1)
+                except asyncio.TimeoutError:
+                    logger.warning(f"Proces za task {task.item_id} SIGTERM timeout, šaljem SIGKILL."); process.kill()
+            raise
+        except FileNotFoundError:
+            task.status = "Kritična Greška"; task.error_message = f"{YT_DLP_EXECUTABLE} ili {FFMPEG_EXECUTABLE} nije pronađen."
+            logger.critical(task.error_message); self._emit(task, "download_error")
+        except Exception as e:
+            task.status = "Greška Programa"; task.error_message = str(e)
+            logger.error(f"[{task.item_id}] Neočekivana greška u async _execute_download: {e}", exc_info=True); self._emit(task, "download_error")
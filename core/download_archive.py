@@ -0,0 +1,82 @@
+# core/download_archive.py
+# Trajni indeks već preuzetih (URL, profil) parova. Za svaki profil postoji zasebna arhiva u yt-dlp
+# --download-archive formatu ("<extractor> <id>" po liniji), koju yt-dlp i sam čita i nadopunjuje,
+# a url_index.tsv pamti koji kanonski URL odgovara kojem arhivskom ID-u za stranice gdje se ID ne vidi iz URL-a.
+# Provjera pri dodavanju u red je O(1): set ID-ova po profilu + dict kanonski URL -> ID, sve u memoriji.
+import os
+import re
+import threading
+import unicodedata
+import logging
+from typing import Dict, Set
+from .settings_handler import CONFIG_DIR
+from .url_canonicalizer import canonicalize_url, archive_id_for
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = os.path.join(CONFIG_DIR, "archives")
+URL_INDEX_FILENAME = "url_index.tsv"
+
+def profile_slug(quality_profile_key: str) -> str:
+    ascii_key = unicodedata.normalize("NFKD", quality_profile_key).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "-", ascii_key.lower()).strip("-") or "default"
+
+class DownloadArchive:
+    def __init__(self, archive_dir: str = ARCHIVE_DIR):
+        self.archive_dir = archive_dir
+        os.makedirs(archive_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._ids_by_profile: Dict[str, Set[str]] = {} # Učitava se lijeno, po profilu
+        self._url_index: Dict[str, str] = {}
+        self._load_url_index()
+
+    def archive_path(self, quality_profile_key: str) -> str:
+        return os.path.join(self.archive_dir, f"{profile_slug(quality_profile_key)}.txt")
+
+    def contains(self, url: str, quality_profile_key: str) -> bool:
+        canonical_url = canonicalize_url(url)
+        with self._lock:
+            archive_id = archive_id_for(url) or self._url_index.get(canonical_url)
+            return archive_id is not None and archive_id in self._profile_ids(quality_profile_key)
+
+    def record(self, url: str, quality_profile_key: str, archive_id: str, write_line: bool = False):
+        """Bilježi uspješno preuzimanje u memoriju i url_index. Liniju u arhivu profila piše yt-dlp (--download-archive),
+        a uz write_line=True ovdje (mrežni stupanj radi bez arhive, pa linija ide tek nakon uspješne obrade)."""
+        archive_id = archive_id.strip()
+        if not archive_id: return
+        canonical_url = canonicalize_url(url)
+        with self._lock:
+            profile_ids = self._profile_ids(quality_profile_key)
+            if write_line and archive_id not in profile_ids: self._append_line(self.archive_path(quality_profile_key), archive_id)
+            profile_ids.add(archive_id)
+            if archive_id_for(url) is None and self._url_index.get(canonical_url) != archive_id:
+                self._url_index[canonical_url] = archive_id
+                self._append_line(os.path.join(self.archive_dir, URL_INDEX_FILENAME), f"{canonical_url}\t{archive_id}")
+
+    def _profile_ids(self, quality_profile_key: str) -> Set[str]:
+        slug = profile_slug(quality_profile_key)
+        ids = self._ids_by_profile.get(slug)
+        if ids is None:
+            ids = set()
+            try:
+                with open(self.archive_path(quality_profile_key), "r", encoding="utf-8") as f:
+                    ids.update(line.strip() for line in f if line.strip())
+            except FileNotFoundError: pass
+            except OSError as e: logger.error(f"Ne mogu pročitati arhivu preuzimanja za '{quality_profile_key}': {e}")
+            self._ids_by_profile[slug] = ids
+        return ids
+
+    def _load_url_index(self):
+        try:
+            with open(os.path.join(self.archive_dir, URL_INDEX_FILENAME), "r", encoding="utf-8") as f:
+                for line in f:
+                    canonical_url, _, archive_id = line.rstrip("\n").partition("\t")
+                    if canonical_url and archive_id: self._url_index[canonical_url] = archive_id
+        except FileNotFoundError: pass
+        except OSError as e: logger.error(f"Ne mogu pročitati indeks arhive preuzimanja: {e}")
+
+    @staticmethod
+    def _append_line(path: str, line: str):
+        try:
+            with open(path, "a", encoding="utf-8") as f: f.write(line + "\n")
+        except OSError as e: logger.error(f"Ne mogu pisati u arhivu preuzimanja ({path}): {e}")
@@ -2,23 +2,47 @@
 import subprocess
 import os
 import threading
-import queue
 import logging
 import re
 import time
+import functools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import Callable, Any, Dict, List
 from . import settings_handler
+from .task_queue import IndexedTaskQueue, DEFAULT_PRIORITY
+from .task_journal import TaskJournal, is_finished_status
+from .progress_protocol import LINE_PROGRESS, LINE_FILEPATH, LINE_ARCHIVE, LINE_PHASE, LINE_RAW, protocol_args, parse_line, apply_progress
+from .ytdlp_worker_pool import YtDlpWorkerPool, WorkerCancelled, DEFAULT_MAX_JOBS_PER_WORKER
+from .extraction_cache import ExtractionCache
+from .download_archive import DownloadArchive
+from .playlist_expander import PlaylistGroup, stream_playlist_entries
+from .url_canonicalizer import task_id_for
+from .host_limits import HostLimiter, MIN_RATE_LIMIT, hostname, split_bandwidth
+from .download_tuning import resolve_tuning, tuning_cli_args, tuning_ytdl_options
+from .process_reactor import get_reactor
+from .metrics import EngineMetrics, engine_metrics, host_label
+from .tracing import tracer, engine_profiler
+from .postprocess_stage import (PostProcessPool, PostProcessJob, EXPECTED_NETWORK_STAGE_WARNINGS, SKIPPED_FIXUP_WARNING, ffmpeg_available,
+                                network_stage_args, plan_postprocess, discard_unused_thumbnail)
+from .format_planner import FormatPlan, plan_from_info_json, plan_downloaded, ytdlp_audio_format
 
 logger = logging.getLogger(__name__)
 
-YT_DLP_EXECUTABLE = "yt-dlp"
-FFMPEG_EXECUTABLE = "ffmpeg"
+YT_DLP_EXECUTABLE_ENV = "BBX_YT_DLP_EXECUTABLE" # Nadjačava yt-dlp (npr. benchmarks/fake_ytdlp.py za mjerenja bez mreže)
+YT_DLP_EXECUTABLE = os.environ.get(YT_DLP_EXECUTABLE_ENV) or "yt-dlp"
+FFMPEG_EXECUTABLE_ENV = "BBX_FFMPEG_EXECUTABLE" # Nadjačava ffmpeg stupnja obrade (npr. benchmarks/fake_ffmpeg.py)
+FFMPEG_EXECUTABLE = os.environ.get(FFMPEG_EXECUTABLE_ENV) or "ffmpeg"
+STDERR_TAIL_LINES = 50 # Koliko zadnjih stderr linija ide u error_message taska
+ENGINE_STEP_THREADS = 4 # Niti za kratke korake taskova (priprema, pokretanje procesa, završetak); ne ovisi o broju slotova
 
 QUALITY_PROFILES = {
     "Video - Najbolji MP4": {"format_selector": "bestvideo[ext=mp4][vcodec^=avc1]+bestaudio[ext=m4a]/bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best", "type": "video", "description": "Najbolja MP4 (H.264) + AAC audio."},
     "Video - 1080p MP4": {"format_selector": "bestvideo[height<=1080][ext=mp4][vcodec^=avc1]+bestaudio[ext=m4a]/bestvideo[height<=1080][ext=mp4]+bestaudio[ext=m4a]/best[height<=1080][ext=mp4]", "type": "video", "description": "Do 1080p MP4 (H.264) + AAC audio."},
     "Video - 720p MP4": {"format_selector": "bestvideo[height<=720][ext=mp4][vcodec^=avc1]+bestaudio[ext=m4a]/bestvideo[height<=720][ext=mp4]+bestaudio[ext=m4a]/best[height<=720][ext=mp4]", "type": "video", "description": "Do 720p MP4 (H.264) + AAC audio."},
     "Audio - Najbolji MP3": {"format_selector": "bestaudio/best", "type": "audio", "extract_audio_format": "mp3", "audio_quality": "0", "description": "Najbolji audio, konvertiran u MP3."},
+    "Audio - MP3 ili izvorni AAC/Opus": {"format_selector": "bestaudio/best", "type": "audio", "extract_audio_format": "mp3", "audio_quality": "0",
+                                         "accept_source_codecs": ("aac", "opus"), "description": "Izvorni AAC/Opus bez kodiranja, inače MP3."},
     "Audio - Najbolji M4A/AAC": {"format_selector": "bestaudio[ext=m4a]/bestaudio[ext=aac]/bestaudio", "type": "audio", "extract_audio_format": "m4a", "description": "Najbolji audio u M4A (AAC) formatu."},
     "Općenito - Najbolje Moguće": {"format_selector": "bestvideo*+bestaudio*/best", "type": "video", "description": "Najbolji video i audio, bilo koji format."}
 }
@@ -31,8 +55,14 @@ def determine_content_type_and_suggest_quality(url: str) -> str: # Ostaje ista
     if "youtube.com/watch" in url_lower or "youtu.be/" in url_lower or "vimeo.com/" in url_lower: return "Video - 1080p MP4"
     if re.search(r"\.(mp4|mkv|webm|mov|avi|flv)(\?|$)", url_lower): return "Video - 1080p MP4"
     if "thepornbang.org" in url_lower : return "Video - Najbolji MP4" # Tvoj primjer
-    current_settings = settings_handler.load_settings()
-    return current_settings.get("default_quality", QUALITY_PROFILE_KEYS[0])
+    return settings_handler.get_setting("default_quality", QUALITY_PROFILE_KEYS[0])
+
+SKIPPED_ARCHIVED_STATUS = "Preskočeno (već preuzeto)"
+SKIPPED_DUPLICATE_STATUS = "Preskočeno (već u redu)"
+POSTPROCESS_QUEUED_STATUS = "Čeka obradu" # Preuzeto, slot je slobodan, čeka nit stupnja obrade (core.postprocess_stage)
+POSTPROCESSING_STATUS = "Obrada..."
+POSTPROCESS_FAILED_RETURN_CODE = 1 # return_code taska kad obrada ne uspije ili se otkaže (yt-dlp je već izašao s 0)
+JOURNALED_UPDATE_TYPES = ("status_update", "progress_update", "download_complete", "download_error")
 
 class DownloadTask: # Ostaje ista
     def __init__(self, url: str, quality_profile_key: str, output_dir: str, item_id: str):
@@ -41,61 +71,329 @@ class DownloadTask: # Ostaje ista
         self.progress_val: float = 0.0; self.final_filename: str | None = None
         self.error_message: str | None = None; self.speed_str: str = ""; self.eta_str: str = ""
         self.process: subprocess.Popen | None = None; self.added_time = time.time()
+        self.queued_at: float | None = None # time.perf_counter() zadnjeg ulaska u red (čekanje na slot za core.metrics i core.tracing)
+        self.resumed: bool = False # Vraćen iz dnevnika nakon ponovnog pokretanja
+        self.return_code: int | None = None # Izlazni kod yt-dlp procesa (None dok proces ne završi)
+        self.downloaded_bytes: int = 0; self.total_bytes: int | None = None # Točni bajtovi iz progress protokola
+        self.completed_bytes: int = 0 # Bajtovi već završenih fajlova unutar istog taska (video + audio)
+        self.archive_id: str | None = None # "<extractor> <id>" kako ga yt-dlp piše u --download-archive
+        self.title: str | None = None # Naslov stavke/playliste iz ravnog izvlačenja, prije nego postoji final_filename
+        self.parent_id: str | None = None; self.is_group: bool = False # Dijete playliste / parent red playliste (core.playlist_expander)
+        self.host_key: str | None = None # Brojač po hostu u kojem task drži slot (core.host_limits)
+        self.rate_limit: int | None = None # Dio ukupnog budžeta brzine u B/s (--limit-rate), None = bez ograničenja
+        self.rate_limit_locked: bool = False # rate_limit je ušao u naredbu yt-dlp procesa i do kraja taska se ne mijenja
+        self.trace = None # core.tracing.PhaseTracker dok se task izvodi uz uključeno praćenje, inače None
+        self.stage_input: dict | None = None # bbx-raw: izlaz mrežnog stupnja (streamovi, naslovnica, meta) kad obradu radi engine
+        self.format_plan: FormatPlan | None = None # Kopija ili kodiranje, odabrani format i kontejner (core.format_planner)
+
+# Zajednički dio za sve engine-e (threading Downloader i AsyncDownloader)
+def _format_selector(task: DownloadTask, profile: dict) -> str:
+    # Plan iz info-JSON-a (core.format_planner) fiksira format koji se kopira umjesto da ga yt-dlp ponovno bira
+    return task.format_plan.format_id if task.format_plan and task.format_plan.format_id else profile["format_selector"]
+
+def build_download_command(task: DownloadTask, current_settings: dict, info_json: str | None = None,
+                           info_json_output: str | None = None, download_archive: str | None = None, network_stage_only: bool = False) -> List[str]:
+    """info_json: kreni iz spremljenog info-JSON-a (bez ponovnog izvlačenja); info_json_output: usput zapiši info-JSON u cache;
+    download_archive: yt-dlp arhiva profila (preskače i bilježi već preuzeto);
+    network_stage_only: samo sirovi streamovi, ffmpeg dio radi core.postprocess_stage."""
+    profile = QUALITY_PROFILES.get(task.quality_profile_key, QUALITY_PROFILES["Općenito - Najbolje Moguće"])
+    source = ["--load-info-json", info_json] if info_json else [task.url]
+    command = [YT_DLP_EXECUTABLE, *source, "--no-check-certificates", "--no-mtime", "--ignore-errors",
+               "--retries", "2", "--fragment-retries", "2",
+               "--continue", # Nastavi postojeće .part fajlove (npr. nakon rušenja ili ponovnog pokretanja)
+               "--output", os.path.join(task.output_dir, "%(title)s.%(ext)s"), # Jednostavnije ime, yt-dlp će paziti na duplikate
+               "--format", _format_selector(task, profile),
+               *protocol_args(), # JSON progress + konačna putanja (core.progress_protocol)
+               *tuning_cli_args(resolve_tuning(current_settings, task.quality_profile_key)), # Fragmenti, chunk, aria2c (core.download_tuning)
+               ]
+    if info_json_output: command.extend(["--write-info-json", "--no-write-playlist-metafiles", "--output", f"infojson:{info_json_output}"])
+    if download_archive: command.extend(["--download-archive", download_archive])
+    if task.rate_limit: command.extend(["--limit-rate", str(task.rate_limit)])
+    if network_stage_only: command.extend(network_stage_args(profile, current_settings))
+    elif profile["type"] == "audio":
+        command.extend(["--extract-audio", "--audio-format", ytdlp_audio_format(profile, current_settings, task.format_plan)])
+        if "audio_quality" in profile: command.extend(["--audio-quality", profile["audio_quality"]])
+        if current_settings.get("embed_thumbnail_audio", True): command.append("--embed-thumbnail")
+    elif profile["type"] == "video":
+        command.append("--merge-output-format"); command.append("mp4")
+        if current_settings.get("add_metadata_video", True): command.append("--add-metadata")
+    if current_settings.get("prefer_hw_acceleration", False): command.append("--prefer-ffmpeg-hw-dl")
+    return command
+
+def build_ytdl_options(task: DownloadTask, current_settings: dict, info_json_output: str | None = None,
+                       download_archive: str | None = None) -> dict:
+    """Isto mapiranje QUALITY_PROFILES kao build_download_command, ali kao YoutubeDL opcije za worker pool."""
+    profile = QUALITY_PROFILES.get(task.quality_profile_key, QUALITY_PROFILES["Općenito - Najbolje Moguće"])
+    options = {"nocheckcertificate": True, "updatetime": False, "ignoreerrors": True, "retries": 2, "fragment_retries": 2,
+               "continuedl": True, "outtmpl": {"default": os.path.join(task.output_dir, "%(title)s.%(ext)s")},
+               "format": _format_selector(task, profile),
+               "quiet": True, "noprogress": True, **tuning_ytdl_options(resolve_tuning(current_settings, task.quality_profile_key))}
+    if info_json_output:
+        options.update(writeinfojson=True, allow_playlist_files=False); options["outtmpl"]["infojson"] = info_json_output
+    if download_archive: options["download_archive"] = download_archive
+    if task.rate_limit: options["ratelimit"] = task.rate_limit
+    postprocessors = []
+    if profile["type"] == "audio":
+        postprocessors.append({"key": "FFmpegExtractAudio", "preferredcodec": ytdlp_audio_format(profile, current_settings, task.format_plan),
+                               "preferredquality": profile.get("audio_quality", "5")})
+        if current_settings.get("embed_thumbnail_audio", True):
+            options["writethumbnail"] = True; postprocessors.append({"key": "EmbedThumbnail", "already_have_thumbnail": False})
+    elif profile["type"] == "video":
+        options["merge_output_format"] = "mp4"
+        if current_settings.get("add_metadata_video", True): postprocessors.append({"key": "FFmpegMetadata", "add_metadata": True})
+    if postprocessors: options["postprocessors"] = postprocessors
+    return options
+
+def reset_progress(task: DownloadTask):
+    task.progress_str = "0.0%"; task.progress_val = 0.0; task.speed_str = ""; task.eta_str = ""
+    task.downloaded_bytes = 0; task.total_bytes = None; task.completed_bytes = 0
+
+def apply_protocol_line(task: DownloadTask, line: str) -> str | None:
+    """Obrađuje liniju progress protokola. Vraća LINE_PROGRESS, LINE_FILEPATH, LINE_ARCHIVE ili LINE_PHASE ako je linija prepoznata, inače None."""
+    kind, value = parse_line(line)
+    if kind == LINE_PROGRESS: apply_progress(task, value)
+    elif kind == LINE_FILEPATH: task.final_filename = os.path.abspath(value) # yt-dlp javlja putanju tek nakon premještanja i post-processinga
+    elif kind == LINE_ARCHIVE: task.archive_id = value
+    elif kind == LINE_PHASE and task.trace is not None: task.trace.marker(value)
+    elif kind == LINE_RAW and task.stage_input is not None: task.stage_input[value[0]] = value[1]
+    return kind
 
 class Downloader:
-    def __init__(self, update_callback: Callable, max_concurrent_downloads: int = 1):
-        self.download_queue = queue.Queue()
+    def __init__(self, update_callback: Callable, max_concurrent_downloads: int = 1, journal: TaskJournal | None = None,
+                 metrics: EngineMetrics | None = None):
+        self.download_queue = IndexedTaskQueue(group_of=lambda task: hostname(task.url)) # Podred po hostu, vidi _take_dispatchable_locked
+        # Svi brojači slotova i active_tasks mijenjaju se isključivo pod ovim lockom;
+        # condition budi dispatcher samo na dodavanje, završetak, otkazivanje ili promjenu limita.
+        self._slot_condition = threading.Condition(threading.Lock())
         self.active_downloads_count = 0
-        self.max_concurrent_downloads = max_concurrent_downloads
+        self.max_concurrent_downloads = max(1, int(max_concurrent_downloads))
         self.update_callback = update_callback
         self.stop_event = threading.Event() # Za zaustavljanje workera
         self.cancel_flags: Dict[str, threading.Event] = {} # Za otkazivanje pojedinačnih taskova
         self.worker_thread: threading.Thread | None = None
+        # Koraci taskova; nijedan ne čeka proces ni drugi task (kraj procesa javlja reaktor, kraj izvlačenja ExtractionCache)
+        self._step_pool = ThreadPoolExecutor(max_workers=ENGINE_STEP_THREADS, thread_name_prefix="DownloadStep")
         self.current_settings = settings_handler.load_settings()
         self.active_tasks: Dict[str, DownloadTask] = {}
+        self._host_limiter = HostLimiter.from_settings(self.current_settings)
+        self._active_per_host: Dict[str, int] = {} # host_key -> broj aktivnih taskova (pod _slot_condition)
         self.all_tasks_map: Dict[str, DownloadTask] = {}
+        self.journal = journal
+        self._worker_pool: YtDlpWorkerPool | None = None # Kreira se tek kad zatreba (download_backend == "worker_pool")
+        self._postprocess_pool: PostProcessPool | None = None # Stupanj obrade (ffmpeg), kreira se s prvim preuzetim taskom
+        self._extraction_cache: ExtractionCache | None = None
+        self._download_archive: DownloadArchive | None = None
+        self.playlist_groups: Dict[str, PlaylistGroup] = {} # Parent redovi playlisti; nisu u all_tasks_map ni u dnevniku
+        self.metrics = metrics or engine_metrics; self.metrics.bind(self) # core.metrics: brojači po prijelazu stanja, gauge-ovi pri izvozu
+        settings_handler.add_settings_listener(self._on_settings_changed)
+
+    def _emit(self, task: DownloadTask, update_type: str, data=None):
+        # Jedina točka kroz koju engine javlja promjene: dnevnik bilježi stanje, a zatim se zove update_callback
+        if self.journal and update_type in JOURNALED_UPDATE_TYPES and task.item_id in self.all_tasks_map:
+            self.journal.record(task)
+        if update_type == "progress_update": self.metrics.progress(task)
+        if data is None: self.update_callback(task, update_type)
+        else: self.update_callback(task, update_type, data)
+        if task.parent_id and update_type in JOURNALED_UPDATE_TYPES:
+            group = self.playlist_groups.get(task.parent_id)
+            group_update_type = group.on_child_update(task) if group else None
+            if group_update_type: self.update_callback(group.task, group_update_type)
+
+    def restore_from_journal(self) -> int:
+        """Vraća u red nezavršene taskove iz prethodne sesije. yt-dlp nastavlja postojeće .part fajlove (--continue)."""
+        if not self.journal: return 0
+        purged = self.journal.purge_finished()
+        restored = 0
+        for row in self.journal.load_unfinished():
+            if row["item_id"] in self.all_tasks_map: continue
+            task = DownloadTask(row["url"], row["quality_profile_key"], row["output_dir"], row["item_id"])
+            task.added_time = row["added_time"]; task.resumed = True
+            task.progress_val = float(row.get("progress_val") or 0.0); task.progress_str = f"{task.progress_val:.1f}%"
+            self.add_to_queue(task); restored += 1
+        logger.info(f"Iz dnevnika vraćeno {restored} nezavršenih zadataka (obrisano {purged} završenih zapisa).")
+        return restored
+
+    def _on_settings_changed(self, new_settings: dict):
+        self.current_settings = new_settings
+        self._apply_limit_settings()
+        new_max = new_settings.get("max_concurrent_downloads", self.max_concurrent_downloads)
+        if new_max != self.max_concurrent_downloads: self.set_max_concurrent_downloads(new_max)
 
-    def add_to_queue(self, task: DownloadTask):
+    def _apply_limit_settings(self):
+        # Ograničenja po hostu i budžet brzine vrijede za nove slotove odmah; aktivni taskovi zadržavaju svoj host_key
+        with self._slot_condition:
+            self._host_limiter = HostLimiter.from_settings(self.current_settings)
+            self._rebalance_bandwidth_locked(); self._slot_condition.notify_all()
+
+    def set_max_concurrent_downloads(self, new_max: int):
+        try: new_max = max(1, int(new_max))
+        except (TypeError, ValueError):
+            logger.warning(f"Neispravan broj istovremenih preuzimanja: {new_max!r}"); return
+        with self._slot_condition:
+            old_max = self.max_concurrent_downloads
+            self.max_concurrent_downloads = new_max
+            self._rebalance_bandwidth_locked()
+            self._slot_condition.notify_all()
+            if self._worker_pool: self._worker_pool.set_max_workers(new_max)
+        # Smanjenje ne prekida aktivna preuzimanja, samo se novi slotovi ne dodjeljuju dok se broj ne spusti ispod limita.
+        logger.info(f"Broj istovremenih preuzimanja promijenjen: {old_max} -> {new_max}")
+
+    def add_to_queue(self, task: DownloadTask, priority: int = DEFAULT_PRIORITY) -> bool:
+        """Vraća False (i postavlja task.status) ako je isti posao već u redu ili je (URL, profil) već preuzet."""
+        existing = self.all_tasks_map.get(task.item_id)
+        if existing is not None and existing is not task and not is_finished_status(existing.status):
+            task.status = SKIPPED_DUPLICATE_STATUS; logger.info(f"Task {task.item_id} je već u redu/aktivan, preskačem."); return False
+        archive = self._get_download_archive()
+        if archive and archive.contains(task.url, task.quality_profile_key):
+            task.status = SKIPPED_ARCHIVED_STATUS; logger.info(f"Već preuzeto ({task.quality_profile_key}), preskačem: {task.url[:70]}"); return False
         logger.info(f"Dodajem task u red: {task.item_id} - {task.url[:70]}...")
         self.all_tasks_map[task.item_id] = task
         self.cancel_flags[task.item_id] = threading.Event() # Kreiraj cancel flag za ovaj task
-        self.download_queue.put(task)
-        task.status = "U redu"
-        self.update_callback(task, "status_update")
+        task.status = "U redu"; task.queued_at = time.perf_counter(); self.metrics.task_queued(task)
+        with self._slot_condition:
+            self.download_queue.put(task, priority)
+            self._slot_condition.notify()
+        self._emit(task, "status_update")
         if self.worker_thread is None or not self.worker_thread.is_alive():
             self.start_worker()
+        return True
+
+    def add_playlist(self, group_task: DownloadTask) -> bool:
+        """Playlista/kanal kao parent red: stavke se ravnim izvlačenjem pretvaraju u zasebne taskove (raspoređuju se na sve slotove).
+        Vraća False ako se ista playlista (isti profil) još obrađuje."""
+        existing = self.playlist_groups.get(group_task.item_id)
+        if existing is not None and not is_finished_status(existing.task.status):
+            group_task.status = SKIPPED_DUPLICATE_STATUS; logger.info(f"Playlista {group_task.item_id} se već obrađuje, preskačem."); return False
+        group_task.is_group = True
+        group = PlaylistGroup(group_task); self.playlist_groups[group_task.item_id] = group
+        logger.info(f"Proširujem playlistu u zasebne taskove: {group_task.item_id} - {group_task.url[:70]}")
+        self._emit(group_task, "status_update")
+        threading.Thread(target=self._expand_playlist, args=(group,), name="PlaylistExpander", daemon=True).start()
+        return True
+
+    def _expand_playlist(self, group: PlaylistGroup):
+        group_task = group.task; error = None; count = 0
+        def on_process(process): group_task.process = process
+        try:
+            for entry_url, title, playlist_title in stream_playlist_entries(YT_DLP_EXECUTABLE, group_task.url, group.cancel_event, on_process):
+                if playlist_title and not group_task.title: group_task.title = playlist_title; self._emit(group_task, "status_update")
+                child = DownloadTask(entry_url, group_task.quality_profile_key, group_task.output_dir, task_id_for(entry_url, group_task.quality_profile_key))
+                child.parent_id = group_task.item_id; child.title = title
+                group.add_child(child.item_id); count += 1
+                if not self.add_to_queue(child): self._emit(child, "status_update") # Preskočeno: odmah se broji kao gotovo
+        except FileNotFoundError: error = f"{YT_DLP_EXECUTABLE} nije pronađen."; logger.critical(error)
+        except Exception as e: error = str(e); logger.error(f"[{group_task.item_id}] Greška pri proširivanju playliste: {e}")
+        finally: group_task.process = None
+        logger.info(f"[{group_task.item_id}] Playlista proširena: {count} stavki.")
+        self._emit(group_task, group.finish_expansion(error))
+
+    def _cancel_group(self, group: PlaylistGroup, by_system: bool) -> List[str]:
+        group.cancel("Otkazano (sistem)" if by_system else "Otkazano (korisnik)")
+        process = group.task.process
+        if process and process.poll() is None:
+            try: process.terminate()
+            except OSError as e: logger.error(f"Greška pri gašenju proširivanja playliste {group.task.item_id}: {e}")
+        return [child_id for child_id in list(group.child_ids)
+                if child_id in self.all_tasks_map and not is_finished_status(self.all_tasks_map[child_id].status)]
+
+    def move_task_to_front(self, task_item_id: str) -> bool:
+        with self._slot_condition: moved = self.download_queue.move_to_front(task_item_id)
+        if moved: logger.info(f"Task {task_item_id} premješten na vrh reda.")
+        return moved
+
+    def reprioritize_task(self, task_item_id: str, priority: int) -> bool:
+        with self._slot_condition: changed = self.download_queue.reprioritize(task_item_id, priority)
+        if changed: logger.info(f"Task {task_item_id} dobio prioritet {priority}.")
+        return changed
+
+    def get_queued_tasks(self) -> List[DownloadTask]:
+        """Taskovi koji još čekaju slot, redom kojim će se preuzimati."""
+        return self.download_queue.ordered_tasks()
 
     def get_all_tasks_snapshot(self) -> List[DownloadTask]:
-        return sorted(list(self.all_tasks_map.values()), key=lambda t: t.added_time, reverse=True)
+        # Parent redovi playlisti idu prvi, da djeca u prikazu imaju pod koga doći
+        return [group.task for group in list(self.playlist_groups.values())] + sorted(list(self.all_tasks_map.values()), key=lambda t: t.added_time, reverse=True)
+
+    def iter_tasks(self):
+        """Kao get_all_tasks_snapshot, ali redoslijedom dodavanja i bez sortiranja (QueueView sinkronizacija)."""
+        yield from [group.task for group in list(self.playlist_groups.values())]
+        yield from list(self.all_tasks_map.values())
+
+    def task_count(self) -> int:
+        return len(self.playlist_groups) + len(self.all_tasks_map)
 
     def remove_task_completely(self, task_item_id: str):
+        if self.playlist_groups.pop(task_item_id, None) is not None: logger.info(f"Playlista {task_item_id} uklonjena."); return
         if task_item_id in self.all_tasks_map: del self.all_tasks_map[task_item_id]
-        if task_item_id in self.active_tasks: del self.active_tasks[task_item_id]
         if task_item_id in self.cancel_flags: del self.cancel_flags[task_item_id]
+        # active_tasks se ne dira ovdje: slot oslobađa _download_done kad proces završi
         logger.info(f"Task {task_item_id} potpuno uklonjen iz DownloadManagera.")
-        # Ako je bio u queue.Queue, bit će preskočen u _process_queue ako više nije u all_tasks_map
+        with self._slot_condition: self.download_queue.remove(task_item_id)
+        if self.journal: self.journal.delete(task_item_id)
 
     def start_worker(self):
         if self.worker_thread is not None and self.worker_thread.is_alive():
             logger.info("Download worker je već aktivan."); return
-        self.current_settings = settings_handler.load_settings(); self.stop_event.clear()
+        self.current_settings = settings_handler.load_settings(); self.stop_event.clear(); self._apply_limit_settings()
         self.worker_thread = threading.Thread(target=self._process_queue, daemon=True)
         self.worker_thread.start(); logger.info("Download worker pokrenut.")
+        if self.current_settings.get("download_backend") == "worker_pool": self._get_worker_pool() # Zagrijavanje prije prvog taska
         if not self.download_queue.empty():
              status_task = DownloadTask("Red", "N/A", "", f"status_q_info_{time.time()}"); status_task.status = f"{self.download_queue.qsize()} zadataka u redu..."
-             self.update_callback(status_task, "general_status_update", status_task.status)
+             self._emit(status_task, "general_status_update", status_task.status)
 
     def stop_worker(self):
         self.stop_event.set(); logger.info("Zahtjev za zaustavljanje SVIH preuzimanja...")
+        # Otkazivanje zbog gašenja ne smije u dnevniku završiti taskove, da se pri sljedećem pokretanju nastave
+        if self.journal: self.journal.freeze()
+        with self._slot_condition: self._slot_condition.notify_all()
+        for group in list(self.playlist_groups.values()):
+            if group.expanding: self._cancel_group(group, by_system=True)
         for task_id in list(self.active_tasks.keys()): self.cancel_task(task_id, by_system=True)
-        drained_tasks = []; _empty_queue_while_draining(self.download_queue, drained_tasks)
-        for task in drained_tasks: task.status = "Otkazano (gašenje)"; self.update_callback(task, "status_update")
+        if self._postprocess_pool: # Preuzeti taskovi koji čekaju ili prolaze obradu nisu u active_tasks
+            for task_id in self._postprocess_pool.task_ids(): self.cancel_task(task_id, by_system=True)
+        with self._slot_condition: drained_tasks = self.download_queue.drain()
+        for task in drained_tasks: task.status = "Otkazano (gašenje)"; self._emit(task, "status_update")
         if self.worker_thread and self.worker_thread.is_alive():
             logger.info("Čekam da se download worker nit završi..."); self.worker_thread.join(timeout=2)
         logger.info("Download worker nit zaustavljena." if not (self.worker_thread and self.worker_thread.is_alive()) else "Download worker se nije ugasio na vrijeme.")
-        self.worker_thread = None; self.active_downloads_count = 0
+        self.worker_thread = None
+        if self.journal: self.journal.close(); self.journal = None
+        if self._worker_pool: self._worker_pool.close(); self._worker_pool = None
+        if self._postprocess_pool: self._postprocess_pool.close(); self._postprocess_pool = None
+
+    def stage_depths(self) -> Dict[str, dict]:
+        """Dubina reda i zauzeće po stupnju pipeline-a: "network" (yt-dlp slotovi) i "postprocess" (ffmpeg niti)."""
+        pool = self._postprocess_pool
+        return {"network": {"queued": self.download_queue.qsize(), "active": self.active_downloads_count, "capacity": self.max_concurrent_downloads},
+                "postprocess": {"queued": pool.queued if pool else 0, "active": pool.active if pool else 0,
+                                "capacity": pool.workers if pool else PostProcessPool.worker_count(self.current_settings.get("postprocess_workers", 0))}}
+
+    def cancel_tasks(self, task_item_ids: List[str], by_system: bool = False) -> int:
+        """Masovno otkazivanje: taskovi iz reda uklanjaju se odjednom, aktivni se gase pojedinačno.
+        ID playliste otkazuje njeno proširivanje i svu djecu."""
+        expanded_ids: List[str] = []
+        for item_id in task_item_ids:
+            group = self.playlist_groups.get(item_id)
+            expanded_ids.extend(self._cancel_group(group, by_system) if group else [item_id])
+        task_item_ids = [item_id for item_id in expanded_ids if item_id in self.all_tasks_map]
+        with self._slot_condition:
+            removed_from_queue = self.download_queue.remove_many(task_item_ids)
+        for task in removed_from_queue:
+            cancel_event = self.cancel_flags.get(task.item_id)
+            if cancel_event: cancel_event.set()
+            task.status = "Otkazano (sistem)" if by_system else "Otkazano (korisnik)"
+            task.error_message = "Preuzimanje otkazano."; task.speed_str = ""; task.eta_str = ""
+            self._emit(task, "download_error")
+        removed_ids = {task.item_id for task in removed_from_queue}
+        cancelled_count = len(removed_from_queue)
+        for item_id in task_item_ids:
+            if item_id not in removed_ids and self.cancel_task(item_id, by_system=by_system): cancelled_count += 1
+        logger.info(f"Masovno otkazano {cancelled_count} zadataka ({len(removed_from_queue)} iz reda).")
+        return cancelled_count
 
     def cancel_task(self, task_item_id: str, by_system: bool = False):
+         if task_item_id in self.playlist_groups: self.cancel_tasks([task_item_id], by_system=by_system); return True
          task = self.all_tasks_map.get(task_item_id)
          if not task:
              logger.warning(f"Pokušaj otkazivanja nepostojećeg taska: {task_item_id}")
@@ -104,7 +402,10 @@ class Downloader:
          logger.info(f"Zahtjev za otkazivanje taska: {task_item_id}, trenutni status: {task.status}")
          cancel_event = self.cancel_flags.get(task_item_id)
          if cancel_event:
-             cancel_event.set() # Signaliziraj niti _execute_download da treba prekinuti
+             cancel_event.set() # Signaliziraj koracima taska (_execute_download, _download_done) da treba prekinuti
+         cache = self._extraction_cache
+         resume = cache.cancel_wait(task.url, task_item_id) if cache else None
+         if resume: resume() # Task je čekao leadera za isti URL; nastavak vidi otkazivanje i završava task
 
          if task.process and task.process.poll() is None: # Ako proces postoji i radi
              logger.info(f"Pokušavam terminirati proces za task {task_item_id} (PID: {task.process.pid})")
@@ -122,185 +423,422 @@ class Downloader:
          task.status = "Otkazano (sistem)" if by_system else "Otkazano (korisnik)"
          task.error_message = "Preuzimanje otkazano."
          task.speed_str = ""; task.eta_str = "" # Očisti info o brzini/ETA
-         self.update_callback(task, "download_error") # Javi GUI-ju (koristi error za bojenje)
-         
-         if task_item_id in self.active_tasks:
-             del self.active_tasks[task_item_id]
-             self.active_downloads_count = max(0, self.active_downloads_count - 1)
-         
-         # Ukloni iz queue.Queue ako je tamo
-         _remove_task_from_queue_obj(self.download_queue, task_item_id)
+         self._emit(task, "download_error") # Javi GUI-ju (koristi error za bojenje)
+
+         # Slot oslobađa isključivo _download_done (u finally), da se ne bi dvaput umanjio brojač.
+         with self._slot_condition:
+             self.download_queue.remove(task_item_id) # O(1), ako je task još u redu
+             self._slot_condition.notify_all()
          return True
 
+    def _host_has_room(self, host: str) -> bool:
+        # Poziva se isključivo pod self._slot_condition
+        host_key, limit = self._host_limiter.classify_host(host)
+        return limit <= 0 or self._active_per_host.get(host_key, 0) < limit
+
+    def _take_dispatchable_locked(self) -> DownloadTask | None:
+        # Prvi task po redoslijedu među podredovima hostova koji imaju mjesta; podredovi zasićenih hostova se ne diraju
+        if self.active_downloads_count >= self.max_concurrent_downloads or not self._budget_has_room_locked(): return None
+        return self.download_queue.pop_first_ready(self._host_has_room)
+
+    def _bandwidth_budget(self) -> int:
+        return int(self.current_settings.get("bandwidth_limit_kib", 0) or 0) * 1024
+
+    def _locked_bandwidth_locked(self) -> int:
+        return sum(task.rate_limit or 0 for task in self.active_tasks.values() if task.rate_limit_locked)
+
+    def _budget_has_room_locked(self) -> bool:
+        # Novi task kreće tek kad mu slobodni dio budžeta može dati barem MIN_RATE_LIMIT, pa zbroj dijelova ne prelazi budžet
+        budget = self._bandwidth_budget()
+        if budget <= 0 or not self.active_tasks: return True
+        flexible = sum(1 for task in self.active_tasks.values() if not task.rate_limit_locked)
+        return budget - self._locked_bandwidth_locked() >= MIN_RATE_LIMIT * (flexible + 1)
+
+    def _dispatchable_count_locked(self, free_slots: int) -> int:
+        # Taskovi iz reda koji bi odmah dobili slot: podred hosta broji se samo do slobodnog mjesta u limitu hosta
+        count = 0; taken: Dict[str, int] = {}
+        for host, size in self.download_queue.group_sizes().items():
+            if count >= free_slots: break
+            host_key, limit = self._host_limiter.classify_host(host)
+            room = size if limit <= 0 else max(0, limit - self._active_per_host.get(host_key, 0) - taken.get(host_key, 0))
+            taken[host_key] = taken.get(host_key, 0) + min(size, room); count += min(size, room)
+        return min(count, free_slots)
+
+    def _rebalance_bandwidth_locked(self):
+        # Ukupni budžet (bandwidth_limit_kib) je zajednička zaliha. yt-dlp proces dobiva --limit-rate pri pokretanju i drži taj
+        # dio do kraja taska (rate_limit_locked); ostatak se dijeli na taskove čija se brzina još može mijenjati (worker_pool
+        # je primjenjuje odmah) i taskove iz reda koji mogu odmah dobiti slot. Dio završenog taska dobivaju oni i sljedeći
+        # taskovi iz reda; već pokrenuti yt-dlp procesi ne mogu dobiti veći limit.
+        budget = self._bandwidth_budget()
+        flexible = [task for task in self.active_tasks.values() if not task.rate_limit_locked]
+        if budget <= 0:
+            for task in flexible: task.rate_limit = None
+            return
+        free = max(budget - self._locked_bandwidth_locked(), min(MIN_RATE_LIMIT, budget)) # Budžet je mogao pasti ispod zauzetog
+        expected = len(flexible) + self._dispatchable_count_locked(self.max_concurrent_downloads - self.active_downloads_count)
+        share = split_bandwidth(free, len(flexible), expected)
+        for task in flexible: task.rate_limit = share
+
+    def _release_slot(self, task: DownloadTask) -> int:
+        with self._slot_condition:
+            if self.active_tasks.pop(task.item_id, None) is not None:
+                self.active_downloads_count = max(0, self.active_downloads_count - 1)
+                if task.host_key is not None:
+                    remaining = self._active_per_host.get(task.host_key, 1) - 1
+                    if remaining > 0: self._active_per_host[task.host_key] = remaining
+                    else: self._active_per_host.pop(task.host_key, None)
+                    task.host_key = None
+                task.rate_limit = None; task.rate_limit_locked = False
+                self._rebalance_bandwidth_locked()
+            self._slot_condition.notify_all()
+            return self.active_downloads_count
+
     def _process_queue(self):
-        while not self.stop_event.is_set():
-            if self.active_downloads_count < self.max_concurrent_downloads:
-                try:
-                    task = self.download_queue.get(block=True, timeout=0.2) # Kraći timeout
-                    
+        while True:
+            try:
+                with self._slot_condition:
+                    task = None
+                    while not self.stop_event.is_set():
+                        task = self._take_dispatchable_locked()
+                        if task is not None: break
+                        logger.debug("Nema slobodnog slota ili zadatka (ili su hostovi zasićeni), worker čeka.")
+                        self._slot_condition.wait()
+                    if self.stop_event.is_set():
+                        if task is not None: self.download_queue.put(task) # Vrati ga, stop_worker ga otkazuje iz reda
+                        break
+
                     if task.item_id not in self.all_tasks_map or self.cancel_flags.get(task.item_id, threading.Event()).is_set():
-                        logger.info(f"Preskačem task {task.item_id} jer je uklonjen ili već otkazan.")
-                        self.download_queue.task_done(); continue
+                        logger.info(f"Preskačem task {task.item_id} jer je uklonjen ili već otkazan."); continue
                     if task.item_id in self.active_tasks:
-                        logger.warning(f"Task {task.item_id} je već aktivan, preskačem."); self.download_queue.task_done(); continue
+                        logger.warning(f"Task {task.item_id} je već aktivan, preskačem."); continue
 
                     self.active_downloads_count += 1; self.active_tasks[task.item_id] = task
-                    logger.info(f"Započinjem obradu taska: {task.item_id} (aktivno: {self.active_downloads_count})")
-                    threading.Thread(target=self._execute_download, args=(task,), daemon=True).start()
-                    self.download_queue.task_done()
-                except queue.Empty:
-                    if self.active_downloads_count == 0 and self.download_queue.empty(): logger.debug("Red prazan, worker čeka.")
-                except Exception as e: logger.error(f"Greška u _process_queue: {e}", exc_info=True)
-            else: self.stop_event.wait(timeout=0.1) # Još kraći wait
-        logger.info("Download worker _process_queue petlja završena."); self.active_downloads_count = 0
+                    task.host_key = self._host_limiter.classify(task.url)[0]
+                    self._active_per_host[task.host_key] = self._active_per_host.get(task.host_key, 0) + 1
+                    self._rebalance_bandwidth_locked()
+                    logger.info(f"Započinjem obradu taska: {task.item_id} (aktivno: {self.active_downloads_count}/{self.max_concurrent_downloads})")
+                self.metrics.task_started(task, task.queued_at)
+                if tracer.enabled and task.queued_at is not None: tracer.record("queue_wait", task.queued_at, time.perf_counter(), tracer.lane(task))
+                self._submit_step(self._execute_download, task)
+            except Exception as e: logger.error(f"Greška u _process_queue: {e}", exc_info=True)
+        logger.info("Download worker _process_queue petlja završena.")
+
+    def _submit_step(self, step: Callable, *args):
+        self._step_pool.submit(self._run_step, step, args)
+
+    def _run_step(self, step: Callable, args: tuple):
+        try: engine_profiler.run(step, *args)
+        except Exception as e: logger.error(f"Greška u koraku taska ({getattr(step, '__name__', step)}): {e}", exc_info=True)
+
+    def _get_extraction_cache(self) -> ExtractionCache | None:
+        if not self.current_settings.get("extraction_cache_enabled", True): return None
+        with self._slot_condition:
+            if self._extraction_cache is None:
+                try:
+                    self._extraction_cache = ExtractionCache(ttl_seconds=float(self.current_settings.get("extraction_cache_ttl_hours", 3)) * 3600,
+                                                             max_bytes=int(self.current_settings.get("extraction_cache_max_mb", 200)) * 1024 * 1024)
+                except OSError as e:
+                    logger.error(f"Cache izvlačenja nije dostupan: {e}"); return None
+            return self._extraction_cache
+
+    def _get_download_archive(self) -> DownloadArchive | None:
+        if not self.current_settings.get("download_archive_enabled", True): return None
+        with self._slot_condition:
+            if self._download_archive is None:
+                try: self._download_archive = DownloadArchive()
+                except OSError as e:
+                    logger.error(f"Arhiva preuzimanja nije dostupna: {e}"); return None
+            return self._download_archive
+
+    def _run_download(self, task: DownloadTask, cancel_flag: threading.Event, log_prefix: str, on_done: Callable, allow_cached: bool = True):
+         # on_done(return_code, stderr_rem, error=None) se zove točno jednom; greška prije pokretanja procesa se baca odmah
+         cache = self._get_extraction_cache()
+         if cache is None: return self._run_backend(task, cancel_flag, log_prefix, on_done)
+         if cancel_flag.is_set(): return on_done(-1, "")
+         wait_started = time.perf_counter()
+         resume = functools.partial(self._submit_step, self._resume_download, task, cancel_flag, log_prefix, on_done, allow_cached, wait_started)
+         acquired = cache.acquire_nowait(task.url, task.item_id, resume)
+         if acquired is None: return # Isti URL izvlači drugi task; nastavak pokreće njegov release() ili cancel_task
+         info_json, is_leader = acquired
+         if is_leader:
+             # Čekači kreću čim je info-JSON zapisan (before_dl), ne tek kad leader preuzme cijeli fajl
+             release_extraction = functools.partial(cache.release, task.url)
+             def on_leader_done(return_code, stderr_rem, error=None):
+                 release_extraction() # Izvlačenje nije uspjelo ili backend ne javlja before_dl
+                 on_done(return_code, stderr_rem, error)
+             try: return self._run_backend(task, cancel_flag, log_prefix, on_leader_done, info_json_output=cache.output_template_for(task.url), on_extracted=release_extraction)
+             except Exception: release_extraction(); raise
+         if not info_json or not allow_cached: return self._run_backend(task, cancel_flag, log_prefix, on_done) # Npr. prethodni leader nije uspio
+         logger.info(f"[{task.item_id}] Metapodaci iz cachea izvlačenja, preskačem ponovno izvlačenje.")
+         def on_cached_done(return_code, stderr_rem, error=None):
+             if error is None and return_code != 0 and not cancel_flag.is_set():
+                 # Najčešće su istekli potpisani linkovi na streamove: izbaci unos i pokušaj jednom sa svježim izvlačenjem
+                 logger.warning(f"[{task.item_id}] Preuzimanje iz cachea nije uspjelo (kod: {return_code}), ponavljam sa svježim izvlačenjem.")
+                 cache.invalidate(task.url); reset_progress(task)
+                 try: return self._run_download(task, cancel_flag, log_prefix, on_done, allow_cached=False)
+                 except Exception as e: return on_done(None, "", e)
+             on_done(return_code, stderr_rem, error)
+         return self._run_backend(task, cancel_flag, log_prefix, on_cached_done, info_json=info_json)
+
+    def _resume_download(self, task: DownloadTask, cancel_flag: threading.Event, log_prefix: str, on_done: Callable,
+                         allow_cached: bool, wait_started: float):
+         # Leader za isti URL je otpustio izvlačenje (ili je task otkazan dok je čekao): ponovi acquire
+         if tracer.enabled: tracer.record("extraction_cache_wait", wait_started, time.perf_counter(), tracer.lane(task))
+         try: self._run_download(task, cancel_flag, log_prefix, on_done, allow_cached)
+         except Exception as e: on_done(None, "", e)
+
+    def _run_backend(self, task: DownloadTask, cancel_flag: threading.Event, log_prefix: str, on_done: Callable, info_json: str | None = None,
+                     info_json_output: str | None = None, on_extracted: Callable | None = None):
+         archive = self._get_download_archive()
+         download_archive = archive.archive_path(task.quality_profile_key) if archive else None
+         profile = QUALITY_PROFILES.get(task.quality_profile_key, QUALITY_PROFILES["Općenito - Najbolje Moguće"])
+         task.format_plan = plan_from_info_json(profile, self.current_settings, info_json) if info_json else None
+         if task.format_plan: self._log_format_plan(task, log_prefix)
+         if self.current_settings.get("download_backend") == "worker_pool":
+             task.stage_input = None
+             if task.trace: task.trace.enter("worker_job", cached_info=bool(info_json)) # Worker ne javlja granice faza
+             # run_job blokira dok worker ne završi, pa posao dobiva svoju nit; broj takvih niti ograničava broj workera
+             threading.Thread(target=self._run_step, name="YtDlpWorkerJob", daemon=True,
+                              args=(self._run_in_worker_pool, (task, cancel_flag, log_prefix, on_done, info_json, info_json_output, download_archive, on_extracted))).start()
+             return
+         network_stage_only = self._postprocess_stage_enabled(task)
+         task.stage_input = {} if network_stage_only else None
+         if network_stage_only: download_archive = None # Bez obrade fajl nije gotov; arhivu nadopunjuje _complete_download nakon commita
+         with self._slot_condition: task.rate_limit_locked = True # --limit-rate ulazi u naredbu; rebalans ga više ne mijenja
+         command = build_download_command(task, self.current_settings, info_json, info_json_output, download_archive, network_stage_only)
+         logger.info(f"[{task.item_id}] Pokrećem: {' '.join(command)}")
+         if task.trace: task.trace.enter("extraction", cached_info=bool(info_json)) # Do --print before_dl (bbx-phase:before_dl)
+         self._run_subprocess(task, command, cancel_flag, log_prefix, on_done, on_extracted)
+
+    def _run_subprocess(self, task: DownloadTask, command: List[str], cancel_flag: threading.Event, log_prefix: str, on_done: Callable,
+                        on_extracted: Callable | None = None):
+         # stdout i stderr čita zajednički reaktor (linije stižu na njegovoj niti); nakon EOF-a izlaz procesa preuzima korak iz poola
+         stderr_tail: deque = deque(maxlen=STDERR_TAIL_LINES)
+         def on_stdout_line(line):
+             if cancel_flag.is_set():
+                 if process.poll() is None: logger.info(f"[{task.item_id}] Detektiran signal za otkazivanje, prekidam proces."); process.terminate()
+                 return
+             line = line.strip()
+             if not line: return
+             kind = apply_protocol_line(task, line)
+             if kind == LINE_PROGRESS: self._emit(task, "progress_update"); return # Progress linije ne idu u log pane
+             logger.debug(f"[{task.item_id}] yt-dlp: {line}")
+             if kind == LINE_PHASE and on_extracted is not None and parse_line(line)[1] == "before_dl": on_extracted()
+             if kind == LINE_FILEPATH: self._emit(task, "log_message", f"{log_prefix} Spremljeno: {task.final_filename}")
+             elif kind is None: self._emit(task, "log_message", f"{log_prefix} {line}")
+         def on_stderr_line(line):
+             line = line.strip()
+             if not line: return
+             if task.stage_input is not None and any(warning in line for warning in EXPECTED_NETWORK_STAGE_WARNINGS):
+                 logger.debug(f"[{task.item_id}] yt-dlp (mrežni stupanj): {line}"); return
+             if task.stage_input is not None and SKIPPED_FIXUP_WARNING in line: # Preskočeni popravak radi stupanj obrade
+                 task.stage_input["fixup"] = True; logger.info(f"[{task.item_id}] yt-dlp (mrežni stupanj, popravak ide u obradu): {line}")
+                 self._emit(task, "log_message", f"{log_prefix} {line} (popravak radi stupanj obrade)"); return
+             stderr_tail.append(line); logger.error(f"[{task.item_id}] yt-dlp stderr: {line}")
+             self._emit(task, "log_message", f"{log_prefix} GREŠKA: {line}")
+         def on_exit():
+             try: return_code = process.wait(timeout=10)
+             except Exception as e: return on_done(None, "", e)
+             on_done(return_code, "\n".join(stderr_tail))
+
+         spawn_started = time.perf_counter()
+         process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                    creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0)
+         self.metrics.process_spawned(time.perf_counter() - spawn_started)
+         task.process = process
+         get_reactor().watch(process, on_stdout_line, on_stderr_line, on_close=functools.partial(self._submit_step, on_exit))
+
+    def _log_format_plan(self, task: DownloadTask, log_prefix: str):
+        logger.info(f"[{task.item_id}] Plan formata: {task.format_plan}")
+        self._emit(task, "log_message", f"{log_prefix} Plan: {task.format_plan}")
+
+    def _postprocess_stage_enabled(self, task: DownloadTask) -> bool:
+        profile = QUALITY_PROFILES.get(task.quality_profile_key, QUALITY_PROFILES["Općenito - Najbolje Moguće"])
+        return profile["type"] in ("audio", "video") and self.current_settings.get("postprocess_stage_enabled", True) \
+            and ffmpeg_available(FFMPEG_EXECUTABLE)
+
+    def _get_postprocess_pool(self) -> PostProcessPool:
+        with self._slot_condition:
+            if self._postprocess_pool is None:
+                self._postprocess_pool = PostProcessPool(self.current_settings.get("postprocess_workers", 0),
+                                                         functools.partial(engine_profiler.run, self._run_postprocess))
+            return self._postprocess_pool
+
+    def _get_worker_pool(self) -> YtDlpWorkerPool:
+        with self._slot_condition:
+            if self._worker_pool is None:
+                self._worker_pool = YtDlpWorkerPool(self.max_concurrent_downloads, self.current_settings.get("worker_pool_max_jobs", DEFAULT_MAX_JOBS_PER_WORKER))
+            return self._worker_pool
+
+    def _run_in_worker_pool(self, task: DownloadTask, cancel_flag: threading.Event, log_prefix: str, on_done: Callable, info_json: str | None = None,
+                            info_json_output: str | None = None, download_archive: str | None = None, on_extracted: Callable | None = None):
+         errors: List[str] = []; extracted = threading.Event()
+         def on_progress(payload):
+             if on_extracted is not None and not extracted.is_set(): # Worker ne javlja before_dl; prvi progress je nakon izvlačenja
+                 extracted.set(); on_extracted()
+             apply_progress(task, payload); self._emit(task, "progress_update")
+             if payload.get("archive_id"): task.archive_id = payload["archive_id"]
+         def on_filepath(filepath):
+             task.final_filename = os.path.abspath(filepath); self._emit(task, "log_message", f"{log_prefix} Spremljeno: {task.final_filename}")
+         def on_log(message):
+             errors.append(message); logger.error(f"[{task.item_id}] yt-dlp worker: {message}")
+             self._emit(task, "log_message", f"{log_prefix} GREŠKA: {message}")
+         try:
+             return_code = self._get_worker_pool().run_job(task.url, build_ytdl_options(task, self.current_settings, info_json_output, download_archive),
+                                                           on_progress, on_filepath, on_log, cancel_flag, info_json=info_json,
+                                                           rate_limit_fn=lambda: task.rate_limit)
+         except WorkerCancelled: return on_done(-1, "")
+         except Exception as e: return on_done(None, "", e)
+         on_done(return_code, "\n".join(errors))
 
     def _execute_download(self, task: DownloadTask):
          cancel_flag_for_task = self.cancel_flags.get(task.item_id)
+         task.trace = tracer.task_tracker(task, "preparation") # None dok praćenje nije uključeno (core.tracing)
+         log_prefix = f"[{os.path.basename(task.url)[:20]}]"
          try:
              if not cancel_flag_for_task or cancel_flag_for_task.is_set():
                  logger.info(f"[{task.item_id}] Preuzimanje preskočeno jer je već otkazano prije pokretanja.")
                  task.status = "Otkazano"; task.error_message = "Otkazano prije pokretanja."
-                 self.update_callback(task, "download_error"); return
+                 self._emit(task, "download_error"); return self._download_done(task, cancel_flag_for_task, log_prefix, None, "")
 
-             task.status = "Priprema..."; task.progress_str = "0.0%"; task.progress_val = 0.0; task.speed_str = ""; task.eta_str = ""
-             self.update_callback(task, "status_update")
+             task.status = "Priprema..."; reset_progress(task)
+             self._emit(task, "status_update")
              os.makedirs(task.output_dir, exist_ok=True)
-             profile = QUALITY_PROFILES.get(task.quality_profile_key, QUALITY_PROFILES["Općenito - Najbolje Moguće"])
-             
-             command = [YT_DLP_EXECUTABLE, task.url, "--no-check-certificates", "--no-mtime", "--ignore-errors",
-                        "--retries", "2", "--fragment-retries", "2",
-                        "--output", os.path.join(task.output_dir, "%(title)s.%(ext)s"), # Jednostavnije ime, yt-dlp će paziti na duplikate
-                        "--format", profile["format_selector"],
-                        "--progress-template", "download-cli:%(progress._percent_str)s ETA:%(progress.eta)s Speed:%(progress.speed)s Filename:%(info.filename)s", # Dodajemo Filename
-                        # Uklanjamo --print filepath jer ćemo parsirati iz progress template-a ili Destination linije
-                        # "--no-simulate", "--dump-json" # Za napredno dohvaćanje info prije downloada
-                        ]
-             # Opcionalno: Dodaj User-Agent
-             # command.extend(["--user-agent", "Mozilla/5.0 ..."])
-
-
-             if profile["type"] == "audio":
-                 command.extend(["--extract-audio", "--audio-format", profile.get("extract_audio_format", "mp3")])
-                 if "audio_quality" in profile: command.extend(["--audio-quality", profile["audio_quality"]])
-                 if self.current_settings.get("embed_thumbnail_audio", True): command.append("--embed-thumbnail")
-                 # Ukloni --merge-output-format za audio
-                 command = [arg for arg in command if arg not in ("--merge-output-format", "mp4")]
-             elif profile["type"] == "video":
-                 command.append("--merge-output-format"); command.append("mp4")
-                 if self.current_settings.get("add_metadata_video", True): command.append("--add-metadata")
-             
-             if self.current_settings.get("prefer_hw_acceleration", False): command.append("--prefer-ffmpeg-hw-dl")
-
-             logger.info(f"[{task.item_id}] Pokrećem: {' '.join(command)}")
+             if task.resumed: logger.info(f"[{task.item_id}] Nastavljam preuzimanje iz prethodne sesije (.part fajlovi se nastavljaju).")
              task.status = "Preuzimanje..."
-             self.update_callback(task, "status_update")
-             
-             process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, 
-                                        text=True, encoding='utf-8', errors='replace',
-                                        creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0)
-             task.process = process
-             
-             temp_final_filename = None # Privremena varijabla za ime fajla
-
-             for line in iter(process.stdout.readline, ''):
-                 if cancel_flag_for_task.is_set():
-                     logger.info(f"[{task.item_id}] Detektiran signal za otkazivanje, prekidam proces.")
-                     if process.poll() is None: process.terminate()
-                     break 
-                 line = line.strip()
-                 if not line: continue
-                 logger.debug(f"[{task.item_id}] yt-dlp: {line}")
-                 self.update_callback(task, "log_message", f"[{os.path.basename(task.url)[:20]}] {line}")
-
-                 if line.startswith("download-cli:"):
-                     match_progress = re.match(r"download-cli:\s*(?P<percent>[\d\.\s]+%).*ETA:(?P<eta>[^ ]+).*Speed:(?P<speed>[^ ]+)(.*Filename:(?P<filename>.+))?", line)
-                     if match_progress:
-                         pd = match_progress.groupdict()
-                         task.progress_str = pd.get("percent", task.progress_str).strip()
-                         try: task.progress_val = float(task.progress_str.replace('%','').strip())
-                         except ValueError: pass
-                         task.eta_str = pd.get("eta", task.eta_str); task.speed_str = pd.get("speed", task.speed_str)
-                         if pd.get("filename") and not temp_final_filename: # Ako yt-dlp javi ime fajla kroz progress
-                             temp_final_filename = pd.get("filename").strip()
-                             logger.info(f"[{task.item_id}] Ime fajla detektirano iz progressa: {temp_final_filename}")
-                         self.update_callback(task, "progress_update")
-                 else: # Pokušaj naći ime fajla i iz drugih linija (manje pouzdano)
-                     dest_match = re.search(r"\[(?:download|ffmpeg|ExtractAudio)\] Destination:\s*(.+)", line)
-                     merge_match = re.search(r"\[Merger\] Merging formats into\s*\"?([^\"]+)\"?", line) # Opcija navodnika
-                     if dest_match: temp_final_filename = dest_match.group(1).strip()
-                     elif merge_match: temp_final_filename = merge_match.group(1).strip()
-
-             stdout_rem, stderr_rem = "", ""
-             if process: stdout_rem, stderr_rem = process.communicate(timeout=10)
-             
-             # Ponovno parsiranje stdout_rem za slučaj da je ime fajla bilo na kraju
-             if stdout_rem:
-                 for line_out in stdout_rem.strip().splitlines():
-                     logger.debug(f"[{task.item_id}] yt-dlp stdout_rem: {line_out}")
-                     self.update_callback(task, "log_message", f"[{os.path.basename(task.url)[:20]}] {line_out}")
-                     if not temp_final_filename: # Traži ime samo ako već nije nađeno
-                         dest_match = re.search(r"\[(?:download|ffmpeg|ExtractAudio)\] Destination:\s*(.+)", line_out); merge_match = re.search(r"\[Merger\] Merging formats into\s*\"?([^\"]+)\"?", line_out)
-                         if dest_match: temp_final_filename = dest_match.group(1).strip()
-                         elif merge_match: temp_final_filename = merge_match.group(1).strip()
-             if stderr_rem:
-                 for line_err in stderr_rem.strip().splitlines():
-                     logger.error(f"[{task.item_id}] yt-dlp stderr_rem: {line_err}")
-                     self.update_callback(task, "log_message", f"[{os.path.basename(task.url)[:20]}] GREŠKA: {line_err}")
+             self._emit(task, "status_update")
+             # Korak završava ovdje; ostatak taska je _download_done, koji pokreće kraj procesa (ili workera)
+             self._run_download(task, cancel_flag_for_task, log_prefix, functools.partial(self._download_done, task, cancel_flag_for_task, log_prefix))
+         except Exception as e: self._download_done(task, cancel_flag_for_task, log_prefix, None, "", e)
+
+    def _download_done(self, task: DownloadTask, cancel_flag_for_task: threading.Event | None, log_prefix: str,
+                       return_code: int | None, stderr_rem: str, error: Exception | None = None):
+         postprocess_job: PostProcessJob | None = None
+         try:
+             if error is not None: raise error
+             if return_code is None: return # Otkazano prije pokretanja, status je već javljen
 
              if cancel_flag_for_task.is_set() or task.status.startswith("Otkaz"): # Provjeri još jednom
                  task.status = "Otkazano" # Postavi konačni status ako je bio "Otkazivanje..."
                  if not task.error_message: task.error_message = "Preuzimanje otkazano."
-                 self.update_callback(task, "download_error")
+                 self._emit(task, "download_error")
                  logger.info(f"[{task.item_id}] Preuzimanje potvrđeno kao otkazano nakon završetka procesa.")
                  return
 
-             return_code = process.returncode if process else -100
+             task.return_code = return_code
              if return_code == 0:
-                 task.status = "Završeno"; task.progress_str = "100.0%"; task.progress_val = 100.0; task.speed_str = ""; task.eta_str = ""
-                 if temp_final_filename:
-                     # Ponekad yt-dlp daje apsolutnu putanju, ponekad relativnu na output folder
-                     if not os.path.isabs(temp_final_filename):
-                         task.final_filename = os.path.join(task.output_dir, os.path.basename(temp_final_filename))
-                     else:
-                         task.final_filename = temp_final_filename # Već je apsolutna
-                     
-                     if not os.path.exists(task.final_filename): 
-                         logger.warning(f"[{task.item_id}] Detektirano ime fajla '{task.final_filename}' ne postoji.")
-                         task.final_filename = None 
-                 if not task.final_filename: logger.warning(f"[{task.item_id}] Konačno ime fajla nije uspješno detektirano.")
-                 self.update_callback(task, "download_complete")
+                 if task.stage_input is not None:
+                     profile = QUALITY_PROFILES.get(task.quality_profile_key, QUALITY_PROFILES["Općenito - Najbolje Moguće"])
+                     planned, task.format_plan = task.format_plan, plan_downloaded(profile, self.current_settings, task.stage_input) # Stvarno preuzeti kodeci
+                     if planned and (planned.action, planned.target) == (task.format_plan.action, task.format_plan.target): task.format_plan.reason = planned.reason
+                     else: self._log_format_plan(task, log_prefix)
+                     postprocess_job = plan_postprocess(profile, self.current_settings, task.final_filename, task.stage_input, task.format_plan)
+                     discard_unused_thumbnail(task.stage_input, postprocess_job)
+                 if postprocess_job is None: self._complete_download(task)
+                 else:
+                     task.status = POSTPROCESS_QUEUED_STATUS; task.speed_str = ""; task.eta_str = ""
+                     self._emit(task, "status_update"); logger.info(f"[{task.item_id}] Preuzeto, posao '{postprocess_job.kind}' ide u stupanj obrade.")
              else:
                  task.status = "Greška"; task.error_message = stderr_rem.strip() if stderr_rem else f"yt-dlp greška (kod: {return_code})"
-                 self.update_callback(task, "download_error")
+                 self._emit(task, "download_error")
          except FileNotFoundError:
              task.status = "Kritična Greška"; task.error_message = f"{YT_DLP_EXECUTABLE} ili {FFMPEG_EXECUTABLE} nije pronađen."
-             logger.critical(task.error_message); self.update_callback(task, "download_error")
+             logger.critical(task.error_message); self._emit(task, "download_error")
          except Exception as e:
              task.status = "Greška Programa"; task.error_message = str(e)
-             logger.error(f"[{task.item_id}] Neočekivana greška u _execute_download: {e}", exc_info=True); self.update_callback(task, "download_error")
+             logger.error(f"[{task.item_id}] Neočekivana greška u preuzimanju: {e}", exc_info=True); self._emit(task, "download_error")
          finally:
-             if task.item_id in self.active_tasks: del self.active_tasks[task.item_id]
-             self.active_downloads_count = max(0, self.active_downloads_count - 1)
+             host = host_label(task) # _release_slot briše host_key
+             remaining_active = self._release_slot(task)
              task.process = None 
-             if task.status not in ["Završeno", "Greška", "Kritična Greška", "Greška Programa"] and not task.status.startswith("Otkazano"):
-                 task.status = "Završeno (?)"; logger.warning(f"Task {task.item_id} završen s nejasnim statusom: {task.status}")
-             self.update_callback(task, "status_update")
-             logger.info(f"Obrada taska {task.item_id} završena ({task.status}). Aktivno: {self.active_downloads_count}")
-             if self.active_downloads_count == 0 and self.download_queue.empty() and not self.stop_event.is_set():
+             if postprocess_job is None: self._finish_task(task, host)
+             else: # Slot je slobodan; kraj taska (metrike, trace, status) javlja stupanj obrade
+                 if task.trace: task.trace.enter("postprocess_queue")
+                 self._get_postprocess_pool().submit(task, postprocess_job, host)
+             logger.info(f"Obrada taska {task.item_id} završena ({task.status}). Aktivno: {remaining_active}")
+             if remaining_active == 0 and self.download_queue.empty() and not self.stop_event.is_set() \
+                and not (self._postprocess_pool and self._postprocess_pool.task_ids()):
                  logger.info("Svi zadaci obrađeni, worker čeka."); status_task = DownloadTask("Red", "N/A", "", f"status_q_empty_{time.time()}"); status_task.status = "Red je prazan."
-                 self.update_callback(status_task, "general_status_update", status_task.status)
-
-# Pomoćne funkcije za red
-def _empty_queue_while_draining(q, drained_list):
- while not q.empty():
-     try: drained_list.append(q.get_nowait())
-     except queue.Empty: break
-
-def _remove_task_from_queue_obj(q_obj, task_item_id_to_remove):
- temp_list = []
- _empty_queue_while_draining(q_obj, temp_list)
- removed = False
- for item in temp_list:
-     if item.item_id == task_item_id_to_remove: removed = True
-     else: q_obj.put(item)
- return removed
\ No newline at end of file
+                 self._emit(status_task, "general_status_update", status_task.status)
+
+    def _complete_download(self, task: DownloadTask):
+         task.status = "Završeno"; task.progress_str = "100.0%"; task.progress_val = 100.0; task.speed_str = ""; task.eta_str = ""
+         if not task.final_filename: logger.warning(f"[{task.item_id}] yt-dlp nije javio konačnu putanju fajla (after_move).")
+         archive = self._get_download_archive()
+         if archive and task.archive_id: # stage_input postoji samo u mrežnom stupnju, gdje yt-dlp nije pisao u arhivu
+             archive.record(task.url, task.quality_profile_key, task.archive_id, write_line=task.stage_input is not None)
+         if task.format_plan: self.metrics.format_planned(task.format_plan)
+         self._emit(task, "download_complete")
+
+    def _finish_task(self, task: DownloadTask, host: str):
+         # Kraj taska u oba stupnja: konačni status, metrike, trace i zadnji status_update
+         if not is_finished_status(task.status):
+             task.status = "Završeno (?)"; logger.warning(f"Task {task.item_id} završen s nejasnim statusom: {task.status}")
+         self.metrics.task_finished(task, host)
+         if task.trace: task.trace.finish(status=task.status, return_code=task.return_code); task.trace = None
+         self._emit(task, "status_update")
+
+    def _run_postprocess(self, task: DownloadTask, job: PostProcessJob, host: str):
+         # Nit stupnja obrade (core.postprocess_stage.PostProcessPool); mrežni slot taska je već slobodan
+         cancel_flag = self.cancel_flags.get(task.item_id) or threading.Event()
+         log_prefix = f"[{os.path.basename(task.url)[:20]}]"
+         try:
+             if task.item_id not in self.all_tasks_map or cancel_flag.is_set():
+                 logger.info(f"[{task.item_id}] Obrada preskočena jer je task otkazan ili uklonjen.")
+                 task.final_filename = None; task.return_code = POSTPROCESS_FAILED_RETURN_CODE
+                 if not is_finished_status(task.status): task.status = "Otkazano"
+                 return
+             task.status = POSTPROCESSING_STATUS; task.progress_val = 0.0; task.progress_str = "0.0%"
+             self._emit(task, "status_update")
+             if task.trace: task.trace.enter("postprocess_stage", job=job.kind, plan=str(task.format_plan))
+             return_code, stderr_rem = self._run_ffmpeg(task, job, cancel_flag, log_prefix)
+             if cancel_flag.is_set() or task.status.startswith("Otkaz"):
+                 self._discard_postprocess(task, job, return_code); task.status = "Otkazano"
+                 if not task.error_message: task.error_message = "Obrada otkazana."
+                 self._emit(task, "download_error"); return
+             if return_code != 0:
+                 self._discard_postprocess(task, job, return_code); task.status = "Greška"; task.error_message = stderr_rem.strip() or f"ffmpeg greška (kod: {return_code})"
+                 self._emit(task, "download_error"); return
+             task.final_filename = os.path.abspath(job.commit())
+             self._emit(task, "log_message", f"{log_prefix} Spremljeno: {task.final_filename}")
+             self._complete_download(task)
+         except FileNotFoundError:
+             self._discard_postprocess(task, job); task.status = "Kritična Greška"; task.error_message = f"{FFMPEG_EXECUTABLE} nije pronađen."
+             logger.critical(task.error_message); self._emit(task, "download_error")
+         except Exception as e:
+             self._discard_postprocess(task, job); task.status = "Greška Programa"; task.error_message = str(e)
+             logger.error(f"[{task.item_id}] Neočekivana greška u obradi: {e}", exc_info=True); self._emit(task, "download_error")
+         finally:
+             task.process = None; task.stage_input = None
+             self._finish_task(task, host)
+             logger.info(f"Obrada taska {task.item_id} završena ({task.status}).")
+
+    def _discard_postprocess(self, task: DownloadTask, job: PostProcessJob, return_code: int | None = None):
+         # Izlaz obrade ne postoji: task ne smije javiti ni putanju ni izlazni kod 0 preuzimanja
+         job.discard(); task.final_filename = None
+         task.return_code = return_code or POSTPROCESS_FAILED_RETURN_CODE
+
+    def _run_ffmpeg(self, task: DownloadTask, job: PostProcessJob, cancel_flag: threading.Event, log_prefix: str):
+         # -progress pipe:1 daje key=value linije; out_time_us i trajanje iz metapodataka daju postotak obrade
+         stderr_tail: deque = deque(maxlen=STDERR_TAIL_LINES)
+         def on_stdout_line(line):
+             if cancel_flag.is_set():
+                 if process.poll() is None: logger.info(f"[{task.item_id}] Detektiran signal za otkazivanje, prekidam ffmpeg."); process.terminate()
+                 return
+             key, _, value = line.partition("=")
+             if key == "out_time_us" and job.duration and value.isdigit():
+                 task.progress_val = min(100.0, int(value) / 1e4 / job.duration); task.progress_str = f"{task.progress_val:.1f}%"
+                 self._emit(task, "progress_update")
+         def on_stderr_line(line):
+             line = line.strip()
+             if not line: return
+             stderr_tail.append(line); logger.error(f"[{task.item_id}] ffmpeg: {line}")
+             self._emit(task, "log_message", f"{log_prefix} GREŠKA: {line}")
+
+         command = job.command(FFMPEG_EXECUTABLE)
+         logger.info(f"[{task.item_id}] Obrada: {' '.join(command)}")
+         process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                    creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0)
+         task.process = process
+         return_code = get_reactor().watch(process, on_stdout_line, on_stderr_line).wait(exit_timeout=10)
+         return return_code, "\n".join(stderr_tail)
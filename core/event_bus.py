@@ -0,0 +1,66 @@
+# core/event_bus.py
+# Sabirnica događaja između engine-a (bilo koja nit) i GUI-ja (Tk nit).
+# Za svaki task čuva se samo zadnji događaj u trenutnom "frameu" (stanje se ionako čita iz samog DownloadTask objekta),
+# log linije idu u ograničeni buffer, a GUI sve pokupi odjednom s drain() na fiksnom ritmu (npr. 10 Hz).
+import threading
+from collections import OrderedDict, deque
+from typing import List, Tuple
+
+# Jači događaj ne smije biti pregažen slabijim unutar istog framea (npr. download_complete pa status_update)
+_UPDATE_RANK = {"progress_update": 0, "status_update": 1, "download_complete": 2, "download_error": 2}
+DEFAULT_MAX_LOG_LINES_PER_FRAME = 500
+
+class CoalescingEventBus:
+    def __init__(self, max_log_lines_per_frame: int = DEFAULT_MAX_LOG_LINES_PER_FRAME):
+        self._lock = threading.Lock()
+        self._task_events: "OrderedDict[str, list]" = OrderedDict() # item_id -> [task, update_type, data]
+        self._log_lines: deque = deque(maxlen=max_log_lines_per_frame)
+        self._general_status: tuple | None = None
+        self._drain_scheduled = False # Pozivatelj je zakazao drain; briše ga drain() ili schedule_failed()
+        self._stats = {"published": 0, "merged": 0, "dropped": 0, "drained": 0, "frames": 0}
+
+    def publish(self, task, update_type: str, data=None) -> bool:
+        """Thread-safe. Vraća True ako drain nije zakazan (tada ga pozivatelj treba zakazati, a ako ne uspije, javiti schedule_failed())."""
+        with self._lock:
+            self._stats["published"] += 1
+            should_schedule = not self._drain_scheduled; self._drain_scheduled = True
+            if update_type == "log_message":
+                if data is not None:
+                    if len(self._log_lines) == self._log_lines.maxlen: self._stats["dropped"] += 1
+                    self._log_lines.append((task, data))
+            elif update_type == "general_status_update":
+                if self._general_status is not None: self._stats["merged"] += 1
+                self._general_status = (task, update_type, data)
+            else:
+                pending = self._task_events.get(task.item_id)
+                if pending is None:
+                    self._task_events[task.item_id] = [task, update_type, data]
+                else:
+                    self._stats["merged"] += 1
+                    if _UPDATE_RANK.get(update_type, 1) >= _UPDATE_RANK.get(pending[1], 1):
+                        pending[0] = task; pending[1] = update_type; pending[2] = data
+            return should_schedule
+
+    def schedule_failed(self):
+        """Zakazivanje draina nije uspjelo (npr. root.after je bacio iznimku): sljedeći publish() opet vraća True."""
+        with self._lock: self._drain_scheduled = False
+
+    def drain(self) -> Tuple[List[tuple], List[tuple]]:
+        """Vraća (task_events, log_lines): zadnji događaj po tasku (+ general status) i log linije redom kojim su stigle."""
+        with self._lock:
+            task_events = [tuple(event) for event in self._task_events.values()]
+            if self._general_status is not None: task_events.append(self._general_status)
+            log_lines = list(self._log_lines)
+            self._task_events.clear(); self._log_lines.clear(); self._general_status = None; self._drain_scheduled = False
+            self._stats["drained"] += len(task_events) + len(log_lines)
+            self._stats["frames"] += 1
+            return task_events, log_lines
+
+    def get_stats(self) -> dict:
+        """Brojači za podešavanje: published, merged (spojeni u isti frame), dropped (log linije preko limita), drained, frames."""
+        with self._lock:
+            return dict(self._stats)
+
+    def reset_stats(self):
+        with self._lock:
+            for key in self._stats: self._stats[key] = 0
@@ -0,0 +1,162 @@
+# core/extraction_cache.py
+# Cache yt-dlp info-JSON-a po kanonskom URL-u, da ponovni pokušaji, ponovno dodavanje u red i isti URL pod drugim
+# profilom ne pokreću ponovno cijelo izvlačenje (mrežni upiti, parsiranje JS playera).
+# Prvo preuzimanje usput zapiše info-JSON u cache (--write-info-json -o "infojson:..."), sljedeća kreću s --load-info-json.
+# Unosi istječu nakon TTL-a (linkovi na streamove vremenom postaju nevažeći), a ukupna veličina na disku je ograničena (LRU).
+# Single-flight: dok jedan task izvlači URL, ostali taskovi za isti URL čekaju njegov rezultat umjesto paralelnog izvlačenja;
+# čekaju samo izvlačenje, ne i leaderovo preuzimanje. Engine čeka bez niti (acquire_nowait): release() poziva nastavke čekača.
+import hashlib
+import json
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, Tuple
+from .settings_handler import CONFIG_DIR
+from .url_canonicalizer import canonicalize_url
+
+logger = logging.getLogger(__name__)
+
+EXTRACTION_CACHE_DIR = os.path.join(CONFIG_DIR, "extraction_cache")
+INFO_JSON_SUFFIX = ".info.json"
+DEFAULT_TTL_SECONDS = 3 * 3600 # YouTube i slični potpisuju linkove na nekoliko sati
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+_WAIT_POLL_SECONDS = 0.2
+
+def _is_single_video_info(path: str) -> bool:
+    # Kod playliste yt-dlp isti predložak prepisuje za svaki video, pa bi u cacheu ostao samo zadnji
+    try:
+        with open(path, "r", encoding="utf-8") as f: info = json.load(f)
+    except (OSError, ValueError): return False
+    return info.get("_type", "video") == "video" and info.get("playlist_index") is None
+
+class ExtractionCache:
+    def __init__(self, cache_dir: str = EXTRACTION_CACHE_DIR, ttl_seconds: float = DEFAULT_TTL_SECONDS, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[int, float]]" = OrderedDict() # key -> (veličina, vrijeme zapisa); redoslijed = LRU
+        self._total_bytes = 0
+        self._in_flight: Dict[str, threading.Event] = {}
+        self._waiters: Dict[str, Dict[str, Callable]] = {} # key -> {waiter_id: nastavak}, vidi acquire_nowait
+        self.stats = {"hits": 0, "misses": 0, "waits": 0, "evicted": 0, "expired": 0}
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def key_for(self, url: str) -> str:
+        return hashlib.sha1(canonicalize_url(url).encode("utf-8")).hexdigest()
+
+    def path_for(self, url: str) -> str:
+        return os.path.join(self.cache_dir, self.key_for(url) + INFO_JSON_SUFFIX)
+
+    def output_template_for(self, url: str) -> str:
+        """Predložak za yt-dlp "infojson:" izlaz; yt-dlp sam dodaje .info.json."""
+        return os.path.join(self.cache_dir, self.key_for(url))
+
+    def acquire(self, url: str, cancel_event: threading.Event | None = None) -> Tuple[str | None, bool]:
+        """Vraća (putanja, False) za važeći unos iz cachea, ili (None, True) ako je pozivatelj "leader" koji izvlači URL
+        i mora na kraju pozvati release(url). Ako isti URL već netko izvlači, čeka njegov rezultat."""
+        key = self.key_for(url)
+        while True:
+            with self._lock:
+                acquired = self._try_acquire_locked(key)
+                if acquired is not None: return acquired
+                flight = self._in_flight[key]
+            while not flight.wait(_WAIT_POLL_SECONDS):
+                if cancel_event is not None and cancel_event.is_set(): return None, False
+
+    def acquire_nowait(self, url: str, waiter_id: str, on_released: Callable) -> Tuple[str | None, bool] | None:
+        """Kao acquire(), ali bez čekanja: ako isti URL već netko izvlači, vraća None, a on_released() se poziva
+        (na niti koja zove release) kad leader završi. Pozivatelj tada ponavlja acquire_nowait()."""
+        key = self.key_for(url)
+        with self._lock:
+            acquired = self._try_acquire_locked(key)
+            if acquired is None: self._waiters.setdefault(key, {})[waiter_id] = on_released
+            return acquired
+
+    def cancel_wait(self, url: str, waiter_id: str) -> Callable | None:
+        """Odjavljuje čekača i vraća njegov nastavak (ako je još čekao), da ga pozivatelj sam pokrene."""
+        key = self.key_for(url)
+        with self._lock:
+            waiters = self._waiters.get(key)
+            on_released = waiters.pop(waiter_id, None) if waiters else None
+            if waiters is not None and not waiters: del self._waiters[key]
+            return on_released
+
+    def release(self, url: str):
+        """Leader javlja kraj izvlačenja: zapisani info-JSON (ako postoji) ulazi u indeks i čekači se bude.
+        Ponovni poziv bez novog acquire() ne radi ništa (engine otpušta čim je info-JSON zapisan i još jednom na kraju)."""
+        key = self.key_for(url); path = os.path.join(self.cache_dir, key + INFO_JSON_SUFFIX)
+        with self._lock:
+            if key not in self._in_flight: return
+        if os.path.exists(path) and not _is_single_video_info(path):
+            logger.info(f"Cache izvlačenja: {url[:70]} je playlista, info-JSON se ne sprema."); self._remove_file(path)
+        with self._lock:
+            try:
+                stat = os.stat(path)
+                self._forget_locked(key, remove_file=False)
+                self._entries[key] = (stat.st_size, stat.st_mtime); self._total_bytes += stat.st_size
+                self._evict_locked()
+            except OSError: pass # Izvlačenje nije uspjelo ili yt-dlp nije zapisao info-JSON
+            flight = self._in_flight.pop(key, None); waiters = self._waiters.pop(key, {})
+        if flight: flight.set()
+        for on_released in waiters.values(): on_released()
+
+    def invalidate(self, url: str):
+        with self._lock: self._forget_locked(self.key_for(url), remove_file=True)
+
+    def clear(self) -> int:
+        with self._lock:
+            removed = len(self._entries)
+            for key in list(self._entries): self._forget_locked(key, remove_file=True)
+            return removed
+
+    def _try_acquire_locked(self, key: str) -> Tuple[str | None, bool] | None:
+        path = self._lookup_locked(key)
+        if path: self.stats["hits"] += 1; return path, False
+        if key not in self._in_flight:
+            self._in_flight[key] = threading.Event(); self.stats["misses"] += 1
+            return None, True
+        self.stats["waits"] += 1
+        return None
+
+    def _lookup_locked(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None: return None
+        path = os.path.join(self.cache_dir, key + INFO_JSON_SUFFIX)
+        if time.time() - entry[1] > self.ttl_seconds or not os.path.exists(path):
+            self.stats["expired"] += 1; self._forget_locked(key, remove_file=True); return None
+        self._entries.move_to_end(key)
+        return path
+
+    def _forget_locked(self, key: str, remove_file: bool):
+        entry = self._entries.pop(key, None)
+        if entry: self._total_bytes -= entry[0]
+        if remove_file: self._remove_file(os.path.join(self.cache_dir, key + INFO_JSON_SUFFIX))
+
+    @staticmethod
+    def _remove_file(path: str):
+        try: os.remove(path)
+        except OSError: pass
+
+    def _evict_locked(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            oldest_key = next(iter(self._entries))
+            self._forget_locked(oldest_key, remove_file=True); self.stats["evicted"] += 1
+
+    def _load_index(self):
+        now = time.time(); found = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(INFO_JSON_SUFFIX): continue
+            path = os.path.join(self.cache_dir, name)
+            try: stat = os.stat(path)
+            except OSError: continue
+            if now - stat.st_mtime > self.ttl_seconds: self._remove_file(path); continue
+            found.append((stat.st_atime, name[:-len(INFO_JSON_SUFFIX)], stat.st_size, stat.st_mtime))
+        with self._lock:
+            for _, key, size, written_at in sorted(found):
+                self._entries[key] = (size, written_at); self._total_bytes += size
+            self._evict_locked()
+        if found: logger.info(f"Cache izvlačenja: učitano {len(self._entries)} unosa ({self._total_bytes // 1024} KiB).")
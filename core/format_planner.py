@@ -0,0 +1,105 @@
+# core/format_planner.py
+# "Stream copy prvo": kodek se mijenja samo kad profil to stvarno traži. Planer gleda koje streamove izvor nudi (formats iz
+# info-JSON-a u cacheu izvlačenja, core.extraction_cache) ili koje je yt-dlp preuzeo (bbx-raw: meta mrežnog stupnja) i bira:
+#   copy       audio ostaje u izvornom kodeku (ciljni kodek profila ili accept_source_codecs profila), najviše se prepakira
+#   transcode  audio se kodira u extract_audio_format profila; jedini slučaj kad ffmpeg troši CPU na kodiranje
+#   merge      video + audio se spajaju s -c copy, u mp4 ako kodeci stanu u njega, inače u mkv
+#   remux      jedan video fajl, -c copy (samo oznake)
+# Plan se bilježi na tasku (DownloadTask.format_plan), u logu taska, traceu (core.tracing) i metrikama (core.metrics).
+# "stream_copy_first": false u postavkama vraća staro ponašanje: profil se uvijek kodira u svoj format.
+import json
+import logging
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+# Slabiji stream koji se samo kopira ima prednost pred transkodiranjem najboljeg dok ima barem ovaj udio njegovog bitrate-a
+STREAM_COPY_MIN_BITRATE_RATIO = 0.75
+# Kodeci koje mp4 muxer ffmpeg-a prima bez -strict; ostalo (vp8, vorbis, theora...) se spaja u mkv, opet bez kodiranja
+_MP4_VIDEO_CODECS = {"h264", "h265", "av1", "vp9"}
+_MP4_AUDIO_CODECS = {"aac", "mp3", "opus", "flac", "ac3", "eac3"}
+_CODEC_PREFIXES = (("mp4a", "aac"), ("aac", "aac"), ("avc", "h264"), ("h264", "h264"), ("hev", "h265"), ("hvc", "h265"), ("h265", "h265"),
+                   ("av01", "av1"), ("av1", "av1"), ("vp09", "vp9"), ("vp9", "vp9"), ("vp08", "vp8"), ("vp8", "vp8"), ("mp3", "mp3"),
+                   ("opus", "opus"), ("vorbis", "vorbis"), ("flac", "flac"), ("ec-3", "eac3"), ("eac3", "eac3"), ("ac-3", "ac3"), ("ac3", "ac3"))
+_TARGET_CODECS = {"mp3": "mp3", "m4a": "aac", "aac": "aac", "opus": "opus", "vorbis": "vorbis", "flac": "flac", "wav": "pcm"}
+COPY_EXTENSIONS = {"aac": "m4a", "mp3": "mp3", "opus": "opus", "vorbis": "ogg", "flac": "flac"} # Kontejner kopiranog audia
+# Ekstenzije izvora po kodeku za --audio-format pravila kad kodeci nisu poznati unaprijed (webm audio je u praksi opus)
+_SOURCE_EXTENSIONS = {"aac": ("m4a",), "mp3": ("mp3",), "opus": ("opus", "webm"), "vorbis": ("ogg",), "flac": ("flac",)}
+
+def normalize_codec(codec) -> str | None:
+    """yt-dlp acodec/vcodec ("mp4a.40.2", "avc1.64001F", "none") -> kratko ime; None ako kodek nije javljen ili ga nema."""
+    if not codec or codec == "none": return None
+    codec = codec.lower()
+    return next((name for prefix, name in _CODEC_PREFIXES if codec.startswith(prefix)), codec.split(".")[0])
+
+class FormatPlan:
+    """Odluka planera za jedan task; target je ekstenzija (copy), audio format profila (transcode) ili kontejner (merge)."""
+    __slots__ = ("action", "target", "codecs", "format_id", "reason")
+    def __init__(self, action: str, target: str | None, codecs: tuple = (), format_id: str | None = None, reason: str = ""):
+        self.action = action; self.target = target; self.codecs = codecs; self.format_id = format_id; self.reason = reason
+
+    def as_dict(self) -> dict:
+        return {"action": self.action, "target": self.target, "codecs": list(self.codecs), "format_id": self.format_id, "reason": self.reason}
+
+    def __str__(self):
+        text = f"{self.action} {'+'.join(self.codecs) or '?'}" + (f" -> {self.target}" if self.target else "")
+        if self.format_id: text += f" [format {self.format_id}]"
+        return f"{text} ({self.reason})" if self.reason else text
+
+def accepted_audio_codecs(profile: dict, current_settings: dict) -> set:
+    """Kodeci koje audio profil prima bez kodiranja: uvijek ciljni, a uz stream_copy_first i accept_source_codecs profila."""
+    accepted = {_TARGET_CODECS.get(profile.get("extract_audio_format", "mp3"))}
+    if current_settings.get("stream_copy_first", True): accepted.update(profile.get("accept_source_codecs", ()))
+    return accepted
+
+def _bitrate(fmt: dict) -> float:
+    return fmt.get("abr") or fmt.get("tbr") or 0.0
+
+def plan_audio_format(profile: dict, current_settings: dict, formats: List[dict] | None) -> FormatPlan | None:
+    """Prije preuzimanja: koji audio stream preuzeti i treba li ga kodirati. formats su iz info-JSON-a, poredani od najlošijeg
+    prema najboljem kao kod yt-dlp-a. None ako izvor nema audio streamove s poznatim kodekom (tada bira format_selector)."""
+    audio = [fmt for fmt in formats or [] if fmt.get("vcodec") == "none" and fmt.get("format_id") and normalize_codec(fmt.get("acodec"))]
+    if not audio: return None
+    best = audio[-1]; accepted = accepted_audio_codecs(profile, current_settings)
+    copyable = [fmt for fmt in audio if normalize_codec(fmt["acodec"]) in accepted and normalize_codec(fmt["acodec"]) in COPY_EXTENSIONS]
+    candidate = copyable[-1] if copyable else None
+    if candidate is best or (candidate and (not _bitrate(best) or _bitrate(candidate) >= STREAM_COPY_MIN_BITRATE_RATIO * _bitrate(best))):
+        codec = normalize_codec(candidate["acodec"])
+        reason = "" if candidate is best else f"{_bitrate(candidate):.0f}k kopija umjesto kodiranja {_bitrate(best):.0f}k"
+        return FormatPlan("copy", COPY_EXTENSIONS[codec], (codec,), candidate["format_id"], reason)
+    reason = f"{normalize_codec(candidate['acodec'])} ima premalo bitrate-a" if candidate else "nijedan audio stream nije u prihvaćenom kodeku"
+    return FormatPlan("transcode", profile.get("extract_audio_format", "mp3"), (normalize_codec(best["acodec"]),), best["format_id"], reason)
+
+def plan_from_info_json(profile: dict, current_settings: dict, info_json: str) -> FormatPlan | None:
+    """Plan iz info-JSON-a u cacheu izvlačenja; samo audio profili biraju format, video odabir ostaje format_selectoru."""
+    if profile["type"] != "audio" or not current_settings.get("stream_copy_first", True): return None
+    try:
+        with open(info_json, "r", encoding="utf-8") as f: info = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Info-JSON za plan formata nije čitljiv ({info_json}): {e}"); return None
+    return plan_audio_format(profile, current_settings, info.get("formats"))
+
+def plan_downloaded(profile: dict, current_settings: dict, stage_input: dict) -> FormatPlan:
+    """Nakon mrežnog stupnja, iz kodeka koje je yt-dlp stvarno preuzeo (bbx-raw: meta): što radi stupanj obrade."""
+    meta = stage_input.get("meta") or {}; format_id = meta.get("format_id")
+    acodec = normalize_codec(meta.get("acodec")); vcodec = normalize_codec(meta.get("vcodec"))
+    if profile["type"] == "audio":
+        if acodec in accepted_audio_codecs(profile, current_settings) and acodec in COPY_EXTENSIONS:
+            return FormatPlan("copy", COPY_EXTENSIONS[acodec], (acodec,), format_id)
+        return FormatPlan("transcode", profile.get("extract_audio_format", "mp3"), (acodec,) if acodec else (), format_id,
+                          "" if acodec else "kodek izvora nije javljen")
+    codecs = tuple(codec for codec in (vcodec, acodec) if codec)
+    if len(stage_input.get("streams") or []) < 2: return FormatPlan("remux", None, codecs, format_id)
+    # Nepoznat kodek se tretira kao mp4-kompatibilan, kao prije planera (--merge-output-format mp4)
+    fits_mp4 = (not vcodec or vcodec in _MP4_VIDEO_CODECS) and (not acodec or acodec in _MP4_AUDIO_CODECS)
+    return FormatPlan("merge", "mp4" if fits_mp4 else "mkv", codecs, format_id, "" if fits_mp4 else "kodeci ne stanu u mp4")
+
+def ytdlp_audio_format(profile: dict, current_settings: dict, plan: FormatPlan | None) -> str:
+    """--audio-format (i preferredcodec za worker pool) kad audio obrađuje yt-dlp. Uz plan: "best" (kopija, bez kodiranja)
+    ili format profila. Bez plana: pravila "izvorna_ekstenzija>cilj" za prihvaćene kodeke, pa format profila."""
+    target = profile.get("extract_audio_format", "mp3")
+    if plan is not None: return "best" if plan.action == "copy" else target
+    if not current_settings.get("stream_copy_first", True): return target
+    rules = [f"{ext}>{COPY_EXTENSIONS[codec]}" for codec in profile.get("accept_source_codecs", ())
+             if codec != _TARGET_CODECS.get(target) and codec in COPY_EXTENSIONS for ext in _SOURCE_EXTENSIONS.get(codec, ())]
+    return "/".join([*rules, target])
@@ -0,0 +1,50 @@
+# core/host_limits.py
+# Ograničenja po hostu i ukupni budžet brzine za Downloader scheduler.
+# Pravila su tablica (lista domena, limit) kao u determine_content_type_and_suggest_quality: sve domene jednog pravila
+# dijele isti brojač (youtube.com i youtu.be su isti host za rate limiting), a ostali hostovi dobivaju zadani limit.
+# Brojači aktivnih taskova po hostu žive u Downloaderu (pod njegovim lockom); ovdje je samo klasifikacija i raspodjela budžeta.
+import logging
+from functools import lru_cache
+from typing import List, Tuple
+from urllib.parse import urlsplit
+from .settings_handler import DEFAULT_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST_RULES = DEFAULT_SETTINGS["host_concurrency_rules"]
+DEFAULT_HOST_LIMIT = DEFAULT_SETTINGS["host_max_concurrent_default"]
+MIN_RATE_LIMIT = 16 * 1024 # Najmanji dio budžeta s kojim task kreće; dok ga nema, task čeka u redu (vidi Downloader._budget_has_room_locked)
+
+@lru_cache(maxsize=4096)
+def hostname(url: str) -> str:
+    """Host URL-a bez "www."; ključ podreda u Downloaderovom redu (pravila ograničenja mogu se mijenjati, host ne)."""
+    host = (urlsplit(url if "://" in url else "https://" + url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+class HostLimiter:
+    def __init__(self, rules: List | None = None, default_limit: int = DEFAULT_HOST_LIMIT):
+        self.default_limit = max(0, int(default_limit))
+        self.rules: List[Tuple[Tuple[str, ...], int]] = []
+        for rule in DEFAULT_HOST_RULES if rules is None else rules:
+            try: domains, limit = rule; self.rules.append((tuple(d.lower().lstrip(".") for d in domains), max(0, int(limit))))
+            except (TypeError, ValueError): logger.warning(f"Neispravno pravilo ograničenja po hostu: {rule!r}")
+
+    @classmethod
+    def from_settings(cls, settings: dict) -> "HostLimiter":
+        return cls(settings.get("host_concurrency_rules"), settings.get("host_max_concurrent_default", DEFAULT_HOST_LIMIT))
+
+    def classify(self, url: str) -> Tuple[str, int]:
+        """Vraća (ključ brojača, limit); limit 0 znači bez ograničenja."""
+        return self.classify_host(hostname(url))
+
+    def classify_host(self, host: str) -> Tuple[str, int]:
+        for domains, limit in self.rules:
+            if any(host == domain or host.endswith("." + domain) for domain in domains): return domains[0], limit
+        return host, self.default_limit
+
+def split_bandwidth(budget_bytes: int, active_count: int, expected_count: int) -> int | None:
+    """Dio slobodnog budžeta po tasku kojem se brzina još može mijenjati. expected_count uključuje i taskove koji mogu
+    odmah dobiti slot, da prvi task ne uzme cijeli budžet koji se njemu više ne može smanjiti (yt-dlp proces ne prima
+    novi --limit-rate). Zbroj dijelova nikad ne prelazi budžet (osim donje granice kad je budžet manji od MIN_RATE_LIMIT)."""
+    if budget_bytes <= 0 or active_count <= 0: return None
+    return max(min(MIN_RATE_LIMIT, budget_bytes), budget_bytes // max(active_count, expected_count))
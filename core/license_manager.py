@@ -1,15 +1,17 @@
 # core/license_manager.py
+# Pokretanje ne smije čekati ni PBKDF2 ni mrežu: izvedeni Fernet ključ se kešira (u memoriji i na disku, vezan uz HWID
+# i salt), is_license_valid() je čisto lokalna provjera, a ponovna provjera na serveru ide u pozadini (refresh_license_async).
+# Zadnja uspješna online provjera ("verified_at") je unutar Fernet tokena (HMAC-SHA256), pa se offline grace period
+# ne može produljiti bez ključa.
 import os
 import json
 import datetime
 import hashlib
 import platform
+import threading
 import uuid
-import requests
+from concurrent.futures import Future, ThreadPoolExecutor
 from cryptography.fernet import Fernet, InvalidToken
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.backends import default_backend
 import base64
 import logging
 
@@ -17,13 +19,24 @@ logger = logging.getLogger(__name__)
 
 # --- KONFIGURACIJA ---
 LICENSE_SERVER_SIMULATOR_URL = "https://pastebin.com/raw/ndbdvnsV" # TVOJ ISPRAVAN RAW LINK
+ACTIVATION_TIMEOUT_S = 15
+REFRESH_TIMEOUT_S = 8
+OFFLINE_GRACE_DAYS = 14 # Koliko dugo licenca vrijedi bez uspješne online provjere
+KDF_ITERATIONS = 100000
+_APP_PEPPER = b"BlackBoxPhoenixSecretPepper_v3!@#SecureDev" # Malo drugačiji za ovu verziju
 
 CONFIG_DIR = os.path.join(os.path.expanduser("~"), ".blackbox_dhq_phoenix_v3")
 LICENSE_FILE = os.path.join(CONFIG_DIR, "license_info.dat")
 SALT_FILE = os.path.join(CONFIG_DIR, "app.salt")
+KEY_CACHE_FILE = os.path.join(CONFIG_DIR, "license_key.cache")
+
+_derived_keys: dict = {} # (hwid, salt) -> Fernet ključ, za više LicenseManager instanci u istom procesu
+_derived_keys_lock = threading.Lock()
 
 class LicenseManager:
-    def __init__(self):
+    def __init__(self, server_url: str | None = None):
+        # server_url zadaje samo kod (lokalni stub server u benchmarkima/testovima); aplikacija uvijek koristi Pastebin URL
+        self.server_url = server_url or LICENSE_SERVER_SIMULATOR_URL
         os.makedirs(CONFIG_DIR, exist_ok=True)
         self.hwid = self._get_hardware_id()
         self.fernet_key = self._get_or_create_fernet_key()
@@ -32,6 +45,7 @@ class LicenseManager:
         else:
             self.cipher_suite = None
             logger.critical("KRITIČNO: Cipher suite nije inicijaliziran! Enkripcija/dekripcija licence neće raditi.")
+        self._executor: ThreadPoolExecutor | None = None
 
     def _get_hardware_id(self):
         try:
@@ -59,18 +73,55 @@ class LicenseManager:
     def _get_or_create_fernet_key(self):
         try:
             salt = self._get_or_create_salt()
-            app_pepper = b"BlackBoxPhoenixSecretPepper_v3!@#SecureDev" # Malo drugačiji za ovu verziju
-            password = (self.hwid + app_pepper.decode()).encode('utf-8')
-            kdf = PBKDF2HMAC(
-                algorithm=hashes.SHA256(), length=32, salt=salt,
-                iterations=100000, backend=default_backend()
-            )
-            key = base64.urlsafe_b64encode(kdf.derive(password))
+            with _derived_keys_lock:
+                key = _derived_keys.get((self.hwid, salt)) or self._load_cached_key(salt)
+                if key is None:
+                    key = self._derive_key(salt); self._store_cached_key(salt, key)
+                _derived_keys[(self.hwid, salt)] = key
             return key
         except Exception as e:
             logger.error(f"Greška pri generiranju Fernet ključa: {e}")
             return None
 
+    def _derive_key(self, salt: bytes) -> bytes:
+        # PBKDF2 (i njegovi uvozi) samo kad ključa nema u kešu
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+        from cryptography.hazmat.backends import default_backend
+        password = (self.hwid + _APP_PEPPER.decode()).encode('utf-8')
+        kdf = PBKDF2HMAC(
+            algorithm=hashes.SHA256(), length=32, salt=salt,
+            iterations=KDF_ITERATIONS, backend=default_backend()
+        )
+        return base64.urlsafe_b64encode(kdf.derive(password))
+
+    # --- Keš izvedenog ključa ---
+    # Ključ na disku je omotan Fernetom čiji je ključ vezan uz isti pepper/HWID/salt, a fajl je čitljiv samo vlasniku;
+    # otisak (HWID, salt, broj iteracija) poništava keš kad se bilo što od toga promijeni.
+    def _key_cache_fingerprint(self, salt: bytes) -> str:
+        return hashlib.sha256(f"{self.hwid}|{salt.hex()}|{KDF_ITERATIONS}".encode('utf-8')).hexdigest()
+
+    def _key_cache_cipher(self, salt: bytes) -> Fernet:
+        return Fernet(base64.urlsafe_b64encode(hashlib.sha256(_APP_PEPPER + self.hwid.encode('utf-8') + salt + b"|key-cache").digest()))
+
+    def _load_cached_key(self, salt: bytes) -> bytes | None:
+        try:
+            with open(KEY_CACHE_FILE, "r", encoding='utf-8') as f: cached = json.load(f)
+            if cached.get("fingerprint") != self._key_cache_fingerprint(salt): logger.info("Keš licencnog ključa ne odgovara HWID/saltu, ponovno izvodim ključ."); return None
+            return self._key_cache_cipher(salt).decrypt(cached["token"].encode('ascii'))
+        except FileNotFoundError: return None
+        except (OSError, ValueError, KeyError, TypeError, AttributeError, InvalidToken) as e:
+            logger.warning(f"Keš licencnog ključa nije upotrebljiv ({e}), ponovno izvodim ključ."); return None
+
+    def _store_cached_key(self, salt: bytes, key: bytes):
+        payload = json.dumps({"fingerprint": self._key_cache_fingerprint(salt), "token": self._key_cache_cipher(salt).encrypt(key).decode('ascii')})
+        tmp_path = KEY_CACHE_FILE + ".tmp"
+        try:
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding='utf-8') as f: f.write(payload)
+            os.replace(tmp_path, KEY_CACHE_FILE)
+        except OSError as e: logger.warning(f"Nije moguće spremiti keš licencnog ključa: {e}")
+
     def _save_license_local(self, license_data: dict):
         if not self.cipher_suite:
             logger.error("Cipher suite nije inicijaliziran, ne mogu spremiti licencu.")
@@ -110,18 +161,21 @@ class LicenseManager:
             except OSError: pass
             return None
        
-    def _fetch_license_from_remote(self, license_key_to_find: str) -> dict | None:
-        # Ova provjera osigurava da URL nije placeholder i da počinje ispravno.
-        if LICENSE_SERVER_SIMULATOR_URL == "https://pastebin.com/raw/XXXXXXXX" or \
-           not str(LICENSE_SERVER_SIMULATOR_URL).startswith("https://pastebin.com/raw/"):
+    def _fetch_license_from_remote(self, license_key_to_find: str, timeout: float = ACTIVATION_TIMEOUT_S) -> dict | None:
+        # Greške s "network_error" su prolazne (licenca i dalje vrijedi unutar grace perioda), "revoked" su konačni odgovor servera
+        server_url = self.server_url
+        # Ova provjera osigurava da konfigurirani URL nije placeholder i da počinje ispravno.
+        if server_url == LICENSE_SERVER_SIMULATOR_URL and (server_url == "https://pastebin.com/raw/XXXXXXXX" or \
+           not str(server_url).startswith("https://pastebin.com/raw/")):
             logger.error("PASTEBIN RAW URL NIJE ISPRAVNO POSTAVLJEN U license_manager.py!")
             return {"error": "Server za licence nije konfiguriran."}
 
+        import requests # Tek kad zatreba: uvoz requests/urllib3 je primjetan dio vremena pokretanja
         remote_data_content = None # Inicijalizacija prije try bloka
 
         try:
-            logger.info(f"Dohvaćam licencu s: {LICENSE_SERVER_SIMULATOR_URL}")
-            response = requests.get(LICENSE_SERVER_SIMULATOR_URL, timeout=15)
+            logger.info(f"Dohvaćam licencu s: {server_url}")
+            response = requests.get(server_url, timeout=timeout)
             
             logger.debug(f"Konačni URL nakon redirekcija: {response.url}")
             logger.debug(f"Statusni kod: {response.status_code}")
@@ -148,10 +202,10 @@ class LicenseManager:
                         logger.info(f"Licenca pronađena u listi na 'serveru' za ključ: {license_key_to_find}")
                         if lic_info.get("hwid_lock") and lic_info.get("hwid_lock") != self.hwid and lic_info.get("type") != "super_admin":
                             logger.warning(f"HWID se ne poklapa za licencu {license_key_to_find}.")
-                            return {"error": "Licenca je vezana za drugi uređaj."}
+                            return {"error": "Licenca je vezana za drugi uređaj.", "revoked": True}
                         return lic_info
                 logger.warning(f"Licencni ključ {license_key_to_find} nije pronađen u listi licenci na 'serveru'.")
-                return {"error": "Licencni ključ nije pronađen u listi."}
+                return {"error": "Licencni ključ nije pronađen u listi.", "revoked": True}
             else: 
                  logger.error(f"Format podataka s Pastebina nije prepoznat ili ključ nije nađen. Dobiveno: {remote_data_content}")
                  return {"error": "Neočekivani format podataka ili ključ nije pronađen."}
@@ -159,13 +213,13 @@ class LicenseManager:
         except requests.exceptions.HTTPError as http_err:
             response_text_snippet_err = response.text[:500] if 'response' in locals() and response and hasattr(response, 'text') else 'Nema tekstualnog odgovora'
             logger.error(f"HTTP greška pri dohvaćanju licence: {http_err}. Odgovor: {response_text_snippet_err}")
-            return {"error": f"HTTP greška: {http_err}."}
+            return {"error": f"HTTP greška: {http_err}.", "network_error": True}
         except requests.exceptions.Timeout:
             logger.error("Timeout pri dohvaćanju licence s 'servera'.")
-            return {"error": "Server za licence nije odgovorio na vrijeme."}
+            return {"error": "Server za licence nije odgovorio na vrijeme.", "network_error": True}
         except requests.exceptions.RequestException as e:
             logger.error(f"Mrežna greška pri dohvaćanju licence s 'servera': {e}")
-            return {"error": f"Mrežna greška: {e}."}
+            return {"error": f"Mrežna greška: {e}.", "network_error": True}
         except json.JSONDecodeError as json_err:
             response_text_snippet_json_err = response.text[:100] if 'response' in locals() and response and hasattr(response, 'text') else 'Nema tekstualnog odgovora'
             logger.error(f"Greška pri parsiranju JSON odgovora s 'servera' (Pastebina): {json_err}. Sadržaj počinje s: {response_text_snippet_json_err}")
@@ -189,6 +243,16 @@ class LicenseManager:
             logger.error(f"Dohvaćena licenca s ključem '{remote_license_data.get('license_key')}' ne odgovara traženom ključu '{license_key}'.")
             return False, {"error": "Dohvaćeni podaci o licenci ne odgovaraju traženom ključu."}
 
+        self._normalise_remote_license(remote_license_data)
+        if self._save_license_local(remote_license_data):
+            logger.info(f"Licenca {license_key} uspješno aktivirana i spremljena.")
+            return True, remote_license_data
+        else:
+            logger.error(f"Aktivacija neuspješna: Greška pri spremanju licence {license_key} lokalno.")
+            return False, {"error": "Greška pri lokalnom spremanju licence."}
+
+    @staticmethod
+    def _normalise_remote_license(remote_license_data: dict):
         if remote_license_data.get("type") == "super_admin":
             logger.info("SuperAdmin licenca potvrđena od strane 'servera'.")
             remote_license_data["user"] = remote_license_data.get("user", "Haris (Super Admin)")
@@ -201,13 +265,52 @@ class LicenseManager:
         # Za ovu simulaciju, pretpostavljamo da server vraća ispravne podatke.
         if "status" not in remote_license_data: # Osnovna provjera
             remote_license_data["status"] = "active" # Pretpostavi active ako nije specificirano
+        remote_license_data["verified_at"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
 
-        if self._save_license_local(remote_license_data):
-            logger.info(f"Licenca {license_key} uspješno aktivirana i spremljena.")
-            return True, remote_license_data
-        else:
-            logger.error(f"Aktivacija neuspješna: Greška pri spremanju licence {license_key} lokalno.")
-            return False, {"error": "Greška pri lokalnom spremanju licence."}
+    def refresh_license(self) -> tuple[bool, dict | None]:
+        """Ponovna online provjera spremljene licence (u pozadini). Mrežna greška nije kraj licence dok traje grace period."""
+        license_data = self._load_license_local()
+        if not license_data or not license_data.get("license_key"):
+            return self.is_license_valid()
+        license_key = license_data["license_key"]
+        remote_license_data = self._fetch_license_from_remote(license_key, timeout=REFRESH_TIMEOUT_S)
+        if remote_license_data and "error" not in remote_license_data and remote_license_data.get("license_key") == license_key:
+            self._normalise_remote_license(remote_license_data)
+            self._save_license_local({**license_data, **remote_license_data})
+            logger.info(f"Licenca {license_key} potvrđena online.")
+            return self.is_license_valid()
+        error_msg = remote_license_data.get("error", "Nepoznata greška.") if remote_license_data else "Nije moguće dohvatiti licencu."
+        if remote_license_data and remote_license_data.get("revoked"):
+            logger.error(f"Server je odbio licencu {license_key}: {error_msg}")
+            license_data["status"] = "revoked"; self._save_license_local(license_data)
+            return False, {"error": error_msg, **license_data}
+        logger.warning(f"Online provjera licence nije uspjela ({error_msg}), vrijedi offline grace period.")
+        return self.is_license_valid()
+
+    def activate_license_async(self, license_key: str) -> Future:
+        return self._background().submit(self.activate_license, license_key)
+
+    def refresh_license_async(self) -> Future:
+        return self._background().submit(self.refresh_license)
+
+    def _background(self) -> ThreadPoolExecutor:
+        # Jedna nit: aktivacija i osvježavanje ne smiju istovremeno pisati license_info.dat
+        if self._executor is None: self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="license")
+        return self._executor
+
+    def _offline_grace_error(self, license_data: dict) -> str | None:
+        verified_at_str = license_data.get("verified_at")
+        now_utc = datetime.datetime.now(datetime.timezone.utc)
+        if not verified_at_str: # Licenca spremljena prije uvođenja grace perioda: grace počinje sada
+            license_data["verified_at"] = now_utc.isoformat(); self._save_license_local(license_data)
+            return None
+        try: verified_at = datetime.datetime.fromisoformat(str(verified_at_str))
+        except ValueError: return "Neispravan zapis zadnje provjere licence."
+        if verified_at.tzinfo is None: verified_at = verified_at.replace(tzinfo=datetime.timezone.utc)
+        if verified_at > now_utc + datetime.timedelta(days=1): return "Sistemsko vrijeme je pomaknuto unatrag; potrebna je online provjera licence."
+        if now_utc - verified_at > datetime.timedelta(days=OFFLINE_GRACE_DAYS):
+            return f"Licenca nije potvrđena online više od {OFFLINE_GRACE_DAYS} dana; spojite se na internet."
+        return None
 
     def is_license_valid(self) -> tuple[bool, dict | None]:
         license_data = self._load_license_local()
@@ -225,6 +328,11 @@ class LicenseManager:
             logger.error(f"HWID se ne poklapa za licencu {license_data.get('license_key')}. Lokalni: {self.hwid}, Licenca: {license_data.get('hwid_lock')}.")
             return False, {"error": "Licenca je vezana za drugi uređaj.", **license_data}
 
+        grace_error = self._offline_grace_error(license_data)
+        if grace_error:
+            logger.warning(grace_error)
+            return False, {**license_data, "error": grace_error, "grace_expired": True}
+
         expires_at_str = license_data.get("expires_at")
         current_time_utc = datetime.datetime.now(datetime.timezone.utc)
 
@@ -0,0 +1,101 @@
+# core/log_buffer.py
+# Ograničeni (ring) buffer log linija za log pane u GUI-ju. Umjesto da svaka linija završi u Tk Text widgetu zauvijek,
+# linije (logging zapisi i yt-dlp ispis taskova) idu u deque fiksnog kapaciteta, a prikaz (gui.components.log_pane)
+# iscrtava samo vidljivi dio. Filtriranje po razini i tasku radi nad bufferom, ne nad widgetom.
+# Thread-safe: logging handler i engine pišu iz svojih niti, GUI čita iz glavne.
+import logging
+import re
+import threading
+import time
+from collections import deque
+from typing import Iterable, List, Set
+
+DEFAULT_CAPACITY = 5000
+KIND_LOG = "log"
+KIND_TASK_OUTPUT = "task_output" # log_message događaji engine-a (yt-dlp ispis, "Spremljeno: ...")
+KIND_STATUS = "status"
+_TASK_PREFIX_RE = re.compile(r"^\[([^\]\s]+)\]") # Engine logira kao "[<item_id>] poruka"
+
+class LogEntry:
+    __slots__ = ("seq", "created", "levelno", "task_id", "text", "kind")
+    def __init__(self, seq: int, created: float, levelno: int, task_id: str | None, text: str, kind: str):
+        self.seq = seq; self.created = created; self.levelno = levelno; self.task_id = task_id; self.text = text; self.kind = kind
+
+    def matches(self, min_level: int, task_ids: Set[str] | None) -> bool:
+        return self.levelno >= min_level and (task_ids is None or self.task_id in task_ids)
+
+class LogRingBuffer:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = max(100, int(capacity))
+        self._entries: deque = deque(maxlen=self.capacity)
+        self._lock = threading.Lock()
+        self._last_seq = 0
+        self.generation = 0 # Raste na clear(), da prikaz zna da mora ispočetka
+        self.stats = {"appended": 0, "dropped": 0}
+
+    @property
+    def last_seq(self) -> int:
+        return self._last_seq
+
+    def append(self, levelno: int, text: str, task_id: str | None = None, kind: str = KIND_LOG) -> int:
+        with self._lock: return self._append_locked(levelno, text, task_id, kind, time.time())
+
+    def extend(self, items: Iterable[tuple]):
+        """items: (levelno, text, task_id, kind); jedan lock za cijeli batch (npr. log linije jednog GUI framea)."""
+        now = time.time()
+        with self._lock:
+            for levelno, text, task_id, kind in items: self._append_locked(levelno, text, task_id, kind, now)
+
+    def _append_locked(self, levelno: int, text: str, task_id: str | None, kind: str, created: float) -> int:
+        if len(self._entries) == self.capacity: self.stats["dropped"] += 1
+        self._last_seq += 1; self.stats["appended"] += 1
+        self._entries.append(LogEntry(self._last_seq, created, levelno, task_id, text, kind))
+        return self._last_seq
+
+    def since(self, seq: int, min_level: int = logging.NOTSET, task_ids: Set[str] | None = None) -> List[LogEntry]:
+        """Unosi noviji od seq koji prolaze filter, starijim redom. O(broj novih), ne O(kapacitet)."""
+        with self._lock:
+            newer = []
+            for entry in reversed(self._entries):
+                if entry.seq <= seq: break
+                if entry.matches(min_level, task_ids): newer.append(entry)
+        newer.reverse()
+        return newer
+
+    def query(self, min_level: int = logging.NOTSET, task_ids: Set[str] | None = None) -> List[LogEntry]:
+        with self._lock: return [entry for entry in self._entries if entry.matches(min_level, task_ids)]
+
+    def clear(self):
+        with self._lock: self._entries.clear(); self.generation += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class LogBufferHandler(logging.Handler):
+    """logging.Handler koji samo dodaje u LogRingBuffer (bez Tk poziva, sigurno iz bilo koje niti)."""
+    def __init__(self, buffer: LogRingBuffer, level: int = logging.DEBUG):
+        super().__init__(level)
+        self.buffer = buffer
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            message = record.getMessage(); kind = KIND_LOG; task_id = None
+            if message.startswith("[STATUS]"): message = message[len("[STATUS]"):].strip(); kind = KIND_STATUS
+            else:
+                task_match = _TASK_PREFIX_RE.match(message)
+                if task_match: task_id = task_match.group(1)
+            self.buffer.append(record.levelno, message, task_id, kind)
+        except Exception: self.handleError(record)
+
+def install_log_buffer_handler(buffer: LogRingBuffer, level: int = logging.DEBUG) -> LogBufferHandler:
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers:
+        if isinstance(handler, LogBufferHandler) and handler.buffer is buffer: return handler
+    handler = LogBufferHandler(buffer, level); root_logger.addHandler(handler)
+    return handler
+
+def task_output_items(log_lines: Iterable[tuple]) -> Iterable[tuple]:
+    """(task, linija) parovi iz CoalescingEventBus.drain() -> stavke za LogRingBuffer.extend."""
+    for task, data in log_lines:
+        text = str(data)
+        yield (logging.ERROR if "GREŠKA:" in text else logging.INFO, text, getattr(task, "item_id", None), KIND_TASK_OUTPUT)
@@ -0,0 +1,293 @@
+# core/metrics.py
+# Instrumentacija download engine-a: brojači i histogrami koje Downloader ažurira na svakom prijelazu stanja
+# (u redu -> pokrenut -> progress -> završen), plus gauge-ovi (dubina reda, aktivni slotovi, ukupni B/s) koji se
+# računaju tek pri čitanju. Ažuriranje je jedan lock + zbrajanje, bez alokacija po događaju.
+# Izvoz: Prometheus tekst na localhostu (/metrics, i /metrics.json) i periodični JSON snapshot u fajl (atomarni upis),
+# pa se jednako prate GUI (app_phoenix) i headless (cli_phoenix) način. Oba su isključena dok se ne uključe u postavkama.
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+import logging
+from collections import deque
+from typing import Callable, Dict, List, Sequence, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+DURATION_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+RATE_WINDOW_S = 10.0 # Prozor za izračun ukupnog B/s iz brojača bajtova
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(label_names: Sequence[str], label_values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape_label(value)}"' for name, value in zip(label_names, label_values)]
+    if extra: parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Counter:
+    kind = "counter"
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name; self.help_text = help_text; self.label_names = tuple(label_names)
+        self._lock = threading.Lock(); self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, labels: tuple = ()):
+        with self._lock: self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, labels: tuple = ()) -> float:
+        with self._lock: return self._values.get(labels, 0.0)
+
+    def samples(self) -> List[Tuple[str, tuple, float]]:
+        with self._lock: return [(self.name, labels, value) for labels, value in self._values.items()]
+
+    def snapshot(self):
+        with self._lock:
+            if not self.label_names: return self._values.get((), 0.0)
+            return {"|".join(map(str, labels)): value for labels, value in self._values.items()}
+
+class Gauge(Counter):
+    """Postavlja se direktno ili se vrijednost računa tek pri čitanju (set_function)."""
+    kind = "gauge"
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (), function: Callable | None = None):
+        super().__init__(name, help_text, label_names); self._function = function
+
+    def set(self, value: float, labels: tuple = ()):
+        with self._lock: self._values[labels] = value
+
+    def set_function(self, function: Callable | None):
+        self._function = function
+
+    def _refresh(self):
+        if self._function is None: return
+        try: value = float(self._function())
+        except Exception as e: logger.debug(f"Metrika {self.name}: greška pri čitanju: {e}"); return
+        self.set(value)
+
+    def samples(self):
+        self._refresh(); return super().samples()
+
+    def snapshot(self):
+        self._refresh(); return super().snapshot()
+
+class Histogram:
+    kind = "histogram"
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = LATENCY_BUCKETS, label_names: Sequence[str] = ()):
+        self.name = name; self.help_text = help_text; self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock(); self._series: Dict[tuple, list] = {} # labels -> [brojevi po bucketu (+Inf zadnji), suma, broj]
+
+    def observe(self, value: float, labels: tuple = ()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None: series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1; series[1] += value; series[2] += 1
+
+    def samples(self):
+        result = []
+        with self._lock: series_items = [(labels, list(series[0]), series[1], series[2]) for labels, series in self._series.items()]
+        for labels, counts, total, count in series_items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                result.append((self.name + "_bucket", labels, cumulative, "+Inf" if bound == float("inf") else _format_value(bound)))
+            result.append((self.name + "_sum", labels, total, None)); result.append((self.name + "_count", labels, count, None))
+        return result
+
+    def snapshot(self):
+        with self._lock:
+            if not self.label_names: return self._summary(self._series.get(()))
+            return {"|".join(map(str, labels)): self._summary(series) for labels, series in self._series.items()}
+
+    def _summary(self, series) -> dict:
+        if series is None: return {"count": 0, "sum": 0.0, "mean": None, "buckets": {}}
+        counts, total, count = series; cumulative = 0; buckets = {}
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count; buckets["+Inf" if bound == float("inf") else _format_value(bound)] = cumulative
+        return {"count": count, "sum": round(total, 6), "mean": round(total / count, 6) if count else None, "buckets": buckets}
+
+class MetricsRegistry:
+    def __init__(self, prefix: str = "bbx_"):
+        self.prefix = prefix; self._metrics: list = []
+
+    def _add(self, metric):
+        self._metrics.append(metric); return metric
+
+    def counter(self, name, help_text, label_names=()) -> Counter: return self._add(Counter(self.prefix + name, help_text, label_names))
+    def gauge(self, name, help_text, label_names=(), function=None) -> Gauge: return self._add(Gauge(self.prefix + name, help_text, label_names, function))
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS, label_names=()) -> Histogram:
+        return self._add(Histogram(self.prefix + name, help_text, buckets, label_names))
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format 0.0.4."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}"); lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample in metric.samples():
+                name, labels, value = sample[0], sample[1], sample[2]
+                extra = f'le="{sample[3]}"' if len(sample) > 3 and sample[3] is not None else ""
+                lines.append(f"{name}{_format_labels(metric.label_names, labels, extra)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        return {"timestamp": time.time(), "metrics": {metric.name: metric.snapshot() for metric in self._metrics}}
+
+def host_label(task) -> str:
+    if task.host_key: return task.host_key # Isti ključ kao core.host_limits (youtu.be i youtube.com su isti host)
+    host = (urlsplit(task.url if "://" in task.url else "https://" + task.url).hostname or "").lower()
+    return (host[4:] if host.startswith("www.") else host) or "unknown"
+
+def result_label(status: str) -> str:
+    if status == "Završeno": return "ok"
+    if status.startswith("Otkaz"): return "cancelled"
+    return "error"
+
+class EngineMetrics:
+    """Metrike jednog engine-a. Downloader zove task_queued / task_started / process_spawned / progress / task_finished."""
+    def __init__(self, registry: MetricsRegistry | None = None):
+        self.registry = registry = registry or MetricsRegistry()
+        self.tasks_queued = registry.counter("tasks_queued_total", "Taskovi dodani u red.")
+        self.tasks_started = registry.counter("tasks_started_total", "Taskovi koji su dobili slot.")
+        self.tasks_finished = registry.counter("tasks_finished_total", "Završeni taskovi po hostu i ishodu (ok, error, cancelled).", ("host", "result"))
+        self.format_plans = registry.counter("format_plans_total", "Uspješni taskovi po planu formata (copy, transcode, merge, remux).", ("action",))
+        self.downloaded_bytes = registry.counter("downloaded_bytes_total", "Preuzeti bajtovi (zbroj svih taskova).")
+        self.queue_depth = registry.gauge("queue_depth", "Taskovi koji čekaju slot.")
+        self.active_slots = registry.gauge("active_slots", "Zauzeti slotovi (aktivna preuzimanja).")
+        self.max_slots = registry.gauge("max_slots", "Najveći broj istovremenih preuzimanja.")
+        self.postprocess_queue_depth = registry.gauge("postprocess_queue_depth", "Preuzeti taskovi koji čekaju nit stupnja obrade (ffmpeg).")
+        self.postprocess_active = registry.gauge("postprocess_active", "Taskovi koji se upravo obrađuju (ffmpeg).")
+        self.bytes_per_second = registry.gauge("download_bytes_per_second", f"Ukupna brzina preuzimanja (prosjek zadnjih {RATE_WINDOW_S:.0f} s).",
+                                               function=self._current_rate)
+        self.queue_wait = registry.histogram("queue_wait_seconds", "Vrijeme od dodavanja u red do dobivanja slota.", DURATION_BUCKETS)
+        self.process_spawn = registry.histogram("process_spawn_seconds", "Trajanje pokretanja yt-dlp procesa (Popen).")
+        self.time_to_first_byte = registry.histogram("time_to_first_byte_seconds", "Od dobivanja slota do prvog preuzetog bajta.")
+        self.task_duration = registry.histogram("task_duration_seconds", "Od dobivanja slota do kraja taska.", DURATION_BUCKETS, ("result",))
+        self._lock = threading.Lock()
+        self._running: Dict[str, list] = {} # item_id -> [vrijeme starta, zadnji downloaded_bytes, prvi bajt viđen]
+        self._rate_samples: deque = deque()
+
+    def bind(self, downloader):
+        """Gauge-ovi koji se čitaju iz Downloadera tek pri izvozu (nula troška na vrućem putu)."""
+        self.queue_depth.set_function(downloader.download_queue.qsize)
+        self.active_slots.set_function(lambda: downloader.active_downloads_count)
+        self.max_slots.set_function(lambda: downloader.max_concurrent_downloads)
+        self.postprocess_queue_depth.set_function(lambda: downloader.stage_depths()["postprocess"]["queued"])
+        self.postprocess_active.set_function(lambda: downloader.stage_depths()["postprocess"]["active"])
+
+    def task_queued(self, task):
+        self.tasks_queued.inc()
+
+    def task_started(self, task, queued_at: float | None):
+        now = time.perf_counter()
+        self.tasks_started.inc()
+        if queued_at is not None: self.queue_wait.observe(now - queued_at)
+        with self._lock: self._running[task.item_id] = [now, task.downloaded_bytes or 0, False]
+
+    def process_spawned(self, seconds: float):
+        self.process_spawn.observe(seconds)
+
+    def progress(self, task):
+        with self._lock:
+            state = self._running.get(task.item_id)
+            if state is None: return
+            downloaded = task.downloaded_bytes or 0
+            delta = downloaded - state[1]; state[1] = downloaded # Reset progressa (ponovni pokušaj) daje negativnu razliku, ne broji se
+            first_byte = not state[2] and downloaded > 0
+            if first_byte: state[2] = True
+            started = state[0]
+        if delta > 0: self.downloaded_bytes.inc(delta)
+        if first_byte: self.time_to_first_byte.observe(time.perf_counter() - started)
+
+    def format_planned(self, plan):
+        self.format_plans.inc(1, (plan.action,))
+
+    def task_finished(self, task, host: str):
+        with self._lock: state = self._running.pop(task.item_id, None)
+        result = result_label(task.status)
+        self.tasks_finished.inc(1, (host, result))
+        if state is not None: self.task_duration.observe(time.perf_counter() - state[0], (result,))
+
+    def _current_rate(self) -> float:
+        now = time.monotonic(); total = self.downloaded_bytes.value()
+        with self._lock:
+            samples = self._rate_samples; samples.append((now, total))
+            while len(samples) > 2 and samples[1][0] <= now - RATE_WINDOW_S: samples.popleft()
+            oldest_time, oldest_total = samples[0]
+        return (total - oldest_total) / (now - oldest_time) if now > oldest_time else 0.0
+
+engine_metrics = EngineMetrics()
+
+# --- Izvoz ---
+def _make_handler(registry: MetricsRegistry):
+    import http.server # Tek kad je endpoint uključen; modul se inače uvozi pri svakom pokretanju engine-a
+
+    class MetricsHandler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, *args): pass
+
+        def do_GET(self):
+            path = urlsplit(self.path).path
+            if path == "/metrics": body = registry.render_prometheus().encode("utf-8"); content_type = "text/plain; version=0.0.4; charset=utf-8"
+            elif path == "/metrics.json": body = json.dumps(registry.snapshot()).encode("utf-8"); content_type = "application/json"
+            else: self.send_error(404); return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type); self.send_header("Content-Length", str(len(body)))
+            self.end_headers(); self.wfile.write(body)
+    return http.server.ThreadingHTTPServer, MetricsHandler
+
+def write_snapshot(registry: MetricsRegistry, path: str):
+    directory = os.path.dirname(os.path.abspath(path)); os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".metrics_", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f: json.dump(registry.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+    except OSError:
+        try: os.remove(tmp_path)
+        except OSError: pass
+        raise
+
+class MetricsExporter:
+    """HTTP endpoint (127.0.0.1:port) i/ili periodični snapshot; port 0 i prazan snapshot_file znače isključeno."""
+    def __init__(self, registry: MetricsRegistry, port: int = 0, snapshot_file: str = "", snapshot_interval_s: float = 15.0, host: str = "127.0.0.1"):
+        self.registry = registry; self.snapshot_file = snapshot_file; self.snapshot_interval_s = max(1.0, float(snapshot_interval_s))
+        self._server = None; self._stop_event = threading.Event(); self._snapshot_thread = None
+        if port:
+            server_class, handler = _make_handler(registry)
+            self._server = server_class((host, int(port)), handler)
+            threading.Thread(target=self._server.serve_forever, name="MetricsHttp", daemon=True).start()
+            logger.info(f"Metrike: http://{host}:{self._server.server_address[1]}/metrics")
+        if snapshot_file:
+            self._snapshot_thread = threading.Thread(target=self._snapshot_loop, name="MetricsSnapshot", daemon=True)
+            self._snapshot_thread.start(); logger.info(f"Metrike: snapshot svakih {self.snapshot_interval_s:.0f} s u {snapshot_file}")
+
+    @property
+    def port(self) -> int | None:
+        return self._server.server_address[1] if self._server else None
+
+    def _snapshot_loop(self):
+        while not self._stop_event.wait(self.snapshot_interval_s): self._write_snapshot()
+
+    def _write_snapshot(self):
+        try: write_snapshot(self.registry, self.snapshot_file)
+        except OSError as e: logger.warning(f"Metrike: snapshot nije zapisan ({self.snapshot_file}): {e}")
+
+    def close(self):
+        self._stop_event.set()
+        if self._server: self._server.shutdown(); self._server.server_close(); self._server = None
+        if self._snapshot_thread: self._snapshot_thread.join(timeout=2); self._write_snapshot(); self._snapshot_thread = None # Zadnje stanje ostaje u fajlu
+
+def start_exporter(settings: dict, port: int | None = None, snapshot_file: str | None = None, registry: MetricsRegistry | None = None) -> MetricsExporter | None:
+    """Iz postavki (metrics_port, metrics_snapshot_file, metrics_snapshot_interval_s); argumenti nadjačavaju postavke.
+    Vraća None ako je sve isključeno ili port nije dostupan."""
+    port = settings.get("metrics_port", 0) if port is None else port
+    snapshot_file = settings.get("metrics_snapshot_file", "") if snapshot_file is None else snapshot_file
+    if not port and not snapshot_file: return None
+    try: return MetricsExporter(registry or engine_metrics.registry, port, snapshot_file, settings.get("metrics_snapshot_interval_s", 15))
+    except OSError as e:
+        logger.error(f"Metrike nisu pokrenute (port {port}): {e}"); return None
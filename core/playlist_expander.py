@@ -0,0 +1,138 @@
+# core/playlist_expander.py
+# Playlista/kanal se više ne preuzima kao jedan task (jedan yt-dlp proces koji serijski prolazi stavke),
+# nego se "ravnim" izvlačenjem (--flat-playlist, bez izvlačenja svakog videa) razlaže na pojedinačne taskove
+# pod zajedničkim parent redom. Stavke se čitaju redom kako ih yt-dlp ispisuje (--lazy-playlist),
+# pa prva djeca kreću u preuzimanje dok se ostatak liste još učitava.
+import json
+import os
+import queue
+import re
+import subprocess
+import threading
+import logging
+from collections import deque
+from typing import Callable, Dict, Iterator, List, Set, Tuple
+from urllib.parse import parse_qsl, urlsplit
+from .task_journal import is_finished_status
+from .process_reactor import get_reactor
+
+logger = logging.getLogger(__name__)
+
+GROUP_EXPANDING_STATUS = "Proširivanje..."
+_END_OF_ENTRIES = object()
+_MAX_NESTING = 1 # Kanal -> tabovi (Videos, Shorts, Live) -> videi; dublje se ne ide
+_PLAYLIST_PATH_RE = re.compile(r"^/(?:playlist|@[^/]+|channel/[^/]+|c/[^/]+|user/[^/]+)(?:/(?:videos|shorts|streams|playlists|featured))?/?$")
+
+def is_probable_playlist_url(url: str) -> bool:
+    """Brza provjera bez mreže: YouTube playliste i kanali, SoundCloud setovi/profili. Ostalo ide kao obični task."""
+    parts = urlsplit(url.strip() if "://" in url else "https://" + url.strip())
+    host = (parts.hostname or "").lower()
+    if host.endswith("youtube.com"):
+        return "list" in dict(parse_qsl(parts.query)) or bool(_PLAYLIST_PATH_RE.match(parts.path))
+    if host.endswith("soundcloud.com"): return "/sets/" in parts.path or parts.path.rstrip("/").endswith(("/tracks", "/likes"))
+    return False
+
+def build_expand_command(executable: str, url: str) -> List[str]:
+    return [executable, url, "--flat-playlist", "--lazy-playlist", "--dump-json", "--no-warnings", "--ignore-errors",
+            "--no-check-certificates"]
+
+def parse_entry_line(line: str) -> Tuple[str, str | None, str | None] | None:
+    """Linija --dump-json ispisa -> (URL stavke, naslov, naslov playliste) ili None ako linija nije upotrebljiva stavka."""
+    try: entry = json.loads(line)
+    except ValueError: return None
+    if not isinstance(entry, dict): return None
+    entry_url = next((value for value in (entry.get("url"), entry.get("webpage_url"), entry.get("original_url"))
+                      if isinstance(value, str) and "://" in value), None)
+    if entry_url is None: return None
+    return entry_url, entry.get("title"), entry.get("playlist_title") or entry.get("playlist")
+
+def stream_playlist_entries(executable: str, url: str, cancel_event: threading.Event,
+                            on_process: Callable | None = None, _depth: int = 0) -> Iterator[Tuple[str, str | None, str | None]]:
+    """Generator stavki redom kojim ih yt-dlp javlja. Ugniježđene playliste (tabovi kanala) proširuju se rekurzivno.
+    Baca RuntimeError ako yt-dlp ne vrati nijednu stavku i izađe s greškom."""
+    # Stavke parsira reaktor (core.process_reactor) na svojoj niti; generator ih samo preuzima iz reda
+    entries: queue.Queue = queue.Queue(); stderr_tail: deque = deque(maxlen=20)
+    def on_stdout_line(line):
+        entry = parse_entry_line(line)
+        if entry is not None: entries.put(entry)
+    def on_stderr_line(line):
+        if line.strip(): stderr_tail.append(line.strip())
+    process = subprocess.Popen(build_expand_command(executable, url), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0)
+    if on_process: on_process(process)
+    watch = get_reactor().watch(process, on_stdout_line, on_stderr_line, on_close=lambda: entries.put(_END_OF_ENTRIES))
+    yielded = 0
+    try:
+        for entry in iter(entries.get, _END_OF_ENTRIES):
+            if cancel_event.is_set(): break
+            if _depth < _MAX_NESTING and entry[0] != url and is_probable_playlist_url(entry[0]):
+                for nested_entry in stream_playlist_entries(executable, entry[0], cancel_event, on_process, _depth + 1):
+                    yielded += 1; yield nested_entry
+                continue
+            yielded += 1; yield entry
+    finally:
+        if process.poll() is None and cancel_event.is_set(): process.terminate()
+        return_code = watch.wait(exit_timeout=10)
+    if return_code != 0 and yielded == 0 and not cancel_event.is_set():
+        raise RuntimeError("\n".join(stderr_tail) or f"yt-dlp greška pri proširivanju playliste (kod: {return_code})")
+
+class PlaylistGroup:
+    """Zbirno stanje parent reda. Svaki događaj djeteta ažurira ga u O(1): zbroj postotaka i broj završenih,
+    bez prolaska kroz svu djecu."""
+    def __init__(self, task):
+        self.task = task
+        self.child_ids: List[str] = []
+        self.expanding = True
+        self.cancel_event = threading.Event()
+        self.cancelled_status: str | None = None
+        self.failed = 0; self.skipped = 0
+        self._lock = threading.Lock()
+        self._progress: Dict[str, float] = {}
+        self._progress_sum = 0.0
+        self._finished: Set[str] = set()
+        self._refresh_locked()
+
+    def add_child(self, child_id: str):
+        with self._lock:
+            if child_id in self._progress: return
+            self.child_ids.append(child_id); self._progress[child_id] = 0.0; self._refresh_locked()
+
+    def on_child_update(self, child) -> str | None:
+        """Vraća tip događaja za parent ("progress_update", "download_complete", "download_error") ili None ako se ništa nije promijenilo."""
+        with self._lock:
+            old_value = self._progress.get(child.item_id)
+            if old_value is None or child.item_id in self._finished: return None
+            value = child.progress_val
+            if is_finished_status(child.status):
+                self._finished.add(child.item_id); value = 100.0
+                if child.status.startswith("Preskočeno"): self.skipped += 1
+                elif child.status != "Završeno": self.failed += 1
+            elif value == old_value: return None
+            self._progress[child.item_id] = value; self._progress_sum += value - old_value
+            return self._refresh_locked()
+
+    def finish_expansion(self, error: str | None = None) -> str:
+        with self._lock:
+            self.expanding = False
+            if error and not self.child_ids: self.task.error_message = error
+            return self._refresh_locked()
+
+    def cancel(self, status: str):
+        with self._lock: self.cancelled_status = status; self.cancel_event.set()
+
+    def _refresh_locked(self) -> str:
+        task = self.task; total = len(self.child_ids); done = len(self._finished)
+        task.progress_val = self._progress_sum / total if total else 0.0; task.progress_str = f"{task.progress_val:.1f}%"
+        task.speed_str = f"{done}/{total}{'+' if self.expanding else ''} gotovo" + (f" ({self.skipped} preskočeno)" if self.skipped else "")
+        task.eta_str = ""
+        if self.expanding or done < total:
+            task.status = GROUP_EXPANDING_STATUS if self.expanding and not total else "Preuzimanje..."
+            return "progress_update"
+        if self.cancelled_status: task.status = self.cancelled_status; return "download_error"
+        if total == 0 or self.failed:
+            task.status = "Greška"
+            if total: task.error_message = f"{self.failed}/{total} stavki nije preuzeto."
+            elif not task.error_message: task.error_message = "Playlista je prazna."
+            return "download_error"
+        task.status = "Završeno"
+        return "download_complete"
@@ -0,0 +1,172 @@
+# core/postprocess_stage.py
+# Drugi stupanj pipeline-a preuzimanja. Mrežni stupanj (yt-dlp u slotu Downloadera) preuzima samo sirove streamove:
+# yt-dlp dobiva --ffmpeg-location na prazan direktorij, pa ne spaja video + audio, ne pretvara audio i ne ugrađuje
+# naslovnicu, nego preko progress protokola (bbx-raw:) javi gdje su streamovi, naslovnica i metapodaci. Slot se tada
+# oslobađa za sljedeće preuzimanje, a ffmpeg posao (spajanje u mp4, pretvorba audia, naslovnica, metapodaci) ide u
+# PostProcessPool s brojem niti prema broju jezgri. Tako mreža ne čeka na CPU i obrnuto.
+# Što ffmpeg radi (kopija, kodiranje, kontejner spajanja) određuje core.format_planner iz stvarno preuzetih kodeka.
+# Backend "worker_pool" i AsyncDownloader i dalje rade post-processing unutar yt-dlp-a.
+import os
+import queue
+import shutil
+import threading
+import logging
+from functools import lru_cache
+from typing import Callable, Dict, List
+
+from .settings_handler import CONFIG_DIR
+from .progress_protocol import RAW_OUTPUT_ARGS
+from .format_planner import FormatPlan, normalize_codec, plan_downloaded
+
+logger = logging.getLogger(__name__)
+
+NO_FFMPEG_DIR = os.path.join(CONFIG_DIR, "no_ffmpeg") # Prazan: yt-dlp u mrežnom stupnju "nema" ffmpeg
+# Upozorenje koje yt-dlp u mrežnom stupnju ispisuje jer namjerno nema ffmpeg; spajanje radi ovaj stupanj
+EXPECTED_NETWORK_STAGE_WARNINGS = ("The formats won't be merged",)
+# yt-dlp bez ffmpeg-a preskače popravke (DASH m4a, HLS AAC ADTS, MPEG-TS u mp4 / AAC timestampovi) i javi ovo; engine tada
+# postavi stage_input["fixup"], a ovaj stupanj napravi -c copy remux s popravkom
+SKIPPED_FIXUP_WARNING = "Install ffmpeg to fix this automatically"
+_MP4_FAMILY_EXTENSIONS = ("mp4", "m4a", "mov")
+# Audio koder i opcije kvalitete po formatu (quality je "audio_quality" profila, 0 = najbolje, kao kod yt-dlp-a)
+_AUDIO_ENCODERS = {"mp3": ("libmp3lame", lambda quality: ["-q:a", str(quality)]),
+                   "m4a": ("aac", lambda quality: ["-b:a", "192k"]), "aac": ("aac", lambda quality: ["-b:a", "192k"]),
+                   "opus": ("libopus", lambda quality: ["-b:a", "160k"]), "vorbis": ("libvorbis", lambda quality: ["-q:a", str(10 - int(quality))]),
+                   "flac": ("flac", lambda quality: []), "wav": ("pcm_s16le", lambda quality: [])}
+_AUDIO_EXTENSIONS = {"vorbis": "ogg", "aac": "m4a"}
+_COVER_CODEC_ARGS = ("-c:v", "mjpeg", "-disposition:v:0", "attached_pic") # webp naslovnice ne idu u mp3/m4a, jpeg ide
+_COVER_EXTENSIONS = ("mp3", "m4a", "flac") # ffmpeg ne zna ugraditi naslovnicu u ogg/opus
+
+@lru_cache(maxsize=4)
+def ffmpeg_available(executable: str) -> bool:
+    if shutil.which(executable): return True
+    logger.warning(f"{executable} nije pronađen u PATH-u, post-processing ostaje unutar yt-dlp-a.")
+    return False
+
+def network_stage_args(profile: dict, current_settings: dict) -> List[str]:
+    """yt-dlp argumenti mrežnog stupnja umjesto --extract-audio / --embed-thumbnail / --merge-output-format / --add-metadata."""
+    os.makedirs(NO_FFMPEG_DIR, exist_ok=True)
+    args = ["--ffmpeg-location", NO_FFMPEG_DIR, *RAW_OUTPUT_ARGS]
+    if profile["type"] == "audio" and current_settings.get("embed_thumbnail_audio", True): args.append("--write-thumbnail")
+    return args
+
+def _metadata_args(meta: dict) -> List[str]:
+    # Ista polja kao yt-dlp-ov FFmpegMetadata za najčešće slučajeve
+    tags = {"title": meta.get("title"), "artist": meta.get("artist") or meta.get("creator") or meta.get("uploader"),
+            "album": meta.get("album"), "date": meta.get("upload_date"), "comment": meta.get("webpage_url")}
+    return [arg for key, value in tags.items() if value for arg in ("-metadata", f"{key}={value}")]
+
+def _fixup_args(output: str, acodec: str | None) -> List[str]:
+    """Ono što bi yt-dlp-ov FixupM4a/FixupM3u8/FixupTimestamp napravio: mp4 kontejner, ASC umjesto ADTS zaglavlja, moov naprijed."""
+    if os.path.splitext(output)[1].lstrip(".").lower() not in _MP4_FAMILY_EXTENSIONS: return []
+    return [*(["-bsf:a", "aac_adtstoasc"] if acodec == "aac" else []), "-movflags", "+faststart"]
+
+def _temp_path(path: str) -> str:
+    base, ext = os.path.splitext(path)
+    return f"{base}.temp{ext}" # ffmpeg bira muxer po ekstenziji
+
+class PostProcessJob:
+    """Jedan ffmpeg poziv: ulazi (streamovi, naslovnica) -> privremeni izlaz, koji commit() premješta na konačno mjesto."""
+    def __init__(self, kind: str, inputs: List[str], output: str, args: List[str], thumbnail: str | None = None, duration: float | None = None):
+        self.kind = kind; self.inputs = inputs; self.output = output; self.args = args
+        self.thumbnail = thumbnail; self.duration = duration
+        self.temp_output = _temp_path(output)
+
+    def command(self, ffmpeg_executable: str) -> List[str]:
+        command = [ffmpeg_executable, "-y", "-nostdin", "-hide_banner", "-loglevel", "error", "-progress", "pipe:1", "-nostats"]
+        for path in (*self.inputs, *([self.thumbnail] if self.thumbnail else [])): command.extend(["-i", path])
+        return [*command, *self.args, self.temp_output]
+
+    def commit(self) -> str:
+        os.replace(self.temp_output, self.output)
+        for path in (*self.inputs, self.thumbnail):
+            if path and os.path.abspath(path) != os.path.abspath(self.output):
+                try: os.remove(path)
+                except OSError as e: logger.warning(f"Sirovi fajl nije obrisan ({path}): {e}")
+        return self.output
+
+    def discard(self):
+        try: os.remove(self.temp_output)
+        except FileNotFoundError: pass
+        except OSError as e: logger.warning(f"Privremeni fajl obrade nije obrisan ({self.temp_output}): {e}")
+
+def plan_postprocess(profile: dict, current_settings: dict, downloaded_file: str | None, stage_input: dict,
+                     plan: FormatPlan | None = None) -> PostProcessJob | None:
+    """ffmpeg posao za ono što je mrežni stupanj preuzeo, po planu formata (zadano plan_downloaded), uz popravak koji je
+    yt-dlp preskočio (stage_input["fixup"]); None ako nema što raditi (npr. kopirani audio je već u svom kontejneru)."""
+    streams = [path for path in stage_input.get("streams") or [] if path] or ([downloaded_file] if downloaded_file else [])
+    streams = [path for path in streams if os.path.exists(path)]
+    if not streams: return None
+    plan = plan or plan_downloaded(profile, current_settings, stage_input)
+    meta = stage_input.get("meta") or {}; base = os.path.splitext(downloaded_file or streams[0])[0]
+    fixup = bool(stage_input.get("fixup")); acodec = normalize_codec(meta.get("acodec"))
+    if profile["type"] == "audio":
+        audio_format = profile.get("extract_audio_format", "mp3")
+        extension = plan.target if plan.action == "copy" else _AUDIO_EXTENSIONS.get(audio_format, audio_format)
+        thumbnail = stage_input.get("thumbnail") if current_settings.get("embed_thumbnail_audio", True) and extension in _COVER_EXTENSIONS else None
+        thumbnail = thumbnail if thumbnail and os.path.exists(thumbnail) else None
+        output = f"{base}.{extension}"
+        if plan.action == "copy":
+            if not thumbnail and not fixup and os.path.abspath(output) == os.path.abspath(streams[0]): return None # Već je u svom kontejneru
+            args = ["-map", "0:a:0", "-c:a", "copy", *(_fixup_args(output, acodec) if fixup else [])]
+        else:
+            encoder, quality_args = _AUDIO_ENCODERS.get(audio_format, ("copy", lambda quality: []))
+            args = ["-map", "0:a:0", "-c:a", encoder, *quality_args(profile.get("audio_quality", "5"))]
+        if thumbnail: args += ["-map", "1:0", *_COVER_CODEC_ARGS]
+        if thumbnail and extension == "mp3": args += ["-id3v2_version", "3", "-metadata:s:v", "title=Album cover", "-metadata:s:v", "comment=Cover (front)"]
+        return PostProcessJob("audio" if plan.action == "transcode" else "audio_copy", streams[:1], output, args, thumbnail, meta.get("duration"))
+    output = f"{base}.{plan.target or 'mp4'}" if len(streams) > 1 else streams[0] # Samo spojeni video mijenja kontejner
+    metadata = _metadata_args(meta) if current_settings.get("add_metadata_video", True) else []
+    if len(streams) == 1 and not metadata and not fixup: return None # Jedan gotov fajl, nema ni spajanja, ni oznaka, ni popravka
+    args = [arg for index in range(len(streams)) for arg in ("-map", str(index))]
+    args += ["-c", "copy", *(_fixup_args(output, acodec) if fixup else []), *metadata]
+    return PostProcessJob("merge" if len(streams) > 1 else "remux", streams, output, args, duration=meta.get("duration"))
+
+def discard_unused_thumbnail(stage_input: dict, job: PostProcessJob | None):
+    """Naslovnica je preuzeta samo za ugradnju; ako je plan ne koristi (kopija u opus/ogg, nema posla), briše se."""
+    thumbnail = stage_input.get("thumbnail")
+    if not thumbnail or (job and job.thumbnail == thumbnail): return
+    try: os.remove(thumbnail)
+    except FileNotFoundError: pass
+    except OSError as e: logger.warning(f"Neiskorištena naslovnica nije obrisana ({thumbnail}): {e}")
+
+class PostProcessPool:
+    """Niti koje redom izvode ffmpeg poslove; run_job(task, job, host) je Downloader._run_postprocess."""
+    def __init__(self, workers: int, run_job: Callable):
+        self.workers = self.worker_count(workers)
+        self._run_job = run_job
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock(); self._tasks: Dict[str, object] = {}; self.active = 0
+        self._threads = [threading.Thread(target=self._worker_loop, name=f"PostProcess-{index}", daemon=True) for index in range(self.workers)]
+        for thread in self._threads: thread.start()
+        logger.info(f"Stupanj obrade pokrenut s {self.workers} niti.")
+
+    @staticmethod
+    def worker_count(setting) -> int:
+        """postprocess_workers iz postavki; 0 = broj jezgri (ffmpeg posao je CPU, ne mreža)."""
+        return max(1, int(setting or 0) or os.cpu_count() or 1)
+
+    def submit(self, task, job: PostProcessJob, host: str):
+        with self._lock: self._tasks[task.item_id] = task
+        self._queue.put((task, job, host))
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize()
+
+    def task_ids(self) -> List[str]:
+        with self._lock: return list(self._tasks)
+
+    def close(self, timeout: float = 2.0):
+        for _ in self._threads: self._queue.put(None)
+        for thread in self._threads: thread.join(timeout=timeout)
+
+    def _worker_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None: break
+            task, job, host = item
+            with self._lock: self.active += 1
+            try: self._run_job(task, job, host)
+            except Exception as e: logger.error(f"[{task.item_id}] Neočekivana greška u stupnju obrade: {e}", exc_info=True)
+            finally:
+                with self._lock: self.active -= 1; self._tasks.pop(task.item_id, None)
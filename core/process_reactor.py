@@ -0,0 +1,188 @@
+# core/process_reactor.py
+# Jedna nit koja preko selectors modula (epoll/kqueue/poll) čita stdout i stderr svih child procesa: yt-dlp po tasku,
+# proširivanje playlisti i worker pool. Pipe-ovi su neblokirajući i čitaju se u komadima od READ_CHUNK_SIZE bajtova;
+# linije se režu direktno iz bytearray buffera (dekodiranje preko memoryview, jedan del po komadu, ne po liniji) i
+# predaju callbacku na niti reaktora. Budući da se i stderr prazni cijelo vrijeme, brbljavi extractor više ne može
+# napuniti pipe i zablokirati proces, a broj I/O niti ne ovisi o broju istovremenih preuzimanja.
+# Callbackovi dijele istu nit, pa moraju biti kratki (parsiranje linije + emit); blokiranje u callbacku koči sve procese.
+# Na Windowsu selectors ne podržava pipe-ove, pa tamo svaki stream dobiva svoju nit za čitanje (isto rezanje linija).
+import os
+import re
+import selectors
+import threading
+import logging
+from typing import Callable, List
+from .tracing import engine_profiler
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 64 * 1024
+_LINE_END = re.compile(rb"[\r\n]") # ffmpeg statistiku osvježava s \r
+_SELECTORS_SUPPORT_PIPES = os.name != "nt"
+
+class _LineSplitter:
+    __slots__ = ("buffer", "on_line")
+    def __init__(self, on_line: Callable | None):
+        self.buffer = bytearray(); self.on_line = on_line
+
+    def feed(self, chunk: bytes) -> int:
+        """Dodaje komad i javlja sve cijele linije u njemu; vraća broj javljenih linija."""
+        buffer = self.buffer; buffer += chunk
+        start = 0; dispatched = 0
+        with memoryview(buffer) as view: # View mora biti pušten prije del-a (bytearray se inače ne može skratiti)
+            for match in _LINE_END.finditer(buffer):
+                end = match.start()
+                if end > start: self._dispatch(view[start:end]); dispatched += 1
+                start = match.end()
+        if start: del buffer[:start]
+        return dispatched
+
+    def flush(self):
+        """EOF: zadnja linija bez završnog \\n."""
+        if self.buffer:
+            with memoryview(self.buffer) as view: self._dispatch(view)
+            self.buffer.clear()
+
+    def _dispatch(self, line_view):
+        if self.on_line is None: return # Stream se samo prazni
+        try: self.on_line(str(line_view, "utf-8", "replace"))
+        except Exception as e: logger.error(f"Greška u callbacku za liniju procesa: {e}", exc_info=True)
+
+class ProcessWatch:
+    """Praćenje jednog procesa u reaktoru. wait() čeka EOF na svim streamovima pa izlaz procesa."""
+    def __init__(self, process, stream_count: int, on_close: Callable | None):
+        self.process = process; self._on_close = on_close
+        self._open_streams = stream_count; self._lock = threading.Lock(); self._closed = threading.Event()
+        if stream_count == 0: self._finish()
+
+    def _stream_closed(self):
+        with self._lock:
+            self._open_streams -= 1
+            if self._open_streams > 0: return
+        self._finish()
+
+    def _finish(self):
+        self._closed.set()
+        if self._on_close:
+            try: self._on_close()
+            except Exception as e: logger.error(f"Greška u on_close callbacku procesa: {e}", exc_info=True)
+
+    @property
+    def streams_closed(self) -> bool:
+        return self._closed.is_set()
+
+    def wait(self, exit_timeout: float | None = None) -> int:
+        """Kao nekad iter(readline) + communicate(timeout): bez limita do EOF-a, pa exit_timeout za sam izlaz (TimeoutExpired)."""
+        self._closed.wait()
+        return self.process.wait(exit_timeout)
+
+class ProcessReactor:
+    def __init__(self, chunk_size: int = READ_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._pending: List[tuple] = [] # (stream, splitter, watch) za registraciju na niti reaktora
+        self._selector: selectors.BaseSelector | None = None
+        self._wakeup_r = self._wakeup_w = None
+        self._thread: threading.Thread | None = None
+        self._stopping = False
+        self.stats = {"reads": 0, "bytes": 0, "lines": 0}
+
+    def watch(self, process, on_stdout_line: Callable | None = None, on_stderr_line: Callable | None = None,
+              on_close: Callable | None = None) -> ProcessWatch:
+        """Preuzima stdout/stderr pipe-ove procesa (ono što je PIPE); callbackovi dobivaju linije bez \\r/\\n.
+        Stream bez callbacka se samo prazni. on_close se zove kad su svi streamovi na EOF-u."""
+        streams = [(stream, on_line) for stream, on_line in ((process.stdout, on_stdout_line), (process.stderr, on_stderr_line)) if stream is not None]
+        watch = ProcessWatch(process, len(streams), on_close)
+        for stream, on_line in streams:
+            splitter = _LineSplitter(on_line)
+            if not _SELECTORS_SUPPORT_PIPES:
+                threading.Thread(target=self._read_blocking, args=(stream, splitter, watch), name="ProcessPipeReader", daemon=True).start()
+                continue
+            os.set_blocking(stream.fileno(), False)
+            with self._lock:
+                self._ensure_started_locked(); self._pending.append((stream, splitter, watch))
+            self._wake()
+        return watch
+
+    def close(self):
+        with self._lock:
+            if self._thread is None: return
+            self._stopping = True
+        self._wake(); self._thread.join(timeout=2)
+        with self._lock: self._thread = None; self._stopping = False # Sljedeći watch() pokreće novu nit
+
+    # --- Nit reaktora ---
+    def _ensure_started_locked(self):
+        if self._thread is not None: return
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False); os.set_blocking(self._wakeup_w, False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+        self._thread = threading.Thread(target=self._run, name="ProcessReactor", daemon=True)
+        self._thread.start()
+
+    def _wake(self):
+        try: os.write(self._wakeup_w, b"\0")
+        except (BlockingIOError, TypeError): pass # Pipe je već pun buđenja / reaktor još ne postoji
+        except OSError as e: logger.debug(f"Reaktor: buđenje nije uspjelo: {e}")
+
+    def _run(self):
+        selector = self._selector
+        while True:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                stopping = self._stopping
+            for entry in pending: selector.register(entry[0].fileno(), selectors.EVENT_READ, entry)
+            if stopping: break
+            events = selector.select()
+            if engine_profiler.active: engine_profiler.run(self._handle_events, events) # Callbackovi linija su CPU reaktora
+            else: self._handle_events(events)
+        for key in list(selector.get_map().values()): # Gašenje: preostali streamovi se zatvaraju, wait() se ne zaglavljuje
+            if key.data is not None: self._close_stream(key)
+        selector.close(); os.close(self._wakeup_r); os.close(self._wakeup_w)
+        logger.debug("Reaktor procesa zaustavljen.")
+
+    def _handle_events(self, events):
+        for key, _events in events:
+            if key.data is None: self._drain_wakeup(); continue
+            self._read_ready(key)
+
+    def _drain_wakeup(self):
+        try:
+            while os.read(self._wakeup_r, 4096): pass
+        except BlockingIOError: pass
+
+    def _read_ready(self, key):
+        splitter = key.data[1]
+        try: chunk = os.read(key.fd, self.chunk_size)
+        except BlockingIOError: return
+        except OSError as e: logger.warning(f"Reaktor: greška pri čitanju pipe-a: {e}"); chunk = b""
+        if chunk:
+            self.stats["reads"] += 1; self.stats["bytes"] += len(chunk); self.stats["lines"] += splitter.feed(chunk)
+            return
+        self._close_stream(key)
+
+    def _close_stream(self, key):
+        stream, splitter, watch = key.data
+        self._selector.unregister(key.fd)
+        splitter.flush(); stream.close(); watch._stream_closed()
+
+    def _read_blocking(self, stream, splitter: _LineSplitter, watch: ProcessWatch):
+        try:
+            while True:
+                chunk = os.read(stream.fileno(), self.chunk_size)
+                if not chunk: break
+                splitter.feed(chunk)
+        except OSError as e: logger.warning(f"Greška pri čitanju pipe-a procesa: {e}")
+        finally:
+            splitter.flush(); stream.close(); watch._stream_closed()
+
+_reactor: ProcessReactor | None = None
+_reactor_lock = threading.Lock()
+
+def get_reactor() -> ProcessReactor:
+    """Zajednički reaktor za cijeli proces; nit se pokreće tek s prvim praćenim procesom."""
+    global _reactor
+    with _reactor_lock:
+        if _reactor is None: _reactor = ProcessReactor()
+        return _reactor
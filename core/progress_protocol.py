@@ -0,0 +1,99 @@
+# core/progress_protocol.py
+# Strojno čitljiv kanal između yt-dlp-a i engine-a umjesto parsiranja ljudskog ispisa regexima.
+# Progress ide kao JSON (--progress-template s %(progress)j, jedna linija po događaju zbog --newline),
+# a konačna putanja fajla stiže tek nakon premještanja/post-processinga (--print after_move:%(filepath)s).
+# Granice faza (za core.tracing) idu kao bbx-phase: linije: --print before_dl nakon izvlačenja i odabira formata, a
+# postprocess progress predložak na početku i kraju svakog post-processora (Merger, FFmpegExtractAudio, FFmpegMetadata...).
+# Kad se post-processing radi u zasebnom stupnju (core.postprocess_stage), yt-dlp još javlja sirove streamove, naslovnicu i
+# metapodatke s kodecima preuzetog formata (bbx-raw:, RAW_OUTPUT_ARGS), jer ih spaja i označava engine, a ne yt-dlp.
+# --print uključuje quiet način rada, pa --progress vraća progress linije; upozorenja i greške i dalje idu na stderr.
+import json
+from typing import List, Tuple
+
+PROGRESS_PREFIX = "bbx-progress:"
+FILEPATH_PREFIX = "bbx-file:"
+ARCHIVE_PREFIX = "bbx-archive:"
+PHASE_PREFIX = "bbx-phase:"
+RAW_PREFIX = "bbx-raw:"
+PROTOCOL_ARGS = ("--newline", "--progress",
+                 "--progress-template", f"download:{PROGRESS_PREFIX}%(progress)j",
+                 "--print", f"after_move:{FILEPATH_PREFIX}%(filepath)s",
+                 "--print", f"after_move:{ARCHIVE_PREFIX}%(extractor_key)s %(id)s", # Isti ID kakav yt-dlp piše u --download-archive
+                 "--print", f"before_dl:{PHASE_PREFIX}before_dl",
+                 "--progress-template", f"postprocess:{PHASE_PREFIX}pp_%(progress.status)s %(progress.postprocessor)s")
+
+LINE_PROGRESS = "progress"
+LINE_FILEPATH = "filepath"
+LINE_ARCHIVE = "archive"
+LINE_PHASE = "phase"
+LINE_RAW = "raw"
+RAW_OUTPUT_ARGS = ("--print", f"after_move:{RAW_PREFIX}streams %(requested_formats.:.filepath)j", # Nespojeni video + audio
+                   "--print", f"after_move:{RAW_PREFIX}thumbnail %(thumbnails.-1.filepath|)s",
+                   "--print", f"after_move:{RAW_PREFIX}meta %(.{{title,uploader,creator,artist,album,upload_date,webpage_url,duration,format_id,acodec,vcodec}})j")
+
+_raw_decode = json.JSONDecoder().raw_decode
+_PROGRESS_PREFIX_LEN = len(PROGRESS_PREFIX)
+_FILEPATH_PREFIX_LEN = len(FILEPATH_PREFIX)
+_ARCHIVE_PREFIX_LEN = len(ARCHIVE_PREFIX)
+_PHASE_PREFIX_LEN = len(PHASE_PREFIX)
+_RAW_PREFIX_LEN = len(RAW_PREFIX)
+
+def protocol_args() -> List[str]:
+    return list(PROTOCOL_ARGS)
+
+def parse_line(line: str) -> Tuple[str | None, object]:
+    """Vraća (LINE_PROGRESS, dict), (LINE_FILEPATH, putanja), (LINE_ARCHIVE, "extractor id"), (LINE_PHASE, "marker"),
+    (LINE_RAW, (ključ, vrijednost)) ili (None, None) za sve ostale linije.
+    Brzi put: samo startswith, bez regexa; JSON se dekodira bez kopiranja ostatka linije."""
+    if line.startswith(PROGRESS_PREFIX):
+        try: payload, _ = _raw_decode(line, _PROGRESS_PREFIX_LEN)
+        except ValueError: return None, None
+        return (LINE_PROGRESS, payload) if isinstance(payload, dict) else (None, None)
+    if line.startswith(FILEPATH_PREFIX):
+        path = line[_FILEPATH_PREFIX_LEN:].strip()
+        return (LINE_FILEPATH, path) if path else (None, None)
+    if line.startswith(ARCHIVE_PREFIX):
+        extractor, _, video_id = line[_ARCHIVE_PREFIX_LEN:].strip().partition(" ")
+        return (LINE_ARCHIVE, f"{extractor.lower()} {video_id}") if extractor and video_id else (None, None)
+    if line.startswith(PHASE_PREFIX):
+        marker = line[_PHASE_PREFIX_LEN:].strip()
+        return (LINE_PHASE, marker) if marker else (None, None)
+    if line.startswith(RAW_PREFIX):
+        key, _, value = line[_RAW_PREFIX_LEN:].partition(" ")
+        if key == "thumbnail": return LINE_RAW, (key, value.strip() or None)
+        try: return LINE_RAW, (key, json.loads(value))
+        except ValueError: return None, None
+    return None, None
+
+def format_bytes(num_bytes) -> str:
+    if num_bytes is None: return ""
+    value = float(num_bytes)
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if value < 1024.0: return f"{value:.1f}{unit}" if unit != "B" else f"{int(value)}B"
+        value /= 1024.0
+    return f"{value:.2f}TiB"
+
+def format_eta(seconds) -> str:
+    if seconds is None: return ""
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    return f"{hours}:{rest // 60:02d}:{rest % 60:02d}" if hours else f"{rest // 60:02d}:{rest % 60:02d}"
+
+def apply_progress(task, payload: dict):
+    """Upisuje progress događaj u task. Bajtovi se zbrajaju preko više fajlova istog taska (npr. video + audio prije spajanja),
+    a postotak prati trenutni fajl kao i yt-dlp-ov vlastiti ispis."""
+    downloaded = payload.get("downloaded_bytes") or 0
+    total = payload.get("total_bytes") or payload.get("total_bytes_estimate")
+    if payload.get("status") == "finished":
+        task.completed_bytes += total or downloaded
+        task.downloaded_bytes = task.completed_bytes; task.total_bytes = task.completed_bytes
+        task.progress_val = 100.0; task.progress_str = "100.0%"; task.speed_str = ""; task.eta_str = ""
+        return
+    task.downloaded_bytes = task.completed_bytes + downloaded
+    task.total_bytes = task.completed_bytes + total if total else None
+    if total: task.progress_val = min(100.0, downloaded * 100.0 / total)
+    elif payload.get("fragment_count"): task.progress_val = min(100.0, (payload.get("fragment_index") or 0) * 100.0 / payload["fragment_count"])
+    task.progress_str = f"{task.progress_val:.1f}%"
+    speed = payload.get("speed")
+    task.speed_str = f"{format_bytes(speed)}/s" if speed else ""
+    task.eta_str = format_eta(payload.get("eta"))
@@ -0,0 +1,151 @@
+# core/queue_model.py
+# Model reda čekanja za QueueView, neovisan o Tk-u. Svi taskovi (i parent redovi playlisti) žive ovdje, a Treeview
+# drži samo redove koji su trenutno na ekranu (gui.views.queue_view). Za svaki red model pamti zadnje izračunate
+# vrijednosti kolona i one koje su stvarno u widgetu, pa se po frameu u Treeview šalju samo promijenjene kolone
+# vidljivih redova. Djeca playliste su ispod parenta i u ravnom poretku se pojavljuju samo kad je parent otvoren.
+import os
+from typing import Dict, Iterable, List, Tuple
+
+COLUMNS = ("filename", "quality", "status", "progress", "speed_eta") # Indeks 0 u vrijednostima reda je tekst "#0" kolone
+_MAX_NAME_LEN = 60
+GROUP_OPEN_MARK = "▾"; GROUP_CLOSED_MARK = "▸"; CHILD_PREFIX = "↳ "
+TAG_UNCHANGED = object()
+
+def display_name(task) -> str:
+    name = os.path.basename(task.final_filename) if task.final_filename else (task.title or task.url)
+    if len(name) > _MAX_NAME_LEN: name = name[:28] + "..." + name[len(name) - 29:] # Skrati sredinu
+    return name
+
+def speed_eta_text(task) -> str:
+    if task.is_group: return task.speed_str # Zbirno: "završeno/ukupno"
+    if task.status == "Preuzimanje..." and not task.speed_str and not task.eta_str and task.progress_val < 1: return "Pokrećem..."
+    return f"{task.speed_str} / {task.eta_str}" if task.speed_str or task.eta_str else "-"
+
+def row_tag(task) -> str | None:
+    if task.status == "Završeno": return "COMPLETED"
+    if "Greška" in task.status or task.status.startswith("Otkazano"): return "ERROR"
+    if task.status in ("Preuzimanje...", "Obrada..."): return "DOWNLOADING"
+    if task.status in ("U redu", "Čeka", "Proširivanje...", "Čeka obradu"): return "WAITING"
+    return None
+
+class QueueRow:
+    __slots__ = ("item_id", "task", "parent_id", "children", "values", "tag", "rendered", "rendered_tag")
+    def __init__(self, item_id: str, task, parent_id: str | None):
+        self.item_id = item_id; self.task = task; self.parent_id = parent_id; self.children: List[str] = []
+        self.values: Tuple[str, ...] = (); self.tag = None
+        self.rendered: Tuple[str, ...] | None = None; self.rendered_tag = None # None = red trenutno nije u widgetu
+
+class QueueModel:
+    def __init__(self):
+        self._rows: Dict[str, QueueRow] = {}
+        self._top_level: List[str] = [] # Redoslijed dodavanja
+        self._expanded: set = set()
+        self._flat: List[str] | None = None # Ravni poredak vidljivih redova; gradi se ponovo samo kad se struktura promijeni
+        self._dirty: set = set() # Redovi u widgetu čije se vrijednosti razlikuju od iscrtanih
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, item_id) -> bool:
+        return str(item_id) in self._rows
+
+    def get_task(self, item_id: str):
+        row = self._rows.get(item_id)
+        return row.task if row else None
+
+    def tasks(self) -> Iterable:
+        return (row.task for row in self._rows.values())
+
+    def children_of(self, item_id: str) -> List[str]:
+        row = self._rows.get(item_id)
+        return list(row.children) if row else []
+
+    def is_rendered(self, item_id: str) -> bool:
+        row = self._rows.get(item_id)
+        return bool(row and row.rendered is not None)
+
+    # --- Promjene ---
+    def upsert(self, task) -> bool:
+        """Dodaje ili osvježava red; vraća True ako se prikaz reda promijenio."""
+        item_id = str(task.item_id); row = self._rows.get(item_id)
+        if row is None:
+            parent_id = task.parent_id if task.parent_id and task.parent_id in self._rows else None
+            row = self._rows[item_id] = QueueRow(item_id, task, parent_id)
+            if parent_id is None: self._top_level.append(item_id); self._flat = None
+            else:
+                parent = self._rows[parent_id]; parent.children.append(item_id)
+                if parent_id in self._expanded: self._flat = None
+                if len(parent.children) == 1: self._refresh(parent) # Parent dobiva strelicu za otvaranje
+        row.task = task
+        return self._refresh(row)
+
+    def remove_many(self, item_ids: Iterable[str]) -> List[str]:
+        """Uklanja redove (parent playliste zajedno s djecom) u jednom prolazu kroz poredak; vraća uklonjene id-eve."""
+        doomed = set()
+        for item_id in item_ids:
+            row = self._rows.get(item_id)
+            if row is None: continue
+            doomed.add(item_id); doomed.update(row.children)
+        if not doomed: return []
+        for item_id in doomed:
+            row = self._rows.pop(item_id, None)
+            if row and row.parent_id and row.parent_id not in doomed and row.parent_id in self._rows:
+                self._rows[row.parent_id].children.remove(item_id)
+            self._dirty.discard(item_id); self._expanded.discard(item_id)
+        self._top_level = [item_id for item_id in self._top_level if item_id not in doomed]
+        self._flat = None
+        return list(doomed)
+
+    def toggle_expanded(self, item_id: str) -> bool:
+        row = self._rows.get(item_id)
+        if row is None or not row.children: return False
+        if item_id in self._expanded: self._expanded.discard(item_id)
+        else: self._expanded.add(item_id)
+        self._flat = None; self._refresh(row)
+        return True
+
+    def _refresh(self, row: QueueRow) -> bool:
+        task = row.task
+        if row.children: mark = GROUP_OPEN_MARK if row.item_id in self._expanded else GROUP_CLOSED_MARK
+        else: mark = ""
+        name = CHILD_PREFIX + display_name(task) if row.parent_id else display_name(task)
+        values = (mark, name, task.quality_profile_key, task.status, task.progress_str, speed_eta_text(task))
+        tag = row_tag(task)
+        if values == row.values and tag == row.tag: return False
+        row.values = values; row.tag = tag
+        if row.rendered is not None: self._dirty.add(row.item_id)
+        return True
+
+    # --- Prikaz ---
+    def flat_ids(self) -> List[str]:
+        if self._flat is None:
+            flat = []
+            for item_id in self._top_level:
+                flat.append(item_id)
+                if item_id in self._expanded: flat.extend(self._rows[item_id].children)
+            self._flat = flat
+        return self._flat
+
+    def mark_rendered(self, item_id: str) -> QueueRow:
+        """Red upravo ubačen u widget s trenutnim vrijednostima."""
+        row = self._rows[item_id]
+        row.rendered = row.values; row.rendered_tag = row.tag; self._dirty.discard(item_id)
+        return row
+
+    def mark_unrendered(self, item_id: str):
+        row = self._rows.get(item_id)
+        if row: row.rendered = None; row.rendered_tag = None
+        self._dirty.discard(item_id)
+
+    def take_changes(self) -> List[Tuple[str, Dict[int, str], object]]:
+        """(item_id, {indeks vrijednosti: nova vrijednost}, novi tag ili TAG_UNCHANGED) za redove u widgetu."""
+        changes = []
+        for item_id in self._dirty:
+            row = self._rows.get(item_id)
+            if row is None or row.rendered is None: continue
+            changed = {index: value for index, (old, value) in enumerate(zip(row.rendered, row.values)) if old != value}
+            tag = row.tag if row.tag != row.rendered_tag else TAG_UNCHANGED
+            if changed or tag is not TAG_UNCHANGED: changes.append((item_id, changed, tag))
+            row.rendered = row.values; row.rendered_tag = row.tag
+        self._dirty.clear()
+        return changes
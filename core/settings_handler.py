@@ -1,18 +1,26 @@
 # core/settings_handler.py
+# Postavke žive u jednom SettingsStore-u po procesu: disk se čita jednom, load_settings() vraća kopiju iz memorije,
+# save_settings() odmah obavještava pretplatnike, a upis na disk je odgođen (debounce) i atomaran (temp fajl + os.replace).
+import atexit
 import json
 import os
 import logging
+import tempfile
+import threading
 
 logger = logging.getLogger(__name__)
 
 CONFIG_DIR = os.path.join(os.path.expanduser("~"), ".blackbox_dhq_phoenix_v3")
 APP_SETTINGS_FILE = os.path.join(CONFIG_DIR, "app_settings.json")
+SETTINGS_WRITE_DEBOUNCE_S = 0.5 # Više spremanja zaredom (npr. geometrija, slajderi) -> jedan upis
 
 DEFAULT_QUALITY_PROFILES_KEYS_PLACEHOLDER = [
      "Video - 1080p MP4", "Video - 720p MP4", "Video - Najbolji MP4", 
-     "Audio - Najbolji MP3", "Audio - Najbolji M4A/AAC", "Općenito - Najbolje Moguće"
+     "Audio - Najbolji MP3", "Audio - MP3 ili izvorni AAC/Opus", "Audio - Najbolji M4A/AAC", "Općenito - Najbolje Moguće"
 ]
 
+SUPPORTED_DOWNLOAD_ENGINES = ("threading", "asyncio") # core.downloader_engine, core.async_engine
+
 DEFAULT_SETTINGS = {
     "output_directory": os.path.join(os.path.expanduser("~"), "Desktop", "BlackBox_Phoenix_Downloads"),
     "default_quality": "Video - 1080p MP4",
@@ -22,10 +30,45 @@ DEFAULT_SETTINGS = {
     "ask_open_folder": True,
     "auto_paste_clipboard": False,
     "max_concurrent_downloads": 1,
+    "host_max_concurrent_default": 0, # Najviše istovremenih preuzimanja s istog hosta (0 = bez ograničenja), core.host_limits
+    # [domene koje dijele brojač, limit]; prvo pravilo koje odgovara hostu vrijedi. Uspoređuje se host URL-a koji korisnik
+    # doda (stranica videa), ne CDN s kojeg yt-dlp stvarno preuzima. Vrijedi i za stavke playliste (playlist_fanout).
+    "host_concurrency_rules": [
+        [["youtube.com", "youtu.be", "youtube-nocookie.com"], 2],
+        [["vimeo.com"], 2],
+        [["soundcloud.com"], 2],
+        [["twitch.tv"], 2],
+    ],
+    "download_tuning": { # "default" + opcionalno unos po ključu profila koji ga nadjačava (core.download_tuning)
+        "default": {"concurrent_fragments": 4, "http_chunk_size": "10M",
+                    "external_downloader": {}, # npr. {"http": "aria2c"} ili {"default": "aria2c", "m3u8": "native"}
+                    "external_downloader_args": {"aria2c": "-x 8 -s 8 -k 1M"}},
+    },
+    "bandwidth_limit_kib": 0, # Ukupni budžet brzine za sva preuzimanja u KiB/s (0 = bez ograničenja); započeti taskovi zadržavaju udio, novi čekaju slobodan budžet
+    "download_engine": "threading", # "threading" (core.downloader_engine) ili "asyncio" (core.async_engine: bez cachea, limita po hostu i obrade)
+    "download_backend": "subprocess", # "subprocess" (yt-dlp proces po tasku) ili "worker_pool" (core.ytdlp_worker_pool)
+    "worker_pool_max_jobs": 25, # Poslova po workeru prije recikliranja procesa
+    "extraction_cache_enabled": True, # info-JSON po URL-u (core.extraction_cache), ponovna preuzimanja preskaču izvlačenje
+    "extraction_cache_ttl_hours": 3,
+    "extraction_cache_max_mb": 200,
+    "playlist_fanout": True, # Playlista/kanal -> zaseban task po stavci pod parent redom (core.playlist_expander)
+    "download_archive_enabled": True, # Preskoči već preuzete (URL, profil) parove (core.download_archive, yt-dlp --download-archive)
+    "resume_unfinished_on_start": True, # Vrati nezavršene taskove iz dnevnika (task_journal.sqlite3) pri pokretanju
     "prefer_hw_acceleration": False,
     "embed_thumbnail_audio": True,
     "add_metadata_video": True,
     "sidebar_width": 240,
+    "log_buffer_lines": 5000, # Kapacitet log panea (ring buffer, core.log_buffer); starije linije ispadaju
+    "gui_refresh_hz": 10, # Koliko puta u sekundi GUI preuzima skupljene događaje iz engine-a
+    "metrics_port": 0, # Prometheus endpoint na 127.0.0.1:<port>/metrics (core.metrics); 0 = isključeno
+    "metrics_snapshot_file": "", # Periodični JSON snapshot metrika (putanja); prazno = isključeno
+    "metrics_snapshot_interval_s": 15,
+    "postprocess_stage_enabled": True, # Spajanje/pretvorba/oznake u zasebnom ffmpeg stupnju, slot se oslobađa odmah nakon preuzimanja
+    "postprocess_workers": 0, # Niti stupnja obrade; 0 = broj CPU jezgri
+    "stream_copy_first": True, # Bez ponovnog kodiranja kad profil prihvaća izvorni kodek (core.format_planner)
+    "trace_file": "", # Chrome trace-event JSON sa spanovima faza preuzimanja, zapisuje se pri izlasku (core.tracing); prazno = isključeno
+    "profile_cpu_file": "", # cProfile engine-a (pstats) pri izlasku; prazno = isključeno
+    "profile_memory_file": "", # tracemalloc top alokacija (tekst) pri izlasku; prazno = isključeno
 }
 
 def _ensure_output_dir_exists(output_dir_path, settings_ref_to_update_on_fallback):
@@ -49,52 +92,131 @@ def _ensure_output_dir_exists(output_dir_path, settings_ref_to_update_on_fallbac
             except OSError as e_fallback_mkdir:
                 logger.critical(f"Nije moguće kreirati ni fallback direktorij '{fallback_dir}': {e_fallback_mkdir}")
 
-def load_settings():
-    os.makedirs(CONFIG_DIR, exist_ok=True)
-    current_settings = DEFAULT_SETTINGS.copy()
-
-    if not os.path.exists(APP_SETTINGS_FILE):
-        logger.info(f"Fajl s postavkama ne postoji ({APP_SETTINGS_FILE}). Kreiram s defaultnim vrijednostima.")
-        _ensure_output_dir_exists(current_settings["output_directory"], current_settings)
-        _save_settings(current_settings)
-        return current_settings
-    
-    try:
-        with open(APP_SETTINGS_FILE, "r", encoding='utf-8') as f:
-            loaded_settings = json.load(f)
-        
-        settings_changed_during_load = False
-        for key, default_value in DEFAULT_SETTINGS.items():
-            if key not in loaded_settings:
-                loaded_settings[key] = default_value
-                settings_changed_during_load = True
-        
-        current_settings = loaded_settings
-        _ensure_output_dir_exists(current_settings["output_directory"], current_settings)
-
-        if settings_changed_during_load :
-             _save_settings(current_settings)
-        return current_settings
-    except (json.JSONDecodeError, IOError, TypeError) as e:
-        logger.error(f"Greška pri čitanju postavki ({APP_SETTINGS_FILE}): {e}. Vraćam na defaultne i spremam.")
+class SettingsStore:
+    """Postavke procesa u memoriji. Čitanja ne diraju disk; pisanja su odgođena za debounce_s i atomarna."""
+    def __init__(self, settings_file: str = APP_SETTINGS_FILE, debounce_s: float = SETTINGS_WRITE_DEBOUNCE_S):
+        self.settings_file = settings_file; self.debounce_s = debounce_s
+        self._lock = threading.RLock()
+        self._settings: dict | None = None
+        self._listeners = [] # Obavještavaju se nakon svakog save() (npr. Downloader za promjenu broja slotova)
+        self._write_timer: threading.Timer | None = None; self._write_pending = False
+        self.stats = {"disk_reads": 0, "disk_writes": 0}
+
+    def get(self) -> dict:
+        """Plitka kopija trenutnih postavki (pozivatelji je smiju mijenjati prije save())."""
+        with self._lock: return dict(self._loaded_locked())
+
+    def get_value(self, key, default=None):
+        with self._lock: return self._loaded_locked().get(key, default)
+
+    def save(self, settings_data: dict):
+        if "output_directory" in settings_data:
+            settings_data["output_directory"] = os.path.abspath(settings_data["output_directory"])
+            _ensure_output_dir_exists(settings_data["output_directory"], settings_data)
+        with self._lock:
+            self._settings = dict(settings_data); self._schedule_write_locked()
+        self._notify(settings_data)
+
+    def flush(self):
+        """Odmah upisuje odgođene promjene (gašenje aplikacije, atexit)."""
+        with self._lock:
+            if self._write_timer is not None: self._write_timer.cancel(); self._write_timer = None
+            if not self._write_pending or self._settings is None: return
+            self._write_pending = False
+            self._write_atomic(json.dumps(self._settings, indent=4, ensure_ascii=False))
+
+    def add_listener(self, callback):
+        with self._lock:
+            if callback not in self._listeners: self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._lock:
+            if callback in self._listeners: self._listeners.remove(callback)
+
+    def _notify(self, settings_data: dict):
+        with self._lock: listeners = list(self._listeners)
+        for callback in listeners:
+            try: callback(settings_data)
+            except Exception as e: logger.error(f"Greška u listeneru postavki {callback}: {e}", exc_info=True)
+
+    def _loaded_locked(self) -> dict:
+        if self._settings is None: self._settings = self._load_from_disk_locked()
+        return self._settings
+
+    def _load_from_disk_locked(self) -> dict:
+        self.stats["disk_reads"] += 1
         current_settings = DEFAULT_SETTINGS.copy()
-        _ensure_output_dir_exists(current_settings["output_directory"], current_settings)
-        _save_settings(current_settings)
-        return current_settings
+        if not os.path.exists(self.settings_file):
+            logger.info(f"Fajl s postavkama ne postoji ({self.settings_file}). Kreiram s defaultnim vrijednostima.")
+            _ensure_output_dir_exists(current_settings["output_directory"], current_settings)
+            self._settings = current_settings; self._schedule_write_locked()
+            return current_settings
+        try:
+            with open(self.settings_file, "r", encoding='utf-8') as f:
+                loaded_settings = json.load(f)
+            missing_keys = [key for key in DEFAULT_SETTINGS if key not in loaded_settings]
+            for key in missing_keys: loaded_settings[key] = DEFAULT_SETTINGS[key]
+            _ensure_output_dir_exists(loaded_settings["output_directory"], loaded_settings)
+            self._settings = loaded_settings
+            if missing_keys: self._schedule_write_locked()
+            return loaded_settings
+        except (json.JSONDecodeError, IOError, TypeError, AttributeError) as e:
+            logger.error(f"Greška pri čitanju postavki ({self.settings_file}): {e}. Vraćam na defaultne i spremam.")
+            _ensure_output_dir_exists(current_settings["output_directory"], current_settings)
+            self._settings = current_settings; self._schedule_write_locked()
+            return current_settings
+
+    def _schedule_write_locked(self):
+        self._write_pending = True
+        if self._write_timer is not None: self._write_timer.cancel()
+        if self.debounce_s <= 0: self._write_timer = None; self.flush(); return
+        self._write_timer = threading.Timer(self.debounce_s, self.flush); self._write_timer.daemon = True
+        self._write_timer.start()
+
+    def _write_atomic(self, text: str):
+        # Novi sadržaj ide u temp fajl u istom direktoriju pa os.replace: nakon pada ostaje ili stari ili novi JSON, nikad prepolovljen
+        settings_dir = os.path.dirname(self.settings_file) or "."; tmp_path = None
+        try:
+            os.makedirs(settings_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix=".app_settings.", suffix=".tmp", dir=settings_dir)
+            with os.fdopen(fd, "w", encoding='utf-8') as f:
+                f.write(text); f.flush(); os.fsync(f.fileno())
+            os.replace(tmp_path, self.settings_file); tmp_path = None
+            self.stats["disk_writes"] += 1
+            logger.info(f"Postavke spremljene u {self.settings_file}")
+        except OSError as e:
+            logger.error(f"Greška: Nije moguće sačuvati postavke u {self.settings_file}: {e}")
+        finally:
+            if tmp_path is not None:
+                try: os.unlink(tmp_path)
+                except OSError: pass
+
+settings_store = SettingsStore()
+atexit.register(settings_store.flush)
+
+def download_engine_error(settings_data: dict) -> str | None:
+    """Poruka za korisnika ako postavke traže engine koji aplikacija ne podržava, inače None."""
+    engine_name = settings_data.get("download_engine", "threading")
+    if engine_name in SUPPORTED_DOWNLOAD_ENGINES: return None
+    return f"download_engine={engine_name!r} nije podržan (podržano: {', '.join(SUPPORTED_DOWNLOAD_ENGINES)})."
+
+def load_settings():
+    return settings_store.get()
+
+def get_setting(key, default=None):
+    """Jedna vrijednost bez kopiranja cijelog rječnika."""
+    return settings_store.get_value(key, default)
 
 def save_settings(settings_data):
-    if "output_directory" in settings_data:
-        settings_data["output_directory"] = os.path.abspath(settings_data["output_directory"])
-        _ensure_output_dir_exists(settings_data["output_directory"], settings_data)
-    _save_settings(settings_data)
-
-def _save_settings(settings_data_to_save):
-    os.makedirs(CONFIG_DIR, exist_ok=True)
-    try:
-        with open(APP_SETTINGS_FILE, "w", encoding='utf-8') as f:
-            json.dump(settings_data_to_save, f, indent=4, ensure_ascii=False)
-        logger.info(f"Postavke spremljene u {APP_SETTINGS_FILE}")
-    except IOError as e:
-        logger.error(f"Greška: Nije moguće sačuvati postavke u {APP_SETTINGS_FILE}: {e}")
-
-initial_settings = load_settings()
\ No newline at end of file
+    settings_store.save(settings_data)
+
+def flush_settings():
+    settings_store.flush()
+
+def add_settings_listener(callback):
+    settings_store.add_listener(callback)
+
+def remove_settings_listener(callback):
+    settings_store.remove_listener(callback)
+
+initial_settings = load_settings()
@@ -0,0 +1,140 @@
+# core/task_journal.py
+# Trajni dnevnik zadataka (SQLite u WAL modu pod CONFIG_DIR) da red i nezavršena preuzimanja prežive rušenje ili gašenje.
+# Zapisi se skupljaju u memoriji (zadnje stanje po tasku) i pišu u jednoj transakciji svakih flush_interval sekundi,
+# pa progress linije ne postaju fsync po liniji. Prijelazi u završno stanje bude writer odmah.
+import os
+import sqlite3
+import threading
+import time
+import logging
+from typing import Dict, List
+from .settings_handler import CONFIG_DIR
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_FILE = os.path.join(CONFIG_DIR, "task_journal.sqlite3")
+FINISHED_STATUSES = ("Završeno", "Greška", "Kritična Greška", "Greška Programa")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    item_id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    quality_profile_key TEXT NOT NULL,
+    output_dir TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress_val REAL NOT NULL DEFAULT 0,
+    final_filename TEXT,
+    error_message TEXT,
+    added_time REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    finished INTEGER NOT NULL DEFAULT 0
+)
+"""
+_UPSERT = ("INSERT OR REPLACE INTO tasks (item_id, url, quality_profile_key, output_dir, status, progress_val, "
+           "final_filename, error_message, added_time, updated_at, finished) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+
+def is_finished_status(status: str) -> bool:
+    return status in FINISHED_STATUSES or status.startswith(("Otkazano", "Završeno", "Preskočeno"))
+
+class TaskJournal:
+    def __init__(self, path: str = JOURNAL_FILE, flush_interval: float = 1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL") # U WAL modu dovoljno za konzistentnost nakon rušenja
+        self._conn.execute(_SCHEMA)
+        self._db_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending_rows: Dict[str, tuple] = {}
+        self._pending_deletes: set = set()
+        self._wake_event = threading.Event() # Ima nečega za pisanje
+        self._urgent_event = threading.Event() # Piši bez čekanja punog intervala
+        self._stop_event = threading.Event()
+        self._frozen = False
+        self._writer_lock = threading.Lock() # Provjera i pokretanje writera su jedan korak (record dolazi s više niti)
+        self._writer_thread: threading.Thread | None = None
+
+    def record(self, task):
+        """Bilježi zadnje stanje taska. Ne piše odmah na disk, osim što završna stanja bude writer."""
+        if self._frozen: return
+        finished = is_finished_status(task.status)
+        row = (task.item_id, task.url, task.quality_profile_key, task.output_dir, task.status, float(task.progress_val or 0.0),
+               task.final_filename, task.error_message, task.added_time, time.time(), 1 if finished else 0)
+        with self._pending_lock:
+            was_idle = not self._pending_rows and not self._pending_deletes
+            self._pending_rows[task.item_id] = row
+            self._pending_deletes.discard(task.item_id)
+        self._ensure_writer()
+        if finished or task.status == "U redu": self._urgent_event.set(); self._wake_event.set()
+        elif was_idle: self._wake_event.set()
+
+    def delete(self, item_id: str):
+        if self._frozen: return
+        with self._pending_lock:
+            self._pending_rows.pop(item_id, None)
+            self._pending_deletes.add(item_id)
+        self._ensure_writer(); self._urgent_event.set(); self._wake_event.set()
+
+    def load_unfinished(self) -> List[dict]:
+        self.flush()
+        with self._db_lock:
+            cursor = self._conn.execute("SELECT item_id, url, quality_profile_key, output_dir, status, progress_val, added_time "
+                                        "FROM tasks WHERE finished = 0 ORDER BY added_time")
+            columns = [col[0] for col in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def purge_finished(self) -> int:
+        self.flush()
+        with self._db_lock:
+            return self._conn.execute("DELETE FROM tasks WHERE finished = 1").rowcount
+
+    def flush(self):
+        with self._pending_lock:
+            rows = list(self._pending_rows.values()); deletes = list(self._pending_deletes)
+            self._pending_rows.clear(); self._pending_deletes.clear()
+        if not rows and not deletes: return
+        with self._db_lock:
+            try:
+                self._conn.execute("BEGIN")
+                if rows: self._conn.executemany(_UPSERT, rows)
+                if deletes: self._conn.executemany("DELETE FROM tasks WHERE item_id = ?", [(item_id,) for item_id in deletes])
+                self._conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                logger.error(f"Greška pri pisanju u dnevnik zadataka ({self.path}): {e}")
+                try: self._conn.execute("ROLLBACK")
+                except sqlite3.Error: pass
+
+    def freeze(self):
+        """Zapisuje sve na disk i dalje ignorira promjene (koristi se pri gašenju, da otkazivanje
+        preuzimanja zbog izlaska iz aplikacije ne označi taskove kao završene)."""
+        self.flush(); self._frozen = True
+
+    def close(self):
+        with self._writer_lock: self._stop_event.set() # Nakon ovoga _ensure_writer više ne pokreće nit
+        self._urgent_event.set(); self._wake_event.set()
+        if self._writer_thread and self._writer_thread.is_alive(): self._writer_thread.join(timeout=2)
+        self.flush(); self._frozen = True
+        with self._db_lock:
+            try: self._conn.close()
+            except sqlite3.Error as e: logger.error(f"Greška pri zatvaranju dnevnika zadataka: {e}")
+
+    def _ensure_writer(self):
+        with self._writer_lock: self._ensure_writer_locked()
+
+    def _ensure_writer_locked(self):
+        if self._stop_event.is_set() or (self._writer_thread is not None and self._writer_thread.is_alive()): return
+        self._writer_thread = threading.Thread(target=self._writer_loop, name="TaskJournalWriter", daemon=True)
+        self._writer_thread.start()
+
+    def _writer_loop(self):
+        # Bez ičega za pisanje nit spava; inače skuplja promjene najviše flush_interval sekundi
+        while not self._stop_event.is_set():
+            self._wake_event.wait()
+            self._wake_event.clear()
+            if self._stop_event.is_set(): break
+            if self._urgent_event.wait(self.flush_interval) and not self._stop_event.is_set():
+                self._stop_event.wait(0.05) # Kratki prozor da masovna dodavanja idu u istu transakciju
+            self._urgent_event.clear()
+            self.flush()
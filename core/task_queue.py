@@ -0,0 +1,159 @@
+# core/task_queue.py
+# Red zadataka s indeksom po item_id: heap (prioritet, redni broj) po podredu + mapa item_id -> unos.
+# Podred je grupa taskova s istim ključem (group_of, npr. host): pop_first_ready preskače cijele grupe koje trenutno
+# ne mogu dobiti slot (zasićeni host) bez vađenja i vraćanja njihovih unosa, pa je dohvat O(broj grupa + log n).
+# Otkazivanje je O(1) (unos se samo označi kao uklonjen), promjena prioriteta i "na vrh" su O(log n),
+# a obrisani unosi se čiste lijeno pri dohvaćanju ili kompaktiranjem kad ih se nakupi previše.
+import heapq
+import itertools
+import queue
+import threading
+from typing import Callable, Dict, Iterable, List
+
+DEFAULT_PRIORITY = 0 # Manji broj = ranije preuzimanje
+_REMOVED = object()
+_COMPACT_MIN_SIZE = 64
+
+class IndexedTaskQueue:
+    def __init__(self, group_of: Callable | None = None):
+        self._group_of = group_of # task -> ključ podreda; None = svi taskovi u jednom podredu
+        self._groups: Dict[object, list] = {} # Ključ -> heap unosa [priority, seq, push_id, item_id, group, task]; task može postati _REMOVED
+        self._entries: Dict[str, list] = {}
+        self._group_sizes: Dict[object, int] = {} # Ključ -> broj živih unosa (bez uklonjenih)
+        self._stale = 0 # Uklonjeni unosi koji su još u heapovima
+        self._seq = itertools.count()
+        self._front_seq = itertools.count(-1, -1) # Negativni redni brojevi za "na vrh" unutar istog prioriteta
+        self._push_ids = itertools.count() # Jedinstven po unosu: usporedba unosa nikad ne dolazi do taska
+        self._lock = threading.RLock()
+
+    def put(self, task, priority: int = DEFAULT_PRIORITY):
+        with self._lock:
+            if task.item_id in self._entries:
+                self._invalidate(task.item_id)
+            self._push(task, priority, next(self._seq))
+
+    def get_nowait(self):
+        with self._lock:
+            task = self.pop_first_ready()
+            if task is None: raise queue.Empty
+            return task
+
+    def pop_first_ready(self, group_ready: Callable | None = None) -> object | None:
+        """Vraća (i uklanja) prvi task po redoslijedu iz podreda za koji group_ready(ključ) vrijedi, ili None.
+        Taskovi ostalih podreda ostaju netaknuti."""
+        with self._lock:
+            best = None
+            for group, heap in list(self._groups.items()):
+                head = self._head(group, heap)
+                if head is None or (group_ready is not None and not group_ready(group)): continue
+                if best is None or head < best: best = head
+            if best is None: return None
+            heap = self._groups[best[4]]; heapq.heappop(heap)
+            if not heap: del self._groups[best[4]]
+            del self._entries[best[3]]; self._count_removed(best[4])
+            return best[-1]
+
+    def peek(self):
+        with self._lock:
+            head = self._first_head()
+            return head[-1] if head else None
+
+    def remove(self, item_id: str):
+        """Uklanja task iz reda u O(1). Vraća uklonjeni task ili None ako ga nije bilo."""
+        with self._lock:
+            return self._invalidate(item_id)
+
+    def remove_many(self, item_ids: Iterable[str]) -> List:
+        with self._lock:
+            removed = [task for task in (self._invalidate(item_id) for item_id in item_ids) if task is not None]
+            return removed
+
+    def reprioritize(self, item_id: str, priority: int) -> bool:
+        with self._lock:
+            entry = self._entries.get(item_id)
+            if entry is None: return False
+            task, seq = entry[-1], entry[1]
+            self._invalidate(item_id)
+            self._push(task, priority, seq) # Zadrži redni broj da FIFO unutar prioriteta ostane isti
+            return True
+
+    def move_to_front(self, item_id: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(item_id)
+            if entry is None: return False
+            task = entry[-1]
+            self._invalidate(item_id)
+            head = self._first_head()
+            front_priority = min(entry[0], head[0]) if head else entry[0]
+            self._push(task, front_priority, next(self._front_seq))
+            return True
+
+    def drain(self) -> List:
+        """Prazni red i vraća sve taskove redom kojim bi se preuzimali."""
+        with self._lock:
+            drained = [entry[-1] for entry in sorted(self._entries.values())]
+            self._groups.clear(); self._entries.clear(); self._group_sizes.clear(); self._stale = 0
+            return drained
+
+    def ordered_tasks(self) -> List:
+        with self._lock:
+            return [entry[-1] for entry in sorted(self._entries.values())]
+
+    def priority_of(self, item_id: str) -> int | None:
+        with self._lock:
+            entry = self._entries.get(item_id)
+            return entry[0] if entry is not None else None
+
+    def group_sizes(self) -> Dict[object, int]:
+        """Broj taskova po podredu, redom kojim su podredovi nastali."""
+        with self._lock:
+            return dict(self._group_sizes)
+
+    def qsize(self) -> int:
+        return len(self._entries)
+
+    def empty(self) -> bool:
+        return not self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._entries
+
+    # --- Interno (pozivati pod self._lock) ---
+    def _push(self, task, priority: int, seq: int):
+        group = self._group_of(task) if self._group_of else None
+        entry = [priority, seq, next(self._push_ids), task.item_id, group, task]
+        self._entries[task.item_id] = entry; self._group_sizes[group] = self._group_sizes.get(group, 0) + 1
+        heapq.heappush(self._groups.setdefault(group, []), entry)
+
+    def _invalidate(self, item_id: str):
+        entry = self._entries.pop(item_id, None)
+        if entry is None: return None
+        task = entry[-1]; entry[-1] = _REMOVED; self._stale += 1; self._count_removed(entry[4])
+        if self._stale > _COMPACT_MIN_SIZE and self._stale > len(self._entries): self._compact()
+        return task
+
+    def _count_removed(self, group):
+        remaining = self._group_sizes[group] - 1
+        if remaining: self._group_sizes[group] = remaining
+        else: del self._group_sizes[group]
+
+    def _head(self, group, heap: list):
+        # Prvi živi unos podreda; obrisane s vrha izbacuje, a prazan podred uklanja
+        while heap and heap[0][-1] is _REMOVED: heapq.heappop(heap); self._stale -= 1
+        if heap: return heap[0]
+        del self._groups[group]
+        return None
+
+    def _first_head(self):
+        heads = [head for head in (self._head(group, heap) for group, heap in list(self._groups.items())) if head is not None]
+        return min(heads) if heads else None
+
+    def _compact(self):
+        for group, heap in list(self._groups.items()):
+            live = [entry for entry in heap if entry[-1] is not _REMOVED]
+            if live: heapq.heapify(live); self._groups[group] = live
+            else: del self._groups[group]
+        self._stale = 0
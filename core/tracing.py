@@ -0,0 +1,215 @@
+# core/tracing.py
+# Opcionalno praćenje faza preuzimanja i profiliranje engine-a, za pitanje "gdje je otišlo vrijeme sporog preuzimanja".
+# Svaki task dobiva svoju traku (tid) sa spanovima: queue_wait (čekanje na slot u _process_queue), pa uzastopne faze
+# preparation -> extraction -> transfer -> merge / postprocess -> finalize (granice javlja yt-dlp kroz progress protokol,
+# core.progress_protocol LINE_PHASE), a cijeli task je jedan span "task" sa statusom. Izvoz je Chrome trace-event JSON
+# ({"traceEvents": [...]}), koji otvaraju chrome://tracing, Perfetto i speedscope.
+# Uz to se može uključiti cProfile (pstats fajl, za snakeviz / python -m pstats) i tracemalloc (top alokacija kao tekst).
+# Sve je isključeno dok se ne uključi u postavkama ili zastavicom; tada je trošak jedna provjera atributa po fazi taska.
+import cProfile
+import json
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import logging
+from collections import deque
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+MAX_TRACE_EVENTS = 200_000 # Najstariji spanovi ispadaju; dovoljno za nekoliko tisuća taskova
+TRACEMALLOC_FRAMES = 10
+TRACEMALLOC_TOP = 50
+# Od 3.12 cProfile ide preko sys.monitoring: jedan profiler vidi sve niti, a drugi se ne može uključiti istovremeno
+_GLOBAL_PROFILER = sys.version_info >= (3, 12)
+
+class _NullSpan:
+    __slots__ = ()
+    def __enter__(self): return self
+    def __exit__(self, *exc_info): return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    __slots__ = ("tracer", "name", "lane", "args", "started")
+    def __init__(self, tracer, name: str, lane: int, args: dict | None):
+        self.tracer = tracer; self.name = name; self.lane = lane; self.args = args; self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter(); return self
+
+    def __exit__(self, *exc_info):
+        self.tracer.record(self.name, self.started, time.perf_counter(), self.lane, self.args)
+        return False
+
+class PhaseTracker:
+    """Faze jednog taska kao uzastopni spanovi na njegovoj traci: enter() zatvara trenutnu fazu i otvara sljedeću."""
+    __slots__ = ("tracer", "lane", "phase", "started", "args", "task_started")
+    def __init__(self, tracer, lane: int, phase: str | None = None):
+        self.tracer = tracer; self.lane = lane
+        self.phase = phase; self.started = self.task_started = time.perf_counter(); self.args: dict | None = None
+
+    def enter(self, phase: str | None, **args):
+        now = time.perf_counter()
+        if self.phase is not None: self.tracer.record(self.phase, self.started, now, self.lane, self.args)
+        self.phase = phase; self.started = now; self.args = args or None
+
+    def marker(self, marker: str):
+        """Granica faze iz progress protokola: "before_dl", "pp_started <PP>", "pp_finished <PP>"."""
+        event, _, postprocessor = marker.partition(" ")
+        if event == "before_dl": self.enter("transfer")
+        elif event == "pp_started": self.enter("merge" if postprocessor == "Merger" else "postprocess", postprocessor=postprocessor)
+        elif event == "pp_finished": self.enter("finalize") # Premještanje, --print after_move i izlaz procesa, ili sljedeći PP
+
+    def finish(self, **args):
+        self.enter(None)
+        self.tracer.record("task", self.task_started, self.started, self.lane, args or None)
+
+class Tracer:
+    def __init__(self, max_events: int = MAX_TRACE_EVENTS):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._events: deque = deque(maxlen=max_events) # (ime, početak, kraj, traka, args); render tek pri izvozu
+        self._lanes: Dict[str, int] = {}; self._lane_names: Dict[int, str] = {}
+        self._origin = time.perf_counter()
+
+    def lane(self, task) -> int:
+        """Traka (tid u Chrome traceu) po tasku; ime trake je ID i URL taska."""
+        with self._lock:
+            lane = self._lanes.get(task.item_id)
+            if lane is None:
+                lane = self._lanes[task.item_id] = len(self._lanes) + 1
+                self._lane_names[lane] = f"{task.item_id} {task.url}"
+            return lane
+
+    def record(self, name: str, started: float, ended: float, lane: int, args: dict | None = None):
+        """Završeni span; vremena su time.perf_counter()."""
+        self._events.append((name, started, ended, lane, args)) # deque.append je atomaran, lock nije potreban
+
+    def span(self, name: str, task, **args):
+        """with tracer.span("ime", task): ... ; kad je praćenje isključeno, vraća zajednički prazni kontekst."""
+        if not self.enabled: return _NULL_SPAN
+        return _Span(self, name, self.lane(task), args or None)
+
+    def task_tracker(self, task, phase: str | None = None) -> PhaseTracker | None:
+        return PhaseTracker(self, self.lane(task), phase) if self.enabled else None
+
+    def clear(self):
+        with self._lock: self._events.clear(); self._lanes.clear(); self._lane_names.clear()
+
+    def chrome_trace(self) -> dict:
+        pid = os.getpid(); origin = self._origin
+        with self._lock: events = list(self._events); lane_names = dict(self._lane_names)
+        trace_events = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": "BlackBox DHQ engine"}}]
+        trace_events += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": lane, "args": {"name": label}} for lane, label in lane_names.items()]
+        for name, started, ended, lane, args in events:
+            event = {"name": name, "cat": "download", "ph": "X", "pid": pid, "tid": lane,
+                     "ts": round((started - origin) * 1e6, 1), "dur": round((ended - started) * 1e6, 1)}
+            if args: event["args"] = args
+            trace_events.append(event)
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path: str) -> int:
+        """Atomarni upis Chrome trace-event JSON-a; vraća broj spanova."""
+        trace = self.chrome_trace()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".trace_", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f: json.dump(trace, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try: os.remove(tmp_path)
+            except OSError: pass
+            raise
+        return sum(1 for event in trace["traceEvents"] if event["ph"] == "X")
+
+class EngineProfiler:
+    """cProfile za niti engine-a. Do 3.11 profiler radi samo na niti koja ga uključi, pa run() profilira svaki poziv
+    (nit taska, obrada događaja u reaktoru) zasebno i spaja ga u zajednički pstats; od 3.12 jedan profiler pokriva sve niti."""
+    def __init__(self):
+        self.active = False
+        self._lock = threading.Lock(); self._stats: pstats.Stats | None = None
+        self._global_profile: cProfile.Profile | None = None
+
+    def start(self):
+        with self._lock:
+            if self.active: return
+            self._stats = None
+            if _GLOBAL_PROFILER: self._global_profile = cProfile.Profile(); self._global_profile.enable()
+            self.active = True
+
+    def run(self, fn: Callable, *args):
+        if not self.active or _GLOBAL_PROFILER: return fn(*args)
+        profile = cProfile.Profile()
+        try: return profile.runcall(fn, *args)
+        finally: self._merge(profile)
+
+    def _merge(self, profile: cProfile.Profile):
+        stats = pstats.Stats(profile)
+        with self._lock:
+            if self._stats is None: self._stats = stats
+            else: self._stats.add(stats)
+
+    def stop(self, path: str) -> bool:
+        """Gasi profiliranje i zapisuje pstats fajl; False ako nije ništa izmjereno."""
+        with self._lock:
+            self.active = False
+            profile, self._global_profile = self._global_profile, None
+        if profile is not None: profile.disable(); self._merge(profile)
+        with self._lock: stats, self._stats = self._stats, None
+        if stats is None: return False
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        stats.dump_stats(path)
+        return True
+
+def write_tracemalloc_report(snapshot, path: str, top: int = TRACEMALLOC_TOP):
+    statistics = snapshot.statistics("lineno")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"Ukupno praćeno: {sum(stat.size for stat in statistics) / 1024:.1f} KiB u {sum(stat.count for stat in statistics)} blokova\n")
+        f.write(f"Top {top} mjesta alokacije (tracemalloc, {TRACEMALLOC_FRAMES} okvira):\n")
+        for stat in statistics[:top]: f.write(f"{stat}\n")
+
+tracer = Tracer()
+engine_profiler = EngineProfiler()
+
+class EngineCapture:
+    """Jedno snimanje: spanovi, cProfile i/ili tracemalloc od pokretanja do close(), koji zapisuje zadane fajlove."""
+    def __init__(self, trace_file: str = "", profile_file: str = "", memory_file: str = ""):
+        self.trace_file = trace_file; self.profile_file = profile_file; self.memory_file = memory_file
+        if trace_file: tracer.clear(); tracer.enabled = True
+        if profile_file: engine_profiler.start()
+        self._owns_tracemalloc = bool(memory_file) and not tracemalloc.is_tracing()
+        if self._owns_tracemalloc: tracemalloc.start(TRACEMALLOC_FRAMES)
+
+    def close(self):
+        if self.trace_file:
+            tracer.enabled = False
+            try: logger.info(f"Trace: {tracer.export_chrome_trace(self.trace_file)} spanova u {self.trace_file}")
+            except OSError as e: logger.error(f"Trace nije zapisan ({self.trace_file}): {e}")
+            self.trace_file = ""
+        if self.profile_file:
+            try:
+                if engine_profiler.stop(self.profile_file): logger.info(f"cProfile engine-a zapisan u {self.profile_file}")
+            except OSError as e: logger.error(f"cProfile nije zapisan ({self.profile_file}): {e}")
+            self.profile_file = ""
+        if self.memory_file:
+            if tracemalloc.is_tracing():
+                snapshot = tracemalloc.take_snapshot()
+                if self._owns_tracemalloc: tracemalloc.stop()
+                try: write_tracemalloc_report(snapshot, self.memory_file); logger.info(f"tracemalloc izvještaj zapisan u {self.memory_file}")
+                except OSError as e: logger.error(f"tracemalloc izvještaj nije zapisan ({self.memory_file}): {e}")
+            self.memory_file = ""
+
+def start_capture(settings: dict, trace_file: str | None = None, profile_file: str | None = None, memory_file: str | None = None) -> EngineCapture | None:
+    """Iz postavki (trace_file, profile_cpu_file, profile_memory_file); argumenti nadjačavaju postavke. None ako je sve isključeno."""
+    trace_file = settings.get("trace_file", "") if trace_file is None else trace_file
+    profile_file = settings.get("profile_cpu_file", "") if profile_file is None else profile_file
+    memory_file = settings.get("profile_memory_file", "") if memory_file is None else memory_file
+    if not trace_file and not profile_file and not memory_file: return None
+    return EngineCapture(trace_file, profile_file, memory_file)
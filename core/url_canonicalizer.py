@@ -0,0 +1,73 @@
+# core/url_canonicalizer.py
+# Kanonski oblik URL-a, da youtu.be/X, youtube.com/watch?v=X&t=5 i varijante s tracking parametrima budu isti posao.
+# Koristi se za ID taskova, ključ cachea izvlačenja i indeks arhive preuzimanja (core.download_archive).
+import hashlib
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Na svakom hostu se brišu samo parametri koji nigdje ne mijenjaju sadržaj; "ref", "pp", "si"... na nekom hostu mogu
+# birati video, pa se brišu samo na hostovima iz _HOST_TRACKING_PARAMS (host ili njegova poddomena)
+_TRACKING_PARAMS = {"fbclid", "gclid"}
+_TRACKING_PREFIXES = ("utm_",)
+_HOST_TRACKING_PARAMS = {
+    "instagram.com": {"igsh", "igshid"},
+    "facebook.com": {"mibextid"},
+    "soundcloud.com": {"si", "ref"},
+    "tiktok.com": {"_r", "_t", "is_from_webapp", "sender_device", "refer"},
+    "twitter.com": {"s", "t", "ref_src", "ref_url"},
+    "x.com": {"s", "t", "ref_src", "ref_url"},
+    "vimeo.com": {"share"},
+}
+_STRIPPED_HOST_PREFIXES = ("www.", "m.")
+_YOUTUBE_HOSTS = {"youtube.com", "music.youtube.com", "youtube-nocookie.com", "youtu.be"}
+_YOUTUBE_ID_RE = re.compile(r"^[0-9A-Za-z_-]{11}$")
+_YOUTUBE_PATH_RE = re.compile(r"^/(?:shorts|embed|live|v|e)/([0-9A-Za-z_-]{11})")
+_VIMEO_PATH_RE = re.compile(r"^/(\d+)(?:/|$)")
+
+def _split(url: str):
+    url = url.strip()
+    if "://" not in url: url = "https://" + url
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    for prefix in _STRIPPED_HOST_PREFIXES:
+        if host.startswith(prefix) and host.count(".") > 1: host = host[len(prefix):]
+    return parts, host
+
+def _youtube_ids(parts, host: str):
+    query = dict(parse_qsl(parts.query))
+    if host == "youtu.be": video_id = parts.path.strip("/").split("/")[0]
+    else:
+        path_match = _YOUTUBE_PATH_RE.match(parts.path)
+        video_id = path_match.group(1) if path_match else query.get("v", "")
+    return (video_id if _YOUTUBE_ID_RE.match(video_id) else None), query.get("list")
+
+def canonicalize_url(url: str) -> str:
+    parts, host = _split(url)
+    if host in _YOUTUBE_HOSTS:
+        video_id, playlist_id = _youtube_ids(parts, host)
+        if video_id: # "list" ostaje jer yt-dlp za watch?v=X&list=L preuzima cijelu playlistu
+            return "https://www.youtube.com/watch?" + urlencode([("v", video_id)] + ([("list", playlist_id)] if playlist_id else []))
+        if playlist_id: return "https://www.youtube.com/playlist?" + urlencode([("list", playlist_id)])
+    stripped = _TRACKING_PARAMS | next((params for domain, params in _HOST_TRACKING_PARAMS.items()
+                                        if host == domain or host.endswith("." + domain)), set())
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if key.lower() not in stripped and not key.lower().startswith(_TRACKING_PREFIXES))
+    netloc = host if parts.port in (None, 80, 443) else f"{host}:{parts.port}"
+    path = parts.path.rstrip("/") if len(parts.path) > 1 else parts.path
+    return urlunsplit((parts.scheme.lower(), netloc, path, urlencode(query), ""))
+
+def archive_id_for(url: str) -> str | None:
+    """ID u formatu yt-dlp --download-archive ("<extractor> <id>") kad ga se može znati bez izvlačenja, inače None."""
+    parts, host = _split(url)
+    if host in _YOUTUBE_HOSTS:
+        video_id, playlist_id = _youtube_ids(parts, host)
+        return f"youtube {video_id}" if video_id and not playlist_id else None
+    if host == "vimeo.com":
+        vimeo_match = _VIMEO_PATH_RE.match(parts.path)
+        return f"vimeo {vimeo_match.group(1)}" if vimeo_match else None
+    return None
+
+def task_id_for(url: str, quality_profile_key: str) -> str:
+    # Isti (kanonski URL, profil) uvijek daje isti ID, pa se duplikat u redu prepoznaje u O(1)
+    digest = hashlib.sha1(f"{canonicalize_url(url)}|{quality_profile_key}".encode("utf-8")).hexdigest()[:16]
+    return f"task_{digest}"
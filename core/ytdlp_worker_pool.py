@@ -0,0 +1,214 @@
+# core/ytdlp_worker_pool.py
+# Pool dugoživućih procesa s već uvezenim yt_dlp modulom (backend "worker_pool" umjesto yt-dlp procesa po tasku).
+# Svaki worker jednom plati pokretanje interpretera i import extractora, a zatim preko pipe-a (JSON linije na stdin/stdout)
+# prima poslove (URL + YoutubeDL opcije) i vraća progress/putanju/log poruke. Nakon max_jobs_per_worker poslova
+# worker se gasi i zamjenjuje novim, da rast memorije (cache extractora, curenja u pluginima) ostane ograničen.
+# Worker je obični "python ytdlp_worker_pool.py --worker" proces, ne multiprocessing, da se ne uvozi __main__ aplikacije (Tk, PIL).
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+import logging
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_JOBS_PER_WORKER = 25
+_POLL_INTERVAL = 0.1
+_CANCEL_GRACE_SECONDS = 3.0 # Otkazivanje se provjerava u progress hooku; ako ga nema (npr. dugo izvlačenje), worker se gasi
+# Iz progress hooka šalju se samo ova polja (info_dict je velik i nije serijalizabilan)
+_PROGRESS_FIELDS = ("status", "downloaded_bytes", "total_bytes", "total_bytes_estimate", "speed", "eta",
+                    "fragment_index", "fragment_count", "filename", "elapsed")
+
+class WorkerCancelled(Exception):
+    pass
+
+class _Worker:
+    def __init__(self, max_jobs: int):
+        self.jobs_left = max_jobs
+        self.ready = False
+        self.process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--worker", str(max_jobs)],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                        text=True, encoding="utf-8", errors="replace", bufsize=1,
+                                        creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0)
+        self.messages: queue.Queue = queue.Queue()
+        # stdout čita zajednički reaktor (bez niti po workeru); None u redu znači EOF, tj. worker je izašao.
+        # Uvoz je ovdje jer se ovaj fajl u workeru pokreće kao skripta, bez paketa.
+        from .process_reactor import get_reactor
+        get_reactor().watch(self.process, self._on_stdout_line, on_close=lambda: self.messages.put(None))
+
+    def _on_stdout_line(self, line: str):
+        try: self.messages.put(json.loads(line))
+        except ValueError: logger.debug(f"yt-dlp worker: neispravna linija: {line.strip()[:200]}")
+
+    def send(self, message: dict):
+        self.process.stdin.write(json.dumps(message) + "\n"); self.process.stdin.flush()
+
+    def is_usable(self) -> bool:
+        return self.jobs_left > 0 and self.process.poll() is None
+
+    def close(self, timeout: float = 2.0):
+        try: self.process.stdin.close() # Worker izlazi na EOF stdin-a
+        except OSError: pass
+        try: self.process.wait(timeout)
+        except subprocess.TimeoutExpired: self.process.kill(); self.process.wait()
+
+class YtDlpWorkerPool:
+    def __init__(self, max_workers: int = 1, max_jobs_per_worker: int = DEFAULT_MAX_JOBS_PER_WORKER, prewarm: bool = True):
+        self.max_workers = max(1, int(max_workers))
+        self.max_jobs_per_worker = max(1, int(max_jobs_per_worker))
+        self._condition = threading.Condition(threading.Lock())
+        self._idle: List[_Worker] = []
+        self._busy_count = 0
+        self._job_seq = 0
+        self._closed = False
+        self.stats = {"spawned": 0, "recycled": 0, "jobs": 0}
+        if prewarm:
+            with self._condition: self._idle.append(self._spawn())
+
+    def set_max_workers(self, max_workers: int):
+        with self._condition:
+            self.max_workers = max(1, int(max_workers)); self._condition.notify_all()
+
+    def run_job(self, url: str, options: dict, on_progress: Callable, on_filepath: Callable, on_log: Callable,
+                cancel_flag: threading.Event, info_json: str | None = None, rate_limit_fn: Callable | None = None) -> int:
+        """Blokira dok worker ne završi posao. Vraća izlazni kod (0 = uspjeh) ili baca WorkerCancelled / RuntimeError.
+        S info_json worker kreće iz spremljenog info-JSON-a umjesto izvlačenja URL-a.
+        rate_limit_fn() se provjerava u petlji; promjena se šalje workeru i vrijedi odmah (yt-dlp čita ratelimit po bloku)."""
+        worker = self._acquire()
+        try:
+            if not worker.ready: self._wait_ready(worker, cancel_flag)
+            with self._condition: self._job_seq += 1; job_id = self._job_seq; self.stats["jobs"] += 1
+            worker.send({"job": job_id, "url": url, "options": options, "info_json": info_json}); worker.jobs_left -= 1
+            cancel_requested_at = None; sent_rate_limit = options.get("ratelimit")
+            while True:
+                if rate_limit_fn is not None:
+                    rate_limit = rate_limit_fn()
+                    if rate_limit != sent_rate_limit: sent_rate_limit = rate_limit; worker.send({"ratelimit": job_id, "value": rate_limit})
+                if cancel_flag.is_set():
+                    if cancel_requested_at is None: cancel_requested_at = time.monotonic(); worker.send({"cancel": job_id})
+                    elif time.monotonic() - cancel_requested_at > _CANCEL_GRACE_SECONDS:
+                        logger.warning(f"yt-dlp worker (PID: {worker.process.pid}) ne reagira na otkazivanje, gasim ga.")
+                        worker.jobs_left = 0; worker.process.kill(); raise WorkerCancelled("Otkazano")
+                try: message = worker.messages.get(timeout=_POLL_INTERVAL)
+                except queue.Empty: continue
+                if message is None: raise RuntimeError(f"yt-dlp worker se neočekivano ugasio (kod: {worker.process.poll()})")
+                if message.get("job") != job_id: continue
+                kind = message.get("type")
+                if kind == "progress": on_progress(message["data"])
+                elif kind == "filepath": on_filepath(message["data"])
+                elif kind == "log": on_log(message["data"])
+                elif kind == "done":
+                    if message.get("cancelled"): raise WorkerCancelled("Otkazano")
+                    if message.get("error"): on_log(message["error"])
+                    return message["return_code"]
+        except OSError as e:
+            worker.jobs_left = 0 # Pipe je pukao, worker se ne vraća u pool
+            raise RuntimeError(f"Veza s yt-dlp workerom prekinuta: {e}")
+        finally:
+            self._release(worker)
+
+    def close(self):
+        with self._condition:
+            self._closed = True; idle = list(self._idle); self._idle.clear(); self._condition.notify_all()
+        for worker in idle: worker.close()
+        logger.info(f"yt-dlp worker pool zatvoren ({self.stats})")
+
+    def _spawn(self) -> _Worker:
+        self.stats["spawned"] += 1
+        return _Worker(self.max_jobs_per_worker)
+
+    def _wait_ready(self, worker: _Worker, cancel_flag: threading.Event):
+        while True:
+            if cancel_flag.is_set(): raise WorkerCancelled("Otkazano prije pokretanja.")
+            try: message = worker.messages.get(timeout=_POLL_INTERVAL)
+            except queue.Empty: continue
+            if message is None: raise RuntimeError("yt-dlp worker se nije pokrenuo (je li yt_dlp instaliran?)")
+            if message.get("type") == "ready": worker.ready = True; return
+
+    def _acquire(self) -> _Worker:
+        with self._condition:
+            while True:
+                if self._closed: raise RuntimeError("yt-dlp worker pool je zatvoren.")
+                while self._idle:
+                    worker = self._idle.pop()
+                    if worker.is_usable(): self._busy_count += 1; return worker
+                    threading.Thread(target=worker.close, daemon=True).start()
+                if self._busy_count < self.max_workers:
+                    self._busy_count += 1; return self._spawn()
+                self._condition.wait()
+
+    def _release(self, worker: _Worker):
+        with self._condition:
+            self._busy_count -= 1
+            has_room = not self._closed and len(self._idle) + self._busy_count < self.max_workers
+            keep = has_room and worker.is_usable()
+            if keep: self._idle.append(worker)
+            elif has_room and worker.jobs_left <= 0: # Istrošeni worker se odmah zamjenjuje svježim (zagrijava se u pozadini)
+                self.stats["recycled"] += 1; self._idle.append(self._spawn())
+            self._condition.notify()
+        if not keep: threading.Thread(target=worker.close, name="YtDlpWorkerClose", daemon=True).start()
+
+# --- Strana workera (izvršava se u zasebnom procesu) ---
+def _worker_main(max_jobs: int):
+    out = os.fdopen(os.dup(sys.stdout.fileno()), "w", encoding="utf-8", buffering=1)
+    sys.stdout = sys.stderr # Sve što yt-dlp eventualno ispiše ne smije pokvariti protokol
+    write_lock = threading.Lock()
+    def send(message: dict):
+        with write_lock: out.write(json.dumps(message, default=str) + "\n")
+
+    import yt_dlp # Skupi import se plaća jednom po workeru, ne po tasku
+    from yt_dlp.utils import DownloadCancelled
+    list(yt_dlp.extractor.gen_extractor_classes()) # Predgrijavanje registra extractora
+
+    jobs: queue.Queue = queue.Queue()
+    cancelled_jobs = set()
+    job_options = {} # job -> dict opcija koji YoutubeDL koristi kao self.params (promjena ratelimita vrijedi odmah)
+    def read_stdin(): # Zasebna nit da "cancel" i "ratelimit" stignu i dok preuzimanje traje
+        for line in sys.stdin:
+            try: message = json.loads(line)
+            except ValueError: continue
+            if "cancel" in message: cancelled_jobs.add(message["cancel"])
+            elif "ratelimit" in message:
+                options = job_options.get(message["ratelimit"])
+                if options is not None: options["ratelimit"] = message["value"]
+            else: jobs.put(message)
+        jobs.put(None)
+    threading.Thread(target=read_stdin, daemon=True).start()
+
+    class _PipeLogger:
+        def __init__(self, job_id): self.job_id = job_id
+        def debug(self, msg): pass
+        def info(self, msg): pass
+        def warning(self, msg): send({"type": "log", "job": self.job_id, "data": msg})
+        def error(self, msg): send({"type": "log", "job": self.job_id, "data": msg})
+
+    send({"type": "ready"})
+    for _ in range(max_jobs):
+        job = jobs.get()
+        if job is None: return
+        job_id = job["job"]
+        def progress_hook(d, job_id=job_id):
+            if job_id in cancelled_jobs: raise DownloadCancelled("Otkazano iz engine-a.")
+            data = {key: d.get(key) for key in _PROGRESS_FIELDS}
+            if d.get("status") == "finished": # Isti ID kakav yt-dlp piše u download_archive
+                info = d.get("info_dict") or {}
+                data["archive_id"] = f"{(info.get('extractor_key') or info.get('ie_key') or '').lower()} {info.get('id')}"
+            send({"type": "progress", "job": job_id, "data": data})
+        options = dict(job["options"], logger=_PipeLogger(job_id), progress_hooks=[progress_hook],
+                       post_hooks=[lambda filepath, job_id=job_id: send({"type": "filepath", "job": job_id, "data": filepath})])
+        result = {"type": "done", "job": job_id, "return_code": 1}
+        job_options[job_id] = options
+        try:
+            with yt_dlp.YoutubeDL(options) as ydl:
+                result["return_code"] = ydl.download_with_info_file(job["info_json"]) if job.get("info_json") else ydl.download([job["url"]])
+        except DownloadCancelled: result["cancelled"] = True
+        except BaseException as e: result["error"] = str(e) # Worker mora preživjeti i grešku extractora
+        finally: job_options.pop(job_id, None)
+        send(result)
+
+if __name__ == "__main__" and sys.argv[1:2] == ["--worker"]:
+    _worker_main(int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_MAX_JOBS_PER_WORKER)
@@ -0,0 +1,149 @@
+# gui/components/log_pane.py
+# Virtualizirani prikaz core.log_buffer.LogRingBuffer: widget u svakom trenutku drži samo linije koje stanu na ekran.
+# Nove linije se skupljaju u bufferu i iscrtavaju u jednom prolazu po ticku (REFRESH_MS), ne insert + see("end") po liniji.
+# Klizač i kotačić miša pomiču prozor po filtriranoj listi; dok je prikaz na dnu, prati nove linije.
+import customtkinter as ctk
+import tkinter as tk
+import logging
+import time
+from collections import deque
+from itertools import islice
+from core.log_buffer import LogRingBuffer, LogEntry, KIND_STATUS, KIND_TASK_OUTPUT
+
+logger = logging.getLogger(__name__)
+
+REFRESH_MS = 100
+LEVEL_FILTERS = {"Sve (debug)": logging.DEBUG, "Info i više": logging.INFO, "Upozorenja i greške": logging.WARNING, "Samo greške": logging.ERROR}
+_DEFAULT_LEVEL_FILTER = "Info i više"
+
+class LogPane(ctk.CTkFrame):
+    def __init__(self, master, log_buffer: LogRingBuffer, theme_colors: dict | None = None, **kwargs):
+        super().__init__(master, fg_color="transparent", **kwargs)
+        self.log_buffer = log_buffer
+        theme_colors = theme_colors or {}
+        self._lines: deque = deque(maxlen=log_buffer.capacity) # Filtrirani pogled na buffer
+        self._last_seq = 0; self._generation = log_buffer.generation
+        self._top = 0; self._rows = 10; self._line_height = 0; self._follow = True; self._dirty = True
+        self._min_level = LEVEL_FILTERS[_DEFAULT_LEVEL_FILTER]
+        self._selected_task_ids: set = set()
+        self._only_selected = tk.BooleanVar(value=False)
+
+        self.grid_rowconfigure(1, weight=1); self.grid_columnconfigure(0, weight=1)
+        header = ctk.CTkFrame(self, fg_color="transparent")
+        header.grid(row=0, column=0, columnspan=2, sticky="ew", padx=10, pady=(5, 5))
+        ctk.CTkLabel(header, text="Detaljni Logovi:", font=ctk.CTkFont(size=14, weight="bold"), anchor="w").pack(side="left")
+        ctk.CTkButton(header, text="Očisti", width=70, height=24, command=self._clear_log,
+                      fg_color=theme_colors.get("BUTTON_FG_COLOR"), hover_color=theme_colors.get("BUTTON_HOVER_COLOR")).pack(side="right", padx=(5, 0))
+        ctk.CTkCheckBox(header, text="Samo odabrani zadatak", variable=self._only_selected, command=self._filters_changed).pack(side="right", padx=5)
+        self.level_menu = ctk.CTkOptionMenu(header, values=list(LEVEL_FILTERS.keys()), width=170, height=24, command=lambda _choice: self._filters_changed())
+        self.level_menu.set(_DEFAULT_LEVEL_FILTER); self.level_menu.pack(side="right", padx=5)
+
+        self.textbox = ctk.CTkTextbox(self, wrap="none", state="disabled", height=100, activate_scrollbars=False, border_width=1,
+                                      border_color=theme_colors.get("BORDER_PRIMARY", "gray50"), font=ctk.CTkFont(family="Consolas", size=10))
+        self.textbox.grid(row=1, column=0, sticky="nsew", padx=(10, 0), pady=(0, 5))
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.grid(row=1, column=1, sticky="ns", padx=(0, 10), pady=(0, 5))
+        self.textbox.tag_config("ERROR", foreground=theme_colors.get("ERROR", "#E05555"))
+        self.textbox.tag_config("WARNING", foreground=theme_colors.get("WARNING", "#E0A030"))
+        self.textbox.tag_config("DEBUG", foreground=theme_colors.get("TEXT_SECONDARY", "gray"))
+        self.textbox.tag_config("STATUS", foreground=theme_colors.get("ACCENT_PRIMARY", "#3B8ED0"))
+        self.textbox.tag_config("YTDLP_OUTPUT", foreground=theme_colors.get("TEXT_PRIMARY", "#DDDDDD"))
+
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"): self.textbox.bind(sequence, self._on_mouse_wheel)
+        self.textbox.bind("<Configure>", self._on_resize)
+        self.after(REFRESH_MS, self._tick)
+
+    # --- Filteri ---
+    def set_selected_tasks(self, task_ids):
+        """Poziva QueueView na promjenu odabira (za playlistu uključuje i djecu)."""
+        self._selected_task_ids = set(task_ids)
+        if self._only_selected.get(): self._filters_changed()
+
+    def _current_task_filter(self):
+        return self._selected_task_ids if self._only_selected.get() else None
+
+    def _filters_changed(self):
+        self._min_level = LEVEL_FILTERS.get(self.level_menu.get(), logging.INFO)
+        self._lines.clear(); self._last_seq = 0; self._follow = True; self._dirty = True
+        self._pull_new_entries()
+        self._render()
+
+    def _clear_log(self):
+        self.log_buffer.clear(); self._filters_changed()
+
+    # --- Osvježavanje ---
+    def _tick(self):
+        if not self.winfo_exists(): return
+        try:
+            if self._pull_new_entries() or self._dirty: self._render()
+        except tk.TclError as e: logger.debug(f"Log pane: Tk greška pri iscrtavanju: {e}")
+        self.after(REFRESH_MS, self._tick)
+
+    def _pull_new_entries(self) -> bool:
+        if self.log_buffer.generation != self._generation:
+            self._generation = self.log_buffer.generation; self._lines.clear(); self._last_seq = 0; self._dirty = True
+        if self.log_buffer.last_seq == self._last_seq: return False
+        new_entries = self.log_buffer.since(self._last_seq, self._min_level, self._current_task_filter())
+        self._last_seq = self.log_buffer.last_seq
+        if not new_entries: return False
+        overflow = max(0, len(self._lines) + len(new_entries) - self._lines.maxlen) # Najstarije linije ispadaju s vrha
+        self._lines.extend(new_entries)
+        if self._follow: self._top = max(0, len(self._lines) - self._rows)
+        else: self._top = max(0, self._top - overflow)
+        return True
+
+    def _render(self):
+        self._dirty = False
+        visible = list(islice(self._lines, self._top, self._top + self._rows))
+        self.textbox.configure(state="normal")
+        self.textbox.delete("1.0", "end")
+        for index, entry in enumerate(visible):
+            self.textbox.insert("end", self._format(entry) + ("\n" if index < len(visible) - 1 else ""), _tag_for(entry))
+        self.textbox.configure(state="disabled")
+        total = len(self._lines)
+        if total: self.scrollbar.set(self._top / total, min(1.0, (self._top + self._rows) / total))
+        else: self.scrollbar.set(0.0, 1.0)
+        if not self._line_height and visible: self._measure_rows()
+
+    @staticmethod
+    def _format(entry: LogEntry) -> str:
+        timestamp = time.strftime("%H:%M:%S", time.localtime(entry.created))
+        if entry.kind == KIND_TASK_OUTPUT or entry.kind == KIND_STATUS: return f"{timestamp} {entry.text}"
+        return f"{timestamp} [{logging.getLevelName(entry.levelno)}] {entry.text}"
+
+    # --- Skrolanje i veličina ---
+    def _set_top(self, top: int):
+        max_top = max(0, len(self._lines) - self._rows)
+        self._top = min(max(0, top), max_top); self._follow = self._top >= max_top
+        self._render()
+
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == "moveto": self._set_top(int(float(value) * len(self._lines)))
+        elif action == "scroll": self._set_top(self._top + int(value) * (self._rows if unit == "pages" else 1))
+
+    def _on_mouse_wheel(self, event):
+        if getattr(event, "num", None) == 4: step = -3
+        elif getattr(event, "num", None) == 5: step = 3
+        else: step = -3 if event.delta > 0 else 3
+        self._set_top(self._top + step)
+        return "break"
+
+    def _measure_rows(self):
+        line_info = self.textbox.dlineinfo("1.0")
+        if line_info: self._line_height = line_info[3]
+        self._on_resize()
+
+    def _on_resize(self, event=None):
+        rows = max(1, self.textbox.winfo_height() // (self._line_height or 16))
+        if rows != self._rows:
+            self._rows = rows
+            if self._follow: self._top = max(0, len(self._lines) - rows)
+            self._dirty = True
+
+def _tag_for(entry: LogEntry) -> str | None:
+    if entry.levelno >= logging.ERROR: return "ERROR"
+    if entry.levelno >= logging.WARNING: return "WARNING"
+    if entry.kind == KIND_STATUS: return "STATUS"
+    if entry.kind == KIND_TASK_OUTPUT: return "YTDLP_OUTPUT"
+    if entry.levelno <= logging.DEBUG: return "DEBUG"
+    return None
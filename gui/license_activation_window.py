@@ -1,7 +1,7 @@
 import customtkinter as ctk
 
 class LicenseActivationWindow(ctk.CTkToplevel): # Koristi CTkToplevel za dodatne prozore
-    def __init__(self, master, license_manager, activation_callback):
+    def __init__(self, master, license_manager, activation_callback, initial_key: str | None = None):
         super().__init__(master)
         self.license_manager = license_manager
         self.activation_callback = activation_callback # Funkcija koja se poziva nakon uspješne aktivacije
@@ -26,6 +26,9 @@ class LicenseActivationWindow(ctk.CTkToplevel): # Koristi CTkToplevel za dodatne
         self.status_label.pack(pady=10)
         
         self.protocol("WM_DELETE_WINDOW", self._on_close_attempt) # Što ako korisnik zatvori ovaj prozor?
+        self._activation_future = None
+        if initial_key: # Ponovna online provjera već poznatog ključa (istekao offline grace period)
+            self.license_key_entry.insert(0, initial_key); self.after(100, self._attempt_activation)
 
     def _on_close_attempt(self):
         # Ako korisnik zatvori prozor za aktivaciju, a nema licence, aplikacija se ne može koristiti.
@@ -43,12 +46,20 @@ class LicenseActivationWindow(ctk.CTkToplevel): # Koristi CTkToplevel za dodatne
             self.status_label.configure(text="Polje za ključ ne može biti prazno.", text_color="orange")
             return
 
+        if self._activation_future is not None: return # Provjera je već u tijeku
         self.status_label.configure(text="Provjeravam licencu...", text_color="gray")
-        # Ovdje bi išla komunikacija s license_manager.activate_license_online(license_key)
-        # ili lokalna provjera ako je to implementirano.
-        # Ovo je SIMULACIJA:
-        # Pretpostavimo da activate_license vraća (True/False, license_info_dict)
-        is_activated, license_info = self.license_manager.activate_license(license_key) # Ova metoda treba biti implementirana
+        self.activate_button.configure(state="disabled")
+        # Mrežni zahtjev ide u pozadinskoj niti license_managera, prozor ostaje responzivan
+        self._activation_future = self.license_manager.activate_license_async(license_key)
+        self.after(100, self._poll_activation)
+
+    def _poll_activation(self):
+        if not self.winfo_exists(): return
+        if not self._activation_future.done(): self.after(100, self._poll_activation); return
+        activation_future, self._activation_future = self._activation_future, None
+        self.activate_button.configure(state="normal")
+        try: is_activated, license_info = activation_future.result()
+        except Exception as e: is_activated, license_info = False, {"error": f"Neočekivana greška: {e}"}
 
         if is_activated:
             self.status_label.configure(text="Licenca uspješno aktivirana!", text_color="green")
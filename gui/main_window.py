@@ -2,18 +2,26 @@
 import customtkinter as ctk
 import tkinter as tk
 from tkinter import messagebox  # Added for messagebox dialogs
+import importlib
 import logging
 import os
+import time
 
 from .sidebar_frame import SidebarFrame
-from .views.downloads_view import DownloadsView
-from .views.queue_view import QueueView
-from .views.settings_view import SettingsView
 
 from core import downloader_engine as de
+from core.event_bus import CoalescingEventBus
+from core.log_buffer import task_output_items
 
 logger = logging.getLogger(__name__)
 
+# Pogledi s vlastitim modulom: modul se uvozi i pogled gradi tek pri prvom select_view (brže prvo iscrtavanje)
+_LAZY_VIEW_CLASSES = {
+    "downloads": (".views.downloads_view", "DownloadsView"),
+    "queue": (".views.queue_view", "QueueView"),
+    "settings": (".views.settings_view", "SettingsView"),
+}
+
 class MainWindow:
     def __init__(self, root: ctk.CTk, user_type: str, license_info: dict, license_manager_instance):
         self.root = root
@@ -23,6 +31,12 @@ class MainWindow:
         self.logger = logger
         self.logger.info(f"MainWindow initialized for user_type={user_type}")
 
+        # Engine objavljuje u sabirnicu iz svojih niti, a GUI je prazni najviše gui_refresh_hz puta u sekundi
+        self.download_events = CoalescingEventBus()
+        refresh_hz = max(1, int(self.root.app_context.get("settings", {}).get("gui_refresh_hz", 10)))
+        self._event_frame_interval = 1.0 / refresh_hz
+        self._last_event_drain = 0.0
+        self.root.app_context["download_event_stats"] = self.download_events.get_stats
         self.download_manager = self.root.app_context.get("download_manager")
         if self.download_manager:
             self.download_manager.update_callback = self.handle_download_update
@@ -64,75 +78,64 @@ class MainWindow:
         self.logger.debug("Glavni layout MainWindow-a postavljen.")
 
     def _create_views(self):
-        self.logger.debug("Kreiram poglede (views)...")
-        app_context = self.root.app_context
+        # Samo tablica graditelja; pogled nastaje u _get_view pri prvom prikazu
+        self._view_builders = {"dashboard": self._build_dashboard_view, "license_info": self._build_license_info_view}
+        for view_name, (module_name, class_name) in _LAZY_VIEW_CLASSES.items():
+            self._view_builders[view_name] = lambda module_name=module_name, class_name=class_name: \
+                getattr(importlib.import_module(module_name, __package__), class_name)(self.main_content_frame, self.root.app_context)
+        if self.user_type == "super_admin":
+            self._view_builders["admin_panel"] = self._build_admin_panel_view
+        self.logger.debug(f"Registrirano {len(self._view_builders)} pogleda (kreiraju se pri prvom prikazu).")
 
-        theme_colors_dict = app_context.get("theme_colors", {})
-        default_view_bg_color = theme_colors_dict.get("BACKGROUND_CONTENT", "#202130")
+    def _get_view(self, view_name: str):
+        view_instance = self.views_cache.get(view_name)
+        if view_instance is None and view_name in self._view_builders:
+            started = time.perf_counter()
+            view_instance = self.views_cache[view_name] = self._view_builders[view_name]()
+            self.logger.debug(f"Pogled '{view_name}' kreiran za {(time.perf_counter() - started) * 1000:.1f} ms.")
+        return view_instance
+
+    def _view_colors(self) -> dict:
+        theme_colors_dict = self.root.app_context.get("theme_colors", {})
         view_text_color = theme_colors_dict.get("TEXT_PRIMARY", "#FFFFFF")
-        view_text_accent_color = theme_colors_dict.get("TEXT_ACCENT", view_text_color)
-        view_text_secondary_color = theme_colors_dict.get("TEXT_SECONDARY", "gray")
+        return {"bg": theme_colors_dict.get("BACKGROUND_CONTENT", "#202130"), "text": view_text_color,
+                "accent": theme_colors_dict.get("TEXT_ACCENT", view_text_color), "secondary": theme_colors_dict.get("TEXT_SECONDARY", "gray")}
 
-        # Dashboard
-        self.logger.debug(f"Kreiram DashboardView.")
-        dashboard_view = ctk.CTkFrame(self.main_content_frame, fg_color=default_view_bg_color)
+    def _build_dashboard_view(self):
+        colors = self._view_colors()
+        dashboard_view = ctk.CTkFrame(self.main_content_frame, fg_color=colors["bg"])
         ctk.CTkLabel(
             dashboard_view,
             text="Dashboard",
             font=ctk.CTkFont(size=36, weight="bold"),
-            text_color=view_text_accent_color
+            text_color=colors["accent"]
         ).pack(pady=30, padx=30, anchor="nw")
         ctk.CTkLabel(
             dashboard_view,
             text="Pregled aktivnosti i statistika (uskoro).",
             font=ctk.CTkFont(size=16),
-            text_color=view_text_secondary_color
+            text_color=colors["secondary"]
         ).pack(pady=10, padx=30, anchor="nw")
-        self.views_cache["dashboard"] = dashboard_view
-
-        self.logger.debug(f"Kreiram DownloadsView.")
-        self.views_cache["downloads"] = DownloadsView(self.main_content_frame, app_context)
+        return dashboard_view
 
-        self.logger.debug(f"Kreiram QueueView.")
-        self.views_cache["queue"] = QueueView(self.main_content_frame, app_context)
-
-        self.logger.debug(f"Kreiram SettingsView.")
-        self.views_cache["settings"] = SettingsView(self.main_content_frame, app_context)
-
-        # License Info
-        self.logger.debug(f"Kreiram LicenseInfoView.")
-        license_info_view = ctk.CTkFrame(self.main_content_frame, fg_color=default_view_bg_color)
+    def _build_license_info_view(self):
+        colors = self._view_colors(); theme_colors_dict = self.root.app_context.get("theme_colors", {})
+        license_info_view = ctk.CTkFrame(self.main_content_frame, fg_color=colors["bg"])
         ctk.CTkLabel(
             license_info_view,
             text="Informacije o Licenci",
             font=ctk.CTkFont(size=36, weight="bold"),
-            text_color=view_text_accent_color
+            text_color=colors["accent"]
         ).pack(pady=30, padx=30, anchor="nw")
-        current_lic_info = app_context.get("license_info", {})
-        ctk.CTkLabel(
-            license_info_view,
-            text=f"Korisnik: {current_lic_info.get('user', 'N/A')}",
-            font=ctk.CTkFont(size=16),
-            text_color=view_text_color
-        ).pack(anchor="w", padx=30, pady=2)
-        ctk.CTkLabel(
-            license_info_view,
-            text=f"Tip Licence: {current_lic_info.get('type', 'N/A')}",
-            font=ctk.CTkFont(size=16),
-            text_color=view_text_color
-        ).pack(anchor="w", padx=30, pady=2)
-        ctk.CTkLabel(
-            license_info_view,
-            text=f"Status: {current_lic_info.get('status', 'N/A')}",
-            font=ctk.CTkFont(size=16),
-            text_color=view_text_color
-        ).pack(anchor="w", padx=30, pady=2)
-        ctk.CTkLabel(
-            license_info_view,
-            text=f"Istječe: {current_lic_info.get('expires_at', 'N/A')}",
-            font=ctk.CTkFont(size=16),
-            text_color=view_text_color
-        ).pack(anchor="w", padx=30, pady=2)
+        current_lic_info = self.root.app_context.get("license_info", {})
+        for label_text in (f"Korisnik: {current_lic_info.get('user', 'N/A')}", f"Tip Licence: {current_lic_info.get('type', 'N/A')}",
+                           f"Status: {current_lic_info.get('status', 'N/A')}", f"Istječe: {current_lic_info.get('expires_at', 'N/A')}"):
+            ctk.CTkLabel(
+                license_info_view,
+                text=label_text,
+                font=ctk.CTkFont(size=16),
+                text_color=colors["text"]
+            ).pack(anchor="w", padx=30, pady=2)
         ctk.CTkButton(
             license_info_view,
             text="Odjavi Licencu",
@@ -140,25 +143,24 @@ class MainWindow:
             fg_color=theme_colors_dict.get("ERROR"),
             hover_color=theme_colors_dict.get("WARNING")
         ).pack(pady=20, padx=30, anchor="w")
-        self.views_cache["license_info"] = license_info_view
+        return license_info_view
 
-        if self.user_type == "super_admin":
-            self.logger.debug(f"Kreiram AdminPanelView.")
-            admin_panel_view = ctk.CTkFrame(self.main_content_frame, fg_color=default_view_bg_color)
-            ctk.CTkLabel(
-                admin_panel_view,
-                text="Admin Panel",
-                font=ctk.CTkFont(size=36, weight="bold"),
-                text_color=view_text_accent_color
-            ).pack(pady=30, padx=30, anchor="nw")
-            ctk.CTkLabel(
-                admin_panel_view,
-                text="Dobrodošao, Harise! Ovo je tvoj administratorski panel (u izradi).",
-                font=ctk.CTkFont(size=16),
-                text_color=view_text_secondary_color
-            ).pack(anchor="w", padx=30)
-            self.views_cache["admin_panel"] = admin_panel_view
-        self.logger.debug("Svi pogledi kreirani.")
+    def _build_admin_panel_view(self):
+        colors = self._view_colors()
+        admin_panel_view = ctk.CTkFrame(self.main_content_frame, fg_color=colors["bg"])
+        ctk.CTkLabel(
+            admin_panel_view,
+            text="Admin Panel",
+            font=ctk.CTkFont(size=36, weight="bold"),
+            text_color=colors["accent"]
+        ).pack(pady=30, padx=30, anchor="nw")
+        ctk.CTkLabel(
+            admin_panel_view,
+            text="Dobrodošao, Harise! Ovo je tvoj administratorski panel (u izradi).",
+            font=ctk.CTkFont(size=16),
+            text_color=colors["secondary"]
+        ).pack(anchor="w", padx=30)
+        return admin_panel_view
 
     def _deactivate_license_action(self):
         if messagebox.askyesno(
@@ -184,9 +186,9 @@ class MainWindow:
                 current_view_instance.on_view_leave()
             current_view_instance.grid_forget()
             self.logger.debug(f"Pogled '{self.current_view_name}' sakriven.")
-        if view_name in self.views_cache:
+        new_view_instance = self._get_view(view_name)
+        if new_view_instance is not None:
             self.current_view_name = view_name
-            new_view_instance = self.views_cache[self.current_view_name]
             new_view_instance.grid(row=0, column=0, sticky="nsew", in_=self.main_content_frame)
             new_view_instance.lift()
             self.root.update_idletasks()
@@ -198,7 +200,7 @@ class MainWindow:
             self._update_status_bar(f"Prikazan pogled: {view_name.replace('_', ' ').capitalize()}")
         else:
             self.logger.warning(f"Pokušaj prikaza nepostojećeg pogleda: {view_name}")
-            if self.current_view_name is None and "dashboard" in self.views_cache:
+            if self.current_view_name is None and "dashboard" in self._view_builders:
                 self.logger.info("Fallback na 'dashboard'.")
                 self.select_view("dashboard")
             else:
@@ -212,56 +214,55 @@ class MainWindow:
             self.logger.warning(f"Status_bar_var nije postavljen: '{message}'")
 
     def handle_download_update(self, task: de.DownloadTask, update_type: str, data=None):
-        if self.root and self.root.winfo_exists():
-            self.root.after(0, self._internal_handle_download_update, task, update_type, data)
-        else:
-            self.logger.warning("Root prozor ne postoji, ne mogu ažurirati GUI za download.")
+        # Poziva se iz niti engine-a: samo spoji događaj u sabirnicu, a drain se zakazuje jednom po frameu
+        if self.download_events.publish(task, update_type, data):
+            delay_ms = int(max(0.0, self._last_event_drain + self._event_frame_interval - time.monotonic()) * 1000)
+            try:
+                if self.root and self.root.winfo_exists(): self.root.after(delay_ms, self._drain_download_events)
+                else: self.download_events.schedule_failed(); self.logger.warning("Root prozor ne postoji, ne mogu ažurirati GUI za download.")
+            except (tk.TclError, RuntimeError) as e_after:
+                self.download_events.schedule_failed(); self.logger.warning(f"Ne mogu zakazati osvježavanje GUI-ja: {e_after}")
 
-    def _internal_handle_download_update(self, task: de.DownloadTask, update_type: str, data=None):
-        self.logger.debug(f"MW internal update: Task ID {task.item_id if task else 'N/A'}, Type: {update_type}")
+    def _drain_download_events(self):
+        self._last_event_drain = time.monotonic()
+        task_events, log_lines = self.download_events.drain()
+        if not task_events and not log_lines: return
+        log_buffer = self.root.app_context.get("log_buffer")
+        if log_lines and log_buffer is not None: log_buffer.extend(task_output_items(log_lines)) # Log pane ih iscrtava u svom ticku
         queue_view_instance = self.views_cache.get("queue")
-        if not isinstance(queue_view_instance, QueueView) or \
-           not hasattr(queue_view_instance, 'queue_treeview') or \
-           not queue_view_instance.queue_treeview:
-            self.logger.warning("QueueView ili QueueView.queue_treeview nije inicijaliziran/dostupan.")
-            self._update_status_bar_for_task(task, update_type)
-            return
+        # Ako QueueView još nije otvoren, događaji se ne čuvaju: pri prvom prikazu se sam sinkronizira iz DM-a
+        if queue_view_instance is not None and getattr(queue_view_instance, 'queue_treeview', None):
+            for task, update_type, _data in task_events:
+                self._apply_task_update(queue_view_instance, task, update_type)
+            queue_view_instance.flush() # Model je ažuriran za cijeli frame; u Treeview idu samo promjene vidljivih redova
+        if task_events: # Statusna traka se osvježava jednom po frameu, zadnjim događajem
+            last_task, last_update_type, last_data = task_events[-1]
+            if last_update_type == "general_status_update" and last_data: self._update_status_bar(str(last_data))
+            else: self._update_status_bar_for_task(last_task, last_update_type)
 
+    def _apply_task_update(self, queue_view_instance, task: de.DownloadTask, update_type: str):
         if update_type == "status_update":
-            if task.status == "U redu":
-                if not queue_view_instance.queue_treeview.exists(str(task.item_id)):
+            if task.status == "U redu" or task.is_group: # Parent red playliste dolazi sa statusom "Proširivanje..."
+                if not queue_view_instance.has_task(task.item_id):
                     queue_view_instance.add_task_to_view(task)
                 else:
                     queue_view_instance.update_task_in_view(task)
-            elif queue_view_instance.queue_treeview.exists(str(task.item_id)):
+            elif queue_view_instance.has_task(task.item_id):
                 queue_view_instance.update_task_in_view(task)
             elif task.status != "U redu":
                 self.logger.warning(f"Update statusa za nepostojeći task {task.item_id} ({task.status}).")
         elif update_type == "progress_update":
-            if queue_view_instance.queue_treeview.exists(str(task.item_id)):
+            if queue_view_instance.has_task(task.item_id):
                 queue_view_instance.update_task_in_view(task)
             else:
                 self.logger.warning(f"Progress update za nepostojeći task {task.item_id}. Dodajem.")
                 queue_view_instance.add_task_to_view(task)
         elif update_type == "download_complete" or update_type == "download_error":
-            if queue_view_instance.queue_treeview.exists(str(task.item_id)):
+            if queue_view_instance.has_task(task.item_id):
                 queue_view_instance.update_task_in_view(task)
             else:
                 self.logger.warning(f"Download završen/greška za nepostojeći task {task.item_id}. Dodajem.")
                 queue_view_instance.add_task_to_view(task)
-        if update_type == "log_message" and data:
-            if hasattr(queue_view_instance, 'log_text_area') and isinstance(queue_view_instance.log_text_area, ctk.CTkTextbox):
-                try:
-                    if queue_view_instance.log_text_area.winfo_exists():
-                        queue_view_instance.log_text_area.configure(state="normal")
-                        queue_view_instance.log_text_area.insert("end", f"{str(data)}\n")
-                        queue_view_instance.log_text_area.configure(state="disabled")
-                        queue_view_instance.log_text_area.see("end")
-                except tk.TclError as e_log_tk:
-                    self.logger.warning(f"Tkinter greška pri upisu u log ({e_log_tk})")
-                except Exception as e_log:
-                    self.logger.error(f"Greška pri upisu u log ({e_log})")
-        self._update_status_bar_for_task(task, update_type)
 
     def _update_status_bar_for_task(self, task: de.DownloadTask | None, update_type: str):
         if not task:
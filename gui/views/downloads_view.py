@@ -1,8 +1,15 @@
 # gui/views/downloads_view.py
 import customtkinter as ctk
+import tkinter as tk
+from tkinter import messagebox
 from .base_view import BaseView # Koristimo osnovnu klasu
+import logging
 from core import downloader_engine as de # Za QUALITY_PROFILE_KEYS
 from core import settings_handler as sh # Za default kvalitetu
+from core.url_canonicalizer import task_id_for
+from core.playlist_expander import is_probable_playlist_url
+
+logger = logging.getLogger(__name__)
 
 class DownloadsView(BaseView):
     def __init__(self, master, app_context: dict, **kwargs):
@@ -44,7 +51,7 @@ class DownloadsView(BaseView):
         self.quality_combobox = ctk.CTkComboBox(url_input_frame, values=de.QUALITY_PROFILE_KEYS, 
                                                 state="readonly", height=35, width=250,
                                                 command=self._quality_profile_selected) # Ako treba akcija na promjenu
-        self.quality_combobox.set(sh.load_settings().get("default_quality", de.QUALITY_PROFILE_KEYS[0]))
+        self.quality_combobox.set(sh.get_setting("default_quality", de.QUALITY_PROFILE_KEYS[0]))
         self.quality_combobox.grid(row=1, column=1, padx=0, pady=10, sticky="w")
         
         # Opis profila kvalitete
@@ -81,7 +88,7 @@ class DownloadsView(BaseView):
                 self.quality_combobox.set(suggested_profile)
                 self._update_quality_description()
         elif hasattr(self, 'quality_combobox'): # Ako je polje prazno
-             self.quality_combobox.set(sh.load_settings().get("default_quality", de.QUALITY_PROFILE_KEYS[0]))
+             self.quality_combobox.set(sh.get_setting("default_quality", de.QUALITY_PROFILE_KEYS[0]))
              self._update_quality_description()
 
     def _paste_from_clipboard_action(self):
@@ -120,11 +127,13 @@ class DownloadsView(BaseView):
             # Za sada, samo logiramo i prosljeđujemo download_manageru
             # Kasnije će QueueView imati Treeview i metode za dodavanje.
             
-            # Ovo je placeholder za ID itema u Treeview-u. Pravi ID će doći iz QueueView-a.
-            placeholder_item_id = f"task_{hash(url)}" 
-            
-            task = de.DownloadTask(url, quality_key, output_dir_val, placeholder_item_id)
-            download_manager.add_to_queue(task)
+            # ID iz kanonskog URL-a + profila: youtu.be/X i youtube.com/watch?v=X&t=5 su isti posao
+            task = de.DownloadTask(url, quality_key, output_dir_val, task_id_for(url, quality_key))
+            # Playliste i kanali se razlažu na zasebne taskove pod parent redom, da ih preuzimaju svi slotovi
+            fan_out = settings.get("playlist_fanout", True) and hasattr(download_manager, "add_playlist") and is_probable_playlist_url(url)
+            if (download_manager.add_playlist(task) if fan_out else download_manager.add_to_queue(task)) is False:
+                messagebox.showinfo("Preskočeno", f"{task.status}:\n{url}", parent=self)
+                return
             
             self.url_entry.delete(0, ctk.END)
             logger.info(f"URL dodan u red: {url} (Kvaliteta: {quality_key})") # Logiraj
@@ -141,8 +150,8 @@ class DownloadsView(BaseView):
         logger.info("Ulazak u DownloadsView.")
         # Ovdje možeš osvježiti npr. default kvalitetu ako se promijenila u postavkama
         if hasattr(self, 'quality_combobox'):
-            self.quality_combobox.set(sh.load_settings().get("default_quality", de.QUALITY_PROFILE_KEYS[0]))
+            self.quality_combobox.set(sh.get_setting("default_quality", de.QUALITY_PROFILE_KEYS[0]))
             self._update_quality_description()
         # Automatsko lijepljenje ako je omogućeno i ako je prozor aktivan
-        if sh.load_settings().get("auto_paste_clipboard", False) and self.winfo_ismapped(): # provjeri da li je view vidljiv
+        if sh.get_setting("auto_paste_clipboard", False) and self.winfo_ismapped(): # provjeri da li je view vidljiv
             self.after(100, self._paste_from_clipboard_action) # Malo odgodi da se UI iscrta
\ No newline at end of file
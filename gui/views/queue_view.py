@@ -1,69 +1,34 @@
 # gui/views/queue_view.py
 import customtkinter as ctk
 import tkinter as tk
-from tkinter import ttk, scrolledtext
+from tkinter import ttk, scrolledtext, messagebox
 from .base_view import BaseView
 import logging
-import os
 from core import downloader_engine as de # <<<<<< DODAJ OVAJ IMPORT
+from core.log_buffer import LogRingBuffer, install_log_buffer_handler
+from core.queue_model import QueueModel, COLUMNS, TAG_UNCHANGED
+from gui.components.log_pane import LogPane
 
 logger = logging.getLogger(__name__)
 
-# Custom Handler za Logging u CTkTextbox widget
-class CTkTextboxHandler(logging.Handler):
-    def __init__(self, textbox_widget: ctk.CTkTextbox):
-        super().__init__()
-        self.textbox_widget = textbox_widget
-        self.level = logging.NOTSET # Defaultni nivo, može se promijeniti
-
-    def emit(self, record):
-        if not self.textbox_widget.winfo_exists(): # Ne radi ništa ako je widget uništen
-            return
-        
-        msg = self.format(record)
-        
-        # Određivanje taga na osnovu nivoa loga
-        tag = None
-        if record.levelno == logging.ERROR or record.levelno == logging.CRITICAL:
-            tag = "ERROR"
-        elif record.levelno == logging.WARNING:
-            tag = "WARNING"
-        elif record.levelno == logging.INFO:
-            # Poseban tretman za naše "[STATUS]" poruke
-            if record.getMessage().startswith("[STATUS]"):
-                 msg = record.getMessage().replace("[STATUS]", "").strip() # Ukloni prefiks
-                 tag = "STATUS" # Koristi poseban tag za status
-            elif "yt-dlp out" in record.name or "yt-dlp stdout_rem" in record.name or "yt-dlp stderr" in record.name:
-                tag = "YTDLP_OUTPUT" # Za yt-dlp output
-            else:
-                tag = "INFO"
-        elif record.levelno == logging.DEBUG:
-            tag = "DEBUG"
-        
-        self.textbox_widget.master.after(0, self._append_text, msg, tag)
-
-    def _append_text(self, msg, tag):
-        if self.textbox_widget.winfo_exists():
-            self.textbox_widget.configure(state="normal")
-            self.textbox_widget.insert("end", msg + '\n', tags=(tag,) if tag else None)
-            self.textbox_widget.configure(state="disabled")
-            self.textbox_widget.see("end")
-
+ROW_HEIGHT = 28 # Mora odgovarati rowheight u Custom.Treeview stilu
 
 class QueueView(BaseView):
     def __init__(self, master, app_context: dict, **kwargs):
-        # self.queue_treeview i self.log_text_area će biti inicijalizirani u build_ui
+        # self.queue_treeview i self.log_pane će biti inicijalizirani u build_ui
         self.queue_treeview: ttk.Treeview | None = None # Eksplicitna inicijalizacija na None
-        self.log_text_area: ctk.CTkTextbox | None = None # Eksplicitna inicijalizacija na None
-        self.treeview_item_map = {} 
+        self.log_pane: LogPane | None = None
+        # Svi taskovi su u modelu; Treeview sadrži samo vidljive redove (virtualizacija), ažurirane diffom jednom po frameu
+        self.model = QueueModel()
+        self._top = 0; self._rows = 8; self._materialised: list = []; self._selected_ids: set = set()
+        self._flush_pending = False; self._synced_with_dm = False; self._stage_depth_text = ""
         self.dm = app_context.get("download_manager")
-        self.log_text_area_handler_ref = None 
         super().__init__(master, "queue", app_context, **kwargs)
         # build_ui se poziva iz super().__init__
 
     def build_ui(self):
         # ... (kod za title_label, queue_actions_top_frame, control_buttons_frame, tree_container, stilovi, kolone - SVE KAO PRIJE) ...
-        # Samo osiguraj da su sve reference na self.queue_treeview i self.log_text_area ispravne
+        # Samo osiguraj da su sve reference na self.queue_treeview i self.log_pane ispravne
         # nakon što su ti widgeti kreirani.
 
         self.grid_rowconfigure(1, weight=3)
@@ -91,6 +56,11 @@ class QueueView(BaseView):
         self.clear_completed_btn.pack(side="left", padx=5)
         self.cancel_selected_btn = ctk.CTkButton(control_buttons_frame, text="Otkaži Odabrano", command=self._cancel_selected_task, height=30, state="disabled", fg_color=btn_fg, hover_color=btn_hover)
         self.cancel_selected_btn.pack(side="left", padx=5)
+        self.move_to_front_btn = ctk.CTkButton(control_buttons_frame, text="Na Vrh Reda", command=self._move_selected_to_front, height=30, state="disabled", fg_color=btn_fg, hover_color=btn_hover)
+        self.move_to_front_btn.pack(side="left", padx=5)
+        # Dubina reda po stupnju pipeline-a: mrežni slotovi (yt-dlp) i stupanj obrade (ffmpeg, core.postprocess_stage)
+        self.stage_depth_label = ctk.CTkLabel(control_buttons_frame, text="", anchor="e", font=ctk.CTkFont(size=11))
+        self.stage_depth_label.pack(side="right", padx=10)
         
         tree_container = ctk.CTkFrame(queue_actions_top_frame, fg_color="transparent")
         tree_container.grid(row=1, column=0, sticky="nsew")
@@ -113,42 +83,38 @@ class QueueView(BaseView):
         style.configure("Custom.Treeview.Heading", background=header_bg_color, foreground=header_text_color, relief="flat", font=ctk.CTkFont(family="Segoe UI", size=11, weight="bold"))
         style.map("Custom.Treeview.Heading", relief=[('active','groove'),('pressed','sunken')])
 
-        cols = ("filename", "quality", "status", "progress", "speed_eta")
+        cols = COLUMNS
         col_names = ("Zadatak", "Kvaliteta", "Status", "Napredak", "Brzina / ETA")
         col_widths = {"filename": 350, "quality": 180, "status": 120, "progress": 100, "speed_eta": 150}
         col_anchors = {"filename": "w", "quality": "w", "status": "w", "progress": "w", "speed_eta":"w"}
 
-        self.queue_treeview = ttk.Treeview(tree_container, columns=cols, show="headings", style="Custom.Treeview", height=8) # Smanjena visina malo
+        # "tree" kolona (#0) služi samo za strelicu otvaranja parent reda playliste (klik na nju otvara/zatvara djecu)
+        self.queue_treeview = ttk.Treeview(tree_container, columns=cols, show="tree headings", style="Custom.Treeview", height=8) # Smanjena visina malo
+        self.queue_treeview.column("#0", width=28, minwidth=28, stretch=tk.NO)
         for i, col_id in enumerate(cols):
             self.queue_treeview.heading(col_id, text=col_names[i], anchor=tk.W)
             self.queue_treeview.column(col_id, width=col_widths[col_id], minwidth=col_widths[col_id]//2, anchor=col_anchors[col_id], stretch=tk.YES if col_id=="filename" else tk.NO)
         
-        tree_scrollbar_y = ctk.CTkScrollbar(tree_container, command=self.queue_treeview.yview)
-        self.queue_treeview.configure(yscrollcommand=tree_scrollbar_y.set)
+        # Klizač pomiče prozor po modelu, ne Treeview (on ionako ima samo vidljive redove)
+        self.tree_scrollbar_y = ctk.CTkScrollbar(tree_container, command=self._on_scrollbar)
         self.queue_treeview.grid(row=0, column=0, sticky="nsew")
-        tree_scrollbar_y.grid(row=0, column=1, sticky="ns")
+        self.tree_scrollbar_y.grid(row=0, column=1, sticky="ns")
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"): self.queue_treeview.bind(sequence, self._on_mouse_wheel)
+        self.queue_treeview.bind("<Configure>", self._on_resize)
+        self.queue_treeview.bind("<Button-1>", self._on_tree_click, add="+")
 
         self.queue_treeview.tag_configure('COMPLETED', background=theme_colors.get("SUCCESS", "lightgreen"), foreground=theme_colors.get("TEXT_PRIMARY_ON_SUCCESS", "black"))
         self.queue_treeview.tag_configure('ERROR', background=theme_colors.get("ERROR", "pink"), foreground=theme_colors.get("TEXT_PRIMARY_ON_ERROR", "black"))
         self.queue_treeview.tag_configure('DOWNLOADING', foreground=theme_colors.get("ACCENT_PRIMARY", "blue"))
         self.queue_treeview.tag_configure('WAITING', foreground=theme_colors.get("TEXT_SECONDARY", "gray"))
 
-        # --- Log prozor ---
-        log_main_frame = ctk.CTkFrame(self, fg_color="transparent")
-        log_main_frame.grid(row=3, column=0, sticky="nsew", padx=5, pady=(5,0)) # row=3 za logove
-        log_main_frame.grid_rowconfigure(1, weight=1)
-        log_main_frame.grid_columnconfigure(0, weight=1)
-
-        log_label = ctk.CTkLabel(log_main_frame, text="Detaljni Logovi:", font=ctk.CTkFont(size=14, weight="bold"), anchor="w")
-        log_label.grid(row=0, column=0, pady=(5,5), padx=10, sticky="ew")
-
-        self.log_text_area = ctk.CTkTextbox(log_main_frame, wrap="word", state="disabled", height=100, # Prilagodi visinu
-                                            border_width=1, 
-                                            border_color=theme_colors.get("BORDER_PRIMARY", "gray50"),
-                                            font=ctk.CTkFont(family="Consolas", size=10))
-        self.log_text_area.grid(row=1, column=0, sticky="nsew", padx=10, pady=(0,5))
-        
-        self._setup_logging_handler() # Postavi handler NAKON što je log_text_area kreiran
+        # --- Log prozor: ring buffer (core.log_buffer) + virtualizirani prikaz samo vidljivih linija ---
+        log_buffer = self.app_context.get("log_buffer")
+        if log_buffer is None: # Npr. view pokrenut bez App-a; inače buffer i handler postavlja app_phoenix
+            log_buffer = LogRingBuffer(self.app_context.get("settings", {}).get("log_buffer_lines", 5000))
+            install_log_buffer_handler(log_buffer); self.app_context["log_buffer"] = log_buffer
+        self.log_pane = LogPane(self, log_buffer, theme_colors)
+        self.log_pane.grid(row=3, column=0, sticky="nsew", padx=5, pady=(5,0)) # row=3 za logove
         
         self.queue_treeview.bind("<<TreeviewSelect>>", self._on_treeview_select)
         
@@ -156,22 +122,24 @@ class QueueView(BaseView):
         self.on_view_enter()
 
 
-    def _setup_logging_handler(self): # Ostaje isto
-         if hasattr(self, 'log_text_area') and self.log_text_area:
-             text_handler = CTkTextboxHandler(self.log_text_area)
-             formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s', datefmt='%H:%M:%S')
-             text_handler.setFormatter(formatter)
-             root_logger = logging.getLogger() 
-             if not any(isinstance(h, CTkTextboxHandler) and h.textbox_widget == self.log_text_area for h in root_logger.handlers):
-                 root_logger.addHandler(text_handler)
-                 text_handler.setLevel(logging.DEBUG) # Postavi na DEBUG da vidimo više
-                 logger.info("CTkTextboxHandler uspješno dodan na root logger.")
-             else: logger.info("CTkTextboxHandler je već bio dodan.")
-         else: logger.error("Pokušaj postavljanja logging handlera, ali log_text_area nije inicijaliziran.")
-
-    def _on_treeview_select(self, event=None): # Ostaje isto
-        selected_items = self.queue_treeview.selection()
+    def _on_treeview_select(self, event=None):
+        # Treeview zna samo za vidljive redove; odabir izvan prozora ostaje zapamćen u _selected_ids
+        self._selected_ids = (self._selected_ids - set(self._materialised)) | set(self.queue_treeview.selection())
+        selected_items = self._selected_item_ids()
+        if self.log_pane: # Filter "samo odabrani zadatak": parent red playliste uključuje i svu djecu
+            self.log_pane.set_selected_tasks([iid for item in selected_items for iid in (item, *self.model.children_of(item))])
         self.cancel_selected_btn.configure(state="normal" if selected_items else "disabled")
+        self.move_to_front_btn.configure(state="normal" if selected_items else "disabled")
+
+    def _selected_item_ids(self) -> list:
+        if not self._selected_ids: return []
+        return [item_id for item_id in self.model.flat_ids() if item_id in self._selected_ids]
+
+    def _on_tree_click(self, event):
+        if not event.state & 0x0005: self._selected_ids.intersection_update(self._materialised) # Klik bez Ctrl/Shift zamjenjuje cijeli odabir
+        if self.queue_treeview.identify_region(event.x, event.y) == "tree":
+            item_id = self.queue_treeview.identify_row(event.y)
+            if item_id and self.model.toggle_expanded(item_id): self.flush(); return "break"
 
     def _start_all_downloads(self): # Ostaje isto
         if self.dm:
@@ -180,87 +148,135 @@ class QueueView(BaseView):
             if status_bar_var: status_bar_var.set("Pokrećem preuzimanja iz reda...")
         else: logger.error("DownloadManager nije dostupan za pokretanje reda.")
 
-    def _clear_finished_tasks(self): # Ostaje isto
-        items_to_remove_from_dm = []; items_to_delete_from_treeview = []
-        for item_id_str in list(self.treeview_item_map.keys()):
-            task = self.treeview_item_map.get(item_id_str)
-            if task and (task.status == "Završeno" or "Greška" in task.status or "Otkazano" in task.status):
-                items_to_delete_from_treeview.append(item_id_str)
-                if self.dm: items_to_remove_from_dm.append(item_id_str)
-        for item_id_str in items_to_delete_from_treeview: self.remove_task_from_view(item_id_str)
+    def _clear_finished_tasks(self):
+        finished_ids = [str(task.item_id) for task in self.model.tasks() if task.status == "Završeno" or "Greška" in task.status or "Otkazano" in task.status]
+        removed_ids = self.model.remove_many(finished_ids) # Uključuje i djecu uklonjenih playlisti
         if self.dm:
-            for item_id_str in items_to_remove_from_dm: self.dm.remove_task_completely(item_id_str)
-        logger.info(f"Obrisano {len(items_to_delete_from_treeview)} završenih/neuspjelih/otkazanih zadataka.")
-        if not self.queue_treeview.get_children():
+            for item_id_str in removed_ids: self.dm.remove_task_completely(item_id_str)
+        self._selected_ids.difference_update(removed_ids); self.flush()
+        logger.info(f"Obrisano {len(removed_ids)} završenih/neuspjelih/otkazanih zadataka.")
+        if not len(self.model):
              status_bar_var = self.app_context.get("status_bar_var")
              if status_bar_var: status_bar_var.set("Red čekanja je prazan.")
 
-    def _cancel_selected_task(self): # Ostaje isto
-         selected_items_iid = self.queue_treeview.selection()
+    def _cancel_selected_task(self):
+         selected_items_iid = self._selected_item_ids()
          if not selected_items_iid:
              messagebox.showwarning("Nema odabira", "Molimo odaberite zadatak za otkazivanje.", parent=self.winfo_toplevel()); return
-         task_item_id_str = selected_items_iid[0] 
-         task_to_cancel = self.treeview_item_map.get(task_item_id_str)
-         if task_to_cancel and self.dm:
-             if task_to_cancel.status == "Preuzimanje..." or task_to_cancel.status == "U redu" or task_to_cancel.status == "Čeka" or task_to_cancel.status == "Priprema...":
-                 if messagebox.askyesno("Potvrda Otkazivanja", f"Jeste li sigurni da želite otkazati preuzimanje za:\n{task_to_cancel.url}?", parent=self.winfo_toplevel()):
-                     if self.dm.cancel_task(task_item_id_str): logger.info(f"Zahtjev za otkazivanje poslan za task ID: {task_item_id_str}")
-                     else: logger.warning(f"Nije moguće otkazati task {task_item_id_str}."); task_to_cancel.status = "Greška otkazivanja"; self.update_task_in_view(task_to_cancel)
-             else: messagebox.showinfo("Info", "Ovaj zadatak nije u stanju koje se može otkazati.", parent=self.winfo_toplevel())
-         self.cancel_selected_btn.configure(state="disabled")
-
-    def add_task_to_view(self, task: de.DownloadTask): # Ostaje isto
-        item_id_str = str(task.item_id)
-        if not self.winfo_exists(): return
-        if not hasattr(self, 'queue_treeview') or not self.queue_treeview: self.after(100, lambda t=task: self.add_task_to_view(t)); return
-        if item_id_str in self.treeview_item_map and self.queue_treeview.exists(item_id_str): self.update_task_in_view(task); return
-        display_url = task.url; len_url = len(display_url)
-        if len_url > 60: display_url = display_url[:28] + "..." + display_url[len_url-29:] # Skrati sredinu
-        if not self.queue_treeview.exists(item_id_str):
-             try:
-                 self.queue_treeview.insert("", "end", iid=item_id_str, values=(display_url, task.quality_profile_key, task.status, task.progress_str, f"{task.speed_str} / {task.eta_str}"))
-                 self.treeview_item_map[item_id_str] = task; logger.debug(f"Task dodan u QueueView: {item_id_str} ({task.status})")
-             except tk.TclError as e_insert: logger.error(f"TclError pri insertu za iid {item_id_str}: {e_insert}. Pokušavam update."); self.update_task_in_view(task)
-        else: self.update_task_in_view(task)
-
-    def update_task_in_view(self, task: de.DownloadTask): # Ostaje isto
-        item_id_str = str(task.item_id)
-        if not self.winfo_exists(): return
-        if not hasattr(self, 'queue_treeview') or not self.queue_treeview: self.after(100, lambda t=task: self.update_task_in_view(t)); return
-        if not self.queue_treeview.exists(item_id_str): self.logger.warning(f"Pokušaj ažuriranja nepostojećeg itema {item_id_str}. Dodajem ga."); self.add_task_to_view(task); return
-        
-        display_name = os.path.basename(task.final_filename) if task.final_filename else task.url
-        len_dn = len(display_name)
-        if len_dn > 60: display_name = display_name[:28] + "..." + display_name[len_dn-29:]
-        speed_eta_display = f"{task.speed_str} / {task.eta_str}" if task.speed_str or task.eta_str else "-"
-        if task.status == "Preuzimanje..." and not task.speed_str and not task.eta_str and task.progress_val < 1: speed_eta_display = "Pokrećem..."
-        try:
-             self.queue_treeview.item(item_id_str, values=(display_name, task.quality_profile_key, task.status, task.progress_str, speed_eta_display))
-             tags_to_apply = ()
-             if task.status == "Završeno": tags_to_apply = ('COMPLETED',)
-             elif "Greška" in task.status or task.status.startswith("Otkazano"): tags_to_apply = ('ERROR',)
-             elif task.status == "Preuzimanje...": tags_to_apply = ('DOWNLOADING',)
-             elif task.status == "U redu" or task.status == "Čeka": tags_to_apply = ('WAITING',)
-             self.queue_treeview.item(item_id_str, tags=tags_to_apply)
-             logger.debug(f"Task ažuriran u QueueView: {item_id_str}, Status: {task.status}, Progres: {task.progress_str}")
-        except tk.TclError as e_update: logger.error(f"TclError pri ažuriranju itema {item_id_str}: {e_update}")
-        if item_id_str in self.treeview_item_map: del self.treeview_item_map[item_id_str]
-
-    def remove_task_from_view(self, task_item_id_str: str): # Ostaje isto
-         if hasattr(self, 'queue_treeview') and self.queue_treeview and self.queue_treeview.exists(task_item_id_str):
-             self.queue_treeview.delete(task_item_id_str)
-         if task_item_id_str in self.treeview_item_map: del self.treeview_item_map[task_item_id_str]
+         cancellable_statuses = ("Preuzimanje...", "U redu", "Čeka", "Priprema...", "Proširivanje...", "Čeka obradu", "Obrada...")
+         tasks_to_cancel = [task for task in (self.model.get_task(iid) for iid in selected_items_iid) if task and task.status in cancellable_statuses]
+         if not tasks_to_cancel:
+             messagebox.showinfo("Info", "Odabrani zadaci nisu u stanju koje se može otkazati.", parent=self.winfo_toplevel())
+         elif self.dm:
+             question = f"Jeste li sigurni da želite otkazati preuzimanje za:\n{tasks_to_cancel[0].url}?" if len(tasks_to_cancel) == 1 else f"Jeste li sigurni da želite otkazati {len(tasks_to_cancel)} preuzimanja?"
+             if messagebox.askyesno("Potvrda Otkazivanja", question, parent=self.winfo_toplevel()):
+                 task_ids = [str(task.item_id) for task in tasks_to_cancel]
+                 cancel_tasks = getattr(self.dm, "cancel_tasks", None) # AsyncDownloader zna samo cancel_task po ID-u
+                 cancelled_count = cancel_tasks(task_ids) if cancel_tasks else sum(1 for item_id in task_ids if self.dm.cancel_task(item_id))
+                 logger.info(f"Zahtjev za otkazivanje poslan za {cancelled_count}/{len(tasks_to_cancel)} zadataka.")
+         self.cancel_selected_btn.configure(state="disabled"); self.move_to_front_btn.configure(state="disabled")
+
+    def _move_selected_to_front(self):
+         if not self.dm: return
+         move_task_to_front = getattr(self.dm, "move_task_to_front", None) # AsyncDownloader nema prioritetni red
+         if not move_task_to_front: logger.info("Aktivni download manager ne podržava premještanje na vrh reda."); return
+         # Obrnutim redom, da prvi odabrani završi na samom vrhu
+         for task_item_id_str in reversed(self._selected_item_ids()):
+             if not move_task_to_front(task_item_id_str): logger.info(f"Task {task_item_id_str} nije u redu čekanja, ne mogu ga premjestiti.")
+
+    # --- Model -> Treeview ---
+    def has_task(self, item_id) -> bool:
+        return item_id in self.model
+
+    def add_task_to_view(self, task: de.DownloadTask):
+        """Dodaje ili osvježava task u modelu; Treeview se ažurira u flush() (jednom po frameu)."""
+        if self.model.upsert(task): self._schedule_flush()
+
+    update_task_in_view = add_task_to_view
+
+    def remove_task_from_view(self, task_item_id_str: str):
+         removed_ids = self.model.remove_many([task_item_id_str])
+         self._selected_ids.difference_update(removed_ids); self._schedule_flush()
          logger.info(f"Task {task_item_id_str} uklonjen iz QueueView.")
 
-    def on_view_enter(self): # Ostaje isto
+    def _schedule_flush(self):
+        if self._flush_pending: return
+        self._flush_pending = True
+        try: self.after_idle(self.flush)
+        except (tk.TclError, RuntimeError): self._flush_pending = False
+
+    def flush(self):
+        """Dovodi Treeview u stanje modela: samo redovi u prozoru [_top, _top + _rows) i samo promijenjene kolone."""
+        self._flush_pending = False
+        if not self.queue_treeview or not self.winfo_exists(): return
+        tree = self.queue_treeview; flat = self.model.flat_ids()
+        self._top = min(self._top, max(0, len(flat) - self._rows))
+        window = flat[self._top:self._top + self._rows]
+        try:
+            if window != self._materialised:
+                keep = set(window); previous = set(self._materialised)
+                stale = [item_id for item_id in self._materialised if item_id not in keep]
+                if stale: tree.delete(*[item_id for item_id in stale if tree.exists(item_id)])
+                for item_id in stale: self.model.mark_unrendered(item_id)
+                for index, item_id in enumerate(window):
+                    if item_id in previous and self.model.is_rendered(item_id): tree.move(item_id, "", index); continue
+                    if tree.exists(item_id): tree.delete(item_id) # Uklonjen pa ponovo dodan između dva flusha
+                    row = self.model.mark_rendered(item_id)
+                    tree.insert("", index, iid=item_id, text=row.values[0], values=row.values[1:], tags=(row.tag,) if row.tag else ())
+                self._materialised = window
+                wanted_selection = [item_id for item_id in window if item_id in self._selected_ids]
+                if set(tree.selection()) != set(wanted_selection): tree.selection_set(wanted_selection)
+            for item_id, changed, tag in self.model.take_changes():
+                for index, value in changed.items():
+                    if index == 0: tree.item(item_id, text=value)
+                    else: tree.set(item_id, COLUMNS[index - 1], value)
+                if tag is not TAG_UNCHANGED: tree.item(item_id, tags=(tag,) if tag else ())
+        except tk.TclError as e_flush: logger.error(f"TclError pri osvježavanju QueueView: {e_flush}")
+        self._update_stage_depths()
+        total = len(flat)
+        if total: self.tree_scrollbar_y.set(self._top / total, min(1.0, (self._top + self._rows) / total))
+        else: self.tree_scrollbar_y.set(0.0, 1.0)
+
+    def _update_stage_depths(self):
+        stage_depths = getattr(self.dm, "stage_depths", None) # AsyncDownloader nema zaseban stupanj obrade
+        if stage_depths is None: return
+        depths = stage_depths(); network = depths["network"]; postprocess = depths["postprocess"]
+        text = (f"Preuzimanje: {network['active']}/{network['capacity']} · u redu {network['queued']}    "
+                f"Obrada: {postprocess['active']}/{postprocess['capacity']} · u redu {postprocess['queued']}")
+        if text != self._stage_depth_text: self._stage_depth_text = text; self.stage_depth_label.configure(text=text)
+
+    # --- Skrolanje i veličina ---
+    def _set_top(self, top: int):
+        top = min(max(0, top), max(0, len(self.model.flat_ids()) - self._rows))
+        if top != self._top: self._top = top; self.flush()
+
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == "moveto": self._set_top(int(float(value) * len(self.model.flat_ids())))
+        elif action == "scroll": self._set_top(self._top + int(value) * (self._rows if unit == "pages" else 1))
+
+    def _on_mouse_wheel(self, event):
+        if getattr(event, "num", None) == 4: step = -3
+        elif getattr(event, "num", None) == 5: step = 3
+        else: step = -3 if event.delta > 0 else 3
+        self._set_top(self._top + step)
+        return "break"
+
+    def _on_resize(self, event=None):
+        rows = max(1, (self.queue_treeview.winfo_height() - ROW_HEIGHT) // ROW_HEIGHT + 1) # Zaglavlje je otprilike visine reda
+        if rows != self._rows: self._rows = rows; self._schedule_flush()
+
+    def _sync_from_dm(self):
+        """Jedan prolaz kroz DM bez sortiranja; potreban samo prvi put i kad se broj taskova ne slaže s modelom."""
+        dm_tasks = list(self.dm.iter_tasks()); dm_task_ids = {str(task.item_id) for task in dm_tasks}
+        stale_ids = [str(task.item_id) for task in self.model.tasks() if str(task.item_id) not in dm_task_ids]
+        if stale_ids: self._selected_ids.difference_update(self.model.remove_many(stale_ids))
+        for task in dm_tasks: self.model.upsert(task)
+        self._synced_with_dm = True
+
+    def on_view_enter(self):
          super().on_view_enter()
-         self.cancel_selected_btn.configure(state="disabled")
-         if self.dm:
-             all_dm_tasks = self.dm.get_all_tasks_snapshot()
-             # Očisti trenutne iteme u treeview koji više ne postoje u DM-u
-             current_tree_items = set(self.queue_treeview.get_children())
-             dm_task_ids = {str(t.item_id) for t in all_dm_tasks}
-             for item_id_str in current_tree_items - dm_task_ids: self.remove_task_from_view(item_id_str)
-             # Dodaj/ažuriraj taskove iz DM-a
-             for task in all_dm_tasks: self.add_task_to_view(task) # add_task_to_view će pozvati update ako već postoji
-         logger.info(f"QueueView aktiviran. Prikazano {len(self.treeview_item_map)} zadataka.")
\ No newline at end of file
+         self.cancel_selected_btn.configure(state="disabled"); self.move_to_front_btn.configure(state="disabled")
+         # Model se ažurira događajima i dok je pogled skriven, pa ulazak ne prolazi kroz sve taskove
+         if self.dm and (not self._synced_with_dm or self.dm.task_count() != len(self.model)): self._sync_from_dm()
+         self.flush()
+         logger.info(f"QueueView aktiviran. U modelu {len(self.model)} zadataka, u prikazu {len(self._materialised)} redova.")
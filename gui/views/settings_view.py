@@ -63,6 +63,32 @@ class SettingsView(BaseView):
                                      button_hover_color=button_hover_color)
         qual_combo.pack(side="left", padx=5, pady=5)
 
+        # 2b. Broj istovremenih preuzimanja (Downloader mijenja broj slotova odmah nakon spremanja)
+        concurrency_frame = ctk.CTkFrame(scrollable_frame, fg_color=frame_fg_color)
+        concurrency_frame.pack(fill="x", pady=5, padx=5, anchor="w")
+        ctk.CTkLabel(concurrency_frame, text="Istovremenih Preuzimanja:", anchor="w", font=label_font, text_color=label_text_color).pack(side="left", padx=(5,10), pady=5)
+        self.settings_vars["max_concurrent_downloads"] = StringVar(value=str(current_settings.get("max_concurrent_downloads", 1)))
+        concurrency_combo = ctk.CTkComboBox(concurrency_frame, variable=self.settings_vars["max_concurrent_downloads"],
+                                            values=[str(n) for n in range(1, 11)], state="readonly", width=100, height=entry_height,
+                                            fg_color=theme_colors_dict.get("INPUT_BG"),
+                                            border_color=theme_colors_dict.get("INPUT_BORDER"),
+                                            button_color=button_fg_color,
+                                            button_hover_color=button_hover_color)
+        concurrency_combo.pack(side="left", padx=5, pady=5)
+
+        # 2c. Download engine (core.downloader_engine ili core.async_engine); vrijedi od sljedećeg pokretanja
+        engine_frame = ctk.CTkFrame(scrollable_frame, fg_color=frame_fg_color)
+        engine_frame.pack(fill="x", pady=5, padx=5, anchor="w")
+        ctk.CTkLabel(engine_frame, text="Download Engine (nakon ponovnog pokretanja):", anchor="w", font=label_font, text_color=label_text_color).pack(side="left", padx=(5,10), pady=5)
+        self.settings_vars["download_engine"] = StringVar(value=current_settings.get("download_engine", "threading"))
+        engine_combo = ctk.CTkComboBox(engine_frame, variable=self.settings_vars["download_engine"],
+                                       values=list(sh.SUPPORTED_DOWNLOAD_ENGINES), state="readonly", width=140, height=entry_height,
+                                       fg_color=theme_colors_dict.get("INPUT_BG"),
+                                       border_color=theme_colors_dict.get("INPUT_BORDER"),
+                                       button_color=button_fg_color,
+                                       button_hover_color=button_hover_color)
+        engine_combo.pack(side="left", padx=5, pady=5)
+
         # 3. Tema Aplikacije
         theme_outer_frame = ctk.CTkFrame(scrollable_frame, fg_color=frame_fg_color)
         theme_outer_frame.pack(fill="x", pady=5, padx=5, anchor="w")
@@ -124,6 +150,11 @@ class SettingsView(BaseView):
                         variable=self.settings_vars["add_metadata_video"], font=label_font,
                         fg_color=checkbox_fg_color, hover_color=checkbox_hover_color).pack(anchor="w", padx=5, pady=4)
 
+        self.settings_vars["stream_copy_first"] = BooleanVar(value=current_settings.get("stream_copy_first", True))
+        ctk.CTkCheckBox(bool_frame, text="Kopiraj izvorni audio umjesto kodiranja gdje profil to dopušta (profil \"Audio - MP3 ili izvorni AAC/Opus\")",
+                        variable=self.settings_vars["stream_copy_first"], font=label_font,
+                        fg_color=checkbox_fg_color, hover_color=checkbox_hover_color).pack(anchor="w", padx=5, pady=4)
+
         # Gumb za spremanje
         save_button_frame = ctk.CTkFrame(scrollable_frame, fg_color="transparent")
         save_button_frame.pack(fill="x", pady=(20,5), padx=5)
@@ -141,9 +172,12 @@ class SettingsView(BaseView):
             self.settings_vars["output_directory"].set(os.path.abspath(new_dir))
 
     def _save_settings_action(self):
-        new_settings = {}
+        # Kreni od postojećih postavki da se ne izgube ključevi koji nemaju widget (geometrija, širina sidebara...)
+        new_settings = dict(self.app_context.get("settings") or sh.load_settings())
         for key, var in self.settings_vars.items():
             new_settings[key] = var.get()
+        try: new_settings["max_concurrent_downloads"] = max(1, int(new_settings.get("max_concurrent_downloads", 1)))
+        except (TypeError, ValueError): new_settings["max_concurrent_downloads"] = sh.DEFAULT_SETTINGS["max_concurrent_downloads"]
         
         output_dir = new_settings["output_directory"]
         if not os.path.isdir(output_dir):
@@ -173,9 +207,7 @@ class SettingsView(BaseView):
         self.logger.info("Postavke spremljene.")
         messagebox.showinfo("Postavke", "Postavke su uspješno sačuvane.\nNeke promjene (npr. boja teme za postojeće elemente) mogu zahtijevati ponovno pokretanje aplikacije.", parent=self)
         
-        dm = self.app_context.get("download_manager")
-        if dm:
-            dm.current_settings = new_settings # Obavijesti DownloadManager o novim postavkama
+        # DownloadManager je pretplaćen na settings_handler pa sam preuzima nove postavke i broj slotova
 
     def on_view_enter(self):
         super().on_view_enter() # Pozovi on_view_enter iz BaseView
@@ -0,0 +1,798 @@
+import asyncio
+import contextlib
+import datetime
+import logging
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+import importlib.util
+
+from core import downloader_engine as de
+from core import settings_handler
+from core.task_queue import IndexedTaskQueue
+from core.task_journal import TaskJournal
+from core.event_bus import CoalescingEventBus
+from core.downloader_engine import Downloader, DownloadTask, QUALITY_PROFILES, apply_protocol_line
+from core.host_limits import HostLimiter, split_bandwidth
+from core.log_buffer import LogRingBuffer, LogBufferHandler, KIND_TASK_OUTPUT
+from core.download_tuning import parse_size, resolve_tuning, tuning_cli_args, tuning_ytdl_options
+from core.progress_protocol import LINE_PROGRESS, LINE_FILEPATH, LINE_RAW, parse_line
+from core.extraction_cache import ExtractionCache
+from core.ytdlp_worker_pool import YtDlpWorkerPool
+from core.url_canonicalizer import canonicalize_url, archive_id_for, task_id_for
+from core.download_archive import DownloadArchive
+from core.playlist_expander import PlaylistGroup, is_probable_playlist_url, parse_entry_line
+from core.queue_model import QueueModel, TAG_UNCHANGED
+from core.settings_handler import SettingsStore, download_engine_error
+from utils.icon_cache import IconStore
+from core.process_reactor import ProcessReactor
+from core.metrics import EngineMetrics, MetricsExporter
+from core.tracing import Tracer
+from core.postprocess_stage import plan_postprocess
+from core.format_planner import FormatPlan, plan_audio_format, plan_downloaded, ytdlp_audio_format
+import subprocess
+import sys
+import json
+import queue
+import shutil
+
+
+class _Task:
+    def __init__(self, item_id):
+        self.item_id = item_id
+
+
+def _load_benchmark(name):
+    # benchmarks/ nije paket; launcheri za fake yt-dlp/ffmpeg su u bench_engine_throughput (uvoz ne dira core ni HOME)
+    spec = importlib.util.spec_from_file_location(name, os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", f"{name}.py"))
+    module = importlib.util.module_from_spec(spec); spec.loader.exec_module(module)
+    return module
+
+
+@contextlib.contextmanager
+def _fake_engine_env(work_dir, **settings):
+    """Engine nad fake yt-dlp/ffmpeg (launcheri u work_dir), s postavkama samo u memoriji; vraća te postavke."""
+    bench = _load_benchmark("bench_engine_throughput")
+    settings = {**settings_handler.DEFAULT_SETTINGS, "output_directory": work_dir, "extraction_cache_enabled": False,
+                "download_archive_enabled": False, **settings}
+    with mock.patch.object(de, "YT_DLP_EXECUTABLE", bench._write_launcher(work_dir)), \
+         mock.patch.object(de, "FFMPEG_EXECUTABLE", bench._write_launcher(work_dir, bench._FAKE_FFMPEG, "fake-ffmpeg")), \
+         mock.patch.object(settings_handler, "load_settings", return_value=settings):
+        yield settings
+
+
+def _run_cli(work_dir, urls, argv=(), **settings):
+    """cli_phoenix.main u _fake_engine_env; vraća (izlazni kod, JSON-lines događaji)."""
+    import io
+    import cli_phoenix
+    url_file = os.path.join(work_dir, "urls.txt")
+    with open(url_file, "w", encoding="utf-8") as f: f.write("\n".join(urls) + "\n")
+    out = io.StringIO()
+    with _fake_engine_env(work_dir, **settings), mock.patch.object(sys, "stdout", out):
+        exit_code = cli_phoenix.main([url_file, "--progress-interval", "60", *argv])
+    return exit_code, [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+class TestSlotScheduler(unittest.TestCase):
+    def test_dispatches_up_to_limit_and_wakes_on_limit_change_and_release(self):
+        started = []
+        downloader = Downloader(lambda *args: None, max_concurrent_downloads=2)
+        downloader._execute_download = started.append # Slot ostaje zauzet dok ga test ne oslobodi
+        for index in range(4): downloader.add_to_queue(DownloadTask(f"https://host{index}.example.com/a.mp4", "Video - 1080p MP4", tempfile.gettempdir(), f"slot_{index}"))
+        def wait_started(count):
+            deadline = time.time() + 2
+            while len(started) < count and time.time() < deadline: time.sleep(0.01)
+            return [task.item_id for task in started]
+        self.assertEqual(wait_started(2), ["slot_0", "slot_1"])
+        time.sleep(0.1); self.assertEqual((len(started), downloader.active_downloads_count, downloader.download_queue.qsize()), (2, 2, 2))
+        downloader.set_max_concurrent_downloads(3)
+        self.assertEqual(wait_started(3)[-1], "slot_2")
+        downloader._release_slot(started[0])
+        self.assertEqual(wait_started(4)[-1], "slot_3")
+        self.assertEqual(downloader.active_downloads_count, 3)
+        downloader.stop_worker()
+
+
+class TestIndexedTaskQueue(unittest.TestCase):
+    def _queue_with(self, *item_ids):
+        q = IndexedTaskQueue()
+        for item_id in item_ids:
+            q.put(_Task(item_id))
+        return q
+
+    def test_fifo_within_priority(self):
+        q = self._queue_with("a", "b", "c")
+        self.assertEqual([q.get_nowait().item_id for _ in range(3)], ["a", "b", "c"])
+        self.assertRaises(queue.Empty, q.get_nowait)
+
+    def test_remove_and_bulk_remove(self):
+        q = self._queue_with("a", "b", "c", "d")
+        self.assertEqual(q.remove("b").item_id, "b")
+        self.assertIsNone(q.remove("b"))
+        self.assertEqual(sorted(t.item_id for t in q.remove_many(["a", "d", "x"])), ["a", "d"])
+        self.assertEqual(len(q), 1)
+        self.assertNotIn("a", q)
+        self.assertEqual(q.get_nowait().item_id, "c")
+        self.assertTrue(q.empty())
+
+    def test_reprioritize_and_move_to_front(self):
+        q = self._queue_with("a", "b", "c")
+        self.assertTrue(q.reprioritize("a", 5))
+        self.assertTrue(q.move_to_front("c"))
+        self.assertFalse(q.move_to_front("missing"))
+        self.assertEqual([t.item_id for t in q.ordered_tasks()], ["c", "b", "a"])
+        self.assertEqual([t.item_id for t in q.drain()], ["c", "b", "a"])
+        self.assertEqual(q.qsize(), 0)
+
+    def test_pop_first_ready_skips_whole_groups(self):
+        q = IndexedTaskQueue(group_of=lambda t: t.item_id[0])
+        for item_id in ("a1", "b1", "a2", "b2"): q.put(_Task(item_id))
+        checked = []
+        self.assertEqual(q.pop_first_ready(lambda group: checked.append(group) or group == "b").item_id, "b1")
+        self.assertEqual(sorted(checked), ["a", "b"]) # Jedna provjera po podredu, ne po tasku
+        self.assertIsNone(q.pop_first_ready(lambda group: False))
+        self.assertTrue(q.move_to_front("b2"))
+        self.assertEqual([t.item_id for t in q.ordered_tasks()], ["b2", "a1", "a2"])
+        self.assertEqual([q.get_nowait().item_id for _ in range(3)], ["b2", "a1", "a2"])
+
+    def test_mass_cancel_compacts_heap(self):
+        q = self._queue_with(*[f"t{i}" for i in range(1000)])
+        q.remove_many([f"t{i}" for i in range(999)])
+        self.assertLess(sum(len(heap) for heap in q._groups.values()), 200)
+        self.assertEqual(q.get_nowait().item_id, "t999")
+
+
+class TestCoalescingEventBus(unittest.TestCase):
+    def test_keeps_strongest_event_per_task(self):
+        bus = CoalescingEventBus()
+        task = _Task("a")
+        self.assertTrue(bus.publish(task, "progress_update"))
+        self.assertFalse(bus.publish(task, "download_complete"))
+        bus.publish(task, "status_update")
+        bus.publish(_Task("b"), "progress_update")
+        task_events, log_lines = bus.drain()
+        self.assertEqual([(t.item_id, u) for t, u, _ in task_events], [("a", "download_complete"), ("b", "progress_update")])
+        self.assertEqual(log_lines, [])
+        self.assertEqual(bus.get_stats()["merged"], 2)
+        self.assertTrue(bus.publish(task, "progress_update"))
+
+    def test_log_lines_are_bounded(self):
+        bus = CoalescingEventBus(max_log_lines_per_frame=3)
+        for i in range(5):
+            bus.publish(_Task("a"), "log_message", f"line {i}")
+        _, log_lines = bus.drain()
+        self.assertEqual([data for _, data in log_lines], ["line 2", "line 3", "line 4"])
+        self.assertEqual(bus.get_stats()["dropped"], 2)
+
+    def test_failed_schedule_is_retried(self):
+        bus = CoalescingEventBus()
+        self.assertTrue(bus.publish(_Task("a"), "progress_update"))
+        bus.schedule_failed() # root.after nije uspio: sabirnica ne smije ostati "zakazana" bez draina
+        self.assertTrue(bus.publish(_Task("b"), "progress_update"))
+        self.assertFalse(bus.publish(_Task("c"), "progress_update"))
+        self.assertEqual(len(bus.drain()[0]), 3)
+
+
+class TestTaskJournal(unittest.TestCase):
+    def test_shutdown_freezes_journal_and_restart_restores_unfinished(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "journal.sqlite3"); started = []
+            downloader = Downloader(lambda *args: None, max_concurrent_downloads=1, journal=TaskJournal(path))
+            downloader._execute_download = started.append # Prvi task drži slot, ostali ostaju u redu
+            for index in range(4): downloader.add_to_queue(DownloadTask(f"https://example.com/{index}.mp4", "Video - 1080p MP4", tmp, f"journal_{index}"))
+            deadline = time.time() + 2
+            while not started and time.time() < deadline: time.sleep(0.01)
+            done = downloader.all_tasks_map["journal_3"]; downloader.download_queue.remove("journal_3")
+            done.status = "Završeno"; downloader._emit(done, "download_complete")
+            downloader.stop_worker() # Otkazivanje zbog gašenja ne smije završiti taskove u dnevniku
+            self.assertEqual((started[0].status, downloader.all_tasks_map["journal_1"].status), ("Otkazano (sistem)", "Otkazano (gašenje)"))
+            restored = Downloader(lambda *args: None, max_concurrent_downloads=1, journal=TaskJournal(path))
+            restored._execute_download = lambda task: None
+            self.assertEqual(restored.restore_from_journal(), 3)
+            self.assertEqual(sorted(restored.all_tasks_map), ["journal_0", "journal_1", "journal_2"])
+            self.assertTrue(all(task.resumed for task in restored.all_tasks_map.values()))
+            self.assertEqual(restored.journal.load_unfinished()[0]["url"], "https://example.com/0.mp4")
+            restored.stop_worker()
+
+
+    def test_concurrent_records_start_one_writer(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            journal = TaskJournal(os.path.join(tmp, "journal.sqlite3")); writers = []
+            journal._writer_loop = lambda: (writers.append(threading.current_thread()), time.sleep(0.3)) # Writer živ dok svi bilježe
+            barrier = threading.Barrier(16)
+            def record(index):
+                task = DownloadTask(f"https://example.com/{index}.mp4", "Video - 1080p MP4", tmp, f"writer_{index}")
+                barrier.wait(); journal.record(task)
+            threads = [threading.Thread(target=record, args=(index,)) for index in range(16)]
+            for thread in threads: thread.start()
+            for thread in threads: thread.join()
+            journal.close(); journal._ensure_writer() # Zatvoreni dnevnik ne pokreće novi writer
+            self.assertEqual(len(writers), 1)
+            self.assertEqual(len(TaskJournal(journal.path).load_unfinished()), 16)
+
+class TestCliExitCodes(unittest.TestCase):
+    def test_exit_codes_and_summary(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            exit_code, events = _run_cli(tmp, ["https://example.com/a?duration=0.1", "https://example.com/b?duration=0.1"], postprocess_stage_enabled=False)
+            self.assertEqual(exit_code, 0)
+            done = sorted((event for event in events if event["event"] == "done"), key=lambda event: event["id"])
+            self.assertEqual([(event["id"], event["ok"], event["exit_code"]) for event in done], [("cli_0", True, 0), ("cli_1", True, 0)])
+            self.assertTrue(all(os.path.isfile(event["file"]) for event in done))
+            self.assertEqual({key: events[-1][key] for key in ("event", "total", "ok", "failed")}, {"event": "summary", "total": 2, "ok": 2, "failed": 0})
+
+            exit_code, events = _run_cli(tmp, ["https://example.com/c?duration=0.1", "https://example.com/d?fail=1", "# komentar"], postprocess_stage_enabled=False)
+            failed = next(event for event in events if event["event"] == "done" and not event["ok"])
+            self.assertEqual((exit_code, failed["id"], failed["status"], failed["exit_code"]), (1, "cli_1", "Greška", 1))
+            self.assertIn("Simulirana greška", failed["error"])
+            self.assertEqual((events[-1]["total"], events[-1]["ok"], events[-1]["failed"]), (2, 1, 1))
+
+            self.assertEqual(_run_cli(tmp, ["https://example.com/e"], ["--jobs", "0"]), (2, []))
+
+
+class TestProgressProtocol(unittest.TestCase):
+    def test_parse_line_recognizes_only_protocol_lines(self):
+        self.assertEqual(parse_line('bbx-progress:{"status": "downloading", "downloaded_bytes": 5}'),
+                         (LINE_PROGRESS, {"status": "downloading", "downloaded_bytes": 5}))
+        self.assertEqual(parse_line("bbx-file:/tmp/a b.mp4"), (LINE_FILEPATH, "/tmp/a b.mp4"))
+        self.assertEqual(parse_line("bbx-progress:{broken"), (None, None))
+        self.assertEqual(parse_line("[download] Destination: x.mp4"), (None, None))
+
+    def test_bytes_accumulate_across_files(self):
+        task = DownloadTask("https://example.com/v", "Video - Najbolji MP4", "/tmp", "t1")
+        apply_protocol_line(task, 'bbx-progress:{"status": "downloading", "downloaded_bytes": 250, "total_bytes": 1000, "speed": 2048, "eta": 65}')
+        self.assertEqual((task.downloaded_bytes, task.total_bytes, task.progress_str), (250, 1000, "25.0%"))
+        self.assertEqual((task.speed_str, task.eta_str), ("2.0KiB/s", "01:05"))
+        apply_protocol_line(task, 'bbx-progress:{"status": "finished", "downloaded_bytes": 1000, "total_bytes": 1000}')
+        apply_protocol_line(task, 'bbx-progress:{"status": "downloading", "downloaded_bytes": 100, "total_bytes_estimate": 400}')
+        self.assertEqual((task.downloaded_bytes, task.total_bytes, task.progress_val), (1100, 1400, 25.0))
+        self.assertEqual(apply_protocol_line(task, "bbx-file:/tmp/v.mp4"), LINE_FILEPATH)
+        self.assertEqual(task.final_filename, "/tmp/v.mp4")
+
+
+@unittest.skipUnless(importlib.util.find_spec("yt_dlp"), "worker pool uvozi yt_dlp modul")
+class TestYtDlpWorkerPool(unittest.TestCase):
+    def test_workers_are_recycled_after_max_jobs(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            media_dir = os.path.join(tmp, "media"); os.makedirs(media_dir)
+            with open(os.path.join(media_dir, "clip.mp4"), "wb") as f: f.write(os.urandom(32 * 1024))
+            server = _load_benchmark("bench_worker_pool")._serve_directory(media_dir); self.addCleanup(server.server_close); self.addCleanup(server.shutdown)
+            pool = YtDlpWorkerPool(max_workers=1, max_jobs_per_worker=2, prewarm=False); self.addCleanup(pool.close)
+            files, pids = [], []
+            for index in range(5):
+                options = {"outtmpl": os.path.join(tmp, "out", f"{index}.%(ext)s"), "quiet": True, "noprogress": True}
+                return_code = pool.run_job(f"http://127.0.0.1:{server.server_port}/clip.mp4", options, lambda data: None, files.append,
+                                           lambda message: None, threading.Event())
+                self.assertEqual(return_code, 0); pids.append(pool._idle[0].process.pid)
+            self.assertEqual(pool.stats, {"spawned": 3, "recycled": 2, "jobs": 5}) # Svaki worker odradi 2 posla pa ga zamijeni svjež
+            self.assertEqual(len(set(pids)), 3)
+            self.assertEqual(sorted(os.path.basename(path) for path in files), [f"{index}.mp4" for index in range(5)])
+
+
+class TestExtractionCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp(prefix="bbx_cache_test_"); self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+
+    def _write_info(self, cache, url, size=10, extra=""):
+        with open(cache.output_template_for(url) + ".info.json", "w", encoding="utf-8") as f:
+            f.write('{"_type": "video"%s, "pad": "%s"}' % (extra, "x" * size))
+
+    def test_single_flight_shares_one_extraction(self):
+        cache = ExtractionCache(self.cache_dir)
+        url = "https://example.com/watch?v=1"
+        self.assertEqual(cache.acquire(url), (None, True))
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(cache.acquire(url + "#t=5")))
+        waiter.start(); time.sleep(0.1)
+        self.assertEqual(results, [])
+        self._write_info(cache, url)
+        cache.release(url); waiter.join(2)
+        self.assertEqual(results, [(cache.path_for(url), False)])
+        self.assertEqual((cache.stats["misses"], cache.stats["waits"], cache.stats["hits"]), (1, 1, 1))
+
+    def test_ttl_lru_and_playlists(self):
+        cache = ExtractionCache(self.cache_dir, ttl_seconds=3600, max_bytes=250)
+        for index in range(3):
+            url = f"https://example.com/{index}"
+            cache.acquire(url); self._write_info(cache, url, size=100); cache.release(url)
+        self.assertEqual(cache.acquire("https://example.com/0"), (None, True)) # Najstariji izbačen zbog limita veličine
+        cache.release("https://example.com/0")
+        playlist_url = "https://example.com/list"
+        cache.acquire(playlist_url); self._write_info(cache, playlist_url, extra=', "playlist_index": 2'); cache.release(playlist_url)
+        self.assertFalse(os.path.exists(cache.path_for(playlist_url)))
+        cache.ttl_seconds = 0
+        self.assertEqual(cache.acquire("https://example.com/2"), (None, True))
+
+    def test_followers_start_once_leader_has_extracted(self):
+        with tempfile.TemporaryDirectory() as tmp, _fake_engine_env(tmp, extraction_cache_enabled=True, postprocess_stage_enabled=False), \
+             mock.patch.object(de, "ExtractionCache", lambda **kwargs: ExtractionCache(self.cache_dir, **kwargs)):
+            first_progress, finished, done = {}, {}, threading.Event()
+            def on_update(task, update_type, data=None):
+                if update_type == "progress_update": first_progress.setdefault(task.item_id, time.monotonic())
+                if task.status == "Završeno" and task.item_id not in finished:
+                    finished[task.item_id] = time.monotonic()
+                    if len(finished) == 2: done.set()
+            downloader = Downloader(update_callback=on_update, max_concurrent_downloads=2)
+            for item_id in ("leader", "follower"): # Zasebni direktoriji: isti URL daje isto ime fajla
+                downloader.add_to_queue(DownloadTask("https://example.com/same?duration=1.5&extract_ms=200", "Općenito - Najbolje Moguće",
+                                                     os.path.join(tmp, item_id), item_id))
+            self.assertTrue(done.wait(20)); downloader.stop_worker()
+            self.assertLess(first_progress["follower"], finished["leader"]) # Ne čeka leaderovo preuzimanje
+            self.assertEqual((downloader._extraction_cache.stats["misses"], downloader._extraction_cache.stats["hits"]), (1, 1))
+
+
+class TestUrlCanonicalizationAndArchive(unittest.TestCase):
+    def test_youtube_variants_share_one_id(self):
+        variants = ["youtu.be/dQw4w9WgXcQ?si=abc", "https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=5&feature=share",
+                    "https://m.youtube.com/shorts/dQw4w9WgXcQ"]
+        self.assertEqual({canonicalize_url(url) for url in variants}, {"https://www.youtube.com/watch?v=dQw4w9WgXcQ"})
+        self.assertEqual(len({task_id_for(url, "Video - 1080p MP4") for url in variants}), 1)
+        self.assertNotEqual(task_id_for(variants[0], "Video - 1080p MP4"), task_id_for(variants[0], "Audio - Najbolji MP3"))
+        self.assertEqual(archive_id_for(variants[1]), "youtube dQw4w9WgXcQ")
+        self.assertEqual(canonicalize_url("https://Example.com/a/?b=2&utm_source=x&a=1#frag"), "https://example.com/a?a=1&b=2")
+        self.assertEqual(canonicalize_url("https://example.com/v?ref=2&pp=x&fbclid=1"), "https://example.com/v?pp=x&ref=2") # Može birati video
+        self.assertEqual(canonicalize_url("https://soundcloud.com/a/b?si=123&ref=clipboard&utm_medium=text"), "https://soundcloud.com/a/b")
+
+    def test_archive_is_per_profile_and_reads_ytdlp_format(self):
+        with tempfile.TemporaryDirectory(prefix="bbx_archive_test_") as archive_dir:
+            archive = DownloadArchive(archive_dir)
+            with open(archive.archive_path("Video - 1080p MP4"), "w", encoding="utf-8") as f: f.write("youtube dQw4w9WgXcQ\n")
+            self.assertTrue(archive.contains("youtu.be/dQw4w9WgXcQ", "Video - 1080p MP4"))
+            self.assertFalse(archive.contains("youtu.be/dQw4w9WgXcQ", "Audio - Najbolji MP3"))
+            with open(archive.archive_path("Video - 1080p MP4"), "a", encoding="utf-8") as f: f.write("generic clip\n") # Kao yt-dlp --download-archive
+            archive.record("https://example.com/clip?utm_source=x", "Video - 1080p MP4", "generic clip")
+            self.assertTrue(DownloadArchive(archive_dir).contains("https://example.com/clip", "Video - 1080p MP4"))
+
+
+class TestPlaylistExpander(unittest.TestCase):
+    def test_detects_playlists_and_parses_flat_entries(self):
+        self.assertTrue(is_probable_playlist_url("https://www.youtube.com/playlist?list=PL123"))
+        self.assertTrue(is_probable_playlist_url("youtube.com/@someone/videos"))
+        self.assertFalse(is_probable_playlist_url("https://www.youtube.com/watch?v=dQw4w9WgXcQ"))
+        self.assertFalse(is_probable_playlist_url("https://example.com/playlist?list=1"))
+        line = '{"_type": "url", "url": "https://www.youtube.com/watch?v=dQw4w9WgXcQ", "title": "T", "playlist_title": "PL"}'
+        self.assertEqual(parse_entry_line(line), ("https://www.youtube.com/watch?v=dQw4w9WgXcQ", "T", "PL"))
+        self.assertIsNone(parse_entry_line('{"_type": "url", "url": "dQw4w9WgXcQ"}'))
+        self.assertIsNone(parse_entry_line("[download] nije JSON"))
+
+    def test_group_aggregates_children_incrementally(self):
+        group_task = DownloadTask("https://www.youtube.com/playlist?list=PL1", "Video - 1080p MP4", "/tmp", "grp")
+        group = PlaylistGroup(group_task)
+        self.assertEqual(group_task.status, "Proširivanje...")
+        children = [DownloadTask(f"https://example.com/{i}", "Video - 1080p MP4", "/tmp", f"c{i}") for i in range(2)]
+        for child in children: group.add_child(child.item_id)
+        children[0].progress_val = 50.0; children[0].status = "Preuzimanje..."
+        self.assertEqual(group.on_child_update(children[0]), "progress_update")
+        self.assertEqual(group_task.progress_str, "25.0%")
+        children[0].status = "Završeno"; group.on_child_update(children[0])
+        self.assertIsNone(group.on_child_update(children[0])) # Ponovljeni završni događaj se ne broji dvaput
+        self.assertEqual(group.finish_expansion(), "progress_update")
+        children[1].status = "Greška"
+        self.assertEqual(group.on_child_update(children[1]), "download_error")
+        self.assertEqual((group_task.status, group_task.progress_val, group_task.speed_str), ("Greška", 100.0, "2/2 gotovo"))
+
+
+class TestHostLimits(unittest.TestCase):
+    def test_rules_share_counter_and_bandwidth_split(self):
+        limiter = HostLimiter([[["youtube.com", "youtu.be"], 2]], default_limit=0)
+        self.assertEqual(limiter.classify("https://youtu.be/x"), ("youtube.com", 2))
+        self.assertEqual(limiter.classify("https://m.youtube.com/watch?v=x"), ("youtube.com", 2))
+        self.assertEqual(limiter.classify("https://www.example.com/a.mp4"), ("example.com", 0))
+        self.assertIsNone(split_bandwidth(0, 2, 2))
+        self.assertEqual(split_bandwidth(1024 * 1024, 1, 4), 256 * 1024) # Slotovi koji će se uskoro popuniti već su uračunati
+        self.assertEqual(split_bandwidth(8 * 1024, 2, 2), 8 * 1024) # Donja granica ne prelazi ni budžet manji od MIN_RATE_LIMIT
+
+    def test_started_shares_never_exceed_budget(self):
+        budget = 1000 * 1024; started = []
+        settings = {**settings_handler.DEFAULT_SETTINGS, "bandwidth_limit_kib": 1000}
+        def wait_started(count):
+            deadline = time.time() + 2
+            while len(started) < count and time.time() < deadline: time.sleep(0.01)
+            time.sleep(0.05); return sorted(task.item_id for task in started)
+        with mock.patch.object(settings_handler, "load_settings", return_value=settings): # start_worker ponovno čita postavke
+            downloader = Downloader(lambda *args: None, max_concurrent_downloads=4)
+            downloader._execute_download = started.append
+            def start_process(task): # Kao _run_backend: --limit-rate ulazi u naredbu
+                with downloader._slot_condition: task.rate_limit_locked = True
+            downloader.add_to_queue(DownloadTask("https://a.example.com/x", "Video - 1080p MP4", tempfile.gettempdir(), "bw_a"))
+            self.assertEqual(wait_started(1), ["bw_a"]); start_process(started[0])
+            self.assertEqual(started[0].rate_limit, budget) # Sam u redu dobiva cijeli budžet...
+            for name in ("b", "c"): downloader.add_to_queue(DownloadTask(f"https://{name}.example.com/x", "Video - 1080p MP4", tempfile.gettempdir(), f"bw_{name}"))
+            self.assertEqual(wait_started(3), ["bw_a"]) # ...pa sljedeći čekaju da se budžet oslobodi umjesto da ga prekorače
+            downloader._release_slot(started[0])
+            self.assertEqual(wait_started(3), ["bw_a", "bw_b", "bw_c"])
+            for task in started[1:]: start_process(task)
+            self.assertEqual([task.rate_limit for task in started[1:]], [budget // 2, budget // 2])
+            downloader.stop_worker()
+            with downloader._slot_condition:
+                for index in range(3): downloader.download_queue.put(DownloadTask(f"https://youtu.be/v{index}", "Video - 1080p MP4", "", f"bw_yt{index}"))
+                self.assertEqual(downloader._dispatchable_count_locked(4), 2) # Limit hosta: treći YouTube task ne dobiva dio budžeta
+
+    def test_scheduler_skips_saturated_host(self):
+        started = []
+        downloader = Downloader(lambda *args: None, max_concurrent_downloads=3)
+        downloader._execute_download = started.append # Slot ostaje zauzet dok ga test ne oslobodi
+        urls = [f"https://www.youtube.com/watch?v=video{i:06d}" for i in range(3)] + ["https://example.com/a.mp4"]
+        for index, url in enumerate(urls): downloader.add_to_queue(DownloadTask(url, "Video - 1080p MP4", tempfile.gettempdir(), f"host_{index}"))
+        deadline = time.time() + 2
+        while len(started) < 3 and time.time() < deadline: time.sleep(0.01)
+        self.assertEqual([task.item_id for task in started], ["host_0", "host_1", "host_3"]) # YouTube limit je 2
+        downloader._release_slot(started[0])
+        while len(started) < 4 and time.time() < deadline: time.sleep(0.01)
+        self.assertEqual(started[-1].item_id, "host_2")
+        downloader.stop_worker()
+
+
+class TestDownloadTuning(unittest.TestCase):
+    def test_profile_overrides_default_and_missing_downloader_is_dropped(self):
+        self.assertEqual((parse_size("10M"), parse_size("512KiB"), parse_size(""), parse_size("x")), (10 * 1024 ** 2, 512 * 1024, None, None))
+        settings = {"download_tuning": {"default": {"concurrent_fragments": 4, "http_chunk_size": "1M",
+                                                    "external_downloader": {"http": "bbx-missing-downloader", "m3u8": "native", "bogus": "native"}},
+                                        "Audio - Najbolji MP3": {"concurrent_fragments": 2}}}
+        tuning = resolve_tuning(settings, "Audio - Najbolji MP3")
+        self.assertEqual(tuning["concurrent_fragments"], 2)
+        self.assertEqual(tuning["external_downloader"], {"m3u8": "native"})
+        self.assertEqual(tuning_cli_args(tuning), ["--concurrent-fragments", "2", "--http-chunk-size", "1048576", "--downloader", "m3u8:native"])
+        self.assertEqual(tuning_ytdl_options(resolve_tuning(settings, "Video - 1080p MP4"))["concurrent_fragment_downloads"], 4)
+
+
+class TestLogRingBuffer(unittest.TestCase):
+    def test_capacity_and_filters_run_on_buffer(self):
+        buffer = LogRingBuffer(capacity=100)
+        for index in range(250): buffer.append(logging.INFO, f"linija {index}", task_id="t1" if index % 2 else "t2", kind=KIND_TASK_OUTPUT)
+        buffer.append(logging.ERROR, "GREŠKA: x", task_id="t1")
+        self.assertEqual((len(buffer), buffer.stats["dropped"], buffer.last_seq), (100, 151, 251))
+        self.assertEqual([entry.text for entry in buffer.since(248)], ["linija 248", "linija 249", "GREŠKA: x"])
+        self.assertEqual([entry.seq for entry in buffer.since(0, logging.ERROR)], [251])
+        self.assertEqual(len(buffer.query(task_ids={"t2"})), 49) # Parni indeksi 152..248
+
+    def test_handler_extracts_task_id_and_status(self):
+        buffer = LogRingBuffer(); handler = LogBufferHandler(buffer)
+        test_logger = logging.getLogger("bbx.test.logbuffer"); test_logger.addHandler(handler); test_logger.propagate = False; test_logger.setLevel(logging.DEBUG)
+        try:
+            test_logger.warning("[task_abc] yt-dlp se žali"); test_logger.info("[STATUS] Red je prazan.")
+        finally: test_logger.removeHandler(handler)
+        first, second = buffer.query()
+        self.assertEqual((first.task_id, first.levelno), ("task_abc", logging.WARNING))
+        self.assertEqual((second.text, second.kind), ("Red je prazan.", "status"))
+
+
+class TestQueueModel(unittest.TestCase):
+    def test_only_changed_columns_of_rendered_rows_are_diffed(self):
+        model = QueueModel(); tasks = [DownloadTask(f"https://example.com/v{index}", "Općenito - Najbolje Moguće", "/tmp", f"t{index}") for index in range(10000)]
+        for task in tasks: model.upsert(task)
+        for item_id in model.flat_ids()[:20]: model.mark_rendered(item_id)
+        self.assertFalse(model.upsert(tasks[0])) # Bez promjene nema diffa
+        tasks[0].progress_str = "50.0%"; tasks[5000].status = "Preuzimanje..."
+        self.assertTrue(model.upsert(tasks[0])); model.upsert(tasks[5000])
+        self.assertEqual(model.take_changes(), [("t0", {4: "50.0%"}, TAG_UNCHANGED)]) # t5000 nije u widgetu
+        self.assertEqual(model.take_changes(), [])
+
+    def test_group_children_appear_only_when_expanded(self):
+        model = QueueModel()
+        group = DownloadTask("https://example.com/playlist?list=x", "Općenito - Najbolje Moguće", "/tmp", "g"); group.is_group = True
+        model.upsert(group); model.upsert(DownloadTask("https://example.com/a", "Općenito - Najbolje Moguće", "/tmp", "other"))
+        for index in range(3):
+            child = DownloadTask(f"https://example.com/c{index}", "Općenito - Najbolje Moguće", "/tmp", f"c{index}"); child.parent_id = "g"; model.upsert(child)
+        self.assertEqual(model.flat_ids(), ["g", "other"])
+        self.assertTrue(model.toggle_expanded("g"))
+        self.assertEqual(model.flat_ids(), ["g", "c0", "c1", "c2", "other"])
+        self.assertEqual(sorted(model.remove_many(["g"])), ["c0", "c1", "c2", "g"])
+        self.assertEqual((model.flat_ids(), len(model)), (["other"], 1))
+
+
+class TestSettingsStore(unittest.TestCase):
+    def test_reads_from_memory_and_debounces_atomic_writes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "app_settings.json")
+            with open(path, "w", encoding="utf-8") as f: json.dump({"output_directory": tmp, "theme": "green"}, f)
+            store = SettingsStore(path, debounce_s=0.05); received = []
+            store.add_listener(received.append)
+            for _ in range(100): self.assertEqual(store.get()["theme"], "green")
+            for index in range(5): store.save({**store.get(), "max_concurrent_downloads": index + 1})
+            self.assertEqual((store.stats["disk_reads"], len(received)), (1, 5))
+            time.sleep(0.3)
+            self.assertEqual(store.stats["disk_writes"], 1) # Nedostajući ključevi pri učitavanju + 5 spremanja = jedan upis
+            with open(path, encoding="utf-8") as f: self.assertEqual(json.load(f)["max_concurrent_downloads"], 5)
+            self.assertEqual(os.listdir(tmp), ["app_settings.json"]) # Nema zaostalih temp fajlova
+
+
+@unittest.skipUnless(importlib.util.find_spec("cryptography"), "cryptography nije instaliran")
+class TestLicenseOfflineGrace(unittest.TestCase):
+    def setUp(self):
+        from core import license_manager
+        self.lm = license_manager; tmp = tempfile.mkdtemp(); self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        self._patches = [mock.patch.object(license_manager, name, os.path.join(tmp, filename)) for name, filename in
+                         (("LICENSE_FILE", "license_info.dat"), ("SALT_FILE", "app.salt"), ("KEY_CACHE_FILE", "license_key.cache"))]
+        for patcher in self._patches: patcher.start()
+
+    def tearDown(self):
+        for patcher in self._patches: patcher.stop()
+
+    def test_cached_key_and_grace_period(self):
+        manager = self.lm.LicenseManager(); self.lm._derived_keys.clear()
+        with mock.patch.object(self.lm.LicenseManager, "_derive_key", side_effect=AssertionError("PBKDF2 ponovo")):
+            self.assertEqual(self.lm.LicenseManager().fernet_key, manager.fernet_key) # Iz keša na disku
+        stale = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=self.lm.OFFLINE_GRACE_DAYS + 1)).isoformat()
+        manager._save_license_local({"license_key": "K", "status": "active", "expires_at": "never", "verified_at": stale})
+        is_valid, info = manager.is_license_valid()
+        self.assertFalse(is_valid); self.assertTrue(info["grace_expired"])
+        with mock.patch.object(manager, "_fetch_license_from_remote", return_value={"error": "Timeout", "network_error": True}):
+            self.assertFalse(manager.refresh_license()[0]) # Mreža ne produljuje grace
+        with mock.patch.object(manager, "_fetch_license_from_remote", return_value={"license_key": "K", "status": "active", "expires_at": "never"}):
+            self.assertTrue(manager.refresh_license_async().result()[0])
+        with mock.patch.object(manager, "_fetch_license_from_remote", return_value={"error": "Nije pronađen", "revoked": True}):
+            self.assertFalse(manager.refresh_license()[0])
+        self.assertEqual(manager.get_current_license_info()["status"], "revoked")
+
+
+@unittest.skipUnless(importlib.util.find_spec("PIL"), "Pillow nije instaliran")
+class TestIconStore(unittest.TestCase):
+    def test_memory_disk_and_mtime_invalidation(self):
+        from PIL import Image
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, "queue_icon.png"); cache_file = os.path.join(tmp, "icon_cache.bin")
+            Image.new("RGBA", (64, 64), (255, 0, 0, 255)).save(source)
+            store = IconStore(tmp, cache_file)
+            first = store.get_bitmap("queue_icon", (22, 22), "light")
+            self.assertIs(store.get_bitmap("queue_icon", (22, 22), "light"), first)
+            self.assertIsNone(store.get_bitmap("missing_icon", (22, 22), "dark"))
+            warm = IconStore(tmp, cache_file) # Novo pokretanje: iz keša na disku, bez skaliranja
+            self.assertEqual(warm.get_bitmap("queue_icon", (22, 22), "light").tobytes(), first.tobytes())
+            self.assertEqual((warm.stats["disk_hits"], warm.stats["scaled"]), (1, 0))
+            Image.new("RGBA", (64, 64), (0, 0, 255, 255)).save(source); os.utime(source, ns=(0, 10 ** 18))
+            fresh = IconStore(tmp, cache_file).get_bitmap("queue_icon", (22, 22), "light")
+            self.assertEqual(fresh.getpixel((10, 10)), (0, 0, 255, 255))
+
+
+class TestProcessReactor(unittest.TestCase):
+    def test_drains_stderr_and_splits_lines(self):
+        # Više od kapaciteta pipe-a na stderr dok se stdout još piše: stari readline petlja samo nad stdout-om bi tu zastala
+        script = ("import sys\n"
+                  "for i in range(3000): sys.stderr.write('WARNING: ' + 'x' * 100 + '\\n')\n"
+                  "sys.stdout.write('a\\r\\nb\\rc\\n\\nzadnja')")
+        reactor = ProcessReactor(chunk_size=4096); stdout_lines, stderr_lines, closed = [], [], threading.Event()
+        process = subprocess.Popen([sys.executable, "-c", script], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        watch = reactor.watch(process, stdout_lines.append, stderr_lines.append, on_close=closed.set)
+        try:
+            self.assertEqual(watch.wait(exit_timeout=10), 0)
+            self.assertTrue(closed.is_set())
+            self.assertEqual(stdout_lines, ["a", "b", "c", "zadnja"])
+            self.assertEqual(len(stderr_lines), 3000)
+        finally: reactor.close()
+
+
+class TestEngineSteps(unittest.TestCase):
+    def test_thread_count_does_not_grow_with_concurrency(self):
+        with tempfile.TemporaryDirectory() as tmp, _fake_engine_env(tmp, postprocess_stage_enabled=False, host_max_concurrent_default=0):
+            finished, done, peak = set(), threading.Event(), {"threads": 0, "active": 0}
+            def on_update(task, update_type, data=None):
+                if task.status == "Završeno": finished.add(task.item_id); len(finished) == 12 and done.set()
+            downloader = Downloader(update_callback=on_update, max_concurrent_downloads=12)
+            baseline = threading.active_count()
+            for i in range(12):
+                downloader.add_to_queue(DownloadTask(f"https://example.com/{i}?duration=1", "Općenito - Najbolje Moguće", tmp, f"steps_{i}"))
+            while not done.wait(0.05):
+                peak["threads"] = max(peak["threads"], threading.active_count()); peak["active"] = max(peak["active"], downloader.active_downloads_count)
+            downloader.stop_worker()
+        self.assertEqual(peak["active"], 12)
+        self.assertLessEqual(peak["threads"] - baseline, de.ENGINE_STEP_THREADS + 2) # + dispatcher i reaktor, ne nit po procesu
+
+
+class TestEngineMetrics(unittest.TestCase):
+    def test_transitions_prometheus_and_snapshot(self):
+        engine = EngineMetrics(); task = _Task("m1"); task.url = "https://www.example.com/v"; task.host_key = None
+        task.downloaded_bytes = 0; task.status = "Preuzimanje..."
+        engine.task_queued(task); engine.task_started(task, time.perf_counter() - 2.0)
+        for downloaded in (1000, 5000, 0, 3000): task.downloaded_bytes = downloaded; engine.progress(task) # 0 = ponovni pokušaj
+        task.status = "Greška"; engine.task_finished(task, "example.com")
+        self.assertEqual(engine.downloaded_bytes.value(), 8000)
+        text = engine.registry.render_prometheus()
+        self.assertIn('bbx_tasks_finished_total{host="example.com",result="error"} 1', text)
+        self.assertIn('bbx_queue_wait_seconds_bucket{le="5"} 1', text)
+        self.assertIn("bbx_time_to_first_byte_seconds_count 1", text)
+        tmp = tempfile.mkdtemp(); self.addCleanup(shutil.rmtree, tmp, ignore_errors=True); path = os.path.join(tmp, "metrics.json")
+        MetricsExporter(engine.registry, snapshot_file=path, snapshot_interval_s=60).close() # close() piše zadnji snapshot
+        with open(path, encoding="utf-8") as f: snapshot = json.load(f)["metrics"]
+        self.assertEqual(snapshot["bbx_task_duration_seconds"]["error"]["count"], 1)
+
+
+class TestTracing(unittest.TestCase):
+    def test_protocol_markers_become_chrome_trace_spans(self):
+        tracer = Tracer(); task = DownloadTask("https://example.com/v", "Video - 720p MP4", "/tmp", "t1")
+        self.assertIsNone(tracer.task_tracker(task)) # Isključeno: bez trackera i bez spanova
+        with tracer.span("extraction_cache_wait", task): pass
+        tracer.enabled = True
+        task.trace = tracer.task_tracker(task, "preparation"); task.trace.enter("extraction")
+        for line in ("bbx-phase:before_dl", "bbx-phase:pp_started Merger", "bbx-phase:pp_finished Merger",
+                     "bbx-phase:pp_started FFmpegMetadata", "bbx-phase:pp_finished FFmpegMetadata"):
+            apply_protocol_line(task, line)
+        task.trace.finish(status="Završeno")
+        tmp = tempfile.mkdtemp(); self.addCleanup(shutil.rmtree, tmp, ignore_errors=True); path = os.path.join(tmp, "trace.json")
+        self.assertEqual(tracer.export_chrome_trace(path), 8)
+        with open(path, encoding="utf-8") as f: events = [event for event in json.load(f)["traceEvents"] if event["ph"] == "X"]
+        self.assertEqual([event["name"] for event in events],
+                         ["preparation", "extraction", "transfer", "merge", "finalize", "postprocess", "finalize", "task"])
+        self.assertEqual(events[5]["args"], {"postprocessor": "FFmpegMetadata"})
+        self.assertEqual(events[-1]["args"], {"status": "Završeno"})
+        self.assertLessEqual(sum(event["dur"] for event in events[:-1]), events[-1]["dur"] + 1)
+
+
+class TestPostProcessStage(unittest.TestCase):
+    def test_merge_and_audio_jobs_from_raw_output(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            video, audio, thumb = (os.path.join(tmp, name) for name in ("a.f137.mp4", "a.f140.m4a", "a.webp"))
+            for path in (video, audio, thumb): open(path, "wb").close()
+            kind, (key, streams) = parse_line(f'bbx-raw:streams {json.dumps([video, audio])}')
+            self.assertEqual((kind, key), (LINE_RAW, "streams"))
+            self.assertEqual(parse_line("bbx-raw:thumbnail "), (LINE_RAW, ("thumbnail", None)))
+            job = plan_postprocess({"type": "video"}, {}, os.path.join(tmp, "a.webm"), {"streams": streams, "meta": {"title": "T"}})
+            self.assertEqual((job.kind, job.output), ("merge", os.path.join(tmp, "a.mp4")))
+            self.assertIn("title=T", job.args)
+            self.assertIsNone(plan_postprocess({"type": "video"}, {"add_metadata_video": False}, video, {}))
+            job = plan_postprocess({"type": "audio", "extract_audio_format": "mp3"}, {}, audio, {"thumbnail": thumb})
+            self.assertEqual((job.output, job.thumbnail), (os.path.join(tmp, "a.f140.mp3"), thumb))
+            open(job.temp_output, "wb").close(); job.commit()
+            self.assertEqual(sorted(os.listdir(tmp)), ["a.f137.mp4", "a.f140.mp3"])
+
+    def test_skipped_ytdlp_fixup_is_applied_by_remux(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            audio, video = os.path.join(tmp, "a.m4a"), os.path.join(tmp, "v.mp4")
+            for path in (audio, video): open(path, "wb").close()
+            profile = {"type": "audio", "extract_audio_format": "m4a"}; copy_plan = FormatPlan("copy", "m4a", ("aac",))
+            self.assertIsNone(plan_postprocess(profile, {}, audio, {"meta": {"acodec": "mp4a.40.2"}}, copy_plan))
+            job = plan_postprocess(profile, {}, audio, {"meta": {"acodec": "mp4a.40.2"}, "fixup": True}, copy_plan)
+            self.assertEqual((job.kind, job.output), ("audio_copy", audio)) # DASH m4a / HLS ADTS -> ispravan m4a, bez kodiranja
+            self.assertEqual(job.args[-5:], ["copy", "-bsf:a", "aac_adtstoasc", "-movflags", "+faststart"])
+            job = plan_postprocess({"type": "video"}, {"add_metadata_video": False}, video, {"meta": {"acodec": "opus"}, "fixup": True})
+            self.assertEqual((job.kind, job.output, job.args), ("remux", video, ["-map", "0", "-c", "copy", "-movflags", "+faststart"]))
+            stage_task = DownloadTask("https://example.com/x", "Audio - Najbolji MP3", tmp, "fixup"); stage_task.stage_input = {}
+            downloader = Downloader(lambda *args: None)
+            with mock.patch.object(de, "get_reactor") as reactor, mock.patch.object(de.subprocess, "Popen"):
+                downloader._run_subprocess(stage_task, ["yt-dlp"], threading.Event(), "", lambda *args: None)
+                on_stderr_line = reactor.return_value.watch.call_args.args[2]
+            on_stderr_line("WARNING: [youtube] x: writing DASH m4a. Only some players support this container. Install ffmpeg to fix this automatically")
+            self.assertEqual(stage_task.stage_input, {"fixup": True})
+
+    def test_failed_postprocess_is_reported_as_failure_without_file(self):
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.dict(os.environ, {"BBX_FAKE_FFMPEG_FAIL": "1"}):
+            exit_code, events = _run_cli(tmp, ["https://example.com/a?duration=0.1"], ["--profile", "Audio - Najbolji MP3"])
+            done = next(event for event in events if event["event"] == "done")
+            self.assertEqual((done["status"], done["ok"], done["exit_code"], done["file"]), ("Greška", False, 1, None))
+            self.assertEqual((events[-1]["ok"], events[-1]["failed"], exit_code), (0, 1, 1))
+            self.assertFalse([name for name in os.listdir(tmp) if name.endswith(".mp3")])
+            finished = threading.Event()
+            with _fake_engine_env(tmp):
+                downloader = Downloader(update_callback=lambda task, update_type, data=None: task.status == "Greška" and finished.set())
+                task = DownloadTask("https://example.com/b?duration=0.1", "Audio - Najbolji MP3", tmp, "pp_fail")
+                downloader.add_to_queue(task); self.assertTrue(finished.wait(15)); downloader.stop_worker()
+            self.assertEqual((task.return_code, task.final_filename), (1, None))
+
+    def test_archive_line_is_written_only_after_postprocess_commit(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            archive_dir = os.path.join(tmp, "archives"); results = {}
+            with _fake_engine_env(tmp, download_archive_enabled=True), \
+                 mock.patch.object(de, "DownloadArchive", lambda: DownloadArchive(archive_dir)), \
+                 mock.patch.object(de, "build_download_command", wraps=de.build_download_command) as build_command:
+                for name, fail in (("ok", "0"), ("broken", "1")):
+                    finished = threading.Event()
+                    downloader = Downloader(update_callback=lambda task, update_type, data=None: task.status in ("Završeno", "Greška") and finished.set())
+                    with mock.patch.dict(os.environ, {"BBX_FAKE_FFMPEG_FAIL": fail}):
+                        task = DownloadTask(f"https://example.com/{name}?duration=0.1", "Audio - Najbolji MP3", tmp, f"arch_{name}")
+                        downloader.add_to_queue(task); self.assertTrue(finished.wait(15)); downloader.stop_worker()
+                    results[name] = task
+            self.assertTrue(all(call.args[4] is None for call in build_command.call_args_list)) # yt-dlp ne dobiva --download-archive
+            self.assertEqual((results["ok"].status, results["broken"].status), ("Završeno", "Greška"))
+            archive = DownloadArchive(archive_dir)
+            self.assertTrue(archive.contains(results["ok"].url, "Audio - Najbolji MP3"))
+            self.assertFalse(archive.contains(results["broken"].url, "Audio - Najbolji MP3"))
+
+
+
+class TestFormatPlanner(unittest.TestCase):
+    MP3 = {"type": "audio", "extract_audio_format": "mp3", "accept_source_codecs": ("aac", "opus")}
+    FORMATS = [{"format_id": "140", "ext": "m4a", "acodec": "mp4a.40.2", "vcodec": "none", "abr": 129},
+               {"format_id": "251", "ext": "webm", "acodec": "opus", "vcodec": "none", "abr": 135},
+               {"format_id": "137", "ext": "mp4", "acodec": "none", "vcodec": "avc1.640028", "tbr": 4000}]
+
+    def test_audio_prefers_stream_copy_and_transcodes_only_when_needed(self):
+        plan = plan_audio_format(self.MP3, {}, self.FORMATS)
+        self.assertEqual((plan.action, plan.format_id, plan.target), ("copy", "251", "opus"))
+        self.assertEqual(ytdlp_audio_format(self.MP3, {}, plan), "best")
+        m4a = {"type": "audio", "extract_audio_format": "m4a"}
+        self.assertEqual(plan_audio_format(m4a, {}, self.FORMATS).format_id, "140") # 129k >= 0.75 * 135k, kopija
+        weak = [dict(self.FORMATS[0], abr=64), self.FORMATS[1]]
+        self.assertEqual((plan_audio_format(m4a, {}, weak).action, plan_audio_format(m4a, {}, weak).format_id), ("transcode", "251"))
+        plan = plan_audio_format(self.MP3, {"stream_copy_first": False}, self.FORMATS)
+        self.assertEqual((plan.action, plan.target), ("transcode", "mp3"))
+        self.assertEqual(ytdlp_audio_format(self.MP3, {}, None), "m4a>m4a/opus>opus/webm>opus/mp3")
+        self.assertIsNone(plan_audio_format(self.MP3, {}, [{"format_id": "0", "acodec": None, "vcodec": "none"}]))
+        shipped_mp3 = QUALITY_PROFILES["Audio - Najbolji MP3"] # Bez accept_source_codecs: MP3 profil uvijek daje mp3
+        self.assertEqual(plan_audio_format(shipped_mp3, {}, self.FORMATS).action, "transcode")
+        self.assertEqual(ytdlp_audio_format(shipped_mp3, {}, None), "mp3")
+        opt_in = QUALITY_PROFILES["Audio - MP3 ili izvorni AAC/Opus"]
+        self.assertEqual((plan_audio_format(opt_in, {}, self.FORMATS).action, plan_audio_format(opt_in, {}, self.FORMATS).target), ("copy", "opus"))
+        self.assertEqual(plan_audio_format(opt_in, {"stream_copy_first": False}, self.FORMATS).action, "transcode")
+
+    def test_merge_falls_back_to_mkv_instead_of_transcoding(self):
+        stage_input = {"streams": ["a.f1.webm", "a.f2.webm"], "meta": {"vcodec": "vp8", "acodec": "vorbis", "format_id": "43+171"}}
+        self.assertEqual(str(plan_downloaded({"type": "video"}, {}, stage_input)), "merge vp8+vorbis -> mkv [format 43+171] (kodeci ne stanu u mp4)")
+        stage_input["meta"].update(vcodec="avc1.64001F", acodec="mp4a.40.2")
+        self.assertEqual(plan_downloaded({"type": "video"}, {}, stage_input).target, "mp4")
+        self.assertEqual(plan_downloaded(self.MP3, {}, {"meta": {"acodec": "vorbis"}}).action, "transcode")
+
+
+
+class TestAsyncEngine(unittest.TestCase):
+    def test_runs_tasks_within_slot_limit_and_reports_failures(self):
+        from core.async_engine import AsyncDownloader
+        active_seen = []
+        with tempfile.TemporaryDirectory() as tmp, _fake_engine_env(tmp):
+            async def scenario():
+                def on_update(task, update_type, data=None):
+                    if update_type == "status_update" and task.status == "Preuzimanje...": active_seen.append(engine.active_downloads_count)
+                async with AsyncDownloader(update_callback=on_update, max_concurrent_downloads=2) as engine:
+                    tasks = [DownloadTask(f"https://example.com/v{index}?duration=0.2" + ("&fail=1" if index == 3 else ""), "Video - 720p MP4", tmp, f"a{index}")
+                             for index in range(4)]
+                    self.assertEqual([engine.submit(task) for task in tasks], [True] * 4)
+                    duplicate = DownloadTask(tasks[0].url, "Video - 720p MP4", tmp, "a0")
+                    self.assertEqual((engine.submit(duplicate), duplicate.status), (False, de.SKIPPED_DUPLICATE_STATUS))
+                    await asyncio.wait_for(engine.join(), 30)
+                    return tasks
+            tasks = asyncio.run(scenario())
+            self.assertEqual([task.status for task in tasks], ["Završeno"] * 3 + ["Greška"])
+            self.assertEqual([task.return_code for task in tasks], [0, 0, 0, 1])
+            self.assertTrue(all(os.path.isfile(task.final_filename) for task in tasks[:3]))
+            self.assertEqual((len(active_seen), max(active_seen)), (4, 2))
+
+    def test_gui_contract_journal_archive_and_removal(self):
+        from core.async_engine import AsyncDownloader
+        with tempfile.TemporaryDirectory() as tmp, _fake_engine_env(tmp, download_archive_enabled=True), \
+             mock.patch.object(de, "DownloadArchive", lambda: DownloadArchive(os.path.join(tmp, "archives"))), \
+             mock.patch("core.async_engine.DownloadArchive", lambda: DownloadArchive(os.path.join(tmp, "archives"))):
+            finished = threading.Event(); journal_path = os.path.join(tmp, "journal.sqlite3")
+            engine = AsyncDownloader(lambda task, update_type, data=None: task.item_id == "done" and task.status == "Završeno" and finished.set(),
+                                     journal=TaskJournal(journal_path))
+            self.assertTrue(engine.add_to_queue(DownloadTask("https://example.com/done?duration=0.1", "Video - 720p MP4", tmp, "done")))
+            self.assertTrue(finished.wait(15))
+            self.assertFalse(engine.add_to_queue(DownloadTask("https://example.com/done?duration=0.1", "Video - 720p MP4", tmp, "again")))
+            for item_id in ("stalled", "pending"): # Jedan slot: "pending" čeka dok "stalled" visi
+                self.assertTrue(engine.add_to_queue(DownloadTask(f"https://example.com/{item_id}?stall=1", "Video - 720p MP4", tmp, item_id)))
+            deadline = time.time() + 10
+            while "stalled" not in engine.active_tasks and time.time() < deadline: time.sleep(0.05)
+            time.sleep(0.3); engine.remove_task_completely("stalled") # Gasi coroutine i yt-dlp proces, slot prelazi na "pending"
+            while "pending" not in engine.active_tasks and time.time() < deadline: time.sleep(0.05)
+            self.assertEqual((list(engine.active_tasks), "stalled" in engine.all_tasks_map), (["pending"], False))
+            engine.stop_worker() # Gašenje ne smije u dnevniku završiti "pending"
+            restored = AsyncDownloader(journal=TaskJournal(journal_path))
+            self.assertEqual([row["item_id"] for row in restored.journal.load_unfinished()], ["pending"])
+            restored.journal.close()
+
+    def test_event_subscribers_are_bounded(self):
+        from core.async_engine import AsyncDownloader, SUBSCRIBER_QUEUE_SIZE
+        async def scenario():
+            async with AsyncDownloader() as engine:
+                stream = engine.events(); first = asyncio.ensure_future(stream.__anext__()); await asyncio.sleep(0)
+                task = DownloadTask("https://example.com/v", "Video - 720p MP4", tempfile.gettempdir(), "events")
+                engine._emit(task, "status_update"); self.assertEqual((await first).update_type, "status_update")
+                for _ in range(SUBSCRIBER_QUEUE_SIZE * 3): engine._emit(task, "progress_update")
+                engine._emit(task, "download_complete")
+                subscriber = engine._subscribers[0]
+                self.assertEqual(subscriber.qsize(), SUBSCRIBER_QUEUE_SIZE)
+                self.assertEqual(subscriber._queue[-1].update_type, "download_complete") # Završni događaj se ne gubi
+                await stream.aclose()
+        asyncio.run(scenario())
+
+    def test_settings_cli_and_app_accept_asyncio_engine(self):
+        self.assertIsNone(download_engine_error({"download_engine": "threading"}))
+        self.assertIsNone(download_engine_error({"download_engine": "asyncio"}))
+        self.assertIn("gevent", download_engine_error({"download_engine": "gevent"}))
+        with tempfile.TemporaryDirectory() as tmp:
+            exit_code, events = _run_cli(tmp, ["https://example.com/a?duration=0.1", "https://example.com/b?fail=1"], download_engine="asyncio")
+            self.assertEqual((exit_code, events[-1]["ok"], events[-1]["failed"]), (1, 1, 1))
+            self.assertEqual(_run_cli(tmp, ["https://example.com/a"], download_engine="gevent"), (2, []))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+# utils/icon_cache.py
+# Memoizirane, unaprijed skalirane ikone za utils.icon_loader. Ključ je (ime, veličina, mod), gdje je mod "light" ili "dark".
+# U procesu se svaka bitmapa skalira najviše jednom; između pokretanja skalirane bitmape žive u jednom kompaktnom fajlu
+# (zlib-komprimirani RGBA bajtovi + JSON indeks), a unos vrijedi dok se mtime/veličina izvornog PNG-a ne promijeni.
+# Nakon prvog korištenja ikona ne košta ni čitanje PNG-a ni LANCZOS resize.
+import json
+import os
+import struct
+import threading
+import zlib
+import logging
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+ICON_MODES = ("light", "dark")
+_CACHE_MAGIC = b"BBXICO1\n"
+_HEADER = struct.Struct("<I") # Duljina JSON indeksa
+
+def _source_candidates(icon_dir: str, base_icon_name: str, mode: str) -> Tuple[str, ...]:
+    # Isti redoslijed kao prije: varijanta za mod, pa generička, pa varijanta za drugi mod
+    other_mode = "dark" if mode == "light" else "light"
+    return (os.path.join(icon_dir, f"{base_icon_name}_{mode}.png"), os.path.join(icon_dir, f"{base_icon_name}.png"),
+            os.path.join(icon_dir, f"{base_icon_name}_{other_mode}.png"))
+
+class IconStore:
+    def __init__(self, icon_dir: str, cache_file: str | None):
+        self.icon_dir = icon_dir; self.cache_file = cache_file
+        self._lock = threading.Lock()
+        self._bitmaps: Dict[Tuple[str, Tuple[int, int], str], object] = {} # (ime, veličina, mod) -> PIL.Image ili None
+        self._index: Dict[str, dict] | None = None; self._blobs: Dict[str, bytes] = {}
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "scaled": 0}
+
+    def get_bitmap(self, base_icon_name: str, size: Tuple[int, int], mode: str):
+        """Skalirana PIL slika za (ime, veličina, mod) ili None ako izvora nema."""
+        key = (base_icon_name, tuple(size), mode)
+        with self._lock:
+            if key in self._bitmaps: self.stats["memory_hits"] += 1; return self._bitmaps[key]
+            bitmap = self._load_locked(base_icon_name, tuple(size), mode)
+            self._bitmaps[key] = bitmap
+            return bitmap
+
+    def clear_memory(self):
+        with self._lock: self._bitmaps.clear()
+
+    def _load_locked(self, base_icon_name: str, size: Tuple[int, int], mode: str):
+        from PIL import Image # Tek kad zatreba, i samo za promašaj u memoriji
+        source_path = next((path for path in _source_candidates(self.icon_dir, base_icon_name, mode) if os.path.exists(path)), None)
+        if source_path is None: return None
+        source_stat = os.stat(source_path)
+        cache_key = f"{base_icon_name}|{size[0]}x{size[1]}|{mode}"
+        entry = self._disk_index_locked().get(cache_key)
+        if entry and entry.get("source") == os.path.basename(source_path) and entry.get("mtime_ns") == source_stat.st_mtime_ns \
+           and entry.get("bytes") == source_stat.st_size and cache_key in self._blobs:
+            try:
+                bitmap = Image.frombytes("RGBA", size, zlib.decompress(self._blobs[cache_key]))
+                self.stats["disk_hits"] += 1
+                return bitmap
+            except (zlib.error, ValueError) as e: logger.warning(f"Oštećen unos keša ikona '{cache_key}': {e}")
+        with Image.open(source_path) as source_image:
+            bitmap = source_image.convert("RGBA").resize(size, Image.LANCZOS)
+        self.stats["scaled"] += 1
+        self._index[cache_key] = {"source": os.path.basename(source_path), "mtime_ns": source_stat.st_mtime_ns, "bytes": source_stat.st_size}
+        self._blobs[cache_key] = zlib.compress(bitmap.tobytes(), 6)
+        self._save_locked()
+        return bitmap
+
+    # --- Fajl keša: MAGIC, duljina indeksa, JSON indeks {ključ: {..., "offset", "length"}}, pa blobovi redom ---
+    def _disk_index_locked(self) -> Dict[str, dict]:
+        if self._index is not None: return self._index
+        self._index = {}
+        if not self.cache_file or not os.path.exists(self.cache_file): return self._index
+        try:
+            with open(self.cache_file, "rb") as f: data = f.read()
+            if not data.startswith(_CACHE_MAGIC): raise ValueError("nepoznat format")
+            start = len(_CACHE_MAGIC); (index_length,) = _HEADER.unpack_from(data, start); start += _HEADER.size
+            index = json.loads(data[start:start + index_length].decode("utf-8")); blob_start = start + index_length
+            for cache_key, entry in index.items():
+                self._blobs[cache_key] = data[blob_start + entry.pop("offset"):][:entry.pop("length")]
+                self._index[cache_key] = entry
+        except (OSError, ValueError, KeyError, struct.error) as e:
+            logger.warning(f"Keš ikona ({self.cache_file}) nije upotrebljiv, gradim ga ponovno: {e}")
+            self._index = {}; self._blobs = {}
+        return self._index
+
+    def _save_locked(self):
+        if not self.cache_file: return
+        index = {}; blobs = []; offset = 0
+        for cache_key, entry in self._index.items():
+            blob = self._blobs[cache_key]
+            index[cache_key] = {**entry, "offset": offset, "length": len(blob)}; blobs.append(blob); offset += len(blob)
+        index_bytes = json.dumps(index, separators=(",", ":")).encode("utf-8")
+        tmp_path = self.cache_file + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.cache_file) or ".", exist_ok=True)
+            with open(tmp_path, "wb") as f: f.write(_CACHE_MAGIC + _HEADER.pack(len(index_bytes)) + index_bytes + b"".join(blobs))
+            os.replace(tmp_path, self.cache_file)
+        except OSError as e: logger.warning(f"Nije moguće spremiti keš ikona: {e}")
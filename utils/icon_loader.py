@@ -1,49 +1,34 @@
 # utils/icon_loader.py
 import customtkinter as ctk
-from PIL import Image, UnidentifiedImageError
 import os
 import logging
+from core.settings_handler import CONFIG_DIR
+from .icon_cache import IconStore
 
 logger = logging.getLogger(__name__)
 
 ICON_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets", "icons")
 os.makedirs(ICON_PATH, exist_ok=True)
+ICON_CACHE_FILE = os.path.join(CONFIG_DIR, "icon_cache.bin")
+
+# Skalirane bitmape po (ime, veličina, mod) su u icon_store (memorija + keš na disku); CTkImage po (ime, veličina) se
+# također pamti, pa ponovni pozivi (rebuild sidebara, buduće statusne ikone po redu) vraćaju isti objekt.
+icon_store = IconStore(ICON_PATH, ICON_CACHE_FILE)
+_ctk_images = {}
 
 def load_icon(icon_name: str, size: tuple = (22, 22)):
-    base_icon_name = icon_name.replace(".png", "")
-    light_image_path = os.path.join(ICON_PATH, f"{base_icon_name}_light.png")
-    dark_image_path = os.path.join(ICON_PATH, f"{base_icon_name}_dark.png")
-    generic_image_path = os.path.join(ICON_PATH, f"{base_icon_name}.png")
+    base_icon_name = icon_name.replace(".png", ""); size = tuple(size)
+    if (base_icon_name, size) in _ctk_images: return _ctk_images[(base_icon_name, size)]
+    icon = None
     try:
-        pil_light_image, pil_dark_image = None, None
-        if os.path.exists(light_image_path): pil_light_image = Image.open(light_image_path)
-        if os.path.exists(dark_image_path): pil_dark_image = Image.open(dark_image_path)
-
-        if pil_light_image and pil_dark_image:
-            logger.debug(f"Ikona '{base_icon_name}' učitana (light/dark).")
-            return ctk.CTkImage(light_image=pil_light_image.resize(size, Image.LANCZOS),
-                                dark_image=pil_dark_image.resize(size, Image.LANCZOS), 
-                                size=size)
-        elif os.path.exists(generic_image_path):
-            img = Image.open(generic_image_path)
-            logger.debug(f"Ikona '{base_icon_name}' učitana (generička).")
-            return ctk.CTkImage(light_image=img.resize(size, Image.LANCZOS),
-                                dark_image=img.resize(size, Image.LANCZOS),
-                                size=size)
-        elif pil_light_image:
-            logger.debug(f"Ikona '{base_icon_name}' učitana (samo light).")
-            return ctk.CTkImage(light_image=pil_light_image.resize(size, Image.LANCZOS),
-                                dark_image=pil_light_image.resize(size, Image.LANCZOS), size=size)
-        elif pil_dark_image:
-            logger.debug(f"Ikona '{base_icon_name}' učitana (samo dark).")
-            return ctk.CTkImage(light_image=pil_dark_image.resize(size, Image.LANCZOS),
-                                dark_image=pil_dark_image.resize(size, Image.LANCZOS), size=size)
-        
-        logger.warning(f"Ikona '{base_icon_name}.png' (ili _light/_dark verzije) nije pronađena u {ICON_PATH}")
-        return None
-    except UnidentifiedImageError: 
-        logger.error(f"Fajl za ikonu '{base_icon_name}' nije validna slika.")
-        return None
-    except Exception as e: 
+        light_image = icon_store.get_bitmap(base_icon_name, size, "light")
+        dark_image = icon_store.get_bitmap(base_icon_name, size, "dark")
+        if light_image is None and dark_image is None:
+            logger.warning(f"Ikona '{base_icon_name}.png' (ili _light/_dark verzije) nije pronađena u {ICON_PATH}")
+        else:
+            icon = ctk.CTkImage(light_image=light_image or dark_image, dark_image=dark_image or light_image, size=size)
+            logger.debug(f"Ikona '{base_icon_name}' učitana ({size[0]}x{size[1]}).")
+    except Exception as e: # Uključuje PIL.UnidentifiedImageError (nije validna slika)
         logger.error(f"Greška pri učitavanju ikone '{base_icon_name}': {e}")
-        return None
\ No newline at end of file
+    _ctk_images[(base_icon_name, size)] = icon
+    return icon
@@ -0,0 +1,28 @@
+# utils/startup_profile.py
+# Mjerenje hladnog pokretanja za "python app_phoenix.py --profile-startup": vremena faza (uvozi, postavke, DM, licenca,
+# glavni prozor, prvo iscrtavanje) od samog početka app_phoenix.py i popis teških modula učitanih do prvog iscrtavanja.
+# Rezultat je jedan JSON objekt na stdout, pa se regresije (npr. requests ili PIL ponovo uvezen pri pokretanju) vide odmah.
+import json
+import sys
+import time
+
+# Moduli koji ne bi trebali biti učitani prije prvog iscrtavanja
+HEAVY_MODULES = ("requests", "urllib3", "PIL", "yt_dlp", "cryptography.hazmat.primitives.kdf.pbkdf2",
+                 "gui.views.downloads_view", "gui.views.queue_view", "gui.views.settings_view")
+
+class StartupProfiler:
+    def __init__(self, enabled: bool = False, started: float | None = None):
+        self.enabled = enabled
+        self.started = time.perf_counter() if started is None else started
+        self.phases = []
+
+    def mark(self, phase: str):
+        if self.enabled: self.phases.append((phase, time.perf_counter() - self.started))
+
+    def report(self) -> dict:
+        return {"phases_ms": {phase: round(elapsed * 1000, 1) for phase, elapsed in self.phases},
+                "modules_loaded": len(sys.modules),
+                "heavy_modules_loaded": [name for name in HEAVY_MODULES if name in sys.modules]}
+
+    def dump(self):
+        print(json.dumps(self.report(), indent=2), flush=True)